@@ -3,44 +3,116 @@
 # Production Server with Avatar Support - Hardened with Socket.IO Proxy
 # ================================
 
-from flask import Flask, render_template, Response, request, jsonify, make_response, g
+from flask import Flask, render_template, Response, request, jsonify, make_response, g, stream_with_context
+from flask import session as flask_session
 from flask_socketio import SocketIO, emit
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 import sys
 import json
 import uuid
 import logging
 import threading
+import queue
+import atexit
+import time
 import secrets
 from datetime import datetime
 from dotenv import load_dotenv
 
 # 3rd party for Speech STS and WebSocket proxy
 import requests
+# Proxy Realtime asyncio (aiohttp): todos los sockets upstream en pocos event loops
 try:
-    # Intentar importar websocket-client
-    import websocket
-    if not hasattr(websocket, 'WebSocketApp'):
-        raise ImportError("websocket module doesn't have WebSocketApp")
+    from src.realtime_proxy import RealtimeProxyEngine
+    REALTIME_PROXY_AVAILABLE = True
 except ImportError:
-    # Si falla, intentar con el nombre alternativo
-    try:
-        from websocket import WebSocketApp
-        import websocket
-    except ImportError:
-        logger.error("websocket-client not installed. Install with: pip install websocket-client")
-        raise
+    REALTIME_PROXY_AVAILABLE = False
+    logging.error("realtime proxy not available. Install aiohttp: pip install aiohttp")
+from src.realtime_audio import REALTIME_AUDIO_RATES
+from src.text_corrections import CorrectionsStore
 
 # Import YPF minipywo system (opcional)
 try:
     from src.agente import minipywo_app
-    from src.pywo_aux_func import replace_token
     MINIPYWO_AVAILABLE = True
 except ImportError:
     MINIPYWO_AVAILABLE = False
     logging.warning("minipywo system not available - function calling will be limited")
 
+# Catálogo Corva compartido y cache de respuestas (métricas de antigüedad y hit ratio)
+try:
+    from src.corva_catalog import get_catalog_stats
+    from src.corva_cache import get_corva_cache_stats
+    from src.corva_resolution_memo import get_resolution_stats
+    CORVA_CATALOG_AVAILABLE = True
+except ImportError:
+    CORVA_CATALOG_AVAILABLE = False
+
+# Poller WITS opcional (estado en vivo de los equipos activos)
+try:
+    from src.corva_wits_poller import start_wits_poller, get_wits_poller_stats
+    CORVA_WITS_POLLER_AVAILABLE = True
+except ImportError:
+    CORVA_WITS_POLLER_AVAILABLE = False
+
+# Health checks livianos (liveness O(1) y readiness cacheado en segundo plano)
+try:
+    from src.health_checks import get_health_checker, health_checker_running, liveness
+    HEALTH_CHECKS_AVAILABLE = True
+except ImportError:
+    HEALTH_CHECKS_AVAILABLE = False
+
+# Registro de métricas en proceso (histogramas de buckets fijos, formato Prometheus)
+try:
+    from src.metrics_registry import REGISTRY, HTTP_REQUEST_SECONDS, EVENTS_TOTAL, register_queue_depth
+    METRICS_REGISTRY_AVAILABLE = True
+except ImportError:
+    METRICS_REGISTRY_AVAILABLE = False
+
+# Pool acotado para ejecutar el grafo fuera del hilo del request
+try:
+    from src.job_pool import JobPool, JobRejected
+    JOB_POOL_AVAILABLE = True
+except ImportError:
+    JOB_POOL_AVAILABLE = False
+
+# Tools de la Realtime API ejecutadas por el proxy (sin ida y vuelta al navegador)
+try:
+    from src.realtime_tools import ToolRegistry
+    REALTIME_TOOLS_AVAILABLE = True
+except ImportError:
+    REALTIME_TOOLS_AVAILABLE = False
+
+# Tokens STS/ICE de Azure Speech cacheados y refrescados en segundo plano
+try:
+    from src.token_broker import get_token_broker, speech_sts_fetcher, ice_relay_fetcher, TokenUnavailable
+    TOKEN_BROKER_AVAILABLE = True
+except ImportError:
+    TOKEN_BROKER_AVAILABLE = False
+
+# Streaming de tokens de la respuesta final (Socket.IO y SSE)
+try:
+    from src.answer_streaming import stream_answer
+    ANSWER_STREAMING_AVAILABLE = True
+except ImportError:
+    ANSWER_STREAMING_AVAILABLE = False
+
+# Dispatcher Corva (fast path vs agente, llamadas LLM por rama)
+try:
+    from src.corva_dispatcher import get_dispatcher_stats
+    CORVA_DISPATCHER_AVAILABLE = True
+except ImportError:
+    CORVA_DISPATCHER_AVAILABLE = False
+
+# Particiones mensuales de Memory / SQL_Query_Executions / Performance_Metrics
+try:
+    from src.db_maintenance import ensure_future_partitions
+    DB_MAINTENANCE_AVAILABLE = True
+except ImportError:
+    DB_MAINTENANCE_AVAILABLE = False
+
 # Load environment variables
 load_dotenv()
 
@@ -78,6 +150,7 @@ AZURE_OPENAI_MODEL = os.environ.get('AZURE_OPENAI_MODEL', 'gpt-4o-realtime-previ
 SPEECH_KEY = os.environ.get('SPEECH_KEY')
 SPEECH_ENDPOINT = os.environ.get('SPEECH_ENDPOINT')
 SPEECH_REGION = os.environ.get('SPEECH_REGION')
+SPEECH_PRIVATE_ENDPOINT = os.environ.get('SPEECH_PRIVATE_ENDPOINT')
 
 # ICE/TURN Server Configuration (opcional)
 ICE_SERVER_URL = os.environ.get('ICE_SERVER_URL')
@@ -118,6 +191,9 @@ ENABLE_METRICS = os.environ.get('ENABLE_METRICS', 'true').lower() == 'true'
 ENABLE_DETAILED_LOGGING = os.environ.get('ENABLE_DETAILED_LOGGING', 'false').lower() == 'true'
 MAX_SESSION_DURATION = int(os.environ.get('MAX_SESSION_DURATION', 3600))
 SESSION_CLEANUP_INTERVAL = int(os.environ.get('SESSION_CLEANUP_INTERVAL', 300))
+# Sin particiones futuras las filas caen en DEFAULT: la retención no las borra y
+# crear luego la partición de ese mes falla
+PARTITION_MAINTENANCE_INTERVAL = int(os.environ.get('PARTITION_MAINTENANCE_INTERVAL', 86400))
 
 # Server Configuration
 FLASK_PORT = int(os.environ.get('FLASK_PORT', 5000))
@@ -130,19 +206,10 @@ TEMPLATES = {
     'chat': os.environ.get('TEMPLATE_CHAT', 'chat.html')
 }
 
-# Correcciones de texto (archivo externo)
+# Correcciones de texto (archivo externo, se recarga si cambia). Preguntas y bloques de respuesta
+# usan replace_token: solo el texto entero igual a una entrada, como pywo_aux_func.replace_token
 TEXT_CORRECTIONS_FILE = os.environ.get('TEXT_CORRECTIONS_FILE', 'config/text_corrections.json')
-
-def load_text_corrections():
-    try:
-        with open(TEXT_CORRECTIONS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data.get('original', []), data.get('replacement', [])
-    except Exception as e:
-        logger.warning(f"Text corrections file not found or invalid ({TEXT_CORRECTIONS_FILE}): {e}")
-        return [], []
-
-original_list, replacement_list = load_text_corrections()
+text_corrections = CorrectionsStore(TEXT_CORRECTIONS_FILE)
 
 # ================================
 # FLASK APPLICATION SETUP
@@ -150,6 +217,12 @@ original_list, replacement_list = load_text_corrections()
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SESSION_SECRET', str(uuid.uuid4()))
 
+# Detrás de App Service / un reverse proxy: cantidad de proxies confiables en X-Forwarded-For
+# (remote_addr es la IP del cliente y no la del proxy). 0 = sin proxy
+PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', '0'))
+if PROXY_FIX_X_FOR > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_FIX_X_FOR)
+
 # CORS
 cors_origins = os.environ.get('CORS_ORIGINS', '*').split(',')
 CORS(app, origins=cors_origins)
@@ -170,132 +243,53 @@ socketio = SocketIO(
 # REALTIME API WEBSOCKET PROXY
 # ================================
 
-# Diccionario para mantener las conexiones WebSocket del Realtime API
-realtime_connections = {}
-realtime_threads = {}
+# Única config de sesión Realtime: la usan las sesiones tibias y el setupSession del front
+# (se pasa a la plantilla). REALTIME_SESSION_CONFIG permite reemplazarla con un JSON
+REALTIME_SESSION = json.loads(os.environ.get('REALTIME_SESSION_CONFIG')
+                              or os.environ.get('REALTIME_WARM_SESSION_CONFIG') or 'null') or {
+    "instructions": "You are a helpful AI assistant. Respond in Spanish (Argentina).",
+    "voice": "alloy",
+    "turn_detection": {
+        "type": "server_vad",
+        "threshold": 0.5,
+        "prefix_padding_ms": 300,
+        "silence_duration_ms": 500
+    },
+    "input_audio_format": "pcm16",
+    "output_audio_format": "pcm16",
+    "input_audio_transcription": {"model": "whisper-1"},
+    "modalities": ["text", "audio"],
+    "temperature": 0.7
+}
 
-class RealtimeWebSocketProxy:
-    """Clase para manejar el proxy del WebSocket de Azure OpenAI Realtime API"""
-    
-    def __init__(self, client_id, sid):
-        self.client_id = client_id
-        self.sid = sid
-        self.ws = None
-        self.is_connected = False
-        self.thread = None
-        
-    def connect(self):
-        """Establece conexión con Azure OpenAI Realtime API"""
-        try:
-            # Construir la URL del WebSocket
-            endpoint = AZURE_OPENAI_ENDPOINT.replace('https://', 'wss://').rstrip('/')
-            deployment = AZURE_OPENAI_DEPLOYMENT
-            api_version = AZURE_OPENAI_API_VERSION
-            api_key = AZURE_OPENAI_API_KEY
-            
-            ws_url = f"{endpoint}/openai/realtime?api-version={api_version}&deployment={deployment}&api-key={api_key}"
-            
-            logger.info(f"Connecting to Realtime API for client {self.client_id}")
-            logger.debug(f"WebSocket URL: {endpoint}/openai/realtime")
-            
-            # Crear WebSocket
-            self.ws = websocket.WebSocketApp(
-                ws_url,
-                on_open=self.on_open,
-                on_message=self.on_message,
-                on_error=self.on_error,
-                on_close=self.on_close
-            )
-            
-            # Ejecutar en thread separado
-            self.thread = threading.Thread(target=self.ws.run_forever)
-            self.thread.daemon = True
-            self.thread.start()
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"Failed to connect to Realtime API: {e}")
-            socketio.emit('realtime_error', {
-                'error': str(e),
-                'client_id': self.client_id
-            }, room=self.sid)
-            return False
-    
-    def on_open(self, ws):
-        """Callback cuando se abre la conexión"""
-        logger.info(f"Realtime WebSocket opened for client {self.client_id}")
-        self.is_connected = True
-        socketio.emit('realtime_connected', {
-            'status': 'connected',
-            'client_id': self.client_id
-        }, room=self.sid)
-    
-    def on_message(self, ws, message):
-        """Callback cuando se recibe un mensaje"""
-        try:
-            # Reenviar el mensaje al cliente via Socket.IO
-            socketio.emit('realtime_message', {
-                'data': message,
-                'client_id': self.client_id
-            }, room=self.sid)
-            
-            if ENABLE_DETAILED_LOGGING:
-                msg_data = json.loads(message)
-                msg_type = msg_data.get('type', 'unknown')
-                # Solo loguear eventos importantes, no audio
-                if msg_type not in ['response.audio.delta', 'response.audio_transcript.delta']:
-                    logger.debug(f"Realtime message type: {msg_type}")
-                
-        except Exception as e:
-            logger.error(f"Error processing Realtime message: {e}")
-    
-    def on_error(self, ws, error):
-        """Callback cuando ocurre un error"""
-        logger.error(f"Realtime WebSocket error for client {self.client_id}: {error}")
-        socketio.emit('realtime_error', {
-            'error': str(error),
-            'client_id': self.client_id
-        }, room=self.sid)
-    
-    def on_close(self, ws, close_status_code=None, close_msg=None):
-        """Callback cuando se cierra la conexión"""
-        logger.info(f"Realtime WebSocket closed for client {self.client_id} (code: {close_status_code}, msg: {close_msg})")
-        self.is_connected = False
-        try:
-            socketio.emit('realtime_closed', {
-                'status': 'disconnected',
-                'client_id': self.client_id,
-                'code': close_status_code,
-                'message': close_msg
-            }, room=self.sid)
-        except Exception as e:
-            logger.error(f"Error emitting realtime_closed: {e}")
-    
-    def send(self, message):
-        """Envía un mensaje al WebSocket de Azure"""
-        if self.ws and self.is_connected:
-            try:
-                if isinstance(message, dict):
-                    message = json.dumps(message)
-                self.ws.send(message)
-                return True
-            except Exception as e:
-                logger.error(f"Error sending message to Realtime API: {e}")
-                return False
-        else:
-            logger.warning(f"Cannot send message - WebSocket not connected for client {self.client_id}")
-            return False
-    
-    def close(self):
-        """Cierra la conexión WebSocket"""
-        if self.ws:
-            try:
-                self.ws.close()
-                self.is_connected = False
-                logger.info(f"Closed Realtime WebSocket for client {self.client_id}")
-            except Exception as e:
-                logger.error(f"Error closing WebSocket: {e}")
+# Motor único para las conexiones Realtime de todos los navegadores (se crea al primer uso
+# o al arrancar, para llenar el pool de sesiones tibias)
+realtime_proxy = None
+realtime_proxy_lock = threading.Lock()
+
+def get_realtime_proxy():
+    global realtime_proxy
+    if realtime_proxy is None and REALTIME_PROXY_AVAILABLE:
+        with realtime_proxy_lock:
+            if realtime_proxy is None:
+                endpoint = AZURE_OPENAI_ENDPOINT.replace('https://', 'wss://').rstrip('/')
+                ws_url = f"{endpoint}/openai/realtime?api-version={AZURE_OPENAI_API_VERSION}&deployment={AZURE_OPENAI_DEPLOYMENT}"
+                logger.debug(f"Realtime proxy upstream: {endpoint}/openai/realtime")
+                realtime_proxy = RealtimeProxyEngine(
+                    ws_url,
+                    headers={'api-key': AZURE_OPENAI_API_KEY},
+                    emit_fn=lambda event, data, sid: socketio.emit(event, data, room=sid),
+                    tools=realtime_tools,
+                    warm_session=REALTIME_SESSION
+                )
+                atexit.register(realtime_proxy.shutdown)
+    return realtime_proxy
+
+def realtime_connection_count():
+    return len(realtime_proxy) if realtime_proxy is not None else 0
+
+def close_realtime_connection(client_id):
+    return realtime_proxy is not None and realtime_proxy.close(client_id)
 
 # ================================
 # SOCKET.IO REALTIME PROXY EVENTS
@@ -315,19 +309,24 @@ def handle_realtime_connect(data):
         return
     
     try:
-        # Cerrar conexión anterior si existe
-        if client_id in realtime_connections:
-            old_proxy = realtime_connections[client_id]
-            old_proxy.close()
-            del realtime_connections[client_id]
-        
-        # Crear nuevo proxy
-        proxy = RealtimeWebSocketProxy(client_id, request.sid)
-        
-        # Conectar al Realtime API
-        if proxy.connect():
-            realtime_connections[client_id] = proxy
-            logger.info(f"Realtime proxy established for client {client_id}")
+        # Audio binario opcional: el cliente pide realtime_audio en lugar de los
+        # response.audio.delta en base64, y puede pedir menor frecuencia (audio_rate)
+        binary_audio = bool(data.get('binary_audio', False))
+        audio_rate = data.get('audio_rate')
+        if audio_rate is not None:
+            audio_rate = int(audio_rate)
+            if audio_rate not in REALTIME_AUDIO_RATES:
+                emit('realtime_error', {'error': f'audio_rate must be one of {REALTIME_AUDIO_RATES}'})
+                return
+
+        # open() reemplaza la conexión anterior del cliente si existía;
+        # realtime_connected/realtime_error llegan cuando termina el handshake
+        proxy = get_realtime_proxy()
+        # session: overrides por usuario sobre la config tibia (session.update incremental)
+        session = data.get('session') if isinstance(data.get('session'), dict) else None
+        if proxy is not None and proxy.open(client_id, request.sid, binary_audio=binary_audio,
+                                            audio_rate=audio_rate, session=session):
+            logger.info(f"Realtime proxy connecting for client {client_id}")
         else:
             emit('realtime_error', {'error': 'Failed to connect to Realtime API'})
             
@@ -345,13 +344,12 @@ def handle_realtime_send(data):
         emit('realtime_error', {'error': 'Missing client_id or message'})
         return
     
-    if client_id not in realtime_connections:
+    if realtime_proxy is None or client_id not in realtime_proxy:
         emit('realtime_error', {'error': 'No active connection for this client'})
         return
     
     try:
-        proxy = realtime_connections[client_id]
-        if proxy.send(message):
+        if realtime_proxy.send(client_id, message):
             if ENABLE_DETAILED_LOGGING:
                 msg_type = message.get('type', 'unknown') if isinstance(message, dict) else 'raw'
                 # Solo loguear mensajes que no sean audio
@@ -364,6 +362,26 @@ def handle_realtime_send(data):
         logger.error(f"Error sending to Realtime API: {e}")
         emit('realtime_error', {'error': str(e)})
 
+@socketio.on('realtime_audio_append')
+def handle_realtime_audio_append(data):
+    """Audio del micrófono como PCM16 binario (adjunto Socket.IO); el proxy arma el append"""
+    client_id = data.get('client_id')
+    audio = data.get('audio')
+    
+    if not client_id or not isinstance(audio, (bytes, bytearray)):
+        emit('realtime_error', {'error': 'Missing client_id or binary audio'})
+        return
+    
+    if realtime_proxy is None or not realtime_proxy.send(client_id, bytes(audio)):
+        emit('realtime_error', {'error': 'No active connection for this client'})
+
+@app.route('/api/realtime-tools', methods=['GET'])
+def get_realtime_tools():
+    """Tools que el proxy ejecuta del lado servidor (definiciones para session.update)"""
+    if realtime_tools is None:
+        return jsonify({'enabled': False, 'tools': []})
+    return jsonify({'enabled': True, 'tools': realtime_tools.definitions()})
+
 @socketio.on('realtime_disconnect')
 def handle_realtime_disconnect(data):
     """Cierra la conexión proxy con Azure OpenAI Realtime API"""
@@ -373,10 +391,7 @@ def handle_realtime_disconnect(data):
         return
     
     try:
-        if client_id in realtime_connections:
-            proxy = realtime_connections[client_id]
-            proxy.close()
-            del realtime_connections[client_id]
+        if close_realtime_connection(client_id):
             logger.info(f"Realtime proxy disconnected for client {client_id}")
             emit('realtime_disconnected', {'status': 'disconnected'})
         else:
@@ -463,6 +478,21 @@ def add_security_headers(response):
     
     return response
 
+# === Latencia por request (registro de métricas) ===
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_request_latency(response):
+    started = getattr(g, "request_started", None)
+    if METRICS_REGISTRY_AVAILABLE and started is not None:
+        # La regla de la ruta (no el path) mantiene acotada la cardinalidad
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_REQUEST_SECONDS.labels(route=route, method=request.method,
+                                    status=str(response.status_code)).observe(time.perf_counter() - started)
+    return response
+
 # ================================
 # MINIPYWO INIT (opcional)
 # ================================
@@ -474,12 +504,109 @@ if MINIPYWO_AVAILABLE:
         logger.error(f"Failed to initialize minipywo: {e}")
         MINIPYWO_AVAILABLE = False
 
+# ================================
+# POOL DE TRABAJOS MINIPYWO
+# ================================
+# /api/minipywo-process responde 202 + job_id y el cliente hace poll; con async=false (o este default
+# en false, para las plantillas viejas que esperan la respuesta) ocupa un worker hasta la espera máxima
+MINIPYWO_ASYNC_DEFAULT = os.environ.get('MINIPYWO_ASYNC_DEFAULT', 'true').lower() == 'true'
+MINIPYWO_SYNC_TIMEOUT_SECONDS = float(os.environ.get('MINIPYWO_SYNC_TIMEOUT_SECONDS', 150))
+# Header con el usuario autenticado que pone el proxy (p. ej. X-MS-CLIENT-PRINCIPAL-ID con Easy Auth de
+# App Service). Vacío = sin autenticación: el límite por usuario usa el socket o la cookie del navegador
+MINIPYWO_PRINCIPAL_HEADER = os.environ.get('MINIPYWO_PRINCIPAL_HEADER', '')
+# Límite por IP en lugar de por cookie (opt-in: detrás de App Service o un NAT corporativo todos
+# comparten IP salvo que PROXY_FIX_X_FOR esté bien configurado)
+MINIPYWO_OWNER_BY_ADDR = os.environ.get('MINIPYWO_OWNER_BY_ADDR', 'false').lower() == 'true'
+
+# Streaming por defecto en process_message (el cliente puede pedirlo con stream=true)
+MINIPYWO_STREAM_DEFAULT = os.environ.get('MINIPYWO_STREAM_DEFAULT', 'false').lower() == 'true'
+
+def run_minipywo_job(payload):
+    config = {"configurable": {"thread_id": payload['client_id']}}
+    on_event = payload.get('on_event')
+    if on_event is None or not ANSWER_STREAMING_AVAILABLE:
+        result = wl_pywo.invoke({"question": payload['question']}, config)
+        return result.get("query_result", "Error processing YPF query")
+
+    # Modo streaming: los tokens salen por on_event a medida que el grafo genera
+    answer = None
+    for event in stream_answer(wl_pywo, {"question": payload['question']}, config,
+                               channel=payload.get('channel', 'socketio'),
+                               transform=text_corrections.replace_token):
+        if event['type'] == 'done':
+            answer = event['answer']
+        on_event(event)
+    return answer or "Error processing YPF query"
+
+minipywo_jobs = JobPool(run_minipywo_job) if MINIPYWO_AVAILABLE and JOB_POOL_AVAILABLE else None
+
+def minipywo_job_owner(sid=None):
+    """
+    Dueño de un job para MINIPYWO_MAX_JOBS_PER_USER y para cancelarlo. Nunca sale del body:
+    client_id/user_id los elige el cliente (y client_id es un uuid nuevo por request si no lo manda).
+    Sin usuario autenticado ni socket, cada navegador tiene un id propio en la cookie de sesión
+    firmada (SESSION_SECRET; con varios workers tiene que ser el mismo en todos)
+    """
+    if MINIPYWO_PRINCIPAL_HEADER:
+        principal = request.headers.get(MINIPYWO_PRINCIPAL_HEADER)
+        if principal:
+            return f"user:{principal}"
+    if sid:
+        return f"sid:{sid}"
+    if MINIPYWO_OWNER_BY_ADDR:
+        return f"addr:{request.remote_addr}"
+    client_key = flask_session.get('minipywo_client')
+    if not client_key:
+        client_key = flask_session['minipywo_client'] = uuid.uuid4().hex
+    return f"client:{client_key}"
+
+# ================================
+# TOOLS REALTIME DEL LADO SERVIDOR
+# ================================
+REALTIME_SERVER_TOOLS = os.environ.get('REALTIME_SERVER_TOOLS', 'true').lower() == 'true'
+
+def run_realtime_minipywo(arguments, context):
+    """query_minipywo llamada por el modelo de voz: corre en el pool de minipywo"""
+    user_message = arguments.get('query', '')
+    question = text_corrections.replace_token(user_message)
+    answer = run_minipywo_job({'client_id': context['client_id'], 'question': question})
+    record_minipywo_exchange(context['client_id'], user_message, answer, 'realtime_tool')
+    return answer
+
+realtime_tools = ToolRegistry() if REALTIME_SERVER_TOOLS and REALTIME_TOOLS_AVAILABLE else None
+if realtime_tools is not None and MINIPYWO_AVAILABLE:
+    realtime_tools.register(
+        "query_minipywo", run_realtime_minipywo,
+        description="Query minipywo system for YPF equipment, wells, workover, and technical data",
+        parameters={
+            "type": "object",
+            "properties": {"query": {"type": "string", "description": "User query to be processed by minipywo"}},
+            "required": ["query"]
+        },
+        pool=minipywo_jobs)
+
 # ================================
 # CLIENT SESSION MGMT
 # ================================
 client_sessions = {}
 session_metrics = {}
 
+def record_event(event, source, client_id=None, field=None, amount=1):
+    # Contador global acotado + contador por sesión (se borra con la sesión)
+    if not ENABLE_METRICS:
+        return
+    if METRICS_REGISTRY_AVAILABLE:
+        EVENTS_TOTAL.labels(event=event, source=source).inc(amount)
+    if field and client_id in session_metrics:
+        session_metrics[client_id][field] += amount
+
+if METRICS_REGISTRY_AVAILABLE:
+    REALTIME_LATENCY_MS = REGISTRY.histogram(
+        "realtime_client_latency_milliseconds", "Latencia Realtime reportada por el front",
+        buckets=(50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000, 10000))
+    register_queue_depth("client_sessions", lambda: len(client_sessions))
+    register_queue_depth("realtime_connections", lambda: realtime_connection_count())
+
 def generate_client_id():
     return str(uuid.uuid4())
 
@@ -502,7 +629,6 @@ def get_or_create_session(client_id):
                 'avatar_frames': 0,
                 'audio_packets': 0,
                 'errors': 0,
-                'latency_samples': [],
                 'realtime_messages': 0
             }
     else:
@@ -515,7 +641,7 @@ def get_or_create_session(client_id):
 @app.route("/")
 def index():
     client_id = generate_client_id()
-    return render_template(TEMPLATES['main'], client_id=client_id)
+    return render_template(TEMPLATES['main'], client_id=client_id, realtime_session=REALTIME_SESSION)
 
 @app.route("/chat")
 def chat_view():
@@ -676,6 +802,14 @@ def get_speech_config():
         }
     })
 
+# Un solo broker para todos los handlers: el token sale de memoria y se renueva
+# en segundo plano al 80% de su validez (antes cada request pedía issueToken)
+token_broker = None
+if TOKEN_BROKER_AVAILABLE and SPEECH_KEY and SPEECH_REGION:
+    token_broker = get_token_broker()
+    token_broker.register("speech", speech_sts_fetcher(SPEECH_REGION, SPEECH_KEY))
+    token_broker.register("ice", ice_relay_fetcher(SPEECH_REGION, SPEECH_KEY, SPEECH_PRIVATE_ENDPOINT))
+
 @app.route("/api/speech-token", methods=["GET"])
 def get_speech_token():
     """
@@ -686,6 +820,18 @@ def get_speech_token():
         if not SPEECH_KEY or not SPEECH_REGION:
             return jsonify({"error": "Speech Service not configured"}), 400
 
+        if token_broker is not None:
+            try:
+                token, expires_in = token_broker.get("speech")
+            except TokenUnavailable as e:
+                logger.error(f"Failed to get speech token: {e}")
+                return jsonify({"error": "Failed to generate token"}), 502
+            return jsonify({
+                "token": token,
+                "region": SPEECH_REGION,
+                "expiresIn": int(expires_in)
+            })
+
         token_endpoint = f"https://{SPEECH_REGION}.api.cognitive.microsoft.com/sts/v1.0/issuetoken"
         resp = requests.post(
             token_endpoint,
@@ -707,8 +853,32 @@ def get_speech_token():
         logger.error(f"Error generating speech token: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/ice-token", methods=["GET"])
+def get_ice_token():
+    """Servidor ICE para el WebRTC del avatar: el TURN propio si está configurado, si no el relay de Speech"""
+    if ICE_SERVER_URL and ICE_SERVER_USERNAME and ICE_SERVER_PASSWORD:
+        return jsonify({"Urls": [ICE_SERVER_URL], "Username": ICE_SERVER_USERNAME, "Password": ICE_SERVER_PASSWORD})
+    if token_broker is None:
+        return jsonify({"error": "Speech Service not configured"}), 400
+    try:
+        token, _ = token_broker.get("ice")
+    except TokenUnavailable as e:
+        logger.error(f"Failed to get ICE relay token: {e}")
+        return jsonify({"error": "Failed to get ICE token"}), 502
+    return Response(token, mimetype='application/json')
+
 # ==== minipywo API (sin cambios funcionales) ====
 
+def record_minipywo_exchange(client_id, user_message, response_text, source):
+    session = get_or_create_session(client_id)
+    session['messages'].append({'role': 'user','content': user_message,'timestamp': datetime.now().isoformat()})
+    session['messages'].append({'role': 'assistant','content': response_text,'timestamp': datetime.now().isoformat()})
+    record_event('message', source, client_id, 'message_count', 2)
+
+def busy_response(error):
+    response = jsonify({ "status": "busy", "reason": error.reason, "message": str(error), "source": "minipywo_busy" })
+    return response, 429, {'Retry-After': str(error.retry_after)}
+
 @app.route("/api/minipywo-process", methods=["POST"])
 def api_minipywo_process():
     if not MINIPYWO_AVAILABLE:
@@ -721,17 +891,34 @@ def api_minipywo_process():
 
         logger.info(f"Processing with minipywo: {user_message}")
 
-        corrected_message = replace_token(user_message, original_list, replacement_list)
-        config = {"configurable": {"thread_id": client_id}}
-        result = wl_pywo.invoke({"question": corrected_message}, config)
-        response_text = result.get("query_result", "Error processing YPF query")
+        corrected_message = text_corrections.replace_token(user_message)
+        payload = {'client_id': client_id, 'question': corrected_message}
+        started = time.perf_counter()
 
-        session = get_or_create_session(client_id)
-        session['messages'].append({'role': 'user','content': user_message,'timestamp': datetime.now().isoformat()})
-        session['messages'].append({'role': 'assistant','content': response_text,'timestamp': datetime.now().isoformat()})
+        if minipywo_jobs is None:
+            response_text = run_minipywo_job(payload)
+            record_minipywo_exchange(client_id, user_message, response_text, 'minipywo_api')
+        else:
+            def save_exchange(job):
+                if job.status == 'done':
+                    record_minipywo_exchange(client_id, user_message, job.result, 'minipywo_api')
 
-        if ENABLE_METRICS and client_id in session_metrics:
-            session_metrics[client_id]['message_count'] += 2
+            try:
+                job = minipywo_jobs.submit(minipywo_job_owner(), payload, on_done=save_exchange)
+            except JobRejected as e:
+                return busy_response(e)
+
+            # Modo asíncrono: el cliente hace poll en /api/jobs/<job_id>
+            if data.get('async', MINIPYWO_ASYNC_DEFAULT):
+                return jsonify({ "status": "queued", "job_id": job.id, "client_id": client_id,
+                                 "status_url": f"/api/jobs/{job.id}" }), 202
+            if not job.wait(MINIPYWO_SYNC_TIMEOUT_SECONDS):
+                return jsonify({ "status": "pending", "job_id": job.id, "client_id": client_id,
+                                 "status_url": f"/api/jobs/{job.id}",
+                                 "message": "La consulta sigue en proceso" }), 202
+            if job.status != 'done':
+                raise RuntimeError(job.error or f"job {job.status}")
+            response_text = job.result
 
         logger.info(f"minipywo response: {response_text[:100]}...")
         return jsonify({
@@ -742,14 +929,97 @@ def api_minipywo_process():
             "original_query": user_message,
             "corrected_query": corrected_message,
             "vad_metrics": vad_metrics,
-            "processing_time": 0
+            "processing_time": round(time.perf_counter() - started, 3)
         })
     except Exception as e:
         logger.error(f"Error processing with minipywo: {e}")
-        if ENABLE_METRICS and client_id in session_metrics:
-            session_metrics[client_id]['errors'] += 1
+        record_event('error', 'minipywo_api', client_id, 'errors')
         return jsonify({ "status": "error", "message": str(e), "source": "minipywo_error" }), 500
 
+# Cada cuánto el stream SSE revisa si su job fue cancelado
+SSE_CANCEL_CHECK_SECONDS = float(os.environ.get('SSE_CANCEL_CHECK_SECONDS', '0.5'))
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route("/api/minipywo-process/stream", methods=["POST"])
+def api_minipywo_process_stream():
+    # Variante SSE de /api/minipywo-process: eventos queued, token, done, cancelled y error
+    if not MINIPYWO_AVAILABLE or not ANSWER_STREAMING_AVAILABLE:
+        return jsonify({ "status": "error", "message": "minipywo streaming not available" }), 503
+    data = request.get_json() or {}
+    user_message = data.get('message', '')
+    client_id = data.get('client_id', generate_client_id())
+    corrected_message = text_corrections.replace_token(user_message)
+    events = queue.Queue()
+    payload = {'client_id': client_id, 'question': corrected_message, 'on_event': events.put, 'channel': 'sse'}
+
+    def finish(job):
+        if job.status == 'done':
+            record_minipywo_exchange(client_id, user_message, job.result, 'minipywo_sse')
+        else:
+            events.put({'type': 'error', 'message': job.error or job.status})
+
+    if minipywo_jobs is not None:
+        try:
+            job = minipywo_jobs.submit(minipywo_job_owner(), payload, on_done=finish)
+        except JobRejected as e:
+            return busy_response(e)
+    else:
+        job = None
+
+    def generate():
+        if job is None:
+            # Sin pool: el grafo corre en un hilo propio y este generador solo lee eventos
+            def run_inline():
+                try:
+                    answer = run_minipywo_job(payload)
+                    record_minipywo_exchange(client_id, user_message, answer, 'minipywo_sse')
+                except Exception as e:
+                    events.put({'type': 'error', 'message': str(e)})
+            threading.Thread(target=run_inline, daemon=True).start()
+        else:
+            yield sse_event('queued', {'job_id': job.id, 'client_id': client_id})
+        last_event = time.monotonic()
+        while True:
+            # DELETE /api/jobs/<id> no llama on_done: el estado del job se revisa entre eventos
+            if job is not None and job.status == 'cancelled':
+                yield sse_event('cancelled', {'job_id': job.id, 'client_id': client_id})
+                return
+            try:
+                event = events.get(timeout=SSE_CANCEL_CHECK_SECONDS)
+            except queue.Empty:
+                if time.monotonic() - last_event >= MINIPYWO_SYNC_TIMEOUT_SECONDS:
+                    yield sse_event('error', {'message': 'timeout'})
+                    return
+                continue
+            last_event = time.monotonic()
+            if event['type'] == 'token':
+                yield sse_event('token', {'text': event['text'], 'node': event['node']})
+            elif event['type'] == 'done':
+                yield sse_event('done', {'response': event['answer'], 'client_id': client_id,
+                                         'ttft_ms': event['ttft_ms'], 'total_ms': event['total_ms']})
+                return
+            else:
+                yield sse_event('error', {'message': event.get('message')})
+                return
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_minipywo_job(job_id):
+    job = minipywo_jobs.get(job_id) if minipywo_jobs else None
+    if job is None:
+        return jsonify({ "status": "error", "message": "job not found" }), 404
+    return jsonify(job.to_dict())
+
+@app.route("/api/jobs/<job_id>", methods=["DELETE"])
+def cancel_minipywo_job(job_id):
+    if not minipywo_jobs or not minipywo_jobs.cancel(job_id, user_key=minipywo_job_owner()):
+        return jsonify({ "status": "error", "message": "job not found or already finished" }), 404
+    return jsonify({ "status": "cancelled", "job_id": job_id })
+
 # ==== Avatar control ====
 
 @app.route("/api/avatar/start", methods=["POST"])
@@ -787,23 +1057,37 @@ def stop_avatar():
 
 # ==== Health & Metrics ====
 
+@app.route('/health/live')
+def health_live():
+    # Liveness: solo confirma que el proceso responde, sin tocar dependencias
+    if HEALTH_CHECKS_AVAILABLE:
+        return jsonify(liveness()), 200
+    return jsonify({'status': 'alive', 'timestamp': datetime.now().isoformat()}), 200
+
+@app.route('/health/ready')
+def health_ready():
+    # Readiness: último resultado del chequeo en segundo plano (sin I/O en el request)
+    if not HEALTH_CHECKS_AVAILABLE:
+        return jsonify({'status': 'unknown', 'ready': True, 'dependencies': {}}), 200
+    readiness = get_health_checker().readiness()
+    readiness['timestamp'] = datetime.now().isoformat()
+    return jsonify(readiness), 200 if readiness['ready'] else 503
+
 @app.route('/health')
 def health():
     realtime_api_ok = bool(AZURE_OPENAI_ENDPOINT and AZURE_OPENAI_API_KEY)
     speech_service_ok = bool(SPEECH_KEY and SPEECH_REGION)
-    minipywo_ok = MINIPYWO_AVAILABLE
     ice_server_ok = bool(ICE_SERVER_URL)
     
     # Check active realtime connections
-    active_realtime_connections = len(realtime_connections)
+    active_realtime_connections = realtime_connection_count()
 
-    if MINIPYWO_AVAILABLE:
-        try:
-            test_config = {"configurable": {"thread_id": "health_check"}}
-            test_result = wl_pywo.invoke({"question": "test"}, test_config)
-            minipywo_ok = test_result is not None
-        except:
-            minipywo_ok = False
+    # El grafo ya no se invoca en cada ping: se usa el chequeo cacheado de dependencias
+    readiness = get_health_checker().readiness() if HEALTH_CHECKS_AVAILABLE else None
+    dependencies = readiness['dependencies'] if readiness else {}
+    minipywo_ok = MINIPYWO_AVAILABLE and not (readiness and readiness['degraded'])
+    if dependencies.get('azure_openai', {}).get('status') == 'down':
+        realtime_api_ok = False
 
     critical_ok = realtime_api_ok and speech_service_ok
     status = "healthy" if critical_ok else "unhealthy"
@@ -841,7 +1125,7 @@ def health():
             'minipywo_system': {
                 'status': 'healthy' if minipywo_ok else 'unhealthy',
                 'available': MINIPYWO_AVAILABLE,
-                'corrections_active': MINIPYWO_AVAILABLE and len(original_list) > 0
+                'corrections_active': MINIPYWO_AVAILABLE and len(text_corrections) > 0
             },
             'ice_server': {
                 'status': 'healthy' if ice_server_ok else 'unhealthy',
@@ -854,6 +1138,9 @@ def health():
                 'active_connections': active_realtime_connections
             }
         },
+        'dependencies': dependencies,
+        'degraded_dependencies': readiness['degraded_dependencies'] if readiness else [],
+        'health_checker_running': HEALTH_CHECKS_AVAILABLE and health_checker_running(),
         'features': {
             'realtime_conversation': realtime_api_ok,
             'avatar_support': realtime_api_ok and speech_service_ok and ENABLE_AVATAR,
@@ -873,15 +1160,20 @@ def health():
             'realtime_config': '/api/voice-live-config',
             'speech_config': '/api/speech-config',
             'speech_token': '/api/speech-token',
+            'ice_token': '/api/ice-token',
             'minipywo_process': '/api/minipywo-process',
+            'minipywo_process_stream': '/api/minipywo-process/stream',
+            'minipywo_job': '/api/jobs/<job_id>',
             'avatar_start': '/api/avatar/start',
             'avatar_stop': '/api/avatar/stop',
             'health_check': '/health',
-            'metrics': '/metrics'
+            'health_live': '/health/live',
+            'health_ready': '/health/ready',
+            'metrics': '/metrics',
+            'metrics_prometheus': '/metrics/prometheus'
         },
         'sessions': {
             'active_count': len(client_sessions),
-            'client_ids': list(client_sessions.keys()),
             'realtime_connected': sum(1 for s in client_sessions.values() if s.get('realtime_connected', False))
         }
     }), 200 if status == "healthy" else 503
@@ -907,7 +1199,7 @@ def metrics():
             'total': len(client_sessions),
             'active': len([s for s in client_sessions.values() if len(s['messages']) > 0]),
             'with_avatar': len([s for s in client_sessions.values() if s.get('avatar_state') == 'active']),
-            'with_realtime': len(realtime_connections)
+            'with_realtime': realtime_connection_count()
         },
         'messages': {
             'total': total_messages,
@@ -919,8 +1211,8 @@ def metrics():
             'rate': total_errors / max(total_messages, 1) if total_messages > 0 else 0
         },
         'proxy': {
-            'active_connections': len(realtime_connections),
-            'connection_ids': list(realtime_connections.keys())
+            'active_connections': realtime_connection_count(),
+            'connection_ids': realtime_proxy.client_ids() if realtime_proxy is not None else []
         },
         'configuration': {
             'avatar_enabled': ENABLE_AVATAR,
@@ -935,9 +1227,27 @@ def metrics():
             'proxy_enabled': True
         }
     }
+    if CORVA_CATALOG_AVAILABLE:
+        metrics_data['corva_catalog'] = get_catalog_stats()
+        metrics_data['corva_cache'] = get_corva_cache_stats()
+        metrics_data['corva_resolution'] = get_resolution_stats()
+    if CORVA_DISPATCHER_AVAILABLE:
+        metrics_data['corva_dispatcher'] = get_dispatcher_stats()
+    if CORVA_WITS_POLLER_AVAILABLE:
+        metrics_data['corva_wits_poller'] = get_wits_poller_stats()
+    if minipywo_jobs is not None:
+        metrics_data['minipywo_jobs'] = minipywo_jobs.stats()
+    if realtime_tools is not None:
+        metrics_data['realtime_tools'] = realtime_tools.stats()
+    if token_broker is not None:
+        metrics_data['speech_tokens'] = token_broker.stats()
+    metrics_data['text_corrections'] = text_corrections.stats()
+    if realtime_proxy is not None:
+        metrics_data['realtime_proxy'] = realtime_proxy.stats(
+            per_connection=request.args.get('realtime_detail') == 'true')
     if ENABLE_METRICS and session_metrics:
+        # Solo agregados: el detalle por sesión hacía /metrics O(sesiones)
         metrics_data['detailed_metrics'] = {
-            'sessions': session_metrics,
             'aggregate': {
                 'total_message_count': sum(m.get('message_count', 0) for m in session_metrics.values()),
                 'total_avatar_frames': sum(m.get('avatar_frames', 0) for m in session_metrics.values()),
@@ -947,6 +1257,13 @@ def metrics():
         }
     return jsonify(metrics_data)
 
+@app.route('/metrics/prometheus')
+def metrics_prometheus():
+    # Formato de texto de Prometheus: costo del scrape proporcional a las series, no a las sesiones
+    if not METRICS_REGISTRY_AVAILABLE:
+        return jsonify({'error': 'metrics registry not available'}), 503
+    return Response(REGISTRY.render_text(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 # ==== Socket.IO Events ====
 
 @socketio.on("connect")
@@ -977,14 +1294,12 @@ def handle_disconnect():
     logger.info(f"Client disconnected (sid: {request.sid})")
     
     # Limpiar conexiones Realtime si existen
-    for client_id, proxy in list(realtime_connections.items()):
-        if proxy.sid == request.sid:
-            try:
-                proxy.close()
-                del realtime_connections[client_id]
+    if realtime_proxy is not None:
+        try:
+            for client_id in realtime_proxy.close_sid(request.sid):
                 logger.info(f"Cleaned up Realtime connection for disconnected client {client_id}")
-            except Exception as e:
-                logger.error(f"Error cleaning up connection for {client_id}: {e}")
+        except Exception as e:
+            logger.error(f"Error cleaning up Realtime connections for sid {request.sid}: {e}")
 
 @socketio.on("realtime_status")
 def handle_realtime_status(data):
@@ -993,8 +1308,8 @@ def handle_realtime_status(data):
     if client_id and client_id in client_sessions:
         client_sessions[client_id]['connection_quality'] = data.get('quality', 'unknown')
         client_sessions[client_id]['realtime_connected'] = data.get('connected', False)
-        if ENABLE_METRICS and client_id in session_metrics and 'latency' in data:
-            session_metrics[client_id]['latency_samples'].append(data['latency'])
+        if ENABLE_METRICS and METRICS_REGISTRY_AVAILABLE and isinstance(data.get('latency'), (int, float)):
+            REALTIME_LATENCY_MS.observe(data['latency'])
     emit('status', {
         'message': f"Realtime API: {data.get('status', 'unknown')}",
         'timestamp': datetime.now().isoformat(),
@@ -1009,38 +1324,71 @@ def handle_process_message(data):
     try:
         user_message = data.get('message', '')
         client_id = data.get('client_id', generate_client_id())
-        config = {"configurable": {"thread_id": client_id}}
-        corrected_message = replace_token(user_message, original_list, replacement_list)
-        result = wl_pywo.invoke({"question": corrected_message}, config)
-        response_text = result.get("query_result", "Error processing YPF query")
-        if ENABLE_METRICS and client_id in session_metrics:
-            session_metrics[client_id]['message_count'] += 1
-        emit('process_response', {
-            'message': response_text,
-            'client_id': client_id,
-            'source': 'minipywo_via_socketio',
-            'timestamp': datetime.now().isoformat()
-        })
-        logger.info(f"Socket.IO: Response sent: {response_text[:100]}...")
+        corrected_message = text_corrections.replace_token(user_message)
+        payload = {'client_id': client_id, 'question': corrected_message}
+        sid = request.sid
+
+        if data.get('stream', MINIPYWO_STREAM_DEFAULT):
+            def push_event(event):
+                if event['type'] == 'token':
+                    socketio.emit('process_token', {'text': event['text'], 'node': event['node'],
+                                                    'client_id': client_id}, to=sid)
+                else:
+                    socketio.emit('process_stream_end', {'client_id': client_id, 'ttft_ms': event['ttft_ms'],
+                                                         'total_ms': event['total_ms']}, to=sid)
+            payload.update(on_event=push_event, channel='socketio')
+
+        def push_result(job):
+            # Corre en el worker del pool: se emite a la sala del socket que hizo la pregunta
+            if job.status != 'done':
+                record_event('error', 'socketio', client_id, 'errors')
+                socketio.emit('error', {'message': f'Error: {job.error}', 'job_id': job.id}, to=sid)
+                return
+            record_event('message', 'socketio', client_id, 'message_count')
+            socketio.emit('process_response', {
+                'message': job.result,
+                'client_id': client_id,
+                'job_id': job.id,
+                'source': 'minipywo_via_socketio',
+                'timestamp': datetime.now().isoformat()
+            }, to=sid)
+            logger.info(f"Socket.IO: Response sent: {job.result[:100]}...")
+
+        if minipywo_jobs is None:
+            response_text = run_minipywo_job(payload)
+            record_event('message', 'socketio', client_id, 'message_count')
+            emit('process_response', {
+                'message': response_text,
+                'client_id': client_id,
+                'source': 'minipywo_via_socketio',
+                'timestamp': datetime.now().isoformat()
+            })
+            return
+
+        try:
+            job = minipywo_jobs.submit(minipywo_job_owner(sid), payload, on_done=push_result)
+        except JobRejected as e:
+            emit('busy', {'message': str(e), 'reason': e.reason, 'retry_after': e.retry_after, 'client_id': client_id})
+            return
+        emit('job_queued', {'job_id': job.id, 'client_id': client_id, 'timestamp': datetime.now().isoformat()})
     except Exception as e:
         logger.error(f"Socket.IO Error: {e}")
-        if ENABLE_METRICS and client_id in session_metrics:
-            session_metrics[client_id]['errors'] += 1
+        record_event('error', 'socketio', client_id, 'errors')
         emit('error', {'message': f'Error: {str(e)}'})
 
+@socketio.on('cancel_job')
+def handle_cancel_job(data):
+    job_id = data.get('job_id')
+    cancelled = bool(minipywo_jobs and job_id and minipywo_jobs.cancel(job_id, user_key=minipywo_job_owner(request.sid)))
+    emit('job_cancelled', {'job_id': job_id, 'cancelled': cancelled})
+
 @socketio.on('avatar_frame')
 def handle_avatar_frame(data):
-    if ENABLE_METRICS:
-        client_id = data.get('client_id')
-        if client_id and client_id in session_metrics:
-            session_metrics[client_id]['avatar_frames'] += 1
+    record_event('avatar_frame', 'socketio', data.get('client_id'), 'avatar_frames')
 
 @socketio.on('audio_packet')
 def handle_audio_packet(data):
-    if ENABLE_METRICS:
-        client_id = data.get('client_id')
-        if client_id and client_id in session_metrics:
-            session_metrics[client_id]['audio_packets'] += 1
+    record_event('audio_packet', 'socketio', data.get('client_id'), 'audio_packets')
 
 # ==== API de prueba ====
 
@@ -1049,7 +1397,7 @@ def test_realtime():
     try:
         data = request.get_json()
         test_message = data.get('message', 'test message')
-        active_connections = len(realtime_connections)
+        active_connections = realtime_connection_count()
         
         return jsonify({
             "status": "success",
@@ -1094,10 +1442,7 @@ def cleanup_old_sessions():
         
         for client_id in sessions_to_remove:
             # Limpiar conexión Realtime si existe
-            if client_id in realtime_connections:
-                proxy = realtime_connections[client_id]
-                proxy.close()
-                del realtime_connections[client_id]
+            close_realtime_connection(client_id)
             
             client_sessions.pop(client_id, None)
             session_metrics.pop(client_id, None)
@@ -1114,6 +1459,58 @@ def schedule_cleanup():
     timer.daemon = True
     timer.start()
 
+def schedule_partition_maintenance():
+    try:
+        ensure_future_partitions()
+    except Exception as e:
+        logger.error(f"Error during partition maintenance: {e}")
+    timer = threading.Timer(PARTITION_MAINTENANCE_INTERVAL, schedule_partition_maintenance)
+    timer.daemon = True
+    timer.start()
+
+# ==== Servicios en segundo plano ====
+# Una vez por proceso: con gunicorn el bloque __main__ no corre, así que cada
+# worker los arranca en su primer request (el pid cubre el fork de --preload)
+_background_services_pid = None
+_background_services_lock = threading.Lock()
+
+def start_background_services():
+    """Limpieza de sesiones, particiones futuras, poller WITS, chequeos de salud, broker de tokens y pool tibio Realtime"""
+    global _background_services_pid
+    if _background_services_pid == os.getpid():
+        return
+    with _background_services_lock:
+        if _background_services_pid == os.getpid():
+            return
+        _background_services_pid = os.getpid()
+
+        if SESSION_CLEANUP_INTERVAL > 0:
+            schedule_cleanup()
+            logger.warning(f"Session cleanup scheduled every {SESSION_CLEANUP_INTERVAL}s")
+
+        if DB_MAINTENANCE_AVAILABLE and PARTITION_MAINTENANCE_INTERVAL > 0:
+            # En un hilo aparte: el primer request no espera a Postgres
+            threading.Thread(target=schedule_partition_maintenance, daemon=True).start()
+            logger.warning(f"Partition maintenance scheduled every {PARTITION_MAINTENANCE_INTERVAL}s")
+
+        if CORVA_WITS_POLLER_AVAILABLE and start_wits_poller():
+            logger.warning("Corva WITS poller started")
+
+        if HEALTH_CHECKS_AVAILABLE:
+            get_health_checker()
+            logger.warning("Background dependency health checks started")
+
+        if token_broker is not None:
+            token_broker.start()
+            logger.warning("Speech token broker started")
+
+        if AZURE_OPENAI_ENDPOINT and AZURE_OPENAI_API_KEY and get_realtime_proxy() is not None:
+            logger.warning(f"Realtime warm pool: {realtime_proxy.warm_size} sessions")
+
+@app.before_request
+def ensure_background_services():
+    start_background_services()
+
 # ==== Main ====
 if __name__ == "__main__":
     logger.warning("Starting Azure Speech Live Voice with Avatar Server (with Socket.IO Proxy)")
@@ -1134,9 +1531,7 @@ if __name__ == "__main__":
     logger.warning(f"Voice: model={VOICE_MODEL} name={VOICE_NAME} lang={LANGUAGE}")
     logger.warning(f"Version: {APP_VERSION}")
 
-    if SESSION_CLEANUP_INTERVAL > 0:
-        schedule_cleanup()
-        logger.warning(f"Session cleanup scheduled every {SESSION_CLEANUP_INTERVAL}s")
+    start_background_services()
 
     logger.warning("=" * 60)
     logger.warning(f"Server starting on {FLASK_HOST}:{FLASK_PORT}")
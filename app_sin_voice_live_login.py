@@ -9,17 +9,16 @@ import os
 import pytz
 import random
 import re
-import requests
-import threading
 import time
 import traceback
 import uuid
 from flask import Flask, Response, render_template, request, session, redirect, url_for, jsonify
-from azure.identity import DefaultAzureCredential
 from langdetect import detect
 from langchain_openai import AzureChatOpenAI
 from src.agente import minipywo_app
-from src.pywo_aux_func import replace_token
+from src.text_corrections import CorrectionAutomaton
+from src.tts_pipeline import TtsPipeline
+from src.token_broker import get_token_broker, speech_aad_fetcher, speech_sts_fetcher, ice_relay_fetcher
 import msal
 from dotenv import load_dotenv
  
@@ -86,17 +85,19 @@ ice_server_password = os.environ.get('ICE_SERVER_PASSWORD') # The ICE password
  
 # Const variables
 default_tts_voice = 'es-AR-TomasNeural' # Default TTS voice
-sentence_level_punctuations = [ '.', '?', '!', ':', ';', '。', '？', '！', '：', '；' ] # Punctuations that indicate the end of a sentence
 enable_quick_reply = False # Enable quick reply for certain chat models which take longer time to respond
 quick_replies = [ 'Let me take a look.', 'Let me check.', 'One moment, please.' ] # Quick reply reponses
 oyd_doc_regex = re.compile(r'\[doc(\d+)\]') # Regex to match the OYD (on-your-data) document reference
 original_list = [   'Rial', 'Ta', 'Taim','aim', 'ɪnˈtel.ə.dʒəns', 'Intelishens', 'encia', 'Cénter', 'Workouver','ouver','ipf','IPF','bpe','BPE'] # Permite corregir en el chat del avatar el texto en inglés
 replacement_list = ['Real', 'Ti', 'Time','ime', 'Intelligence', 'Intelligence', 'ence', 'Center', 'Workover','over','YPF','YPF','VPE','VPE'] # Permite corregir en el chat del avatar el texto en inglés
+# Autómatas compilados una vez: correcciones del chat (sobre el stream, con límite de palabra) y pronunciaciones
+# del TTS. Con mayúsculas exactas como replace_token/str.replace: "Ta" corrige el token "Ta", no "ta" ni "TA"
+chat_corrections = CorrectionAutomaton(zip(original_list, replacement_list), fold=False)
+pronunciation_corrections = CorrectionAutomaton(replacements.items(), fold=False)
  
 # Global variables
 client_contexts = {} # Client contexts
-speech_token = None # Speech token
-ice_token = None # ICE token
+token_broker = get_token_broker() # Speech/ICE tokens cacheados y refrescados en segundo plano
  
 # ==================== RUTAS DE AUTENTICACIÓN ====================
 @app.route('/debug')
@@ -211,7 +212,7 @@ def chatview():
 # The API route to get the speech token
 @app.route("/api/getSpeechToken", methods=["GET"])
 def getspeechtoken() -> Response:
-    global speech_token
+    speech_token, _ = token_broker.get('speech')
     response = Response(speech_token, status=200)
     response.headers['SpeechRegion'] = speech_region
     if speech_private_endpoint:
@@ -231,8 +232,15 @@ def geticetoken() -> Response:
         })
        
         return Response(custom_ice_token, status=200)
+    ice_token, _ = token_broker.get('ice')
     return Response(ice_token, status=200)
  
+# The API route to get the TTS pipeline metrics (time to first audio, gap between sentences) per client
+@app.route("/api/ttsStats", methods=["GET"])
+def ttsstats() -> Response:
+    return jsonify({str(client_id): context['tts_pipeline'].stats()
+                    for client_id, context in list(client_contexts.items()) if context.get('tts_pipeline') is not None})
+ 
 # The API route to connect the TTS avatar
 @app.route("/api/connectAvatar", methods=["POST"])
 def connectavatar() -> Response:
@@ -263,10 +271,14 @@ def connectavatar() -> Response:
  
         client_context['speech_synthesizer'] = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
         speech_synthesizer = client_context['speech_synthesizer']
+        if client_context.get('tts_pipeline') is not None:
+            client_context['tts_pipeline'].close()
+        client_context['tts_pipeline'] = createttspipeline(client_id, speech_synthesizer)
        
-        ice_token_obj = json.loads(ice_token)
         # Apply customized ICE server if provided
-        if ice_server_url and ice_server_username and ice_server_password:
+        if not (ice_server_url and ice_server_username and ice_server_password):
+            ice_token_obj = json.loads(token_broker.get('ice')[0])
+        else:
             ice_token_obj = {
                 'Urls': [ ice_server_url_remote ] if ice_server_url_remote else [ ice_server_url ],
                 'Username': ice_server_username,
@@ -358,8 +370,8 @@ def speak() -> Response:
 def stopspeaking() -> Response:
     global client_contexts
     client_id = uuid.UUID(request.headers.get('ClientId'))
-    is_speaking = client_contexts[client_id]['is_speaking']
-    if is_speaking:
+    tts_pipeline = client_contexts[client_id].get('tts_pipeline')
+    if tts_pipeline is not None and tts_pipeline.is_speaking:
         stopspeakinginternal(client_id)
     return Response('Speaking stopped.', status=200)
  
@@ -396,9 +408,7 @@ def chat() -> Response:
             'chat_initiated': False,
             'messages': [],
             'data_sources': [],
-            'is_speaking': False,
-            'spoken_text_queue': [],
-            'speaking_thread': None,
+            'tts_pipeline': None,
             'last_speak_time': None,
             'user_id': client_id               # <--- Añadido: para que siempre esté en el contexto y luego en el state!
         }
@@ -443,6 +453,9 @@ def disconnectavatar() -> Response:
     client_id = uuid.UUID(request.headers.get('ClientId'))
     client_context = client_contexts[client_id]
     speech_synthesizer = client_context['speech_synthesizer']
+    if client_context.get('tts_pipeline') is not None:
+        client_context['tts_pipeline'].close()
+        client_context['tts_pipeline'] = None
     try:
         connection = speechsdk.Connection.from_speech_synthesizer(speech_synthesizer)
         connection.close()
@@ -465,35 +478,12 @@ def initializeclient() -> uuid.UUID:
         'chat_initiated': False, # Flag to indicate if the chat context is initiated
         'messages': [], # Chat messages (history)
         'data_sources': [], # Data sources for 'on your data' scenario
-        'is_speaking': False, # Flag to indicate if the avatar is speaking
-        'spoken_text_queue': [], # Queue to store the spoken text
-        'speaking_thread': None, # The thread to speak the spoken text queue
+        'tts_pipeline': None, # Sentence-level TTS pipeline (queue + lookahead synthesis) for the avatar
         'last_speak_time': None, # The last time the avatar spoke
         'user_id': client_id   # <-- ASÍ SIEMPRE DISPONIBLE
     }
     return client_id
  
-# Refresh the ICE token which being called
-def refreshicetoken() -> None:
-    global ice_token
-    if speech_private_endpoint:
-        ice_token = requests.get(f'{speech_private_endpoint}/tts/cognitiveservices/avatar/relay/token/v1', headers={'Ocp-Apim-Subscription-Key': speech_key}).text
-    else:
-        ice_token = requests.get(f'https://{speech_region}.tts.speech.microsoft.com/cognitiveservices/avatar/relay/token/v1', headers={'Ocp-Apim-Subscription-Key': speech_key}).text
- 
-# Refresh the speech token every 9 minutes
-def refreshspeechtoken() -> None:
-    global speech_token
-    while True:
-        # Refresh the speech token every 9 minutes
-        if speech_private_endpoint:
-            credential = DefaultAzureCredential(managed_identity_client_id=user_assigned_managed_identity_client_id)
-            token = credential.get_token('https://cognitiveservices.azure.com/.default')
-            speech_token = f'aad#{speech_resource_url}#{token.token}'
-        else:
-            speech_token = requests.post(f'https://{speech_region}.api.cognitive.microsoft.com/sts/v1.0/issueToken', headers={'Ocp-Apim-Subscription-Key': speech_key}).text
-        time.sleep(60 * 9)
- 
 # Conecta con AZURE AI SEARCH y memoria del chat.
 # Initialize the chat context, e.g. chat history (messages), data sources, etc. For chat scenario.
 def initializechatcontext(system_prompt: str, client_id: uuid.UUID) -> None:
@@ -563,13 +553,15 @@ def handleuserquery(user_query: str, client_id: uuid.UUID, config: dict, user_id
    
     assistant_reply = ''
     tool_content = ''
-    spoken_sentence = ''
+    # Correcciones del texto que ve el usuario: el corrector retiene solo lo que puede ser parte de un patrón
+    display_corrector = chat_corrections.stream()
  
     print('MESSAGE QUE LLEGA AL LLM:', messages)
-   
-    is_first_chunk = True
-    is_first_sentence = True
-    j = 0
+ 
+    # El pipeline del avatar corta por oración/cláusula y sintetiza con lookahead
+    tts_pipeline = client_context.get('tts_pipeline')
+    if tts_pipeline is not None:
+        tts_pipeline.begin_response()
     initial_state = {
         "question": messages[-1]['content'],
         "user_id": user_id,  # ✅ SETEAR EXPLÍCITAMENTE
@@ -580,6 +572,9 @@ def handleuserquery(user_query: str, client_id: uuid.UUID, config: dict, user_id
     print('ENTRO AL MINI PYWO STREAM')
     for chunk, metadata in wl_pywo.stream(initial_state, stream_mode="messages", config=config):
         if getattr(chunk, "name", None) == "log":
+            pending_display = display_corrector.flush()
+            if pending_display:
+                yield pending_display
            
             # Añadir un espacio extra antes del primer token del log para indicar inicio de frase
             yield " "  # Espacio adicional para marcar inicio de log/frase nueva
@@ -588,76 +583,40 @@ def handleuserquery(user_query: str, client_id: uuid.UUID, config: dict, user_id
             for word in words:
                 # Añadir un espacio antes de cada palabra (excepto la primera)
                 response_token = " " + word if word != words[0] else word
-               
-                if response_token is not None:
-                    if is_first_chunk:
-                        is_first_chunk = False
-                    if oyd_doc_regex.search(response_token):
-                        response_token = oyd_doc_regex.sub('', response_token).strip()
-                    yield response_token # muestra el token del llm al cliente en la imagen                
-                    assistant_reply += response_token  # build up the assistant message
-                    if response_token == '\n' or response_token == '\n\n':
-                        if is_first_sentence:
-                            is_first_sentence = False
-                        speakwithqueue(spoken_sentence.strip(), 0, client_id)
-                        spoken_sentence = ''
-                    else:
-                        response_token = response_token.replace('\n', '')
-                        spoken_sentence += response_token  # build up the spoken sentence
-                        if spoken_sentence.endswith("."):
-                                    time.sleep(0.5)  # Pausa breve entre oraciones
-                        if len(response_token) == 1 or len(response_token) == 2:
-                            for punctuation in sentence_level_punctuations:
-                                if response_token.startswith(punctuation):
-                                    if is_first_sentence:
-                                        is_first_sentence = False
-                                    speakwithqueue(spoken_sentence.strip(), 0, client_id)
-                                    spoken_sentence = ''
-                                    break
+                if oyd_doc_regex.search(response_token):
+                    response_token = oyd_doc_regex.sub('', response_token).strip()
+                yield response_token # muestra el token del llm al cliente en la imagen
+                assistant_reply += response_token  # build up the assistant message
+                if tts_pipeline is not None:
+                    tts_pipeline.feed(response_token)
+                if response_token.endswith("."):
+                    time.sleep(0.5)  # Pausa breve entre oraciones
+            # El log es una frase aparte de lo que siga
             yield " "  # Espacio adicional para marcar inicio de log/frase nueva
             assistant_reply += " "
+            if tts_pipeline is not None:
+                tts_pipeline.feed("\n")
             continue
  
         if ((metadata['langgraph_node'] =='general_response') or (metadata['langgraph_node']=='generate_human_readable_answer') or (metadata['langgraph_node']=='repreguntar') or (metadata['langgraph_node']=='stream_ini_consulta') or (metadata['langgraph_node']=='corva')) and (getattr(chunk, "name", None) != "memoria"):
            
             response_token = chunk.content
            
-            print('chunk.content',response_token)
             if response_token is not None:
-                if is_first_chunk:
-                    is_first_chunk = False
                 if oyd_doc_regex.search(response_token):
                     response_token = oyd_doc_regex.sub('', response_token).strip()
-                corrected_token = replace_token(response_token, original_list, replacement_list)
-                yield corrected_token #response_token # muestra el token del llm al cliente en la imagen pero corregido.              
+                corrected_token = display_corrector.feed(response_token)
+                if corrected_token:
+                    yield corrected_token #response_token # muestra el token del llm al cliente en la imagen pero corregido.              
                 assistant_reply += response_token  # build up the assistant message
-               
-                if response_token == '\n' or response_token == '\n\n':
-                    if is_first_sentence:
-                       
-                        is_first_sentence = False
-                       
-                    speakwithqueue(spoken_sentence.strip(), 0, client_id)
-                    spoken_sentence = ''
-                else:
-                   
-                    response_token = response_token.replace('\n', '')
-                    spoken_sentence += response_token  # build up the spoken sentence
-                   
-                    if len(response_token) == 1 or len(response_token) == 2:
-                        for punctuation in sentence_level_punctuations:
-                           
-                            if response_token.startswith(punctuation):
-                                if is_first_sentence:
-                                    is_first_sentence = False
-                                speakwithqueue(spoken_sentence.strip(), 0, client_id)
-                                spoken_sentence = ''
-                                break
-       
-        j = j+1                          
-    if spoken_sentence != '':
-        speakwithqueue(spoken_sentence.strip(), 0, client_id)
-        spoken_sentence = ''
+                if tts_pipeline is not None:
+                    tts_pipeline.feed(response_token)
+ 
+    pending_display = display_corrector.flush()
+    if pending_display:
+        yield pending_display
+    if tts_pipeline is not None:
+        tts_pipeline.end_response()
  
     if len(data_sources) > 0:
         tool_message = {
@@ -673,62 +632,49 @@ def handleuserquery(user_query: str, client_id: uuid.UUID, config: dict, user_id
     messages.append(assistant_message)
  
  
-# Speak the given text. If there is already a speaking in progress, add the text to the queue. For chat scenario.
-def speakwithqueue(text: str, ending_silence_ms: int, client_id: uuid.UUID) -> None:
-    global client_contexts
+# Build the SSML for a sentence (language detected once per response by the pipeline).
+def buildspeechssml(text: str, lang: str, ending_silence_ms: int, client_id: uuid.UUID) -> str:
     client_context = client_contexts[client_id]
-    spoken_text_queue = client_context['spoken_text_queue']
-    is_speaking = client_context['is_speaking']
-    spoken_text_queue.append(text)
-    if not is_speaking:
-        def speakthread():
-            nonlocal client_context
-            nonlocal spoken_text_queue
-            nonlocal ending_silence_ms
-            tts_voice = client_context['tts_voice']
-            personal_voice_speaker_profile_id = client_context['personal_voice_speaker_profile_id']
-            client_context['is_speaking'] = True
-            while len(spoken_text_queue) > 0:
-                text = spoken_text_queue.pop(0)
-                speaktext(text, tts_voice, personal_voice_speaker_profile_id, ending_silence_ms, client_id)
-                client_context['last_speak_time'] = datetime.datetime.now(pytz.UTC)
-            client_context['is_speaking'] = False
-        client_context['speaking_thread'] = threading.Thread(target=speakthread)
-        client_context['speaking_thread'].start()
- 
-# Speak the given text.
-def speaktext(text: str, voice: str, speaker_profile_id: str, ending_silence_ms: int, client_id: uuid.UUID) -> str:
-    for old, new in replacements.items():
-        text = text.replace(old, new)
-    print('TEXTO DENTRO DEL SPEACKTEXT', text)
-    lang = detect(text)
-    print('IDIOMA DENTRO DEL SPEACKTEXT', lang)
+    text = pronunciation_corrections.replace(text)
     xml_lang = xml_lang_by_lang.get(lang, "es-AR")
-    voice_name = voice
-    print('VOZ DENTRO DEL SPEACKTEXT', voice_name)
-    ssml = f"""<speak version='1.0' xmlns='http://www.w3.org/2001/10/synthesis' xmlns:mstts='http://www.w3.org/2001/mstts' xml:lang="{xml_lang}">
-                 <voice name='{voice_name}'>
-                     <mstts:ttsembedding speakerProfileId='{speaker_profile_id}'>
+    ending_silence = f"<break time='{ending_silence_ms}ms' />" if ending_silence_ms > 0 else ""
+    return f"""<speak version='1.0' xmlns='http://www.w3.org/2001/10/synthesis' xmlns:mstts='http://www.w3.org/2001/mstts' xml:lang="{xml_lang}">
+                 <voice name='{client_context['tts_voice']}'>
+                     <mstts:ttsembedding speakerProfileId='{client_context['personal_voice_speaker_profile_id']}'>
                          <mstts:leadingsilence-exact value='0'/>
                          {html.escape(text)}
+                         {ending_silence}
                      </mstts:ttsembedding>
                  </voice>
                </speak>"""
-    print("HTML ESCAPE TEXT", {html.escape(text)})
-    print("XML ESCAPE TEXT", {xml_lang})
-    if ending_silence_ms > 0:
-        ssml = f"""<speak version='1.0' xmlns='http://www.w3.org/2001/10/synthesis' xmlns:mstts='http://www.w3.org/2001/mstts' xml:lang="{xml_lang}">
-                     <voice name='{voice_name}'>
-                         <mstts:ttsembedding speakerProfileId='{speaker_profile_id}'>
-                             <mstts:leadingsilence-exact value='0'/>
-                             {html.escape(text)}
-                             <break time='{ending_silence_ms}ms' />
-                         </mstts:ttsembedding>
-                     </voice>
-                   </speak>"""
-        print("Estoy en ENDING SILENCE_MS", ending_silence_ms)
-        print("XML ESCAPE TEXT", {xml_lang})
-    return speakssml(ssml, client_id, False)
+ 
+# Log synthesis errors of the pipelined sentences (same checks as speakssml, without raising).
+def checksynthesisresult(speech_sythesis_result) -> None:
+    if speech_sythesis_result.reason == speechsdk.ResultReason.Canceled:
+        cancellation_details = speech_sythesis_result.cancellation_details
+        print(f"Speech synthesis canceled: {cancellation_details.reason}")
+        if cancellation_details.reason == speechsdk.CancellationReason.Error:
+            print(f"Result ID: {speech_sythesis_result.result_id}. Error details: {cancellation_details.error_details}")
+ 
+# Create the sentence-level TTS pipeline of a client, wired to its speech synthesizer events.
+def createttspipeline(client_id: uuid.UUID, speech_synthesizer) -> TtsPipeline:
+    client_context = client_contexts[client_id]
+    tts_pipeline = TtsPipeline(
+        str(client_id)[:8],
+        speak_async=speech_synthesizer.speak_ssml_async,
+        build_ssml=lambda text, lang, ending_silence_ms: buildspeechssml(text, lang, ending_silence_ms, client_id),
+        stop=lambda: sendstopcontrol(speech_synthesizer),
+        detect_fn=detect,
+        on_result=checksynthesisresult)
+ 
+    def on_finished(evt):
+        client_context['last_speak_time'] = datetime.datetime.now(pytz.UTC)
+        tts_pipeline.audio_finished()
+ 
+    speech_synthesizer.synthesis_started.connect(lambda evt: tts_pipeline.audio_started())
+    speech_synthesizer.synthesis_completed.connect(on_finished)
+    speech_synthesizer.synthesis_canceled.connect(on_finished)
+    return tts_pipeline
  
 # Speak the given ssml with speech sdk
 def speakssml(ssml: str, client_id: uuid.UUID, asynchronized: bool) -> str:
@@ -747,19 +693,22 @@ def speakssml(ssml: str, client_id: uuid.UUID, asynchronized: bool) -> str:
 def stopspeakinginternal(client_id: uuid.UUID) -> None:
     global client_contexts
     client_context = client_contexts[client_id]
-    speech_synthesizer = client_context['speech_synthesizer']
-    spoken_text_queue = client_context['spoken_text_queue']
-    spoken_text_queue.clear()
+    tts_pipeline = client_context.get('tts_pipeline')
+    if tts_pipeline is not None:
+        tts_pipeline.cancel()
+ 
+# Send the stop control message to the avatar synthesis
+def sendstopcontrol(speech_synthesizer) -> None:
     try:
         connection = speechsdk.Connection.from_speech_synthesizer(speech_synthesizer)
         connection.send_message_async('synthesis.control', '{"action":"stop"}').get()
     except Exception as e:
         print(f"Sending message through connection object is not yet supported by current Speech SDK.{e}")
  
-# Start the speech token refresh thread
-speechTokenRefereshThread = threading.Thread(target=refreshspeechtoken)
-speechTokenRefereshThread.daemon = True
-speechTokenRefereshThread.start()
- 
-# Fetch ICE token at startup
-refreshicetoken()
\ No newline at end of file
+# Tokens de speech (AAD con endpoint privado, STS con la key) e ICE relay, refrescados por el broker
+if speech_private_endpoint:
+    token_broker.register('speech', speech_aad_fetcher(speech_resource_url, user_assigned_managed_identity_client_id))
+else:
+    token_broker.register('speech', speech_sts_fetcher(speech_region, speech_key))
+token_broker.register('ice', ice_relay_fetcher(speech_region, speech_key, speech_private_endpoint))
+token_broker.start()
@@ -0,0 +1,101 @@
+# bench_asset_name_index.py
+# Compara el recorrido completo de la cascada de 7 niveles (comportamiento anterior
+# de search_asset_by_name) contra AssetNameIndex sobre catálogos de 1000 y 5000 assets.
+# Reporta latencia por búsqueda, qué fracción del catálogo re-scorea el índice y
+# si sus matches son exactamente los del recorrido completo: mejor match, matches
+# con score >= 90 (niveles exactos, fuzzy alto, rig explícito) y top 25 que se
+# envía al LLM.
+#
+#   python benchmark/bench_asset_name_index.py
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.corva_asset_index import AssetNameIndex, scan_all, RAPIDFUZZ_AVAILABLE
+
+SIZES = [1000, 5000]
+QUERIES = 200
+
+YACIMIENTOS = ["LCav", "LLL", "ADCH", "BajE", "LACh", "AdCh", "EOr", "BdT"]
+RIGS = ["DLS-167", "DLS-168", "H&P-252", "Nabors F35", "Nabors T430", "SAI-303", "Quintana Q-18"]
+
+
+def fake_catalog(n, rng):
+    catalog = []
+    for i in range(n):
+        well = f"YPF.Nq.{rng.choice(YACIMIENTOS)}-{rng.randint(1, 2000)}{rng.choice(['', '(h)', '(d)'])}"
+        rig = rng.choice(RIGS) if rng.random() < 0.6 else ""
+        catalog.append({
+            "id": str(100000 + i),
+            "original_id": str(100000 + i),
+            "attributes": {"name": f"{well} (Rig: {rig})" if rig else well},
+            "well_name": well,
+            "rig_name": rig,
+            "last_active_at": "2026-01-01T00:00:00",
+        })
+    return catalog
+
+
+def fake_query(catalog, rng):
+    asset = rng.choice(catalog)
+    kind = rng.random()
+    if kind < 0.3:
+        return asset["well_name"].lower()
+    if kind < 0.6:
+        # Nombre corto sin prefijo, como lo dicen los usuarios
+        return asset["well_name"].split(".")[-1].lower()
+    if kind < 0.8 and asset["rig_name"]:
+        return asset["rig_name"].lower()
+    # Con un error de tipeo
+    short = asset["well_name"].split(".")[-1].lower()
+    pos = rng.randrange(len(short))
+    return short[:pos] + short[pos + 1:]
+
+
+def top_k(results, k=25):
+    return [position for position, _, _ in sorted(results, key=lambda r: (-r[1], r[0]))[:k]]
+
+
+def strong(results, threshold=90):
+    return {(position, score, reason) for position, score, reason in results if score >= threshold}
+
+
+def timeit(fn, queries):
+    t0 = time.perf_counter()
+    results = [fn(q) for q in queries]
+    return (time.perf_counter() - t0) / len(queries) * 1000, results
+
+
+if __name__ == "__main__":
+    rng = random.Random(7)
+    print(f"fuzz: {'rapidfuzz' if RAPIDFUZZ_AVAILABLE else 'fuzzywuzzy'}")
+    print(f"{'assets':>6} | {'scan ms':>8} | {'índice ms':>9} | {'build ms':>8} | {'re-score':>8} | "
+          f"{'top1':>7} | {'>=90':>7} | {'top25':>6} | {'iguales':>7}")
+    for size in SIZES:
+        catalog = fake_catalog(size, rng)
+        queries = [fake_query(catalog, rng) for _ in range(QUERIES)]
+
+        t0 = time.perf_counter()
+        index = AssetNameIndex.build(catalog)
+        build_ms = (time.perf_counter() - t0) * 1000
+
+        scan_ms, scan_results = timeit(lambda q: scan_all(q, catalog), queries)
+        index_ms, index_results = timeit(lambda q: index.search(q), queries)
+        same_top1 = sum(1 for a, b in zip(scan_results, index_results) if top_k(a, 1) == top_k(b, 1))
+        same_strong = sum(1 for a, b in zip(scan_results, index_results) if strong(a) == strong(b))
+        overlap = sum(
+            len(set(top_k(a)) & set(top_k(b))) / len(top_k(a)) if a else float(not b)
+            for a, b in zip(scan_results, index_results)
+        ) / len(queries)
+        identical = sum(1 for a, b in zip(scan_results, index_results) if a == b)
+        rescored = sum(len(ids) if (ids := index.candidate_ids(q)) is not None else size
+                       for q in queries) / (len(queries) * size)
+
+        print(f"{size:>6} | {scan_ms:>8.2f} | {index_ms:>9.3f} | {build_ms:>8.1f} | {rescored:>8.1%} | "
+              f"{same_top1:>3}/{QUERIES} | {same_strong:>3}/{QUERIES} | {overlap:>6.1%} | {identical:>3}/{QUERIES}")
+        for query, a, b in zip(queries, scan_results, index_results):
+            if a != b:
+                print(f"  ❌ {query!r}: faltan {sorted(set(a) - set(b))[:3]}")
@@ -0,0 +1,99 @@
+# bench_filler_bank.py
+# Aviso inicial de stream_ini armado con src/filler_bank.py en lugar de la
+# llamada al LLM con stream_ini_prompt. Mide la latencia de elegir el filler
+# (detección de intención y entidades + selección) y, sobre sesiones de
+# preguntas reales del dominio, cuántos avisos repiten la entidad y cuántas
+# veces se repite un filler dentro de la misma sesión.
+# La latencia del camino anterior es la del round trip a gpt-4o-mini: se toma
+# de LLM_BASELINE_MS (medirla en el entorno con Azure OpenAI).
+#
+#   python benchmark/bench_filler_bank.py
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.filler_bank import FillerBank, detect_entities
+
+LLM_BASELINE_MS = float(os.environ.get("LLM_BASELINE_MS", "650"))
+SESSIONS = 200
+QUESTIONS_PER_SESSION = 12
+
+QUESTIONS = (
+    "¿Qué hizo el DLS-167 ayer?",
+    "¿En qué está el equipo 35?",
+    "Dame el NPT del dls 167 la semana pasada",
+    "¿A qué profundidad está el pozo LACh-388(h)?",
+    "Top 10 equipos con mejor ROP este mes",
+    "¿Cuántos pozos perforó el NBRS-F103 en marzo 2024?",
+    "Estado del H&P-219",
+    "Lista de pozos activos en perforación",
+    "¿Qué operaciones tuvo el pozo YPF.Nq.LACh-123(h) el 12/03?",
+    "Comparar el DLS-168 con el DLS-167",
+    "¿Cuáles son los equipos de workover?",
+    "¿Cuántas horas de parada hubo hoy?",
+    "¿Qué está haciendo el DLS-167?",
+    "Dame la producción del pozo LACh-1001(h)",
+)
+
+# Castellano común que no debe leerse como equipo ni pozo (el filler se dice en voz alta)
+NO_ASSET_QUESTIONS = (
+    "dame 5 pozos con más NPT",
+    "cual fue el npt de junio 2024",
+    "quiero ver 20 registros",
+    "listame todos 3 equipos",
+    "la profundidad del pozo de 3000 metros",
+    "top 10 equipos con mejor ROP",
+)
+
+
+def session_repeats(bank, session_id, rng):
+    said, repeats, with_entity = [], 0, 0
+    for _ in range(QUESTIONS_PER_SESSION):
+        question = rng.choice(QUESTIONS)
+        filler, _, entities = bank.pick(question, session_id)
+        repeats += filler in said
+        with_entity += any(value in filler for value in entities.values())
+        said.append(filler)
+    return repeats, with_entity, len(set(said))
+
+
+if __name__ == "__main__":
+    bank = FillerBank(rng=random.Random(7))
+    for question in QUESTIONS:
+        print(f"{question:<60} -> {bank.pick(question, 'demo')[0]}")
+
+    false_assets = []
+    for question in NO_ASSET_QUESTIONS:
+        entities = detect_entities(question)
+        if "equipo" in entities or "pozo" in entities:
+            false_assets.append((question, entities))
+    print(f"\nfrases sin equipo/pozo: {len(NO_ASSET_QUESTIONS) - len(false_assets)}/{len(NO_ASSET_QUESTIONS)} ok")
+    for question, entities in false_assets:
+        print(f"  ❌ {question!r} -> {entities}")
+
+    latencies = []
+    for i in range(20000):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        t0 = time.perf_counter()
+        bank.pick(question, f"lat-{i % 50}")
+        latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+    p50, p99 = statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+    rng = random.Random(11)
+    rows = [session_repeats(bank, f"s-{i}", rng) for i in range(SESSIONS)]
+    total = SESSIONS * QUESTIONS_PER_SESSION
+    repeats = sum(row[0] for row in rows)
+    with_entity = sum(row[1] for row in rows)
+    distinct = statistics.mean(row[2] for row in rows)
+
+    print(f"\n{'camino':<24} | {'p50 ms':>8} | {'p99 ms':>8}")
+    print(f"{'LLM (stream_ini_prompt)':<24} | {LLM_BASELINE_MS:>8.1f} | {'-':>8}")
+    print(f"{'banco local':<24} | {p50:>8.3f} | {p99:>8.3f}")
+    print(f"\n{SESSIONS} sesiones x {QUESTIONS_PER_SESSION} preguntas: {with_entity / total:.0%} repiten la entidad, "
+          f"{repeats / total:.1%} fillers repetidos en la sesión, {distinct:.1f} distintos por sesión")
+    print(f"stats: {bank.stats()}")
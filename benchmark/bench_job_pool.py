@@ -0,0 +1,105 @@
+# bench_job_pool.py
+# Carga sobre un grafo simulado (sleep + un backend con capacidad limitada, como
+# el rate limit de Azure OpenAI) comparando un hilo por request (lo que hacía
+# el modo threading de Socket.IO) contra JobPool de src/job_pool.py.
+# Reporta hilos vivos máximos, latencia p50/p95 de las aceptadas, rechazos
+# (429/busy) y throughput.
+#
+#   python benchmark/bench_job_pool.py
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.job_pool import JobPool, JobRejected
+
+CLIENTS = 200
+USERS = 40
+ARRIVAL_SECONDS = 2.0
+BACKEND_CAPACITY = 4
+WORKERS = 4
+QUEUE_SIZE = 24
+
+_backend = threading.Semaphore(BACKEND_CAPACITY)
+
+
+def fake_graph(payload):
+    """Relevancia + SQL + respuesta: ~150 ms de espera en un backend de capacidad fija"""
+    with _backend:
+        time.sleep(payload["cost"])
+    return f"respuesta a {payload['question']}"
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def watch_threads(stop, peak):
+    while not stop.is_set():
+        peak[0] = max(peak[0], threading.active_count())
+        time.sleep(0.005)
+
+
+def arrivals(rng):
+    return [(i, f"user-{rng.randrange(USERS)}", rng.uniform(0.1, 0.2), rng.uniform(0, ARRIVAL_SECONDS))
+            for i in range(CLIENTS)]
+
+
+def run_thread_per_request(plan):
+    latencies, lock = [], threading.Lock()
+
+    def handle(i, cost, submitted):
+        fake_graph({"question": i, "cost": cost})
+        with lock:
+            latencies.append(time.perf_counter() - submitted)
+
+    threads = []
+    t0 = time.perf_counter()
+    for i, _, cost, at in sorted(plan, key=lambda item: item[3]):
+        time.sleep(max(0.0, at - (time.perf_counter() - t0)))
+        thread = threading.Thread(target=handle, args=(i, cost, time.perf_counter()))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return latencies, 0, time.perf_counter() - t0
+
+
+def run_pool(plan):
+    pool = JobPool(fake_graph, workers=WORKERS, queue_size=QUEUE_SIZE, max_per_user=2, name="bench")
+    pool.start()
+    jobs, rejected = [], 0
+    t0 = time.perf_counter()
+    for i, user, cost, at in sorted(plan, key=lambda item: item[3]):
+        time.sleep(max(0.0, at - (time.perf_counter() - t0)))
+        try:
+            jobs.append((time.perf_counter(), pool.submit(user, {"question": i, "cost": cost})))
+        except JobRejected:
+            rejected += 1
+    for _, job in jobs:
+        job.wait()
+    latencies = [job.finished_at - job.submitted_at for _, job in jobs]
+    return latencies, rejected, time.perf_counter() - t0
+
+
+if __name__ == "__main__":
+    plan = arrivals(random.Random(5))
+    print(f"{CLIENTS} preguntas en {ARRIVAL_SECONDS:.0f}s, backend con capacidad {BACKEND_CAPACITY}\n")
+    print(f"{'modo':<22} | {'hilos máx':>9} | {'aceptadas':>9} | {'rechazadas':>10} | {'p50 s':>6} | {'p95 s':>6} | {'req/s':>6}")
+    for name, runner in (("hilo por request", run_thread_per_request), ("JobPool", run_pool)):
+        stop, peak = threading.Event(), [threading.active_count()]
+        watcher = threading.Thread(target=watch_threads, args=(stop, peak), daemon=True)
+        watcher.start()
+        latencies, rejected, elapsed = runner(plan)
+        stop.set()
+        watcher.join()
+        print(f"{name:<22} | {peak[0]:>9} | {len(latencies):>9} | {rejected:>10} | "
+              f"{statistics.median(latencies):>6.2f} | {percentile(latencies, 95):>6.2f} | "
+              f"{len(latencies) / elapsed:>6.1f}")
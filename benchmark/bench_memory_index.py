@@ -0,0 +1,128 @@
+# bench_memory_index.py
+# Compara el ranking original con difflib contra el índice en memoria por usuario
+# para 50, 500 y 5000 filas de historial por usuario. Con embeddings falsos de
+# 3072 dimensiones compara el coseno en Python puro (por documento) contra el
+# producto matriz-vector del índice.
+#
+#   python benchmark/bench_memory_index.py
+import hashlib
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import src.memory_index as memory_index
+from src.memory_index import UserMemoryIndex, rank_by_difflib
+
+SIZES = [50, 500, 5000]
+TOP_K = 5
+QUERIES = 200
+EMBEDDING_DIM = 3072
+
+SUJETOS = ["equipo", "pozo", "zona", "NPT", "perforación", "terminación", "workover", "producción", "diesel"]
+VERBOS = ["cuántos", "cuál es", "dame", "mostrame", "decime"]
+COSAS = ["profundidad", "ROP", "horas", "consumo", "metros", "estado", "tiempo perdido"]
+NOMBRES = ["DLS-167", "DLS-168", "H&P-252", "F35", "LCav-415", "LLL-1234", "ADCH-20"]
+
+
+def fake_question(rng):
+    return (f"{rng.choice(VERBOS)} {rng.choice(COSAS)} del {rng.choice(SUJETOS)} "
+            f"{rng.choice(NOMBRES)} en la última semana {rng.randint(1, 99)}")
+
+
+def fake_history(n, rng):
+    now = datetime.now()
+    return [{
+        'session_id': f"user144_session_{i // 10}",
+        'question': fake_question(rng),
+        'answer': "respuesta " * 20,
+        'relevance': 'consulta',
+        'sql_query': "SELECT 1",
+        'interaction_type': 'sql_workflow_complete',
+        'processing_time': 1.0,
+        'created_at': now - timedelta(minutes=i),
+        'correction_success': False,
+        'user_id': '144'
+    } for i in range(n)]
+
+
+class FakeEmbeddings:
+    """Vector determinístico por texto (sin llamar a Azure OpenAI)"""
+
+    def embed_query(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+        return np.random.default_rng(seed).standard_normal(EMBEDDING_DIM).tolist()
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+def python_cosines(q_vec, vectors):
+    """Coseno anterior: zip + sum por documento sobre tuplas de floats"""
+    return {doc_id: sum(a * b for a, b in zip(q_vec, vector)) for doc_id, vector in vectors.items()}
+
+
+def timeit(fn, questions):
+    t0 = time.perf_counter()
+    for q in questions:
+        fn(q)
+    return (time.perf_counter() - t0) / len(questions) * 1000
+
+
+if __name__ == "__main__":
+    rng = random.Random(42)
+    print(f"{'filas':>6} | {'difflib ms':>10} | {'índice ms':>9} | {'sync ms':>8} | {'overlap':>7}")
+    for size in SIZES:
+        history = fake_history(size, rng)
+        questions = [fake_question(rng) for _ in range(QUERIES)]
+
+        index = UserMemoryIndex(use_embeddings=False)
+        t0 = time.perf_counter()
+        index.sync(history)
+        sync_ms = (time.perf_counter() - t0) * 1000
+
+        # Solo una fracción para difflib en tamaños grandes (es lento)
+        n_diff = QUERIES if size <= 500 else 20
+        diff_ms = timeit(lambda q: rank_by_difflib(q, history, TOP_K), questions[:n_diff])
+        idx_ms = timeit(lambda q: index.search(q, TOP_K), questions)
+
+        overlap = 0
+        for q in questions[:20]:
+            a = {id(x) for x in rank_by_difflib(q, history, TOP_K)}
+            b = {id(x) for _, x in index.search(q, TOP_K)}
+            overlap += len(a & b)
+        print(f"{size:>6} | {diff_ms:>10.3f} | {idx_ms:>9.3f} | {sync_ms:>8.2f} | {overlap / (20 * TOP_K):>7.0%}")
+
+    memory_index._get_embeddings_client = lambda: FakeEmbeddings()
+    print(f"\nembeddings de {EMBEDDING_DIM} dimensiones (calculados en segundo plano)")
+    print(f"{'filas':>6} | {'sync ms':>8} | {'python ms':>9} | {'matmul ms':>9} | {'búsqueda ms':>11}")
+    for size in (50, 500):
+        history = fake_history(size, rng)
+        questions = [fake_question(rng) for _ in range(20)]
+        index = UserMemoryIndex(use_embeddings=True)
+        t0 = time.perf_counter()
+        index.sync(history)
+        sync_ms = (time.perf_counter() - t0) * 1000
+        memory_index._EMBEDDING_EXECUTOR.submit(lambda: None).result()
+
+        as_tuples = {doc_id: tuple(vector.tolist()) for doc_id, vector in index._vectors.items()}
+        q_vecs = [memory_index.embed_question(q) for q in questions]
+        py_ms = timeit(lambda q: python_cosines(tuple(q.tolist()), as_tuples), q_vecs[:5])
+        index.search(questions[0], TOP_K)
+        np_ms = timeit(lambda q: index._matrix @ q, q_vecs)
+        search_ms = timeit(lambda q: index.search(q, TOP_K, exclude_session="user144_session_0"), questions)
+        print(f"{size:>6} | {sync_ms:>8.2f} | {py_ms:>9.2f} | {np_ms:>9.3f} | {search_ms:>11.3f}")
+
+    # Fila guardada después de la carga: entra sin releer el historial y la sesión actual no vuelve
+    index.add({**history[0], 'session_id': "user144_session_nueva", 'created_at': datetime.now(),
+               'question': "consumo de diesel del DLS-999 hoy"})
+    found = [item['session_id'] for _, item in index.search("consumo de diesel del DLS-999 hoy", 1)]
+    hidden = [item['session_id'] for _, item in index.search("consumo de diesel del DLS-999 hoy", TOP_K,
+                                                             exclude_session="user144_session_nueva")]
+    print(f"\nadd() visible en la búsqueda: {found == ['user144_session_nueva']}, "
+          f"sesión actual excluida: {'user144_session_nueva' not in hidden}")
@@ -0,0 +1,194 @@
+# bench_memory_queries.py
+# EXPLAIN ANALYZE de las consultas de langmem_functions antes y después de la
+# migración 002 (user_id indexado + user_stats), sobre un Postgres local sembrado.
+#
+#   BENCH_PG_DSN="dbname=neuro_bench user=postgres host=localhost" \
+#       python benchmark/bench_memory_queries.py --rows 200000 --users 500
+#
+# Trabaja dentro del schema "neuro_bench" (se borra y recrea en cada corrida).
+# NUNCA apuntar BENCH_PG_DSN a la base de producción.
+import argparse
+import os
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+import psycopg2
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "migrations"))
+
+from backfill_memory_user_id import REBUILD_USER_STATS_QUERY, REBUILD_USER_SESSIONS_QUERY
+
+BENCH_PG_DSN = os.environ.get("BENCH_PG_DSN", "dbname=neuro_bench user=postgres host=localhost")
+BENCH_SCHEMA = "neuro_bench"
+
+# Esquema base de Memory (tal como lo escribe save_complete_memory)
+MEMORY_DDL = """
+CREATE TABLE Memory (
+    id SERIAL PRIMARY KEY,
+    user_id TEXT,
+    session_id TEXT,
+    user_question TEXT,
+    relevance TEXT,
+    sql_query TEXT,
+    query_result TEXT,
+    correction_success BOOLEAN,
+    processing_time_seconds DOUBLE PRECISION,
+    interaction_type TEXT,
+    human_message_id TEXT,
+    ai_message_id TEXT,
+    lista_equipos_activos JSONB,
+    lista_pozos_activos JSONB,
+    agent_state_snapshot JSONB,
+    created_at TIMESTAMP,
+    expires_at TIMESTAMP
+)
+"""
+
+SEED_QUERY = """
+INSERT INTO Memory (
+    user_id, session_id, user_question, relevance, sql_query, query_result,
+    correction_success, processing_time_seconds, interaction_type, created_at, expires_at
+)
+SELECT
+    (g %% %(users)s)::text,
+    'user' || (g %% %(users)s) || '_session_' || (g / 20),
+    'pregunta de prueba ' || g,
+    CASE WHEN g %% 3 = 0 THEN 'casual' ELSE 'consulta' END,
+    'SELECT ' || g,
+    repeat('resultado ', 20),
+    g %% 7 = 0,
+    random() * 10,
+    (ARRAY['sql_workflow_complete', 'general_response', 'corva'])[1 + g %% 3],
+    now() - (random() * interval '90 days'),
+    now()
+FROM generate_series(1, %(rows)s) AS g
+"""
+
+OLD_QUERIES = {
+    "historial (IN subquery)": ("""
+        SELECT session_id, user_question, query_result, relevance, sql_query,
+               interaction_type, processing_time_seconds, created_at, correction_success, user_id
+        FROM Memory
+        WHERE created_at >= %(since7)s
+          AND session_id IN (SELECT DISTINCT session_id FROM Memory WHERE user_id = %(user)s)
+          AND session_id != %(session)s
+        ORDER BY CASE WHEN interaction_type = 'sql_workflow_complete' THEN 1 ELSE 2 END, created_at DESC
+        LIMIT 50
+    """),
+    "stats (LIKE '%user..%')": ("""
+        SELECT COUNT(*), COUNT(CASE WHEN relevance = 'consulta' THEN 1 END),
+               COUNT(CASE WHEN relevance = 'casual' THEN 1 END), AVG(processing_time_seconds),
+               COUNT(CASE WHEN correction_success = true THEN 1 END), COUNT(DISTINCT session_id)
+        FROM Memory
+        WHERE created_at >= %(since30)s AND session_id LIKE %(like)s
+    """),
+    "topics (GROUP BY global)": ("""
+        SELECT interaction_type, COUNT(*) as frequency
+        FROM Memory
+        WHERE created_at >= %(since30)s
+        GROUP BY interaction_type
+        ORDER BY frequency DESC
+        LIMIT 5
+    """),
+}
+
+NEW_QUERIES = {
+    "historial (user_id)": ("""
+        SELECT session_id, user_question, query_result, relevance, sql_query,
+               interaction_type, processing_time_seconds, created_at, correction_success, user_id
+        FROM Memory
+        WHERE created_at >= %(since7)s
+          AND user_id = %(user)s
+          AND session_id != %(session)s
+        ORDER BY CASE WHEN interaction_type = 'sql_workflow_complete' THEN 1 ELSE 2 END, created_at DESC
+        LIMIT 50
+    """),
+    "stats (user_stats)": ("""
+        SELECT COALESCE(SUM(total_interactions), 0), COALESCE(SUM(sql_queries), 0),
+               COALESCE(SUM(casual_chats), 0),
+               SUM(total_processing_time) / NULLIF(SUM(processing_time_samples), 0),
+               COALESCE(SUM(successful_corrections), 0),
+               (SELECT COUNT(*) FROM user_sessions WHERE user_id = %(user)s AND last_seen_at >= %(since30)s)
+        FROM user_stats
+        WHERE user_id = %(user)s AND day >= %(since30_day)s
+    """),
+    "topics (user_stats)": ("""
+        SELECT topic.key, SUM(topic.value::int) AS frequency
+        FROM user_stats, jsonb_each_text(user_stats.topics) AS topic
+        WHERE user_id = %(user)s AND day >= %(since30_day)s
+        GROUP BY topic.key
+        ORDER BY frequency DESC
+        LIMIT 5
+    """),
+}
+
+EXEC_TIME_RE = re.compile(r"Execution Time: ([\d.]+) ms")
+
+
+def explain(cursor, query, params, repeat=5):
+    """Mediana del Execution Time de EXPLAIN ANALYZE"""
+    times = []
+    for _ in range(repeat):
+        cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params)
+        plan = "\n".join(row[0] for row in cursor.fetchall())
+        times.append(float(EXEC_TIME_RE.search(plan).group(1)))
+    times.sort()
+    return times[len(times) // 2], plan
+
+
+def run_queries(cursor, queries, params, show_plans):
+    for name, query in queries.items():
+        median_ms, plan = explain(cursor, query, params)
+        print(f"   {name:28s} {median_ms:10.3f} ms")
+        if show_plans:
+            print("      " + plan.replace("\n", "\n      "))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--plans", action="store_true", help="Imprime los planes completos")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(BENCH_PG_DSN)
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {BENCH_SCHEMA}")
+    cursor.execute(f"SET search_path TO {BENCH_SCHEMA}")
+    cursor.execute(MEMORY_DDL)
+
+    t0 = time.perf_counter()
+    cursor.execute(SEED_QUERY, {"rows": args.rows, "users": args.users})
+    cursor.execute("ANALYZE Memory")
+    print(f"🌱 Sembradas {args.rows} filas para {args.users} usuarios en {time.perf_counter() - t0:.1f}s")
+
+    now = datetime.now()
+    params = {
+        "user": "42",
+        "session": "user42_session_actual",
+        "like": "%user42%",
+        "since7": now - timedelta(days=7),
+        "since30": now - timedelta(days=30),
+        "since30_day": (now - timedelta(days=30)).date(),
+    }
+
+    print("\n📉 ANTES (esquema original)")
+    run_queries(cursor, OLD_QUERIES, params, args.plans)
+
+    with open(os.path.join(ROOT, "migrations", "002_memory_user_id_and_stats.sql")) as f:
+        cursor.execute(f.read())
+    cursor.execute(REBUILD_USER_STATS_QUERY)
+    cursor.execute(REBUILD_USER_SESSIONS_QUERY)
+    cursor.execute("ANALYZE")
+
+    print("\n📈 DESPUÉS (migración 002)")
+    run_queries(cursor, NEW_QUERIES, params, args.plans)
+
+    cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+    cursor.close()
+    conn.close()
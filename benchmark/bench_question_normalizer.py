@@ -0,0 +1,110 @@
+# bench_question_normalizer.py
+# Microbenchmark de src/question_normalizer.py contra juntar_numeros_sucesivos
+# (src/pywo_aux_func.py: un re.sub por número en palabras, regex armada en
+# cada llamada). Además de la latencia por pregunta, mide cuántas claves
+# distintas producen variantes de transcripción de la misma pregunta
+# ("dls 167", "DLS-167", "Dls167", "dls uno seis siete"...): cada clave de
+# más es un miss en los caches que dependen del texto de la pregunta. Antes
+# de medir verifica que castellano común con números y los nombres oficiales
+# de pozo salgan sin cambios, y que los dígitos dictados después de
+# "equipo"/"pozo" se sigan uniendo como hacía juntar_numeros_sucesivos.
+#
+#   python benchmark/bench_question_normalizer.py
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.question_normalizer import QuestionNormalizer
+
+ROUNDS = 2000
+
+# Variantes de STT de las mismas preguntas
+VARIANTS = (
+    ("¿Qué hizo el DLS-167 ayer?", "que hizo el dls 167 ayer", "Qué hizo el Dls167 ayer?",
+     "que hizo el el dls uno seis siete ayer", "eh que hizo el DLS ciento sesenta y siete ayer"),
+    ("¿Cuánto duró cada fase del pozo LACh-391?", "cuanto duro cada fase del pozo lach 391",
+     "cuánto duró cada fase del pozo LaCh 391", "cuanto duro cada fase del pozo lach tres nueve uno"),
+    ("pozos activos en LLL", "pozos activos en Loma La Lata", "Pozos activos en  LLL?"),
+    ("¿Cuántas horas de NPT hubo en las últimas 24 horas?", "cuantas horas de NPT hubo en las ultimas veinticuatro horas"),
+    ("novedades del equipo LS-168", "novedades del equipo ls 168", "novedades del equipo LS 1 6 8"),
+    ("contratista que más pozos perforó en 2025", "contratista que mas pozos perforo en dos mil veinticinco"),
+)
+
+# (pregunta, esperado): cambian los códigos con prefijo conocido y los dígitos
+# dictados tras "equipo"/"pozo"/"rig"; el resto de los números queda como está
+CHECK_CASES = (
+    ("dame los pozos nuevos 5", "dame los pozos nuevos 5"),
+    ("en el 2024 3 veces", "en el 2024 3 veces"),
+    ("a las 10 30", "a las 10 30"),
+    ("¿A qué profundidad está el pozo LACh-388(h)?", "¿A qué profundidad está el pozo LACh-388(h)?"),
+    ("el dls 167 3 veces", "el DLS-167 3 veces"),
+    ("niveles de co2 y h2s", "niveles de co2 y h2s"),
+    ("cuantos metros perforó el equipo uno seis siete", "cuantos metros perforó el equipo 167"),
+    ("datos del pozo 1 6 7", "datos del pozo 167"),
+    ("mil gracias", "mil gracias"),
+    ("dame uno de los equipos", "dame uno de los equipos"),
+)
+
+
+def juntar_numeros_sucesivos(texto):
+    """src/pywo_aux_func.juntar_numeros_sucesivos"""
+    palabras_a_numeros = {
+        "cero": "0", "uno": "1", "dos": "2", "tres": "3", "cuatro": "4", "cinco": "5", "seis": "6",
+        "siete": "7", "ocho": "8", "nueve": "9", "diez": "10", "once": "11", "doce": "12"
+    }
+    for palabra, numero in palabras_a_numeros.items():
+        texto = re.sub(fr'\b{palabra}\b', numero, texto, flags=re.IGNORECASE)
+    return re.sub(r'(\d+)\s+(\d+)', r'\1\2', texto)
+
+
+def per_call_us(fn, questions):
+    samples = []
+    for _ in range(ROUNDS // len(questions) + 1):
+        t0 = time.perf_counter()
+        for question in questions:
+            fn(question)
+        samples.append((time.perf_counter() - t0) * 1e6 / len(questions))
+    return statistics.median(samples), max(samples)
+
+
+def exact_key(text):
+    return text
+
+
+def folded_key(text):
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+if __name__ == "__main__":
+    normalizer = QuestionNormalizer()
+    failures = [(question, got, expected) for question, expected in CHECK_CASES
+                if (got := normalizer.normalize(question)) != expected]
+    print(f"frases verificadas: {len(CHECK_CASES) - len(failures)}/{len(CHECK_CASES)} ok")
+    for question, got, expected in failures:
+        print(f"  ❌ {question!r} -> {got!r} (esperado {expected!r})")
+    print()
+    questions = [question for group in VARIANTS for question in group]
+
+    print(f"{len(questions)} preguntas, {ROUNDS} rondas\n")
+    print(f"{'función':<36} | {'µs/pregunta p50':>15} | {'peor ronda':>10}")
+    for name, fn in (("juntar_numeros_sucesivos", juntar_numeros_sucesivos),
+                     ("QuestionNormalizer.normalize", normalizer.normalize),
+                     ("QuestionNormalizer.cache_key", normalizer.cache_key)):
+        p50, worst = per_call_us(fn, questions)
+        print(f"{name:<36} | {p50:>15.1f} | {worst:>10.1f}")
+
+    print(f"\n{'clave de cache':<36} | {'claves':>6} | {'preguntas distintas':>19}")
+    for name, key in (("texto crudo", exact_key),
+                      ("juntar_numeros + minúsculas", lambda q: folded_key(juntar_numeros_sucesivos(q))),
+                      ("QuestionNormalizer.cache_key", normalizer.cache_key)):
+        keys = {key(question) for question in questions}
+        print(f"{name:<36} | {len(keys):>6} | {len(VARIANTS):>19}")
+
+    print()
+    for group in VARIANTS:
+        keys = {normalizer.cache_key(question) for question in group}
+        print(f"{len(group)} variantes -> {len(keys)} clave(s): {sorted(keys)}")
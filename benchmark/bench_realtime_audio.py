@@ -0,0 +1,171 @@
+# bench_realtime_audio.py
+# CPU (servidor y navegador estimado) por segundo de audio y bytes en el cable
+# (Socket.IO) del proxy Realtime, antes y después del camino binario de
+# src/realtime_proxy.py.
+#
+# Bajada: 60 s de respuesta de la Realtime API en response.audio.delta de
+# 20 ms (PCM16 24 kHz) pasan por RealtimeConnection.handle_upstream_text con
+# un shard simulado; cada emit se serializa como lo hace python-socketio
+# (paquete de texto 42[...] o binario 45N-[...] + adjuntos). "CPU cliente" es
+# una estimación del trabajo del navegador: JSON.parse + atob de cada delta
+# (acá json.loads + b64decode); con el adjunto binario el PCM llega listo.
+# Subida: 60 s de micrófono en bloques de 2048 muestras (lo que manda el
+# ScriptProcessor del front): realtime_send con el JSON en base64 contra
+# realtime_audio_append con el PCM como adjunto.
+#
+#   python benchmark/bench_realtime_audio.py
+import asyncio
+import base64
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.realtime_audio import NUMPY_AVAILABLE, encode_audio_append
+from src.realtime_proxy import RealtimeConnection
+
+AUDIO_SECONDS = 60
+SAMPLE_RATE = 24000
+DELTA_MS = 20
+MIC_SAMPLES = 2048
+ROUNDS = 5
+
+
+def pcm_noise(rng, samples):
+    return bytes(rng.getrandbits(8) for _ in range(samples * 2))
+
+
+def socketio_packet(event, data):
+    """Bytes en el cable de un emit (formato de paquetes de python-socketio)"""
+    attachments = []
+
+    def placeholder(value):
+        if isinstance(value, bytes):
+            attachments.append(value)
+            return {"_placeholder": True, "num": len(attachments) - 1}
+        if isinstance(value, dict):
+            return {k: placeholder(v) for k, v in value.items()}
+        return value
+
+    body = json.dumps([event, placeholder(data)], separators=(",", ":"))
+    if attachments:
+        return len(f"45{len(attachments)}-") + len(body) + sum(len(a) for a in attachments), 1 + len(attachments)
+    return len("42") + len(body), 1
+
+
+class FakeShard:
+    index = 0
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.wire_bytes = 0
+        self.frames = 0
+        self.messages = []
+
+    def emit(self, event, data, sid):
+        size, frames = socketio_packet(event, data)
+        self.wire_bytes += size
+        self.frames += frames
+        if event == "realtime_message":
+            self.messages.append(data["data"])
+
+
+def client_decode_seconds(messages):
+    t0 = time.process_time()
+    for message in messages:
+        event = json.loads(message)
+        if event.get("type") == "response.audio.delta":
+            base64.b64decode(event["delta"])
+    return time.process_time() - t0
+
+
+def api_messages(rng):
+    messages = []
+    for response in range(AUDIO_SECONDS // 5):
+        # Respuestas de 5 s, cada una cerrada por sus eventos de control
+        for _ in range(5000 // DELTA_MS):
+            delta = base64.b64encode(pcm_noise(rng, SAMPLE_RATE * DELTA_MS // 1000)).decode("ascii")
+            messages.append(json.dumps({"type": "response.audio.delta", "event_id": f"event_{rng.getrandbits(32)}",
+                                        "response_id": f"resp_{response}", "item_id": f"item_{response}",
+                                        "output_index": 0, "content_index": 0, "delta": delta}))
+        messages.append(json.dumps({"type": "response.audio.done", "response_id": f"resp_{response}"}))
+        messages.append(json.dumps({"type": "response.done", "response": {"id": f"resp_{response}"}}))
+    return messages
+
+
+def run_downstream(messages, binary_audio, audio_rate=None):
+    best = float("inf")
+    for _ in range(ROUNDS):
+        shard = FakeShard()
+        connection = RealtimeConnection(shard, "bench", "sid", "", {}, 64, 4,
+                                        binary_audio=binary_audio, audio_rate=audio_rate)
+        t0 = time.process_time()
+        for message in messages:
+            connection.handle_upstream_text(message)
+        connection._flush_audio()
+        best = min(best, time.process_time() - t0)
+        shard.loop.close()
+    return best, shard.wire_bytes, shard.frames, client_decode_seconds(shard.messages)
+
+
+def run_upstream(chunks, binary):
+    best, wire = float("inf"), 0
+    for _ in range(ROUNDS):
+        shard = FakeShard()
+        connection = RealtimeConnection(shard, "bench", "sid", "", {}, 10 ** 6, 10 ** 6)
+        wire = 0
+        t0 = time.process_time()
+        for pcm in chunks:
+            if binary:
+                # realtime_audio_append: el paquete trae el PCM como adjunto
+                size, _ = socketio_packet("realtime_audio_append", {"client_id": "bench", "audio": pcm})
+                connection.enqueue(pcm)
+            else:
+                # realtime_send: python-socketio parsea el JSON del paquete y el proxy lo vuelve a serializar
+                payload = {"client_id": "bench", "message": {"type": "input_audio_buffer.append",
+                                                             "audio": base64.b64encode(pcm).decode("ascii")}}
+                packet = "42" + json.dumps(["realtime_send", payload], separators=(",", ":"))
+                size = len(packet)
+                connection.enqueue(json.dumps(json.loads(packet[2:])[1]["message"]))
+            wire += size
+        while connection._pending:
+            _, message, _ = connection._pending.popleft()
+            if isinstance(message, bytes):
+                message = encode_audio_append(message)
+        best = min(best, time.process_time() - t0)
+        shard.loop.close()
+    return best, wire
+
+
+def row(name, cpu, wire, frames=None, client_cpu=None):
+    frames_text = f"{frames / AUDIO_SECONDS:>9.1f}" if frames is not None else f"{'-':>9}"
+    client_text = f"{client_cpu * 1000 / AUDIO_SECONDS:>16.3f}" if client_cpu is not None else f"{'-':>16}"
+    print(f"{name:<30} | {cpu * 1000 / AUDIO_SECONDS:>14.3f} | {client_text} | "
+          f"{wire / 1024 / AUDIO_SECONDS:>13.1f} | {frames_text}")
+
+
+if __name__ == "__main__":
+    rng = random.Random(7)
+    messages = api_messages(rng)
+    header = (f"{'modo':<30} | {'CPU servidor ms':>14} | {'CPU cliente ms est':>16} | "
+              f"{'KB/s en cable':>13} | {'frames/s':>9}")
+
+    print("CPU en ms por segundo de audio; frames = frames WebSocket (cada adjunto es uno)\n")
+    print(f"Bajada: {AUDIO_SECONDS}s de audio en deltas de {DELTA_MS} ms ({len(messages)} mensajes)\n")
+    print(header)
+    row("JSON/base64 (antes)", *run_downstream(messages, binary_audio=False))
+    row("binario 80 ms", *run_downstream(messages, binary_audio=True))
+    if NUMPY_AVAILABLE:
+        row("binario 80 ms → 16 kHz", *run_downstream(messages, binary_audio=True, audio_rate=16000))
+        row("binario 80 ms → 8 kHz", *run_downstream(messages, binary_audio=True, audio_rate=8000))
+    else:
+        print("(sin numpy: se omite el remuestreo)")
+
+    chunks = [pcm_noise(rng, MIC_SAMPLES) for _ in range(AUDIO_SECONDS * SAMPLE_RATE // MIC_SAMPLES)]
+    print(f"\nSubida: {AUDIO_SECONDS}s de micrófono en bloques de {MIC_SAMPLES} muestras\n")
+    print(header)
+    row("realtime_send JSON (antes)", *run_upstream(chunks, binary=False))
+    row("realtime_audio_append binario", *run_upstream(chunks, binary=True))
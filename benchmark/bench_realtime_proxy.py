@@ -0,0 +1,128 @@
+# bench_realtime_proxy.py
+# Prueba de carga de src/realtime_proxy.py contra un servidor WebSocket local
+# que imita Azure OpenAI Realtime: responde session.created al conectar y un
+# response.audio.delta por cada input_audio_buffer.append. N clientes mandan
+# 20 ms de audio PCM16 24 kHz cada 20 ms desde unos pocos hilos (como los
+# handlers de Socket.IO). Reporta hilos del proceso, throughput, lag de envío
+# y audio fusionado/descartado.
+#
+#   python benchmark/bench_realtime_proxy.py [clientes ...]
+import asyncio
+import base64
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from aiohttp import web, WSMsgType
+
+from src.realtime_proxy import RealtimeProxyEngine
+
+CLIENT_COUNTS = [int(arg) for arg in sys.argv[1:]] or [50, 200]
+DURATION_SECONDS = 5.0
+FRAME_SECONDS = 0.02
+DRIVER_THREADS = 4
+AUDIO_FRAME = base64.b64encode(b"\x00\x01" * int(24000 * FRAME_SECONDS)).decode("ascii")
+DELTA = json.dumps({"type": "response.audio.delta", "delta": base64.b64encode(b"\x02" * 480).decode("ascii")})
+
+
+async def realtime_handler(request):
+    ws = web.WebSocketResponse(max_msg_size=0)
+    await ws.prepare(request)
+    await ws.send_str(json.dumps({"type": "session.created"}))
+    async for msg in ws:
+        if msg.type == WSMsgType.TEXT and '"input_audio_buffer.append"' in msg.data[:60]:
+            await ws.send_str(DELTA)
+    return ws
+
+
+def start_fake_server():
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    port = []
+
+    async def serve():
+        app = web.Application()
+        app.router.add_get("/openai/realtime", realtime_handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port.append(site._server.sockets[0].getsockname()[1])
+        started.set()
+
+    threading.Thread(target=lambda: (loop.run_until_complete(serve()), loop.run_forever()),
+                     name="fake-realtime", daemon=True).start()
+    started.wait()
+    return port[0]
+
+
+def run(clients, port):
+    received = Counter()
+    lock = threading.Lock()
+
+    def emit(event, data, sid):
+        with lock:
+            received[event] += 1
+
+    engine = RealtimeProxyEngine(f"http://127.0.0.1:{port}/openai/realtime", headers={}, emit_fn=emit)
+    ids = [f"client-{i}" for i in range(clients)]
+    for client_id in ids:
+        engine.open(client_id, sid=client_id)
+    deadline = time.time() + 10
+    while time.time() < deadline and received["realtime_connected"] < clients:
+        time.sleep(0.05)
+
+    message = json.dumps({"type": "input_audio_buffer.append", "audio": AUDIO_FRAME})
+    stop = threading.Event()
+    sent = Counter()
+
+    def driver(chunk):
+        next_tick = time.perf_counter()
+        while not stop.is_set():
+            for client_id in chunk:
+                if engine.send(client_id, message):
+                    sent[threading.get_ident()] += 1
+            next_tick += FRAME_SECONDS
+            time.sleep(max(0.0, next_tick - time.perf_counter()))
+
+    drivers = [threading.Thread(target=driver, args=(ids[i::DRIVER_THREADS],), daemon=True)
+               for i in range(DRIVER_THREADS)]
+    t0 = time.perf_counter()
+    for thread in drivers:
+        thread.start()
+    time.sleep(DURATION_SECONDS)
+    peak_threads = threading.active_count()
+    stop.set()
+    for thread in drivers:
+        thread.join()
+    time.sleep(0.5)
+    elapsed = time.perf_counter() - t0
+    stats = engine.stats()
+    engine.shutdown()
+    return {
+        "connected": received["realtime_connected"],
+        "threads": peak_threads,
+        "sent_per_s": sum(sent.values()) / elapsed,
+        "upstream_per_s": stats["messages_out"] / elapsed,
+        "deltas_per_s": received["realtime_message"] / elapsed,
+        "max_lag_ms": stats["max_send_lag_ms"],
+        "merged": stats["audio_merged"],
+        "dropped": stats["audio_dropped"],
+    }
+
+
+if __name__ == "__main__":
+    port = start_fake_server()
+    print(f"{'clientes':>8} | {'conectados':>10} | {'hilos':>5} | {'enviados/s':>10} | {'upstream/s':>10} | "
+          f"{'deltas/s':>9} | {'lag máx ms':>10} | {'fusionados':>10} | {'descartados':>11}")
+    for clients in CLIENT_COUNTS:
+        r = run(clients, port)
+        print(f"{clients:>8} | {r['connected']:>10} | {r['threads']:>5} | {r['sent_per_s']:>10.0f} | "
+              f"{r['upstream_per_s']:>10.0f} | {r['deltas_per_s']:>9.0f} | {r['max_lag_ms']:>10.1f} | "
+              f"{r['merged']:>10} | {r['dropped']:>11}")
+    print("\n(el proxy anterior usaba un hilo de websocket-client por cliente: hilos ≈ clientes + base)")
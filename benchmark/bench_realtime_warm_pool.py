@@ -0,0 +1,101 @@
+# bench_realtime_warm_pool.py
+# Latencia de inicio de sesión de voz con y sin el pool tibio de
+# src/realtime_proxy.py: tiempo desde open() hasta tener la sesión lista
+# (session.updated en el navegador). El servidor falso imita Azure OpenAI
+# Realtime con un handshake lento (TLS + WebSocket) y demora en aplicar
+# session.update. Los usuarios llegan espaciados, como al apretar el micrófono.
+#
+#   python benchmark/bench_realtime_warm_pool.py
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from aiohttp import web, WSMsgType
+
+from src.realtime_proxy import RealtimeProxyEngine
+
+HANDSHAKE_SECONDS = 0.25
+SESSION_UPDATE_SECONDS = 0.12
+USERS = 20
+ARRIVAL_GAP_SECONDS = 0.4
+SESSION = {"voice": "alloy", "modalities": ["text", "audio"]}
+
+
+async def realtime_handler(request):
+    await asyncio.sleep(HANDSHAKE_SECONDS)
+    ws = web.WebSocketResponse(max_msg_size=0)
+    await ws.prepare(request)
+    await ws.send_str(json.dumps({"type": "session.created"}))
+    async for msg in ws:
+        if msg.type == WSMsgType.TEXT and json.loads(msg.data).get("type") == "session.update":
+            await asyncio.sleep(SESSION_UPDATE_SECONDS)
+            await ws.send_str(json.dumps({"type": "session.updated"}))
+    return ws
+
+
+def start_fake_server():
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    port = []
+
+    async def serve():
+        app = web.Application()
+        app.router.add_get("/openai/realtime", realtime_handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port.append(site._server.sockets[0].getsockname()[1])
+        started.set()
+
+    threading.Thread(target=lambda: (loop.run_until_complete(serve()), loop.run_forever()),
+                     name="fake-realtime", daemon=True).start()
+    started.wait()
+    return port[0]
+
+
+def run(port, warm_size):
+    ready = {}
+    opened = {}
+    lock = threading.Lock()
+
+    def emit(event, data, sid):
+        # El front manda session.update al conectar salvo que la sesión ya venga configurada
+        if event == "realtime_connected" and not data.get("session_configured"):
+            engine.send(data["client_id"], {"type": "session.update", "session": SESSION})
+        elif event == "realtime_message" and '"session.updated"' in data["data"]:
+            with lock:
+                ready.setdefault(data["client_id"], time.perf_counter())
+
+    engine = RealtimeProxyEngine(f"http://127.0.0.1:{port}/openai/realtime", headers={}, emit_fn=emit,
+                                 warm_size=warm_size, warm_session=SESSION)
+    time.sleep(1.0)  # el pool se llena al crear el motor (antes del primer usuario)
+    for i in range(USERS):
+        client_id = f"user-{i}"
+        opened[client_id] = time.perf_counter()
+        engine.open(client_id, sid=client_id)
+        time.sleep(ARRIVAL_GAP_SECONDS)
+    time.sleep(1.0)
+    stats = engine.stats()
+    engine.shutdown()
+    latencies = sorted((ready[c] - opened[c]) * 1000 for c in opened if c in ready)
+    return latencies, stats.get("warm_pool", {})
+
+
+if __name__ == "__main__":
+    port = start_fake_server()
+    print(f"handshake {HANDSHAKE_SECONDS * 1000:.0f} ms, session.update {SESSION_UPDATE_SECONDS * 1000:.0f} ms, "
+          f"{USERS} usuarios cada {ARRIVAL_GAP_SECONDS * 1000:.0f} ms\n")
+    print(f"{'pool tibio':>10} | {'listas':>6} | {'p50 ms':>7} | {'p95 ms':>7} | {'hit rate':>8}")
+    for warm_size in (0, 1, 2):
+        latencies, warm = run(port, warm_size)
+        hit_rate = warm.get("hit_rate")
+        print(f"{warm_size:>10} | {len(latencies):>6} | {statistics.median(latencies):>7.1f} | "
+              f"{latencies[int(len(latencies) * 0.95) - 1]:>7.1f} | "
+              f"{'-' if hit_rate is None else f'{hit_rate:.0%}':>8}")
@@ -0,0 +1,187 @@
+# bench_text_corrections.py
+# Correcciones de texto con 10.000 patrones: camino anterior (replace_token
+# recorriendo la lista por cada token del LLM y str.replace por entrada para
+# las pronunciaciones) contra src/text_corrections.py (autómata Aho-Corasick
+# compilado una vez, aplicado al texto entero y sobre el stream de tokens).
+# Reporta tiempo de compilación, costo por respuesta y por token, el máximo
+# de caracteres retenidos por el stream, y cuánto tarda la recarga en caliente
+# del JSON. Antes de medir verifica que las entradas cortas del archivo real
+# ("Ta", "ipf") no toquen preguntas comunes.
+#
+#   python benchmark/bench_text_corrections.py
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.text_corrections import CorrectionAutomaton, CorrectionsStore, load_corrections_file
+
+CONFIG_FILE = os.path.join(os.path.dirname(__file__), "..", "config", "text_corrections.json")
+PATTERNS = 10_000
+
+# (texto, esperado) con config/text_corrections.json: preguntas enteras (replace_token) y stream del avatar
+QUESTION_CASES = (
+    ("TA-123 pozo", "TA-123 pozo"),
+    ("que es ta", "que es ta"),
+    ("Ta bien, y la IPF?", "Ta bien, y la IPF?"),
+    ("IPF", "YPF"),
+    (" Taim ", " Time "),
+)
+STREAM_CASES = (
+    ("TA-123 pozo", "TA-123 pozo"),
+    ("que es ta", "que es ta"),
+    ("la ipf y el Taim de la IPFX", "la YPF y el Time de la IPFX"),
+    ("Rial Taim Intelligence", "Real Time Intelligence"),
+)
+RESPONSES = 20
+SYLLABLES = ("la", "ch", "ma", "ta", "ri", "co", "ne", "qu", "en", "lo", "ba", "jo", "gu", "ar", "di", "pe")
+
+
+def make_patterns(rng):
+    patterns = {}
+    while len(patterns) < PATTERNS:
+        word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 5))).capitalize()
+        if rng.random() < 0.3:
+            word += f"-{rng.randint(1, 999)}"
+        if rng.random() < 0.1:
+            word += " " + "".join(rng.choice(SYLLABLES) for _ in range(3))
+        patterns[word] = word.upper()
+    return list(patterns.items())
+
+
+def make_response(rng, patterns):
+    words = []
+    for _ in range(300):
+        if rng.random() < 0.05:
+            words.append(rng.choice(patterns)[0])
+        else:
+            words.append(rng.choice(("el", "pozo", "equipo", "tiene", "metros", "de", "profundidad", "y", "la",
+                                     "operación", "sigue", "en", "curso,", "con", "presión", "estable.")))
+    return " ".join(words)
+
+
+def llm_tokens(text):
+    return re.findall(r"\s*[\w\-]+|\s*[^\w\s]", text)
+
+
+# ===============================
+# CAMINO ANTERIOR
+# ===============================
+
+def replace_token(token, original_list, replacement_list):
+    """src/pywo_aux_func.replace_token"""
+    leading_space = ''
+    trailing_space = ''
+    if token and token[0].isspace():
+        i = 0
+        while i < len(token) and token[i].isspace():
+            leading_space += token[i]
+            i += 1
+    if token and token[-1].isspace():
+        i = len(token) - 1
+        while i >= 0 and token[i].isspace():
+            trailing_space = token[i] + trailing_space
+            i -= 1
+    stripped_token = token.strip()
+    stripped_originals = [orig.strip() for orig in original_list]
+    if stripped_token in stripped_originals:
+        index = stripped_originals.index(stripped_token)
+        return leading_space + replacement_list[index] + trailing_space
+    return token
+
+
+def str_replace_loop(text, patterns):
+    for old, new in patterns:
+        text = text.replace(old, new)
+    return text
+
+
+def timed(fn, repeat=1):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - t0) * 1000 / repeat, result
+
+
+def regressions():
+    store = CorrectionsStore(CONFIG_FILE)
+    automaton = CorrectionAutomaton(load_corrections_file(CONFIG_FILE), fold=False)
+    failures = [(text, got, expected) for text, expected in QUESTION_CASES
+                if (got := store.replace_token(text)) != expected]
+    failures += [(text, got, expected) for text, expected in STREAM_CASES
+                 if (got := automaton.replace(text)) != expected]
+    print(f"regresiones de entradas cortas: {len(QUESTION_CASES) + len(STREAM_CASES) - len(failures)}/"
+          f"{len(QUESTION_CASES) + len(STREAM_CASES)} ok")
+    for text, got, expected in failures:
+        print(f"  ❌ {text!r} -> {got!r} (esperado {expected!r})")
+    print()
+
+
+if __name__ == "__main__":
+    regressions()
+    rng = random.Random(3)
+    patterns = make_patterns(rng)
+    responses = [make_response(rng, patterns) for _ in range(RESPONSES)]
+    tokens = [llm_tokens(text) for text in responses]
+    original_list = [original for original, _ in patterns]
+    replacement_list = [replacement for _, replacement in patterns]
+    total_tokens = sum(len(t) for t in tokens)
+    print(f"{PATTERNS} patrones, {RESPONSES} respuestas de ~{statistics.mean(len(r) for r in responses):.0f} "
+          f"caracteres ({total_tokens} tokens)\n")
+
+    build_ms, automaton = timed(lambda: CorrectionAutomaton(patterns))
+    print(f"compilación del autómata: {build_ms:.0f} ms, {len(automaton._goto)} nodos, "
+          f"patrón más largo {automaton.max_length}\n")
+
+    print(f"{'modo':<36} | {'ms/respuesta':>12} | {'µs/token':>9}")
+
+    def report(name, total_ms):
+        print(f"{name:<36} | {total_ms / RESPONSES:>12.2f} | {total_ms * 1000 / total_tokens:>9.1f}")
+
+    ms, _ = timed(lambda: [[replace_token(tok, original_list, replacement_list) for tok in t] for t in tokens])
+    report("replace_token por token (lista)", ms)
+    ms, _ = timed(lambda: [str_replace_loop(text, patterns) for text in responses])
+    report("str.replace por entrada", ms)
+    ms, batch = timed(lambda: [automaton.replace(text) for text in responses], repeat=5)
+    report("autómata (texto entero)", ms)
+
+    held, per_token = [], []
+
+    def stream_all():
+        outputs = []
+        for response_tokens in tokens:
+            corrector = automaton.stream()
+            parts = []
+            for tok in response_tokens:
+                t0 = time.perf_counter()
+                parts.append(corrector.feed(tok))
+                per_token.append((time.perf_counter() - t0) * 1e6)
+                held.append(len(corrector._pending))
+            parts.append(corrector.flush())
+            outputs.append("".join(parts))
+        return outputs
+
+    ms, streamed = timed(stream_all)
+    report("autómata (stream de tokens)", ms)
+    per_token.sort()
+    corrected = sum(len(re.findall(r"\b[A-ZÑ]{4,}", text)) for text in batch)
+    print(f"\nstream: p99 {per_token[int(len(per_token) * 0.99) - 1]:.1f} µs/token, máximo retenido {max(held)} "
+          f"caracteres, igual al texto entero: {streamed == batch}, ~{corrected} correcciones aplicadas")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "text_corrections.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"original": original_list, "replacement": replacement_list}, f)
+        store = CorrectionsStore(path, check_interval=0)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"original": original_list + ["Rial Taim"], "replacement": replacement_list + ["Real Time"]}, f)
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 1_000_000))
+        reload_ms, text = timed(lambda: store.apply("Rial Taim Intelligence"))
+        print(f"recarga en caliente: {reload_ms:.0f} ms -> {text!r}; con el archivo sin cambios: "
+              f"{timed(lambda: store.apply('Rial Taim'), repeat=1000)[0] * 1000:.1f} µs por apply")
@@ -0,0 +1,77 @@
+# bench_timeseries_payload.py
+# Compara el payload que llega al contexto del LLM para series de Corva de 1k a
+# 100k puntos: registros crudos con json.dumps contra el resumen numpy + LTTB de
+# src/corva_timeseries.py. Reporta tokens (tiktoken si está instalado, si no
+# caracteres/4), tiempo de formateo y tiempo de tokenización.
+#
+#   python benchmark/bench_timeseries_payload.py
+import json
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.corva_timeseries import fracking_stage_payload, format_summary, series_points
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count_tokens(text):
+        return len(_encoding.encode(text))
+except ImportError:
+    def count_tokens(text):
+        return len(text) // 4
+
+SIZES = [1_000, 10_000, 100_000]
+
+
+def fake_rop_series(n, rng):
+    start = 1_760_000_000
+    records = []
+    for i in range(n):
+        rop = 80 + 30 * math.sin(i / 300) + rng.gauss(0, 8) + (150 if rng.random() < 0.001 else 0)
+        records.append({"timestamp": start + i, "asset_id": 12345, "data": {"rop_mean": round(rop, 2)}})
+    return records
+
+
+def fake_stages(n, rng):
+    return [{"timestamp": 1_760_000_000 + i * 3600,
+             "data": {"stage_number": i + 1, "key": "total_proppant", "value": rng.uniform(2e5, 4e5)}}
+            for i in range(n)]
+
+
+def compact(records):
+    summary, points = series_points(records, "data.rop_mean")
+    lines = [f"Resumen ROP: {format_summary(summary, 'ft/hr')}"]
+    lines += [f"{int(t)}: {v:,.2f} ft/hr" for t, v in points]
+    return "\n".join(lines)
+
+
+def measure(fn, records):
+    t0 = time.perf_counter()
+    text = fn(records)
+    format_ms = (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    tokens = count_tokens(text)
+    tokenize_ms = (time.perf_counter() - t0) * 1000
+    return tokens, format_ms, tokenize_ms
+
+
+if __name__ == "__main__":
+    rng = random.Random(11)
+    print(f"{'puntos':>7} | {'crudo tokens':>12} | {'crudo ms':>9} | {'compacto tokens':>15} | {'compacto ms':>11}")
+    for size in SIZES:
+        records = fake_rop_series(size, rng)
+        raw_tokens, raw_fmt, raw_tok = measure(lambda r: json.dumps(r, indent=2), records)
+        cmp_tokens, cmp_fmt, cmp_tok = measure(compact, records)
+        print(f"{size:>7} | {raw_tokens:>12,} | {raw_fmt + raw_tok:>9.1f} | {cmp_tokens:>15,} | {cmp_fmt + cmp_tok:>11.1f}")
+
+    stages = fake_stages(100, rng)
+    t0 = time.perf_counter()
+    payload = fracking_stage_payload(stages)
+    print(f"\nfracking 100 etapas: {len(payload['stages'])} etapas representativas, "
+          f"máx en etapa {payload['max_stage'][0]}, {(time.perf_counter() - t0) * 1000:.2f} ms")
@@ -0,0 +1,105 @@
+# bench_token_broker.py
+# Carga sobre /api/speech-token contra un STS local (fake_speech_sts.py con
+# 80 ms de latencia): el handler anterior pedía issueToken en cada request;
+# con TokenBroker el token sale de memoria y se refresca en segundo plano.
+# Reporta llamadas a STS, latencia p50/p95/máx del handler y errores; luego
+# deja el STS caído un rato y muestra que el broker sigue sirviendo el token
+# y reintenta con backoff.
+#
+#   python benchmark/bench_token_broker.py
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import requests
+
+from fake_speech_sts import start_fake_sts
+from src.token_broker import TokenBroker, TokenUnavailable, speech_sts_fetcher
+
+STS_LATENCY_SECONDS = 0.08
+CLIENTS = 16
+DURATION_SECONDS = 4.0
+# Validez del token de prueba (más larga que la corrida: un solo pedido en frío)
+TOKEN_TTL_SECONDS = 60.0
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def load(handler):
+    latencies, errors, lock = [], [0], threading.Lock()
+    stop = time.perf_counter() + DURATION_SECONDS
+
+    def client():
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            try:
+                handler()
+                elapsed = time.perf_counter() - t0
+                with lock:
+                    latencies.append(elapsed * 1000)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=client) for _ in range(CLIENTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+def report(name, server, latencies, errors):
+    print(f"{name:<26} | {len(latencies):>8} | {server.calls['sts']:>9} | {statistics.median(latencies):>7.2f} | "
+          f"{percentile(latencies, 95):>7.2f} | {max(latencies):>7.2f} | {errors:>7}")
+
+
+if __name__ == "__main__":
+    print(f"{CLIENTS} clientes durante {DURATION_SECONDS:.0f}s, STS con {STS_LATENCY_SECONDS * 1000:.0f} ms\n")
+    print(f"{'modo':<26} | {'requests':>8} | {'STS calls':>9} | {'p50 ms':>7} | {'p95 ms':>7} | {'máx ms':>7} | {'errores':>7}")
+
+    server = start_fake_sts(STS_LATENCY_SECONDS)
+    url = f"{server.url}/sts/v1.0/issueToken"
+
+    def issue_per_request():
+        resp = requests.post(url, headers={"Ocp-Apim-Subscription-Key": "bench"}, timeout=10)
+        resp.raise_for_status()
+        return resp.text
+
+    report("issueToken por request", server, *load(issue_per_request))
+
+    server = start_fake_sts(STS_LATENCY_SECONDS)
+    broker = TokenBroker(backoff_base=0.2, backoff_max=1.0)
+    broker.register("speech", speech_sts_fetcher("local", "bench", base_url=server.url, ttl=TOKEN_TTL_SECONDS))
+    report("TokenBroker (en frío)", server, *load(lambda: broker.get("speech")))
+
+    # Falla de STS con el token todavía vigente: se sigue sirviendo y se reintenta con backoff
+    broker.start()
+    time.sleep(0.3)
+    server.failing = True
+    calls_before = server.calls["sts"]
+    broker.refresh("speech")
+    latencies, errors = load(lambda: broker.get("speech"))
+    server.failing = False
+    stats = broker.stats()["speech"]
+    print(f"\nSTS caído {DURATION_SECONDS:.0f}s con token vigente: {len(latencies)} requests servidos, "
+          f"{errors} errores, {server.calls['sts'] - calls_before} reintentos con backoff, "
+          f"fallas consecutivas {stats['consecutive_failures']}")
+
+    # Token vencido y STS caído: el error es explícito y rápido para cada waiter
+    expired = TokenBroker(backoff_base=0.2, backoff_max=1.0)
+    expired.register("speech", speech_sts_fetcher("local", "bench", base_url=server.url, ttl=TOKEN_TTL_SECONDS))
+    server.failing = True
+    try:
+        expired.get("speech")
+    except TokenUnavailable as e:
+        print(f"Sin token y STS caído: TokenUnavailable ({e})")
+    broker.stop()
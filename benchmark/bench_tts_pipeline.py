@@ -0,0 +1,268 @@
+# bench_tts_pipeline.py
+# Voz del avatar para una respuesta que llega en streaming: camino anterior
+# (corte en cada signo de puntuación, hilo por ráfaga con pop(0), langdetect
+# por oración y speak_ssml_async().get() antes de preparar la siguiente)
+# contra src/tts_pipeline.py (chunker por oración/cláusula, idioma una vez
+# por respuesta y la oración siguiente ya encolada en el synthesizer).
+# El synthesizer falso imita el del SDK con avatar: procesa los pedidos de a
+# uno, cada turno tiene una demora inicial y el audio dura según el texto;
+# dispara synthesis_started/synthesis_completed como el SDK.
+# Reporta tiempo al primer audio, turnos, silencio medio entre oraciones con
+# la siguiente ya lista, y cuánto tarda en callarse ante un barge-in.
+#
+#   python benchmark/bench_tts_pipeline.py
+import html
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.tts_pipeline import TtsPipeline
+
+TURN_START_SECONDS = 0.08       # primer byte de audio de cada turno
+SPEECH_CHARS_PER_SECOND = 60.0  # ~4x la velocidad real para que la corrida sea corta
+LLM_TOKENS_PER_SECOND = 40.0
+RUNS = 3
+
+try:
+    from langdetect import detect
+    DETECT_LABEL = "langdetect"
+except ImportError:
+    # Costo típico de langdetect por oración corta (perfiles ya cargados)
+    def detect(text):
+        time.sleep(0.015)
+        return "es"
+    DETECT_LABEL = "langdetect simulado (15 ms)"
+
+ANSWER = (
+    "El pozo LACh-123 está en etapa de workover: se completó la limpieza del tubing y se bajó la "
+    "herramienta de pesca. Profundidad actual: 2.450 metros; ROP promedio de 12,5 m/h. "
+    "Observaciones del turno: sin pérdidas de circulación, presión estable. "
+    "Próximos pasos: ensayo de admisión, y si da bien, cementación del tramo inferior. "
+    "¿Querés que te pase el detalle de las operaciones de las últimas 24 horas?"
+)
+SENTENCE_LEVEL_PUNCTUATIONS = ['.', '?', '!', ':', ';', '。', '？', '！', '：', '；']
+
+
+class _ResultFuture(Future):
+    """Future con get() como el ResultFuture del SDK"""
+
+    def get(self):
+        return self.result()
+
+
+class _Signal:
+    def __init__(self):
+        self.callbacks = []
+
+    def connect(self, callback):
+        self.callbacks.append(callback)
+
+    def fire(self):
+        for callback in self.callbacks:
+            callback(None)
+
+
+class FakeAvatarSynthesizer:
+    """Pedidos en serie como el SDK; stop() corta el turno actual y descarta los encolados"""
+
+    def __init__(self):
+        self.synthesis_started = _Signal()
+        self.synthesis_completed = _Signal()
+        self.synthesis_canceled = _Signal()
+        self.requests = deque()
+        self.cond = threading.Condition()
+        self.stopped = threading.Event()
+        self.turns = 0
+        self.busy = False
+        self.audio_log = []  # (inicio, fin) de cada audio
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def speak_ssml_async(self, ssml):
+        future = _ResultFuture()
+        with self.cond:
+            self.requests.append((ssml, future))
+            self.cond.notify()
+        return future
+
+    def stop(self):
+        with self.cond:
+            dropped, self.requests = list(self.requests), deque()
+        for _, future in dropped:
+            future.set_result("canceled")
+        self.stopped.set()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.requests)
+                ssml, future = self.requests.popleft()
+                self.stopped.clear()
+                self.busy = True
+            self.turns += 1
+            text = re.sub(r"<[^>]+>", "", ssml).strip()
+            if self.stopped.wait(TURN_START_SECONDS):
+                self.busy = False
+                future.set_result("canceled")
+                continue
+            start = time.perf_counter()
+            self.synthesis_started.fire()
+            interrupted = self.stopped.wait(len(text) / SPEECH_CHARS_PER_SECOND)
+            self.audio_log.append((start, time.perf_counter()))
+            (self.synthesis_canceled if interrupted else self.synthesis_completed).fire()
+            self.busy = False
+            future.set_result("canceled" if interrupted else "completed")
+
+
+def llm_tokens(text):
+    """Palabras y signos como tokens separados, como los entrega el LLM"""
+    return re.findall(r"\s*[\w\-.,/%]+(?<![.,])|\s*[^\w\s]", text)
+
+
+def build_ssml(text, lang, ending_silence_ms=0):
+    return f"<speak xml:lang='{lang}'><voice name='es-AR-TomasNeural'>{html.escape(text)}</voice></speak>"
+
+
+# ===============================
+# CAMINO ANTERIOR
+# ===============================
+
+class LegacySpeaker:
+    """speakwithqueue/speaktext de app_sin_voice_live_login.py antes del pipeline"""
+
+    def __init__(self, synthesizer):
+        self.synthesizer = synthesizer
+        self.queue = []
+        self.is_speaking = False
+
+    def speakwithqueue(self, text):
+        self.queue.append(text)
+        if not self.is_speaking:
+            def speakthread():
+                self.is_speaking = True
+                while len(self.queue) > 0:
+                    sentence = self.queue.pop(0)
+                    lang = detect(sentence)
+                    self.synthesizer.speak_ssml_async(build_ssml(sentence, lang)).get()
+                self.is_speaking = False
+            threading.Thread(target=speakthread, daemon=True).start()
+
+    def stop(self):
+        self.queue.clear()
+        self.synthesizer.stop()
+
+
+def stream_legacy(speaker, tokens):
+    spoken_sentence = ""
+    for token in tokens:
+        time.sleep(1 / LLM_TOKENS_PER_SECOND)
+        spoken_sentence += token
+        if len(token) == 1 or len(token) == 2:
+            if any(token.startswith(p) for p in SENTENCE_LEVEL_PUNCTUATIONS):
+                speaker.speakwithqueue(spoken_sentence.strip())
+                spoken_sentence = ""
+    if spoken_sentence != "":
+        speaker.speakwithqueue(spoken_sentence.strip())
+
+
+def stream_pipeline(pipeline, tokens):
+    pipeline.begin_response()
+    for token in tokens:
+        time.sleep(1 / LLM_TOKENS_PER_SECOND)
+        pipeline.feed(token)
+    pipeline.end_response()
+
+
+# ===============================
+# MEDICIÓN
+# ===============================
+
+def wait_quiet(synthesizer, settle=0.5):
+    """Espera a que no queden pedidos ni audio sonando"""
+    last = len(synthesizer.audio_log)
+    while True:
+        time.sleep(settle)
+        with synthesizer.cond:
+            busy = bool(synthesizer.requests) or synthesizer.busy
+        if not busy and len(synthesizer.audio_log) == last:
+            return
+        last = len(synthesizer.audio_log)
+
+
+def summarize(synthesizer, t0, text_ready):
+    audio = synthesizer.audio_log
+    first_audio = (audio[0][0] - t0) * 1000
+    gaps = [(audio[i + 1][0] - max(audio[i][1], text_ready[i + 1])) * 1000 for i in range(len(audio) - 1)]
+    total = (audio[-1][1] - t0) * 1000
+    return first_audio, synthesizer.turns, statistics.mean(gaps) if gaps else 0.0, total
+
+
+def run_legacy(tokens):
+    synthesizer = FakeAvatarSynthesizer()
+    speaker = LegacySpeaker(synthesizer)
+    ready = []
+    original = speaker.speakwithqueue
+    speaker.speakwithqueue = lambda text: (ready.append(time.perf_counter()), original(text))
+    t0 = time.perf_counter()
+    stream_legacy(speaker, tokens)
+    wait_quiet(synthesizer)
+    return summarize(synthesizer, t0, ready)
+
+
+def run_pipeline(tokens):
+    synthesizer = FakeAvatarSynthesizer()
+    pipeline = TtsPipeline("bench", synthesizer.speak_ssml_async, build_ssml, stop=synthesizer.stop,
+                           detect_fn=detect)
+    synthesizer.synthesis_started.connect(lambda evt: pipeline.audio_started())
+    synthesizer.synthesis_completed.connect(lambda evt: pipeline.audio_finished())
+    synthesizer.synthesis_canceled.connect(lambda evt: pipeline.audio_finished())
+    ready = []
+    original = pipeline.enqueue
+    pipeline.enqueue = lambda text, ending_silence_ms=0: (ready.append(time.perf_counter()),
+                                                           original(text, ending_silence_ms))
+    t0 = time.perf_counter()
+    stream_pipeline(pipeline, tokens)
+    wait_quiet(synthesizer)
+    result = summarize(synthesizer, t0, ready)
+    pipeline.close()
+    return result, pipeline.stats()
+
+
+def barge_in(tokens, after=1.5):
+    synthesizer = FakeAvatarSynthesizer()
+    pipeline = TtsPipeline("barge", synthesizer.speak_ssml_async, build_ssml, stop=synthesizer.stop)
+    synthesizer.synthesis_started.connect(lambda evt: pipeline.audio_started())
+    streamer = threading.Thread(target=stream_pipeline, args=(pipeline, tokens), daemon=True)
+    streamer.start()
+    time.sleep(after)
+    t_cancel = time.perf_counter()
+    pipeline.cancel()
+    # El LLM sigue mandando tokens después del barge-in
+    streamer.join()
+    wait_quiet(synthesizer)
+    silence_ms = max(0.0, (max(end for _, end in synthesizer.audio_log) - t_cancel) * 1000)
+    late = sum(1 for start, _ in synthesizer.audio_log if start > t_cancel)
+    return silence_ms, late
+
+
+if __name__ == "__main__":
+    tokens = llm_tokens(ANSWER)
+    print(f"respuesta de {len(ANSWER)} caracteres / {len(tokens)} tokens a {LLM_TOKENS_PER_SECOND:.0f} tok/s, "
+          f"turno {TURN_START_SECONDS * 1000:.0f} ms, {DETECT_LABEL}\n")
+    print(f"{'modo':<22} | {'1er audio ms':>12} | {'turnos':>6} | {'hueco medio ms':>14} | {'total ms':>8}")
+    for name, runner in (("anterior", run_legacy), ("TtsPipeline", lambda t: run_pipeline(t)[0])):
+        rows = [runner(tokens) for _ in range(RUNS)]
+        first, turns, gap, total = (statistics.median(col) for col in zip(*rows))
+        print(f"{name:<22} | {first:>12.0f} | {turns:>6.0f} | {gap:>14.1f} | {total:>8.0f}")
+
+    _, stats = run_pipeline(tokens)
+    print(f"\nstats del pipeline: 1er audio {stats['last_first_audio_ms']} ms, "
+          f"hueco medio {stats['avg_gap_ms']} ms, idioma {stats['language']}")
+    silence_ms, late = barge_in(tokens)
+    print(f"barge-in: silencio a los {silence_ms:.0f} ms del cancel, {late} oraciones sonaron después")
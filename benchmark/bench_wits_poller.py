@@ -0,0 +1,92 @@
+# bench_wits_poller.py
+# Levanta un servidor HTTP local que imita los endpoints WITS/métricas de Corva
+# (con latencia simulada) y compara la consulta a demanda de profundidad/ROP
+# contra la lectura desde el snapshot de CorvaWitsPoller. Reporta también los
+# requests por ciclo y cuántos quedan diferidos por el presupuesto.
+#
+#   python benchmark/bench_wits_poller.py
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("APIM_AUTH_CREDENTIAL", "fake")
+os.environ["CORVA_CACHE_ENABLED"] = "false"
+
+from src.corva_tool import build_dataset_request, make_corva_request_fixed
+from src.corva_wits_poller import CorvaWitsPoller
+
+ASSETS = 40
+LATENCY_SECONDS = 0.8
+QUERIES = 50
+BUDGET_PER_MINUTE = 100
+
+
+class FakeCorvaHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(LATENCY_SECONDS)
+        url = urlparse(self.path)
+        query = json.loads(parse_qs(url.query).get("query", ["{}"])[0])
+        asset_ids = query["asset_id"]["$in"] if isinstance(query.get("asset_id"), dict) else [query.get("asset_id")]
+        records = []
+        for asset_id in asset_ids:
+            data = {"hole_depth": random.uniform(1000, 20000), "bit_depth": random.uniform(1000, 20000),
+                    "rop_mean": random.uniform(10, 200), "value": random.uniform(10, 200), "key": "rop"}
+            records.append({"asset_id": asset_id, "timestamp": int(time.time()), "data": data})
+        body = json.dumps(records).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeCatalog:
+    def __init__(self, n):
+        self.candidates = [{"id": str(1000 + i), "attributes": {"name": f"DLS-{100 + i}"}} for i in range(n)]
+
+    def active_candidates(self, since):
+        return self.candidates
+
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeCorvaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    catalog = FakeCatalog(ASSETS)
+    rng = random.Random(3)
+
+    # A demanda: una consulta por pregunta
+    t0 = time.perf_counter()
+    for _ in range(QUERIES // 10):
+        endpoint, params = build_dataset_request("wits_depth", rng.choice(catalog.candidates)["id"])
+        make_corva_request_fixed(endpoint, params=params, base_url=base_url, use_cache=False)
+    on_demand_ms = (time.perf_counter() - t0) / (QUERIES // 10) * 1000
+
+    # Poller: dos ciclos (el segundo ya está limitado por el presupuesto)
+    poller = CorvaWitsPoller(catalog_fn=lambda: catalog, base_url=base_url,
+                             max_requests_per_minute=BUDGET_PER_MINUTE)
+    for cycle in (1, 2):
+        t0 = time.perf_counter()
+        poller.poll_once()
+        stats = poller.stats()
+        print(f"ciclo {cycle}: {time.perf_counter() - t0:.2f}s | requests={stats['requests']} "
+              f"diferidos={stats['budget_deferred']} | assets con profundidad="
+              f"{stats['staleness']['wits_depth']['assets']}/{ASSETS}")
+
+    t0 = time.perf_counter()
+    served = sum(1 for _ in range(QUERIES)
+                 if poller.get("wits_depth", rng.choice(catalog.candidates)["id"]) is not None)
+    memory_ms = (time.perf_counter() - t0) / QUERIES * 1000
+
+    print(f"a demanda: {on_demand_ms:.1f} ms/pregunta | desde memoria: {memory_ms:.4f} ms/pregunta "
+          f"({served}/{QUERIES} servidas)")
+    server.shutdown()
@@ -0,0 +1,68 @@
+# fake_speech_sts.py
+# Servidor STS local que imita los endpoints de token de Azure Speech para
+# probar src/token_broker.py sin credenciales:
+#   POST /sts/v1.0/issueToken                          -> token opaco (texto)
+#   GET  /tts/cognitiveservices/avatar/relay/token/v1  -> JSON Urls/Username/Password
+# Permite latencia artificial y fallas a demanda (server.failing = True).
+#
+#   from fake_speech_sts import start_fake_sts  (con benchmark/ en sys.path)
+#   server = start_fake_sts(latency=0.08); fetcher = speech_sts_fetcher("x", "key", base_url=server.url)
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body, content_type="text/plain"):
+        payload = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _serve(self, kind):
+        server = self.server
+        with server.lock:
+            server.calls[kind] += 1
+        time.sleep(server.latency)
+        if server.failing:
+            self._reply(503, "unavailable")
+        elif not self.headers.get("Ocp-Apim-Subscription-Key"):
+            self._reply(401, "missing key")
+        elif kind == "sts":
+            self._reply(200, f"token-{uuid.uuid4().hex}")
+        else:
+            self._reply(200, json.dumps({"Urls": ["turn:relay.local:3478"], "Username": uuid.uuid4().hex,
+                                         "Password": uuid.uuid4().hex}), "application/json")
+
+    def do_POST(self):
+        if self.path.lower().startswith("/sts/v1.0/issuetoken"):
+            self._serve("sts")
+        else:
+            self._reply(404, "not found")
+
+    def do_GET(self):
+        if self.path.startswith("/tts/cognitiveservices/avatar/relay/token/v1"):
+            self._serve("relay")
+        else:
+            self._reply(404, "not found")
+
+
+def start_fake_sts(latency=0.05, port=0):
+    """Arranca el STS falso en un hilo; devuelve el servidor (url, calls, failing, latency)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.failing = False
+    server.calls = Counter()
+    server.lock = threading.Lock()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, name="fake-sts", daemon=True).start()
+    return server
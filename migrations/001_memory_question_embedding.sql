@@ -0,0 +1,12 @@
+-- =====================================================================
+-- Columna vectorial opcional para búsqueda de contexto por similitud
+-- Requiere la extensión pgvector. Habilitar con MEMORY_VECTOR_COLUMN_ENABLED=true
+-- Dimensión 3072 = text-embedding-3-large (deployment embeddingada003l)
+-- =====================================================================
+
+CREATE EXTENSION IF NOT EXISTS vector;
+
+ALTER TABLE Memory ADD COLUMN IF NOT EXISTS question_embedding vector(3072);
+
+-- El filtro por usuario acota la búsqueda a pocas filas, por lo que el orden
+-- por coseno (<=>) se resuelve con un scan exacto sobre ese subconjunto.
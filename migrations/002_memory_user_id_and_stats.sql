@@ -0,0 +1,121 @@
+-- =====================================================================
+-- Memory: user_id indexable + estadísticas por usuario incrementales
+--
+-- Reemplaza los filtros no sargables de langmem_functions
+--   session_id LIKE '%user{id}%'                          -> user_id = %s
+--   session_id IN (SELECT DISTINCT session_id ... )       -> user_id = %s
+--   GROUP BY interaction_type sobre toda la tabla Memory  -> user_stats
+--
+-- La columna Memory.user_id ya existe (save_complete_memory la escribe);
+-- acá solo se indexa.
+--
+-- Luego de aplicar, correr: python migrations/backfill_memory_user_id.py
+-- =====================================================================
+
+CREATE INDEX IF NOT EXISTS idx_memory_user_created
+    ON Memory (user_id, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_memory_session_created
+    ON Memory (session_id, created_at DESC);
+
+-- ---------------------------------------------------------------------
+-- Estadísticas diarias por usuario (mantiene la ventana de 30 días exacta
+-- sumando como máximo 30 filas por usuario)
+-- ---------------------------------------------------------------------
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id                 TEXT        NOT NULL,
+    day                     DATE        NOT NULL,
+    total_interactions      INTEGER     NOT NULL DEFAULT 0,
+    sql_queries             INTEGER     NOT NULL DEFAULT 0,
+    casual_chats            INTEGER     NOT NULL DEFAULT 0,
+    total_processing_time   DOUBLE PRECISION NOT NULL DEFAULT 0,
+    processing_time_samples INTEGER     NOT NULL DEFAULT 0,
+    successful_corrections  INTEGER     NOT NULL DEFAULT 0,
+    topics                  JSONB       NOT NULL DEFAULT '{}'::jsonb,
+    last_seen_at            TIMESTAMP   NOT NULL,
+    PRIMARY KEY (user_id, day)
+);
+
+CREATE TABLE IF NOT EXISTS user_sessions (
+    user_id       TEXT      NOT NULL,
+    session_id    TEXT      NOT NULL,
+    first_seen_at TIMESTAMP NOT NULL,
+    last_seen_at  TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_id, session_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_sessions_last_seen
+    ON user_sessions (user_id, last_seen_at DESC);
+
+-- ---------------------------------------------------------------------
+-- user_id derivado del session_id cuando el writer no lo informa
+-- ("user123_session_x" -> "123"). Una sesión sin usuario deja user_id NULL:
+-- no se inventa un usuario por sesión (no suma a user_stats / user_sessions)
+-- ---------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION memory_fill_user_id() RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.user_id IS NULL AND NEW.session_id IS NOT NULL THEN
+        NEW.user_id := (regexp_match(NEW.session_id, '(?:^|_)user(\d+)(?:_|$)'))[1];
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_memory_fill_user_id ON Memory;
+CREATE TRIGGER trg_memory_fill_user_id
+    BEFORE INSERT ON Memory
+    FOR EACH ROW EXECUTE FUNCTION memory_fill_user_id();
+
+-- ---------------------------------------------------------------------
+-- Actualización incremental de user_stats / user_sessions
+-- ---------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION memory_update_user_stats() RETURNS TRIGGER AS $$
+DECLARE
+    ts    TIMESTAMP := COALESCE(NEW.created_at, now());
+    topic TEXT      := COALESCE(NEW.interaction_type, 'general');
+BEGIN
+    IF NEW.user_id IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO user_stats AS s (
+        user_id, day, total_interactions, sql_queries, casual_chats,
+        total_processing_time, processing_time_samples,
+        successful_corrections, topics, last_seen_at
+    ) VALUES (
+        NEW.user_id, ts::date, 1,
+        CASE WHEN NEW.relevance = 'consulta' THEN 1 ELSE 0 END,
+        CASE WHEN NEW.relevance = 'casual' THEN 1 ELSE 0 END,
+        COALESCE(NEW.processing_time_seconds, 0),
+        CASE WHEN NEW.processing_time_seconds IS NULL THEN 0 ELSE 1 END,
+        CASE WHEN NEW.correction_success THEN 1 ELSE 0 END,
+        jsonb_build_object(topic, 1),
+        ts
+    )
+    ON CONFLICT (user_id, day) DO UPDATE SET
+        total_interactions      = s.total_interactions + 1,
+        sql_queries             = s.sql_queries + EXCLUDED.sql_queries,
+        casual_chats            = s.casual_chats + EXCLUDED.casual_chats,
+        total_processing_time   = s.total_processing_time + EXCLUDED.total_processing_time,
+        processing_time_samples = s.processing_time_samples + EXCLUDED.processing_time_samples,
+        successful_corrections  = s.successful_corrections + EXCLUDED.successful_corrections,
+        topics = s.topics || jsonb_build_object(
+            topic, COALESCE((s.topics ->> topic)::int, 0) + 1
+        ),
+        last_seen_at = GREATEST(s.last_seen_at, EXCLUDED.last_seen_at);
+
+    IF NEW.session_id IS NOT NULL THEN
+        INSERT INTO user_sessions AS us (user_id, session_id, first_seen_at, last_seen_at)
+        VALUES (NEW.user_id, NEW.session_id, ts, ts)
+        ON CONFLICT (user_id, session_id) DO UPDATE SET
+            last_seen_at = GREATEST(us.last_seen_at, EXCLUDED.last_seen_at);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_memory_update_user_stats ON Memory;
+CREATE TRIGGER trg_memory_update_user_stats
+    AFTER INSERT ON Memory
+    FOR EACH ROW EXECUTE FUNCTION memory_update_user_stats();
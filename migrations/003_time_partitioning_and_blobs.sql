@@ -0,0 +1,160 @@
+-- =====================================================================
+-- Particionado mensual por created_at + deduplicación de resultados
+--
+-- Convierte Memory, SQL_Query_Executions y Performance_Metrics a tablas
+-- particionadas por rango (mensual). La retención se hace con
+-- `python -m src.db_maintenance retention`, que desprende y elimina
+-- particiones vencidas en lugar de borrar fila por fila.
+--
+-- Requiere 002_memory_user_id_and_stats.sql aplicada (recrea sus triggers).
+-- Corre en una sola transacción: si el conteo de filas copiadas no coincide
+-- se aborta y las tablas originales quedan intactas.
+-- NOTA: toma lock exclusivo de las tablas durante la copia, correr en ventana.
+-- =====================================================================
+
+BEGIN;
+
+-- ---------------------------------------------------------------------
+-- Partición mensual de una tabla padre (idempotente)
+-- ---------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION create_monthly_partition(parent TEXT, month_start DATE)
+RETURNS TEXT AS $$
+DECLARE
+    first_day DATE := date_trunc('month', month_start)::date;
+    part_name TEXT := lower(parent) || '_p' || to_char(first_day, 'YYYYMM');
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+        part_name, lower(parent), first_day, (first_day + interval '1 month')::date
+    );
+    RETURN part_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ---------------------------------------------------------------------
+-- Conversión de una tabla existente a particionada por created_at
+-- ---------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION convert_to_monthly_partitions(tbl TEXT, months_ahead INTEGER DEFAULT 2)
+RETURNS VOID AS $$
+DECLARE
+    parent      TEXT := lower(tbl);
+    legacy      TEXT := lower(tbl) || '_legacy';
+    seq         TEXT;
+    first_month DATE;
+    last_month  DATE;
+    m           DATE;
+    n_legacy    BIGINT;
+    n_new       BIGINT;
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = parent
+    ) THEN
+        RAISE NOTICE '% ya está particionada', parent;
+        RETURN;
+    END IF;
+
+    EXECUTE format('ALTER TABLE %I RENAME TO %I', parent, legacy);
+    EXECUTE format('UPDATE %I SET created_at = now() WHERE created_at IS NULL', legacy);
+
+    EXECUTE format(
+        'CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)',
+        parent, legacy
+    );
+    EXECUTE format('ALTER TABLE %I ALTER COLUMN created_at SET DEFAULT now()', parent);
+    EXECUTE format('ALTER TABLE %I ADD PRIMARY KEY (id, created_at)', parent);
+
+    -- La secuencia del id pasa a pertenecer a la tabla nueva
+    seq := pg_get_serial_sequence(legacy, 'id');
+    IF seq IS NOT NULL THEN
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY %I.id', seq, parent);
+    END IF;
+
+    EXECUTE format('SELECT date_trunc(''month'', MIN(created_at))::date FROM %I', legacy) INTO first_month;
+    first_month := COALESCE(first_month, date_trunc('month', now())::date);
+    last_month := (date_trunc('month', now()) + make_interval(months => months_ahead))::date;
+
+    m := first_month;
+    WHILE m <= last_month LOOP
+        PERFORM create_monthly_partition(parent, m);
+        m := (m + interval '1 month')::date;
+    END LOOP;
+    EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF %I DEFAULT', parent || '_default', parent);
+
+    EXECUTE format('INSERT INTO %I SELECT * FROM %I', parent, legacy);
+
+    EXECUTE format('SELECT COUNT(*) FROM %I', legacy) INTO n_legacy;
+    EXECUTE format('SELECT COUNT(*) FROM %I', parent) INTO n_new;
+    IF n_legacy <> n_new THEN
+        RAISE EXCEPTION 'Copia incompleta de %: % filas originales vs % copiadas', parent, n_legacy, n_new;
+    END IF;
+
+    EXECUTE format('DROP TABLE %I', legacy);
+    RAISE NOTICE '% particionada: % filas', parent, n_new;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT convert_to_monthly_partitions('Memory');
+SELECT convert_to_monthly_partitions('SQL_Query_Executions');
+SELECT convert_to_monthly_partitions('Performance_Metrics');
+
+-- Índices (se propagan a todas las particiones)
+CREATE INDEX IF NOT EXISTS idx_memory_user_created
+    ON Memory (user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_memory_session_created
+    ON Memory (session_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_sql_executions_session_created
+    ON SQL_Query_Executions (session_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_performance_metrics_function_created
+    ON Performance_Metrics (function_name, created_at DESC);
+
+-- Triggers de 002 (se perdieron con la tabla original)
+DROP TRIGGER IF EXISTS trg_memory_fill_user_id ON Memory;
+CREATE TRIGGER trg_memory_fill_user_id
+    BEFORE INSERT ON Memory
+    FOR EACH ROW EXECUTE FUNCTION memory_fill_user_id();
+
+DROP TRIGGER IF EXISTS trg_memory_update_user_stats ON Memory;
+CREATE TRIGGER trg_memory_update_user_stats
+    AFTER INSERT ON Memory
+    FOR EACH ROW EXECUTE FUNCTION memory_update_user_stats();
+
+-- ---------------------------------------------------------------------
+-- Deduplicación de resultados grandes (MEMORY_RESULT_DEDUP_ENABLED=true)
+-- Memory.query_result queda NULL y el contenido vive una sola vez en result_blobs
+-- ---------------------------------------------------------------------
+CREATE TABLE IF NOT EXISTS result_blobs (
+    hash          TEXT PRIMARY KEY,
+    content       TEXT      NOT NULL,
+    size_bytes    INTEGER   NOT NULL,
+    ref_count     INTEGER   NOT NULL DEFAULT 1,
+    first_seen_at TIMESTAMP NOT NULL DEFAULT now(),
+    last_used_at  TIMESTAMP NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_result_blobs_last_used
+    ON result_blobs (last_used_at);
+
+ALTER TABLE Memory ADD COLUMN IF NOT EXISTS query_result_hash TEXT;
+
+-- La limpieza de result_blobs solo borra hashes que ninguna fila de Memory referencia
+CREATE INDEX IF NOT EXISTS idx_memory_query_result_hash
+    ON Memory (query_result_hash) WHERE query_result_hash IS NOT NULL;
+
+-- ---------------------------------------------------------------------
+-- Compresión lz4 de columnas grandes (PostgreSQL 14+, aplica a filas nuevas)
+-- ---------------------------------------------------------------------
+DO $$
+BEGIN
+    IF current_setting('server_version_num')::int >= 140000 THEN
+        ALTER TABLE Memory ALTER COLUMN query_result SET COMPRESSION lz4;
+        ALTER TABLE Memory ALTER COLUMN agent_state_snapshot SET COMPRESSION lz4;
+        ALTER TABLE result_blobs ALTER COLUMN content SET COMPRESSION lz4;
+    ELSE
+        RAISE NOTICE 'lz4 no disponible (PostgreSQL < 14), se mantiene pglz';
+    END IF;
+END;
+$$;
+
+COMMIT;
@@ -0,0 +1,23 @@
+-- =====================================================================
+-- Alias persistentes de assets de Corva (src/corva_resolution_memo.py)
+--
+-- Nombre normalizado tal como lo escribe/dice el usuario → asset resuelto.
+-- Se cargan desde matches de alta confianza o validados por el LLM para no
+-- repetir búsqueda + validación. El TTL (CORVA_ALIAS_TTL_DAYS) se aplica al
+-- leer; los alias de assets que salen del catálogo se eliminan al refrescarlo.
+-- =====================================================================
+
+CREATE TABLE IF NOT EXISTS corva_asset_aliases (
+    alias          TEXT PRIMARY KEY,
+    asset_id       TEXT      NOT NULL,
+    original_id    TEXT,
+    asset_name     TEXT,
+    well_name      TEXT,
+    rig_name       TEXT,
+    last_active_at TEXT,
+    source         TEXT      NOT NULL,
+    created_at     TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_corva_asset_aliases_created
+    ON corva_asset_aliases (created_at);
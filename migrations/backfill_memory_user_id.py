@@ -0,0 +1,155 @@
+# backfill_memory_user_id.py
+# Completa Memory.user_id en filas históricas y reconstruye user_stats / user_sessions.
+# Solo las sesiones "user<id>_..." tienen usuario; el resto queda con user_id NULL
+# (incluidas las filas viejas que guardaron el session_id como user_id).
+# Correr una vez luego de aplicar 002_memory_user_id_and_stats.sql:
+#
+#   python migrations/backfill_memory_user_id.py [--batch-size 5000]
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.postgres_integration import get_postgres_connection
+
+CLEAR_SESSION_AS_USER_BATCH_QUERY = """
+WITH batch AS (
+    SELECT id FROM Memory
+    WHERE user_id = session_id
+    LIMIT %s
+)
+UPDATE Memory m
+SET user_id = NULL
+FROM batch
+WHERE m.id = batch.id
+"""
+
+BACKFILL_BATCH_QUERY = """
+WITH batch AS (
+    SELECT id FROM Memory
+    WHERE user_id IS NULL AND session_id ~ '(?:^|_)user\\d+(?:_|$)'
+    LIMIT %s
+)
+UPDATE Memory m
+SET user_id = (regexp_match(m.session_id, '(?:^|_)user(\\d+)(?:_|$)'))[1]
+FROM batch
+WHERE m.id = batch.id
+"""
+
+REBUILD_USER_STATS_QUERY = """
+INSERT INTO user_stats (
+    user_id, day, total_interactions, sql_queries, casual_chats,
+    total_processing_time, processing_time_samples,
+    successful_corrections, topics, last_seen_at
+)
+SELECT
+    d.user_id, d.day, d.total_interactions, d.sql_queries, d.casual_chats,
+    d.total_processing_time, d.processing_time_samples,
+    d.successful_corrections, t.topics, d.last_seen_at
+FROM (
+    SELECT
+        user_id,
+        created_at::date AS day,
+        COUNT(*) AS total_interactions,
+        COUNT(CASE WHEN relevance = 'consulta' THEN 1 END) AS sql_queries,
+        COUNT(CASE WHEN relevance = 'casual' THEN 1 END) AS casual_chats,
+        COALESCE(SUM(processing_time_seconds), 0) AS total_processing_time,
+        COUNT(processing_time_seconds) AS processing_time_samples,
+        COUNT(CASE WHEN correction_success = true THEN 1 END) AS successful_corrections,
+        MAX(created_at) AS last_seen_at
+    FROM Memory
+    WHERE user_id IS NOT NULL AND created_at IS NOT NULL
+    GROUP BY user_id, created_at::date
+) d
+JOIN (
+    SELECT user_id, day, jsonb_object_agg(topic, frequency) AS topics
+    FROM (
+        SELECT user_id, created_at::date AS day,
+               COALESCE(interaction_type, 'general') AS topic,
+               COUNT(*) AS frequency
+        FROM Memory
+        WHERE user_id IS NOT NULL AND created_at IS NOT NULL
+        GROUP BY 1, 2, 3
+    ) x
+    GROUP BY user_id, day
+) t ON t.user_id = d.user_id AND t.day = d.day
+"""
+
+REBUILD_USER_SESSIONS_QUERY = """
+INSERT INTO user_sessions (user_id, session_id, first_seen_at, last_seen_at)
+SELECT user_id, session_id, MIN(created_at), MAX(created_at)
+FROM Memory
+WHERE user_id IS NOT NULL AND session_id IS NOT NULL AND created_at IS NOT NULL
+GROUP BY user_id, session_id
+"""
+
+
+def run_batches(conn, query: str, batch_size: int) -> int:
+    """
+    Ejecuta un UPDATE por lotes para no bloquear la tabla en una sola transacción
+    """
+    total = 0
+    cursor = conn.cursor()
+    while True:
+        cursor.execute(query, (batch_size,))
+        updated = cursor.rowcount
+        conn.commit()
+        total += updated
+        print(f"   🔄 Lote actualizado: {updated} filas (total {total})")
+        if updated < batch_size:
+            break
+    cursor.close()
+    return total
+
+
+def backfill_user_id(conn, batch_size: int) -> int:
+    """
+    Sesiones anónimas guardadas con su session_id como user_id -> NULL;
+    luego completa user_id desde las sesiones "user<id>_..."
+    """
+    cleared = run_batches(conn, CLEAR_SESSION_AS_USER_BATCH_QUERY, batch_size)
+    print(f"   🧹 Sesiones anónimas sin usuario: {cleared} filas")
+    return run_batches(conn, BACKFILL_BATCH_QUERY, batch_size)
+
+
+def rebuild_user_stats(conn) -> None:
+    """
+    Reconstruye user_stats y user_sessions desde Memory (idempotente)
+    """
+    cursor = conn.cursor()
+    cursor.execute("TRUNCATE user_stats, user_sessions")
+    cursor.execute(REBUILD_USER_STATS_QUERY)
+    stats_rows = cursor.rowcount
+    cursor.execute(REBUILD_USER_SESSIONS_QUERY)
+    session_rows = cursor.rowcount
+    conn.commit()
+    cursor.close()
+    print(f"   📊 user_stats: {stats_rows} filas, user_sessions: {session_rows} filas")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill de Memory.user_id y user_stats")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--skip-stats", action="store_true",
+                        help="Solo completa user_id, no reconstruye user_stats")
+    args = parser.parse_args()
+
+    conn = get_postgres_connection()
+    if not conn:
+        print("❌ Sin conexión a PostgreSQL")
+        sys.exit(1)
+
+    t0 = time.perf_counter()
+    print("🚀 Backfill de Memory.user_id")
+    updated = backfill_user_id(conn, args.batch_size)
+    print(f"✅ user_id completado en {updated} filas")
+
+    if not args.skip_stats:
+        print("🚀 Reconstruyendo user_stats")
+        rebuild_user_stats(conn)
+        print("✅ user_stats reconstruida")
+
+    conn.close()
+    print(f"⏱️ Tiempo total: {time.perf_counter() - t0:.1f}s")
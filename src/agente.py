@@ -11,6 +11,7 @@ from src.enrutadores.routers import general_relevance_router, field_corr_router,
 # from src.react_sql_agent.src.wrapper_agent import react_sql_wrapper 
 from langgraph.graph import StateGraph, END
 from langgraph.checkpoint.memory import MemorySaver
+from src.metrics_registry import timed_node
 
 def minipywo_app():
     """
@@ -20,11 +21,11 @@ def minipywo_app():
     workflow = StateGraph(AgentState)
     memory = MemorySaver()
     
-    workflow.add_node("check_relevance", check_general_relevance)
+    workflow.add_node("check_relevance", timed_node("check_relevance", check_general_relevance))
     workflow.set_entry_point('check_relevance')
-    workflow.add_node("general_response", general_response)
-    workflow.add_node("corva", corva_call)
-    workflow.add_node('stream_ini_consulta', stream_ini)
+    workflow.add_node("general_response", timed_node("general_response", general_response))
+    workflow.add_node("corva", timed_node("corva", corva_call))
+    workflow.add_node('stream_ini_consulta', timed_node('stream_ini_consulta', stream_ini))
     workflow.add_conditional_edges( "check_relevance", general_relevance_router, {
             "consulta": "stream_ini_consulta",
             "general_response":"general_response",
@@ -32,12 +33,12 @@ def minipywo_app():
        },
     )
         # ─────── NUEVO NODO CON GRAFO REACT ───────
-    workflow.add_node("react_sql", react_sql_wrapper) 
+    workflow.add_node("react_sql", timed_node("react_sql", react_sql_wrapper)) 
     # from stream_ini_consulta --> react_sql
     workflow.add_edge("stream_ini_consulta", "react_sql")   
     
     # Después de react_sql vamos a la respuesta legible para humano
-    workflow.add_node("generate_human_readable_answer", generate_human_readable_answer)
+    workflow.add_node("generate_human_readable_answer", timed_node("generate_human_readable_answer", generate_human_readable_answer))
     workflow.add_edge("react_sql", "generate_human_readable_answer")
     # cierres
     workflow.add_edge("generate_human_readable_answer", END)
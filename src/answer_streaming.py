@@ -0,0 +1,118 @@
+"""
+Streaming de la respuesta final del grafo minipywo
+==================================================
+
+process_message esperaba a que terminara todo el grafo y emitía un solo
+mensaje: en la rama SQL el usuario no veía nada hasta que
+generate_human_readable_answer terminaba de generar. stream_answer() corre el
+grafo con stream_mode=["messages", "updates"] y devuelve eventos:
+
+- {"type": "token", "text", "node"}: tokens de los nodos de respuesta
+  (MINIPYWO_STREAM_NODES), agrupados en ventanas de MINIPYWO_STREAM_FLUSH_MS
+  para no mandar un frame por token; el primer token sale sin esperar
+- {"type": "done", "answer", "ttft_ms", "total_ms"}: query_result final
+
+Cada fin de nodo (evento "updates") fuerza un flush, así el texto pendiente
+no queda retenido mientras corre un nodo lento (p. ej. la consulta SQL).
+Los mensajes que los nodos guardan en memoria (name="memoria") no se emiten.
+"""
+
+import os
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from src.metrics_registry import REGISTRY
+
+MINIPYWO_STREAM_FLUSH_MS = float(os.environ.get("MINIPYWO_STREAM_FLUSH_MS", "40"))
+MINIPYWO_STREAM_NODES = [
+    node.strip() for node in os.environ.get(
+        "MINIPYWO_STREAM_NODES", "stream_ini_consulta,generate_human_readable_answer,general_response,corva"
+    ).split(",") if node.strip()
+]
+
+TIME_TO_FIRST_TOKEN_SECONDS = REGISTRY.histogram(
+    "minipywo_time_to_first_token_seconds", "Tiempo hasta el primer token de la respuesta", ["channel"])
+STREAM_TOTAL_SECONDS = REGISTRY.histogram(
+    "minipywo_stream_duration_seconds", "Duración total de respuestas en streaming", ["channel"])
+
+
+def _chunk_text(chunk: Any) -> str:
+    content = getattr(chunk, "content", None)
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        # Algunos modelos devuelven bloques [{"type": "text", "text": ...}]
+        return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+    return ""
+
+
+def stream_answer(graph, inputs: Dict[str, Any], config: Dict[str, Any], channel: str = "socketio",
+                  flush_ms: float = MINIPYWO_STREAM_FLUSH_MS, nodes=None,
+                  transform=None) -> Iterator[Dict[str, Any]]:
+    """
+    Corre el grafo en modo streaming y genera eventos token/done
+
+    Args:
+        transform: función opcional aplicada a cada bloque de texto antes de
+            emitirlo (p. ej. replace_token para las correcciones de entidades)
+    """
+    nodes = set(nodes or MINIPYWO_STREAM_NODES)
+    window = flush_ms / 1000.0
+    started = time.perf_counter()
+    first_token_at: Optional[float] = None
+    buffer, buffer_node, buffer_started = [], None, 0.0
+    answer = None
+
+    def flush():
+        nonlocal buffer, buffer_node
+        text = "".join(buffer)
+        node = buffer_node
+        buffer, buffer_node = [], None
+        if transform is not None:
+            text = transform(text)
+        return {"type": "token", "text": text, "node": node}
+
+    for mode, payload in graph.stream(inputs, config=config, stream_mode=["messages", "updates"]):
+        if mode == "updates":
+            # Fin de un nodo: se emite lo pendiente y se toma el query_result más reciente
+            if buffer:
+                yield flush()
+            for update in (payload or {}).values():
+                if isinstance(update, dict) and update.get("query_result") is not None:
+                    answer = update["query_result"]
+            continue
+
+        chunk, metadata = payload
+        if metadata.get("langgraph_node") not in nodes or getattr(chunk, "name", None) == "memoria":
+            continue
+        text = _chunk_text(chunk)
+        if not text:
+            continue
+
+        now = time.perf_counter()
+        node = metadata.get("langgraph_node")
+        if buffer and node != buffer_node:
+            yield flush()
+        if not buffer:
+            buffer_started = now
+        buffer.append(text)
+        buffer_node = node
+
+        if first_token_at is None:
+            first_token_at = now
+            TIME_TO_FIRST_TOKEN_SECONDS.labels(channel=channel).observe(now - started)
+            yield flush()
+        elif now - buffer_started >= window:
+            yield flush()
+
+    if buffer:
+        yield flush()
+
+    total = time.perf_counter() - started
+    STREAM_TOTAL_SECONDS.labels(channel=channel).observe(total)
+    yield {
+        "type": "done",
+        "answer": answer,
+        "ttft_ms": round((first_token_at - started) * 1000, 1) if first_token_at else None,
+        "total_ms": round(total * 1000, 1),
+    }
@@ -4,6 +4,7 @@ from langchain_openai import AzureOpenAIEmbeddings
 
 import os
 import requests
+from src.metrics_registry import observe_dependency
 import time
 
 load_dotenv()
@@ -90,7 +91,8 @@ def catalogo_index_retrieval(input: str, embeddings_query=None) -> tuple:
         search_endpoint = f"{AZURE_SEARCH_SERVICE_ENDPOINT}/indexes/{AZURE_SEARCH_INDEX}/docs/search?api-version={AZURE_SEARCH_API_VERSION}"
         
         start_time = time.time()
-        response = requests.post(search_endpoint, headers=headers, json=body)
+        with observe_dependency("azure_search", "catalogo"):
+            response = requests.post(search_endpoint, headers=headers, json=body)
         status_code = response.status_code
         if status_code >= 400:
             error_message = f'Status code: {status_code}.'
@@ -2,6 +2,7 @@ from dotenv import load_dotenv
 from langchain_openai import AzureOpenAIEmbeddings
 import os
 import requests
+from src.metrics_registry import observe_dependency
 
 from src.sqltool_aux_fun import fuzzy_search
 
@@ -87,7 +88,8 @@ def call_azure_search(input: str, table_name: str, embeddings_query=None):
    
     search_endpoint = f"{AZURE_SEARCH_SERVICE_ENDPOINT}/indexes/{AZURE_SEARCH_INDEX}/docs/search?api-version={AZURE_SEARCH_API_VERSION}"
     
-    response = requests.post(search_endpoint, headers=headers, json=body)
+    with observe_dependency("azure_search", "columns"):
+        response = requests.post(search_endpoint, headers=headers, json=body)
     return response
 
 
@@ -39,6 +39,8 @@ try:
         get_wits_summary,
         get_metrics_rop,
         get_operations,
+        get_assets_snapshot,
+        count_llm_call,
         
         # NUEVAS FUNCIONES A AGREGAR:
         get_asset_detailed_info,      # ← NUEVA
@@ -53,6 +55,8 @@ except ImportError as e:
     print(f"⚠️ Error al importar funciones de corva_tool_avatar: {e}")
     raise
 
+from src.corva_resolution_memo import current_corva_session
+
 # 🔧 IMPORTAR MEMORIA AVATAR SI ESTÁ DISPONIBLE
 try:
     from src.langmem_functions import (
@@ -181,6 +185,7 @@ class CorvaAgnoAgent:
                     self._create_wits_summary_tool(), 
                     self._create_metrics_rop_tool(),
                     self._create_operations_tool(),
+                    self._create_assets_snapshot_tool(),   # ⚡ CONSULTAS COMPUESTAS EN PARALELO
                     self._create_fracking_metrics_tool(),  # ← NUEVA TOOL
                 ],
                 instructions=self._create_avatar_instructions(),
@@ -245,6 +250,8 @@ class CorvaAgnoAgent:
         - ROP en tiempo real → fetch_wits_summary()
         - Métricas históricas → fetch_metrics_rop()
         - Tiempos de operación → fetch_operations()
+        - **Varios datos y/o varios assets en la misma pregunta → fetch_assets_snapshot()**
+          (una sola llamada en paralelo, NO encadenar fetch_wits_depth + fetch_wits_summary + ...)
 
         ### EJEMPLOS DE CLASIFICACIÓN ACTUALIZADA:
 
@@ -262,6 +269,8 @@ class CorvaAgnoAgent:
         ❓ "KPIs del DLS 168" → search_specific_asset() + fetch_asset_kpis()
         ❓ "profundidad actual del LCav-415" → fetch_wits_depth()
         ❓ "ROP del pozo ABC-001" → fetch_wits_summary()
+        ❓ "profundidad, ROP y operaciones del DLS-167" → fetch_assets_snapshot("DLS-167", "wits_depth,wits_summary,operations")
+        ❓ "compará ROP de DLS-167 y DLS-168" → fetch_assets_snapshot("DLS-167,DLS-168", "metrics_rop")
 
         ### REGLAS CRÍTICAS DE VALIDACIÓN ACTUALIZADAS:
         - **fetch_asset_detailed_info() NO requiere search_specific_asset() previo** (tiene su propio matching)
@@ -617,6 +626,43 @@ class CorvaAgnoAgent:
         
         return fetch_operations
     
+    def _create_assets_snapshot_tool(self):
+        """⚡ HERRAMIENTA DE CONSULTAS COMPUESTAS (varios datos / varios assets en paralelo)"""
+        @tool
+        def fetch_assets_snapshot(asset_names: str, data_types: str) -> str:
+            """
+            Obtiene varios tipos de dato de uno o más assets con todas las consultas en paralelo.
+            
+            Args:
+                asset_names: Nombres de rigs o wells separados por coma (ej: "DLS-167,DLS-168")
+                data_types: Tipos de dato separados por coma: wits_depth (profundidad),
+                            wits_summary (ROP actual), metrics_rop (ROP por sección),
+                            operations (tiempos de operación)
+                
+            Returns:
+                str: Resultados formateados por asset y tipo de dato
+            """
+            try:
+                names = [name.strip() for name in asset_names.split(",") if name.strip()]
+                types = [data_type.strip() for data_type in data_types.split(",") if data_type.strip()]
+                print(f"⚡ SNAPSHOT AVATAR: assets={names} datos={types}")
+                
+                if not names or not types:
+                    return "⚠️ Especifica al menos un asset y un tipo de dato"
+                
+                sections = []
+                for result in get_assets_snapshot(names, types):
+                    if result.get("success"):
+                        sections.append(format_response_for_agent(result))
+                    else:
+                        sections.append(f"⚠️ {result.get('error', 'Error desconocido')}")
+                return "\n\n".join(sections)
+                    
+            except Exception as e:
+                return f"Error al obtener datos en paralelo: {str(e)}"
+        
+        return fetch_assets_snapshot
+    
     def _create_asset_detailed_info_tool(self):
         """🔧 Tool para obtener información completa y detallada de un asset específico"""
         @tool
@@ -765,13 +811,17 @@ class CorvaAgnoAgent:
                     print(f"⚠️ Error obteniendo contexto Avatar: {context_error}")
                     # Continuar sin contexto
             
-            # Ejecutar agente Agno Avatar
+            # Ejecutar agente Agno Avatar (la sesión habilita el memo de assets por sesión;
+            # si no llega, se conserva la que fijó el dispatcher)
+            session_token = current_corva_session.set(session_id or user_id or current_corva_session.get())
             try:
                 response = self.agent.run(enhanced_query)
                 
                 if response is None:
                     return "⚠️ No se pudo generar respuesta Avatar"
                 
+                count_llm_call(_count_model_calls(response))
+                
                 result = str(response)
                 
                 # 🔧 GUARDAR MÉTRICAS AVATAR
@@ -788,12 +838,25 @@ class CorvaAgnoAgent:
             except Exception as agent_error:
                 print(f"❌ Error en agente Avatar: {agent_error}")
                 return f"Error ejecutando agente Avatar: {str(agent_error)}"
+            finally:
+                current_corva_session.reset(session_token)
             
         except Exception as e:
             print(f"❌ Error general Avatar: {e}")
             return f"Error procesando Avatar: {str(e)}"
 
 
+def _count_model_calls(response) -> int:
+    """
+    Llamadas al modelo de una corrida del agente: una por mensaje del asistente
+    (selección de tool y respuesta final). Si la respuesta no trae mensajes se
+    estima el mínimo del loop (2).
+    """
+    messages = getattr(response, "messages", None) or []
+    calls = sum(1 for message in messages if getattr(message, "role", None) == "assistant")
+    return calls or 2
+
+
 # 🔧 INTERFAZ DE COMPATIBILIDAD AVATAR
 _corva_agent_avatar_instance = None
 
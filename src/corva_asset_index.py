@@ -0,0 +1,266 @@
+"""
+Índice de nombres de assets de Corva
+=====================================
+
+Reemplaza el recorrido completo del catálogo en search_asset_by_name (cascada de
+7 niveles con fuzz por cada asset) por:
+
+1. Generación de candidatos con una cota por nivel de la cascada:
+   - nombres normalizados exactos (nivel 1)
+   - intersección de trigramas: la búsqueda o un componente crítico es
+     substring del nombre (niveles 2, 3 y 7)
+   - caracteres en común con el well name, vectorizado con numpy: sin ellos
+     no se alcanza el umbral fuzzy (niveles 4 y 5)
+   - los pocos rigs distintos del catálogo, evaluados todos (nivel 6)
+2. Re-score solo de los candidatos con la misma cascada de niveles
+   (`score_asset_match`), usando rapidfuzz si está instalado.
+
+Ninguna cota descarta un asset que la cascada aceptaría: el resultado es el
+mismo que el recorrido completo (`scan_all`).
+
+El índice se construye en cada refresco del catálogo (src/corva_catalog.py).
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple, Iterable
+
+import numpy as np
+
+try:
+    from rapidfuzz import fuzz
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    from fuzzywuzzy import fuzz
+    RAPIDFUZZ_AVAILABLE = False
+
+MIN_MATCH_SCORE = 70
+RIG_KEYWORDS = ["dls", "nabors", "h&p", "rig", "f35", "t430"]
+
+_COMPONENT_RE = re.compile(r'[a-zA-Z]+[-.]?\d+(?:\([a-zA-Z]\))?')
+
+
+# ===============================
+# CASCADA DE MATCHING (7 NIVELES)
+# ===============================
+
+def score_asset_match(search_name_lower: str, asset: Dict, fuzz_module=None) -> Tuple[bool, float, str]:
+    """
+    Aplica la cascada de prioridades de search_asset_by_name a un asset
+
+    Returns:
+        (match_found, match_score, match_reason)
+    """
+    fz = fuzz_module or fuzz
+    name = asset.get("attributes", {}).get("name", "").lower()
+    well_name = (asset.get("well_name") or "").lower()
+    rig_name = (asset.get("rig_name") or "").lower()
+
+    # PRIORIDAD 1: MATCH EXACTO COMPLETO
+    if (search_name_lower == well_name or
+            search_name_lower == name or
+            search_name_lower == rig_name):
+        return True, 100, "exact_complete_match"
+
+    # PRIORIDAD 2: MATCH EXACTO POR SUBSTRING EN WELL NAME
+    if well_name and search_name_lower in well_name:
+        return True, 98, "exact_well_substring"
+
+    # PRIORIDAD 3: MATCH EXACTO POR SUBSTRING EN NOMBRE COMBINADO
+    if search_name_lower in name:
+        return True, 95, "exact_name_substring"
+
+    if well_name:
+        # PRIORIDAD 4: FUZZY MATCH ALTO EN WELL NAME
+        ratio = fz.ratio(search_name_lower, well_name)
+        if ratio >= 90:
+            return True, ratio, "fuzzy_well_high"
+
+        # PRIORIDAD 5: FUZZY MATCH MEDIO EN WELL NAME
+        partial = fz.partial_ratio(search_name_lower, well_name)
+        if partial >= 85:
+            return True, partial, "fuzzy_well_medium"
+
+    # PRIORIDAD 6: MATCH EN RIG NAME (solo para búsquedas explícitas de rigs)
+    if rig_name and any(keyword in search_name_lower for keyword in RIG_KEYWORDS):
+        rig_partial = fz.partial_ratio(search_name_lower, rig_name)
+        if rig_partial >= 80:
+            return True, rig_partial, "rig_explicit_match"
+
+    # PRIORIDAD 7: MATCH POR COMPONENTES CRÍTICOS (números + letras)
+    if well_name or name:
+        target_text = well_name if well_name else name
+        search_components = _COMPONENT_RE.findall(search_name_lower)
+        target_components = _COMPONENT_RE.findall(target_text)
+
+        if search_components and target_components:
+            exact_component_matches = sum(1 for search_comp in search_components
+                                          if any(search_comp in target_comp for target_comp in target_components))
+            if exact_component_matches > 0:
+                match_score = min(90, (exact_component_matches / len(search_components)) * 85 + 10)
+                if match_score >= MIN_MATCH_SCORE:
+                    return True, match_score, "component_critical_match"
+
+    return False, 0, ""
+
+
+# ===============================
+# ESTRUCTURAS DEL ÍNDICE
+# ===============================
+
+def _trigrams(text: str) -> set:
+    if len(text) < 3:
+        return {text} if text else set()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _min_shared_chars(threshold: float, partial: bool) -> float:
+    """
+    Fracción mínima de caracteres en común (multiconjunto) que necesita un par de
+    textos para alcanzar `threshold` en fuzz.ratio / fuzz.partial_ratio.
+
+    ratio = 2M / (|a| + |b|), con M <= caracteres en común. En partial_ratio la
+    ventana puede quedar más corta que el texto menor en los bordes, así que solo
+    se garantiza M >= t / (2 - t) * menor. Se resta medio punto por el redondeo
+    de fuzzywuzzy.
+    """
+    t = (threshold - 0.5) / 100
+    return t / (2 - t) if partial else t
+
+
+FUZZY_WELL_HIGH_SHARED = _min_shared_chars(90, partial=False)
+FUZZY_WELL_MEDIUM_SHARED = _min_shared_chars(85, partial=True)
+RIG_EXPLICIT_SHARED = _min_shared_chars(80, partial=True)
+
+
+class AssetNameIndex:
+    """
+    Índice sobre los candidatos del catálogo. Las posiciones coinciden con
+    `CorvaAssetCatalog.candidates` de la misma versión del catálogo.
+
+    `candidate_ids` devuelve un superconjunto de los assets que pasan algún nivel
+    de la cascada, así que `search` da exactamente los mismos matches que `scan_all`.
+    """
+
+    def __init__(self, candidates: List[Dict]):
+        self.candidates = candidates
+        self.exact: Dict[str, set] = {}
+        self.trigrams: Dict[str, set] = {}
+        self.rigs: Dict[str, set] = {}
+
+        alphabet: Dict[str, int] = {}
+        well_names = []
+        for doc_id, asset in enumerate(candidates):
+            well_name = (asset.get("well_name") or "").lower()
+            rig_name = (asset.get("rig_name") or "").lower()
+            names = {well_name, asset.get("attributes", {}).get("name", "").lower(), rig_name}
+            names.discard("")
+            for text in names:
+                self.exact.setdefault(text, set()).add(doc_id)
+                for gram in _trigrams(text):
+                    self.trigrams.setdefault(gram, set()).add(doc_id)
+            if rig_name:
+                self.rigs.setdefault(rig_name, set()).add(doc_id)
+            for ch in well_name:
+                alphabet.setdefault(ch, len(alphabet))
+            well_names.append(well_name)
+
+        # Conteo de caracteres por well name: cota vectorizada para los niveles fuzzy
+        self.alphabet = alphabet
+        self.well_counts = np.zeros((len(candidates), max(len(alphabet), 1)), dtype=np.int16)
+        for doc_id, well_name in enumerate(well_names):
+            for ch in well_name:
+                self.well_counts[doc_id, alphabet[ch]] += 1
+        self.well_lengths = np.array([len(name) for name in well_names], dtype=np.int32)
+
+    @classmethod
+    def build(cls, candidates: List[Dict]) -> "AssetNameIndex":
+        return cls(candidates)
+
+    def _containing(self, text: str) -> set:
+        """Assets con todos los trigramas de `text` (superconjunto de los que lo contienen)"""
+        postings = sorted((self.trigrams.get(gram, set()) for gram in _trigrams(text)), key=len)
+        if not postings:
+            return set()
+        ids = set(postings[0])
+        for posting in postings[1:]:
+            ids &= posting
+            if not ids:
+                break
+        return ids
+
+    def _fuzzy_well_ids(self, search_name_lower: str) -> np.ndarray:
+        """Niveles 4-5: well names con suficientes caracteres en común para el umbral fuzzy"""
+        query = np.zeros(self.well_counts.shape[1], dtype=np.int16)
+        for ch in search_name_lower:
+            position = self.alphabet.get(ch)
+            if position is not None:
+                query[position] += 1
+        shared = np.minimum(self.well_counts, query).sum(axis=1)
+        query_length = len(search_name_lower)
+        high = 2 * shared >= FUZZY_WELL_HIGH_SHARED * (self.well_lengths + query_length)
+        medium = shared >= FUZZY_WELL_MEDIUM_SHARED * np.minimum(self.well_lengths, query_length)
+        return np.flatnonzero((high | medium) & (self.well_lengths > 0))
+
+    def candidate_ids(self, search_name_lower: str) -> Optional[set]:
+        """
+        Superconjunto de los assets que pueden pasar algún nivel de la cascada, o
+        None si la búsqueda es demasiado corta para acotarla (se recorre todo).
+        """
+        components = _COMPONENT_RE.findall(search_name_lower)
+        if len(search_name_lower) < 3 or any(len(component) < 3 for component in components):
+            return None
+
+        # Nivel 1: match exacto
+        ids = set(self.exact.get(search_name_lower, ()))
+        # Niveles 2-3: la búsqueda es substring del well name o del nombre combinado
+        ids |= self._containing(search_name_lower)
+        # Niveles 4-5: fuzzy sobre el well name
+        ids.update(self._fuzzy_well_ids(search_name_lower).tolist())
+        # Nivel 6: pocos rigs distintos, se evalúan todos
+        if any(keyword in search_name_lower for keyword in RIG_KEYWORDS):
+            for rig_name, posting in self.rigs.items():
+                if fuzz.partial_ratio(search_name_lower, rig_name) >= 80:
+                    ids |= posting
+        # Nivel 7: algún componente crítico es substring de un componente del asset
+        for component in components:
+            ids |= self._containing(component)
+        return ids
+
+    def search(self, search_name_lower: str, allowed=None,
+               min_score: float = MIN_MATCH_SCORE) -> List[Tuple[int, float, str]]:
+        """
+        Candidatos re-scoreados con la cascada de niveles.
+
+        Args:
+            search_name_lower: nombre buscado en minúsculas
+            allowed: máscara booleana de posiciones habilitadas (p. ej. activos recientes)
+
+        Returns:
+            Lista de (posición, match_score, match_reason) con score >= min_score,
+            la misma que devuelve scan_all
+        """
+        ids = self.candidate_ids(search_name_lower)
+        if ids is None:
+            ids = range(len(self.candidates))
+        results = []
+        # Orden por posición: mismo desempate que el recorrido completo
+        for doc_id in sorted(ids):
+            if allowed is not None and not allowed[doc_id]:
+                continue
+            found, score, reason = score_asset_match(search_name_lower, self.candidates[doc_id])
+            if found and score >= min_score:
+                results.append((doc_id, score, reason))
+        return results
+
+
+def scan_all(search_name_lower: str, candidates: Iterable[Dict], fuzz_module=None,
+             min_score: float = MIN_MATCH_SCORE) -> List[Tuple[int, float, str]]:
+    """
+    Recorrido completo (comportamiento previo al índice), usado como fallback y en benchmarks
+    """
+    results = []
+    for doc_id, asset in enumerate(candidates):
+        found, score, reason = score_asset_match(search_name_lower, asset, fuzz_module)
+        if found and score >= min_score:
+            results.append((doc_id, score, reason))
+    return results
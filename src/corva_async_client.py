@@ -0,0 +1,320 @@
+"""
+Cliente async de Corva (aiohttp)
+================================
+
+Las preguntas compuestas ("profundidad, ROP y operaciones del DLS-167",
+"compará ROP de DLS-167 y DLS-168") hacían una llamada bloqueante detrás de
+otra. Este cliente las lanza juntas para que la latencia sea la de la llamada
+más lenta y no la suma:
+
+- Concurrencia acotada por host (CORVA_MAX_CONCURRENCY_PER_HOST)
+- fetch_many([(endpoint, params, base_url), ...]) para fan-out
+- fetch_batched: varios assets en una sola consulta `asset_id $in [...]`
+- fetch_many_with_batched: fan-out y consulta por lote en el mismo gather
+- Adaptadores sync (fetch_many_sync, fetch_batched_sync, fetch_many_with_batched_sync,
+  resolve_many_sync) que corren sobre un event loop propio en un hilo de fondo,
+  para las tools sync
+
+Las respuestas pasan por el mismo cache de src/corva_cache.py. Sin aiohttp
+instalado, los adaptadores caen a un pool de hilos con make_corva_request_fixed.
+"""
+
+import asyncio
+import contextvars
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+from src.corva_tool import CorvaAPIError, CORVA_BASE_URL_DATA, make_corva_request_fixed
+from src.metrics_registry import observe_dependency, register_queue_depth
+from src.corva_cache import (
+    CORVA_CACHE_ENABLED, CLASS_TTL_SECONDS, endpoint_class, make_cache_key, get_response_cache
+)
+
+CORVA_MAX_CONCURRENCY_PER_HOST = int(os.environ.get("CORVA_MAX_CONCURRENCY_PER_HOST", "6"))
+CORVA_ASYNC_TIMEOUT_SECONDS = float(os.environ.get("CORVA_ASYNC_TIMEOUT_SECONDS", "30"))
+
+# (endpoint, params, base_url)
+CorvaRequest = Tuple[str, Optional[Dict], Optional[str]]
+# (endpoint, params, asset_ids, base_url)
+CorvaBatchedRequest = Tuple[str, Dict, Sequence, Optional[str]]
+
+
+def _auth_headers() -> Dict[str, str]:
+    auth_credential = os.getenv("APIM_AUTH_CREDENTIAL")
+    if not auth_credential:
+        raise CorvaAPIError("APIM_AUTH_CREDENTIAL no configurada")
+    return {
+        "Authorization": f"Basic {auth_credential}",
+        "Accept": "application/json",
+        "Content-Type": "application/json"
+    }
+
+
+def _batched_params(params: Dict, asset_ids: Sequence) -> Dict:
+    """Reemplaza el filtro de asset por `$in` y escala el `limit` (que es por asset)"""
+    query = json.loads(params.get("query", "{}"))
+    query["asset_id"] = {"$in": [int(asset_id) for asset_id in asset_ids]}
+    batched = dict(params)
+    batched["query"] = json.dumps(query)
+    batched["limit"] = int(params.get("limit", 10)) * len(asset_ids)
+    # Sin asset_id en la proyección no se pueden separar los registros por asset
+    if batched.get("fields") and "asset_id" not in batched["fields"].split(","):
+        batched["fields"] = f"{batched['fields']},asset_id"
+    return batched
+
+
+def _records(data: Any) -> List:
+    records = data.get("data", []) if isinstance(data, dict) else data
+    return records if isinstance(records, list) else []
+
+
+def _split_by_asset(data: Any, asset_ids: Sequence, limit: Optional[int] = None) -> Dict[str, List]:
+    """Registros por asset, cada uno recortado a su `limit` (la respuesta viene en el orden del sort)"""
+    by_asset: Dict[str, List] = {str(asset_id): [] for asset_id in asset_ids}
+    for record in _records(data):
+        if isinstance(record, dict) and str(record.get("asset_id")) in by_asset:
+            rows = by_asset[str(record.get("asset_id"))]
+            if limit is None or len(rows) < limit:
+                rows.append(record)
+    return by_asset
+
+
+def _crowded_out(data: Any, by_asset: Dict[str, List], batched_limit: int, limit: int) -> List[str]:
+    """
+    El `limit` del lote es total: si la respuesta lo llenó, un asset con muchos registros
+    pudo dejar a otros sin los suyos. Devuelve los assets que hay que pedir por separado.
+    """
+    if len(_records(data)) < batched_limit:
+        return []
+    return [asset_id for asset_id, rows in by_asset.items() if len(rows) < limit]
+
+
+class AsyncCorvaClient:
+    """
+    Cliente aiohttp con una sesión compartida y un semáforo por host
+    """
+
+    def __init__(self, max_per_host: int = CORVA_MAX_CONCURRENCY_PER_HOST,
+                 timeout: float = CORVA_ASYNC_TIMEOUT_SECONDS):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self._session = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(limit_per_host=self.max_per_host)
+            )
+        return self._session
+
+    def _semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.max_per_host)
+        return self._semaphores[host]
+
+    async def _request(self, url: str, params: Optional[Dict]) -> Any:
+        session = await self._get_session()
+        async with self._semaphore(url):
+            try:
+                with observe_dependency("corva", "rest_async"):
+                    async with session.get(url, headers=_auth_headers(), params=params) as response:
+                        body = await response.read()
+                        if response.status != 200:
+                            text = body.decode("utf-8", errors="ignore")
+                            print(f"❌ Error HTTP {response.status} (async): {url}")
+                            raise CorvaAPIError(f"Error HTTP {response.status}: {text}", status_code=response.status)
+                        if not body.strip():
+                            return {"data": [], "message": "Respuesta vacía del servidor"}
+                        try:
+                            return json.loads(body)
+                        except json.JSONDecodeError:
+                            content_type = response.headers.get("content-type", "").lower()
+                            text = body.decode("utf-8", errors="ignore")
+                            if "html" in content_type:
+                                return {"error": "API devolvió HTML en lugar de JSON", "html_preview": text[:200]}
+                            if "text" in content_type:
+                                return {"data": text, "message": "Respuesta en texto plano"}
+                            return {"error": "Formato de respuesta no reconocido", "content": text[:200]}
+            except CorvaAPIError:
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise CorvaAPIError(f"Error de conexión: {str(e)}")
+
+    async def fetch(self, endpoint: str, params: Optional[Dict] = None, base_url: Optional[str] = None) -> Any:
+        """
+        Una consulta, usando el cache compartido (sin singleflight para no bloquear el loop)
+        """
+        url = f"{base_url or CORVA_BASE_URL_DATA}{endpoint}"
+        if not CORVA_CACHE_ENABLED:
+            return await self._request(url, params)
+
+        cache = get_response_cache()
+        key = make_cache_key(url, params)
+        found, cached = cache.peek(key)
+        if found:
+            return cached
+        cls = endpoint_class(endpoint)
+        data = await self._request(url, params)
+        cache.put(key, CLASS_TTL_SECONDS[cls], data, cls=cls)
+        return data
+
+    async def fetch_many(self, requests: Sequence[CorvaRequest]) -> List[Any]:
+        """
+        Fan-out en paralelo. Devuelve una respuesta por request, en el mismo orden;
+        los errores se devuelven como excepciones en su posición.
+        """
+        return await asyncio.gather(
+            *(self.fetch(endpoint, params, base_url) for endpoint, params, base_url in requests),
+            return_exceptions=True
+        )
+
+    async def fetch_batched(self, endpoint: str, params: Dict, asset_ids: Sequence,
+                            base_url: Optional[str] = None) -> Dict[str, List]:
+        """
+        Misma consulta para varios assets en un único request `asset_id $in [...]`.
+        El `limit` de `params` se interpreta por asset: la respuesta se recorta por asset
+        y los que quedaron cortos porque el lote llegó a su límite se piden aparte.
+
+        Returns:
+            {asset_id (str): registros de ese asset}
+        """
+        limit = int(params.get("limit", 10))
+        batched = _batched_params(params, asset_ids)
+        data = await self.fetch(endpoint, batched, base_url)
+        by_asset = _split_by_asset(data, asset_ids, limit)
+        crowded = _crowded_out(data, by_asset, batched["limit"], limit)
+        if crowded:
+            refetched = await asyncio.gather(
+                *(self.fetch(endpoint, _batched_params(params, [asset_id]), base_url) for asset_id in crowded))
+            for asset_id, data in zip(crowded, refetched):
+                by_asset[asset_id] = _split_by_asset(data, [asset_id], limit)[asset_id]
+        return by_asset
+
+    async def fetch_many_with_batched(self, requests: Sequence[CorvaRequest],
+                                      batched: CorvaBatchedRequest) -> Tuple[List[Any], Any]:
+        """
+        fetch_many y fetch_batched en el mismo gather: la consulta por lote no suma
+        un round trip antes del fan-out.
+
+        Returns:
+            (respuestas de fetch_many, {asset_id: registros} o la excepción del lote)
+        """
+        endpoint, params, asset_ids, base_url = batched
+        responses, by_asset = await asyncio.gather(
+            self.fetch_many(requests),
+            self.fetch_batched(endpoint, params, asset_ids, base_url),
+            return_exceptions=True
+        )
+        return responses, by_asset
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+# ===============================
+# ADAPTADORES SYNC
+# ===============================
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_client: Optional[AsyncCorvaClient] = None
+_loop_lock = threading.Lock()
+_thread_pool = ThreadPoolExecutor(max_workers=CORVA_MAX_CONCURRENCY_PER_HOST, thread_name_prefix="corva-fanout")
+register_queue_depth("corva_fanout", lambda: _thread_pool._work_queue.qsize())
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Event loop dedicado en un hilo daemon (la sesión aiohttp vive en este loop)"""
+    global _loop, _client
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="corva-async-loop", daemon=True).start()
+                _client = AsyncCorvaClient()
+                _loop = loop
+    return _loop
+
+
+def _run(coro_factory: Callable[[AsyncCorvaClient], Any]) -> Any:
+    loop = _get_loop()
+    future = asyncio.run_coroutine_threadsafe(coro_factory(_client), loop)
+    return future.result()
+
+
+def fetch_many_sync(requests: Sequence[CorvaRequest]) -> List[Any]:
+    """Versión sync de fetch_many para las tools del agente"""
+    if not requests:
+        return []
+    if AIOHTTP_AVAILABLE:
+        return _run(lambda client: client.fetch_many(requests))
+
+    def call(request: CorvaRequest):
+        endpoint, params, base_url = request
+        try:
+            return make_corva_request_fixed(endpoint, params=params, base_url=base_url)
+        except Exception as e:
+            return e
+    return list(_thread_pool.map(call, requests))
+
+
+def fetch_batched_sync(endpoint: str, params: Dict, asset_ids: Sequence,
+                       base_url: Optional[str] = None) -> Dict[str, List]:
+    """Versión sync de fetch_batched"""
+    if AIOHTTP_AVAILABLE:
+        return _run(lambda client: client.fetch_batched(endpoint, params, asset_ids, base_url))
+    return _fetch_batched_blocking(endpoint, params, asset_ids, base_url)
+
+
+def _fetch_batched_blocking(endpoint: str, params: Dict, asset_ids: Sequence,
+                            base_url: Optional[str] = None) -> Dict[str, List]:
+    """fetch_batched sin aiohttp, con make_corva_request_fixed"""
+    limit = int(params.get("limit", 10))
+    batched = _batched_params(params, asset_ids)
+    data = make_corva_request_fixed(endpoint, params=batched, base_url=base_url)
+    by_asset = _split_by_asset(data, asset_ids, limit)
+    for asset_id in _crowded_out(data, by_asset, batched["limit"], limit):
+        data = make_corva_request_fixed(endpoint, params=_batched_params(params, [asset_id]), base_url=base_url)
+        by_asset[asset_id] = _split_by_asset(data, [asset_id], limit)[asset_id]
+    return by_asset
+
+
+def fetch_many_with_batched_sync(requests: Sequence[CorvaRequest],
+                                 batched: CorvaBatchedRequest) -> Tuple[List[Any], Any]:
+    """Versión sync de fetch_many_with_batched; el lote falla como excepción, no lanza"""
+    if AIOHTTP_AVAILABLE:
+        return _run(lambda client: client.fetch_many_with_batched(requests, batched))
+
+    def call_batched():
+        try:
+            return _fetch_batched_blocking(*batched)
+        except Exception as e:
+            return e
+    future = _thread_pool.submit(call_batched)
+    responses = fetch_many_sync(requests)
+    return responses, future.result()
+
+
+def resolve_many_sync(resolver: Callable[[str], Any], names: Sequence[str]) -> List[Any]:
+    """
+    Ejecuta un resolver bloqueante (p. ej. resolve_asset_for_data, que puede llamar
+    al LLM de validación) para varios nombres en paralelo
+    """
+    if len(names) <= 1:
+        return [resolver(name) for name in names]
+    # Cada hilo corre con una copia del contexto (sesión del memo, contador de LLM)
+    contexts = [contextvars.copy_context() for _ in names]
+    return list(_thread_pool.map(lambda ctx, name: ctx.run(resolver, name), contexts, names))
@@ -0,0 +1,287 @@
+"""
+Cache de respuestas de Corva con coalescing (singleflight)
+===========================================================
+
+Varios usuarios mirando los mismos equipos activos disparan las mismas
+consultas a Corva (WITS, KPIs, métricas, operaciones, alertas) con segundos de
+diferencia. Cada una tarda 1-2 s y consume cuota del rate limit de APIM.
+
+- Clave: (base_url + endpoint, params normalizados)
+- TTL por clase de endpoint (WITS ~15 s, KPIs/assets minutos), configurable por env
+- Singleflight: requests idénticos concurrentes comparten una sola llamada upstream
+- Cache negativo: respuestas vacías y 404 se recuerdan con un TTL más corto;
+  el error se guarda como (tipo, args, estado) y cada hit lanza una instancia nueva
+- Cada llamador recibe una copia profunda: puede modificar su respuesta sin
+  tocar la guardada ni la de otros requests
+- Contadores de hits, llamadas upstream y requests coalescidos para /metrics
+"""
+
+import copy
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+CORVA_CACHE_ENABLED = os.environ.get("CORVA_CACHE_ENABLED", "true").lower() == "true"
+CORVA_CACHE_MAX_ENTRIES = int(os.environ.get("CORVA_CACHE_MAX_ENTRIES", "2000"))
+CORVA_CACHE_NEGATIVE_TTL = float(os.environ.get("CORVA_CACHE_NEGATIVE_TTL", "30"))
+# Tiempo máximo que un request espera la llamada en curso de otro antes de ir upstream
+CORVA_CACHE_WAIT_SECONDS = float(os.environ.get("CORVA_CACHE_WAIT_SECONDS", "35"))
+
+# (fragmento de endpoint, clase) - se evalúan en orden, gana el primero que coincide
+ENDPOINT_CLASSES = [
+    ("/data/corva/wits", "wits"),
+    ("/data/ypf/kpi", "kpis"),
+    ("/data/corva/metrics", "metrics"),
+    ("/data/corva/operations", "operations"),
+    ("/data/corva/assets", "assets"),
+    ("/alerts", "alerts"),
+    ("/rigs", "assets"),
+    ("/wells", "assets"),
+]
+
+CLASS_TTL_SECONDS = {
+    "wits": float(os.environ.get("CORVA_CACHE_TTL_WITS", "15")),
+    "kpis": float(os.environ.get("CORVA_CACHE_TTL_KPIS", "300")),
+    "metrics": float(os.environ.get("CORVA_CACHE_TTL_METRICS", "120")),
+    "operations": float(os.environ.get("CORVA_CACHE_TTL_OPERATIONS", "60")),
+    "assets": float(os.environ.get("CORVA_CACHE_TTL_ASSETS", "300")),
+    "alerts": float(os.environ.get("CORVA_CACHE_TTL_ALERTS", "30")),
+    "default": float(os.environ.get("CORVA_CACHE_TTL_DEFAULT", "30")),
+}
+
+
+def endpoint_class(endpoint: str) -> str:
+    for fragment, name in ENDPOINT_CLASSES:
+        if fragment in endpoint:
+            return name
+    return "default"
+
+
+def _normalize_param(value: Any) -> Any:
+    # Los filtros de Corva llegan como JSON serializado: se re-serializan con claves ordenadas
+    if isinstance(value, str) and value[:1] in ("{", "["):
+        try:
+            return json.dumps(json.loads(value), sort_keys=True)
+        except ValueError:
+            return value
+    return value
+
+
+def make_cache_key(url: str, params: Optional[Dict]) -> str:
+    normalized = {str(k): _normalize_param(v) for k, v in (params or {}).items() if v is not None}
+    return f"{url}?{json.dumps(normalized, sort_keys=True, default=str)}"
+
+
+def is_empty_response(data: Any) -> bool:
+    """Respuestas sin datos (se cachean como negativas)"""
+    if data is None or data == [] or data == {}:
+        return True
+    return isinstance(data, dict) and "data" in data and not data["data"] and "error" not in data
+
+
+def copy_response(value: Any) -> Any:
+    """Copia profunda de una respuesta JSON (dict/list anidados); otros tipos con deepcopy"""
+    if isinstance(value, dict):
+        return {k: copy_response(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [copy_response(v) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return copy.deepcopy(value)
+
+
+class _CachedError:
+    """
+    Error cacheado sin la instancia original: re-lanzar la misma excepción desde varios
+    hilos comparte (y va alargando) su __traceback__ y su contexto
+    """
+    __slots__ = ("type", "args", "state")
+
+    def __init__(self, error: BaseException):
+        self.type = type(error)
+        self.args = error.args
+        self.state = dict(getattr(error, "__dict__", {}))
+
+    def build(self) -> BaseException:
+        error = self.type.__new__(self.type, *self.args)
+        error.args = self.args
+        if self.state:
+            error.__dict__.update(self.state)
+        return error
+
+
+class _Flight:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[_CachedError] = None
+
+
+class CorvaResponseCache:
+    """
+    Cache LRU con TTL y singleflight. Guarda tanto resultados como errores
+    cacheables (p. ej. 404) para re-lanzarlos sin ir upstream.
+    """
+
+    def __init__(self, max_entries: int = CORVA_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any, Optional[_CachedError]]]" = OrderedDict()
+        self._inflight: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.counters = {
+            "requests": 0,
+            "hits": 0,
+            "negative_hits": 0,
+            "coalesced": 0,
+            "upstream_calls": 0,
+            "upstream_errors": 0,
+            "evictions": 0,
+        }
+        self.upstream_by_class: Dict[str, int] = {}
+
+    def _lookup(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, ttl: float, result: Any, error: Optional[_CachedError]) -> None:
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, result, error)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    @staticmethod
+    def _deliver(result: Any, error: Optional[_CachedError]) -> Any:
+        if error is not None:
+            raise error.build()
+        return copy_response(result)
+
+    def get_or_fetch(self, key: str, ttl: float, fetch: Callable[[], Any],
+                     cls: str = "default",
+                     negative_ttl: float = CORVA_CACHE_NEGATIVE_TTL,
+                     is_negative_error: Callable[[BaseException], bool] = lambda e: False) -> Any:
+        """
+        Devuelve la respuesta cacheada o ejecuta `fetch` una sola vez por clave,
+        aunque lleguen varios requests idénticos en paralelo.
+        """
+        with self._lock:
+            self.counters["requests"] += 1
+            entry = self._lookup(key)
+            if entry is not None:
+                _, result, error = entry
+                self.counters["hits"] += 1
+                if error is not None or is_empty_response(result):
+                    self.counters["negative_hits"] += 1
+                return self._deliver(result, error)
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+            else:
+                self.counters["coalesced"] += 1
+
+        if not leader:
+            if flight.event.wait(CORVA_CACHE_WAIT_SECONDS):
+                return self._deliver(flight.result, flight.error)
+            # La llamada líder se colgó: seguir por cuenta propia sin cachear
+            return fetch()
+
+        try:
+            with self._lock:
+                self.counters["upstream_calls"] += 1
+                self.upstream_by_class[cls] = self.upstream_by_class.get(cls, 0) + 1
+            try:
+                flight.result = fetch()
+            except BaseException as e:
+                flight.error = _CachedError(e)
+                with self._lock:
+                    self.counters["upstream_errors"] += 1
+                    if is_negative_error(e):
+                        self._store(key, min(ttl, negative_ttl), None, flight.error)
+                raise
+            with self._lock:
+                store_ttl = min(ttl, negative_ttl) if is_empty_response(flight.result) else ttl
+                self._store(key, store_ttl, flight.result, None)
+            return copy_response(flight.result)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def peek(self, key: str) -> Tuple[bool, Any]:
+        """
+        Consulta sin singleflight (para el cliente async, que no puede bloquear el loop).
+        Returns: (encontrado, respuesta); re-lanza errores cacheados.
+        """
+        with self._lock:
+            self.counters["requests"] += 1
+            entry = self._lookup(key)
+            if entry is None:
+                return False, None
+            _, result, error = entry
+            self.counters["hits"] += 1
+            if error is not None or is_empty_response(result):
+                self.counters["negative_hits"] += 1
+        return True, self._deliver(result, error)
+
+    def put(self, key: str, ttl: float, result: Any, cls: str = "default",
+            negative_ttl: float = CORVA_CACHE_NEGATIVE_TTL) -> None:
+        """Registra una respuesta obtenida fuera de get_or_fetch (se guarda una copia: el llamador sigue con la suya)"""
+        result = copy_response(result)
+        with self._lock:
+            self.counters["upstream_calls"] += 1
+            self.upstream_by_class[cls] = self.upstream_by_class.get(cls, 0) + 1
+            store_ttl = min(ttl, negative_ttl) if is_empty_response(result) else ttl
+            self._store(key, store_ttl, result, None)
+
+    def invalidate(self, prefix: str = "") -> int:
+        """Elimina las entradas cuya clave empieza con `prefix` (todas si es vacío)"""
+        with self._lock:
+            keys = [k for k in self._entries if k.startswith(prefix)]
+            for k in keys:
+                del self._entries[k]
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            entries = len(self._entries)
+            inflight = len(self._inflight)
+            by_class = dict(self.upstream_by_class)
+        requests = counters["requests"]
+        return {
+            "enabled": CORVA_CACHE_ENABLED,
+            "entries": entries,
+            "inflight": inflight,
+            **counters,
+            "hit_ratio": round(counters["hits"] / requests, 3) if requests else 0.0,
+            "upstream_saved_ratio": round(1 - counters["upstream_calls"] / requests, 3) if requests else 0.0,
+            "upstream_by_class": by_class,
+            "ttl_seconds": CLASS_TTL_SECONDS,
+        }
+
+
+_response_cache = CorvaResponseCache()
+
+
+def get_response_cache() -> CorvaResponseCache:
+    return _response_cache
+
+
+def get_corva_cache_stats() -> Dict[str, Any]:
+    return _response_cache.stats()
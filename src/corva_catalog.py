@@ -0,0 +1,390 @@
+"""
+Catálogo de assets de Corva compartido por todo el proceso
+===========================================================
+
+Antes cada consulta a Corva descargaba hasta 1000 assets de la compañía 375
+(1-3 s por pregunta). Este módulo los carga una vez, los refresca en segundo
+plano cada CORVA_CATALOG_REFRESH_MINUTES y, si Corva no responde, sigue
+sirviendo la última copia buena (stale).
+
+Los campos usados para filtrar y ordenar (last_active_at, nombres, ids) se
+guardan como columnas pandas/numpy para que el filtro de actividad reciente y
+el bonus de recencia se calculen vectorizados sobre una ventana configurable.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+import pandas as pd
+
+from src.corva_asset_index import AssetNameIndex
+
+CORVA_CATALOG_REFRESH_MINUTES = float(os.environ.get("CORVA_CATALOG_REFRESH_MINUTES", "10"))
+CORVA_ACTIVE_WINDOW_DAYS = int(os.environ.get("CORVA_ACTIVE_WINDOW_DAYS", "90"))
+CORVA_COMPANY_ID = int(os.environ.get("CORVA_COMPANY_ID", "375"))
+CORVA_CATALOG_PAGE_LIMIT = 1000
+
+# Assets activos en los últimos N días reciben +5 de prioridad
+VERY_RECENT_DAYS = 7
+
+
+def resolve_cutoff(cutoff_date: Optional[str] = None) -> datetime:
+    """
+    Fecha de corte de actividad: la explícita (YYYY-MM-DD) o hoy - CORVA_ACTIVE_WINDOW_DAYS
+    """
+    if cutoff_date:
+        return datetime.strptime(cutoff_date, "%Y-%m-%d")
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=CORVA_ACTIVE_WINDOW_DAYS)
+
+
+def _parse_last_active(value) -> Optional[datetime]:
+    """Misma interpretación de fechas que filter_by_recent_activity"""
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        if "T" in value:
+            return datetime.fromisoformat(value.replace("Z", "").split(".")[0])
+        return datetime.strptime(value[:10], "%Y-%m-%d")
+    except Exception:
+        return None
+
+
+def _build_candidate(asset: Dict) -> Optional[Dict]:
+    """
+    Candidato de búsqueda a partir del asset crudo (misma forma que
+    search_asset_by_name usaba al construir candidate_assets)
+    """
+    asset_name_field = (asset.get("name") or
+                        asset.get("asset_name") or
+                        asset.get("data", {}).get("name", ""))
+    rig_name_field = (asset.get("rig") or {}).get("name", "")
+    asset_id = (asset.get("id") or
+                asset.get("asset_id") or
+                asset.get("_id", ""))
+    if not asset_id:
+        return None
+
+    final_name = asset_name_field
+    if not asset_name_field and rig_name_field:
+        final_name = rig_name_field
+    elif asset_name_field and rig_name_field:
+        final_name = f"{asset_name_field} (Rig: {rig_name_field})"
+    if not final_name:
+        return None
+
+    # ID correcto para KPIs: el del active_child si existe
+    kpi_asset_id = asset_id
+    active_child = asset.get("active_child")
+    if active_child and isinstance(active_child, dict) and active_child.get("id"):
+        kpi_asset_id = active_child.get("id")
+
+    return {
+        "id": str(kpi_asset_id),
+        "original_id": str(asset_id),
+        "attributes": {"name": final_name},
+        "well_name": asset_name_field or "",
+        "rig_name": rig_name_field or "",
+        "last_active_at": asset.get("last_active_at", "N/A"),
+    }
+
+
+class CorvaAssetCatalog:
+    """
+    Catálogo en memoria de assets de Corva con TTL y refresco en segundo plano.
+
+    - `raw_assets`: respuesta cruda del endpoint (para info detallada)
+    - `frame`: DataFrame con una fila por candidato válido
+    - `candidates`: lista de dicts de candidatos, alineada con `frame`
+    - `name_index`: índice de nombres (AssetNameIndex) sobre `candidates`
+    """
+
+    def __init__(self, refresh_minutes: float = CORVA_CATALOG_REFRESH_MINUTES, fetch_fn=None):
+        self.refresh_seconds = refresh_minutes * 60
+        self._fetch_fn = fetch_fn or self._fetch_from_corva
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._refresh_listeners = []
+        self._thread = None
+        self._stop = threading.Event()
+
+        self.raw_assets: List[Dict] = []
+        self.raw_by_id: Dict[str, Dict] = {}
+        self.candidates: List[Dict] = []
+        self.name_index: Optional[AssetNameIndex] = None
+        self.frame = pd.DataFrame()
+        self._last_active = np.array([], dtype="datetime64[s]")
+
+        self.loaded_at: Optional[float] = None
+        self.version = 0
+        self.refresh_count = 0
+        self.refresh_errors = 0
+        self.last_error: Optional[str] = None
+        self.last_refresh_seconds: Optional[float] = None
+
+    # ===============================
+    # CARGA Y REFRESCO
+    # ===============================
+
+    @staticmethod
+    def _fetch_from_corva() -> List[Dict]:
+        # Import diferido: corva_tool importa este módulo
+        from src.corva_tool import make_corva_request_fixed, CORVA_ASSETS_URL, CORVA_BASE_URL_DATA
+
+        params = {
+            "limit": CORVA_CATALOG_PAGE_LIMIT,
+            "query": json.dumps({"company_id": CORVA_COMPANY_ID}),
+            "sort": json.dumps({"name": 1}),
+            "skip": 0
+        }
+        # El catálogo ya es un cache: cada refresco va directo a Corva
+        data = make_corva_request_fixed(CORVA_ASSETS_URL, params=params, base_url=CORVA_BASE_URL_DATA,
+                                        use_cache=False)
+        if isinstance(data, list):
+            return data
+        if isinstance(data, dict):
+            if "error" in data:
+                raise ValueError(data["error"])
+            return data.get("data", data.get("results", []))
+        raise ValueError(f"Formato de respuesta inesperado: {type(data)}")
+
+    def add_refresh_listener(self, listener) -> None:
+        """
+        Registra una función `listener(catalog)` que se ejecuta tras cada refresco
+        exitoso (índices derivados, invalidación de caches, etc.)
+        """
+        self._refresh_listeners.append(listener)
+        if self.loaded_at is not None:
+            listener(self)
+
+    def refresh(self) -> bool:
+        """
+        Descarga el catálogo y reemplaza la copia en memoria. Si falla se conserva
+        la copia anterior (stale) y se registra el error.
+        """
+        with self._refresh_lock:
+            t0 = time.perf_counter()
+            try:
+                assets = self._fetch_fn()
+                if not assets and self.raw_assets:
+                    raise ValueError("Corva devolvió un catálogo vacío")
+                self._load(assets or [])
+                self.refresh_count += 1
+                self.last_error = None
+                self.last_refresh_seconds = time.perf_counter() - t0
+                print(f"✅ Catálogo Corva actualizado: {len(self.candidates)} assets en {self.last_refresh_seconds:.2f}s")
+            except Exception as e:
+                self.refresh_errors += 1
+                self.last_error = str(e)
+                if self.raw_assets:
+                    print(f"⚠️ Falló el refresco del catálogo Corva, se sirve copia de hace {self.age_seconds():.0f}s: {e}")
+                else:
+                    print(f"❌ No se pudo cargar el catálogo Corva: {e}")
+                return False
+
+        for listener in list(self._refresh_listeners):
+            try:
+                listener(self)
+            except Exception as e:
+                print(f"⚠️ Error en listener de refresco del catálogo: {e}")
+        return True
+
+    def _load(self, assets: List[Dict]) -> None:
+        candidates, raw_by_id, last_active = [], {}, []
+        for asset in assets:
+            if not asset or not isinstance(asset, dict):
+                continue
+            raw_id = asset.get("id") or asset.get("asset_id") or asset.get("_id")
+            if raw_id:
+                raw_by_id[str(raw_id)] = asset
+            candidate = _build_candidate(asset)
+            if candidate is None:
+                continue
+            candidates.append(candidate)
+            last_active.append(_parse_last_active(
+                asset.get("last_active_at") or asset.get("data", {}).get("last_active_at")
+            ))
+
+        frame = pd.DataFrame({
+            "id": [c["id"] for c in candidates],
+            "original_id": [c["original_id"] for c in candidates],
+            "name": [c["attributes"]["name"] for c in candidates],
+            "well_name": [c["well_name"] for c in candidates],
+            "rig_name": [c["rig_name"] for c in candidates],
+            "last_active_at": pd.to_datetime(last_active),
+        })
+        last_active_values = frame["last_active_at"].values.astype("datetime64[s]")
+
+        # El índice se construye antes del swap para que nunca quede desalineado con `candidates`
+        try:
+            name_index = AssetNameIndex.build(candidates)
+        except Exception as e:
+            print(f"⚠️ No se pudo construir el índice de nombres, se usará recorrido completo: {e}")
+            name_index = None
+
+        # Reemplazo atómico de todas las estructuras
+        with self._lock:
+            self.raw_assets = assets
+            self.raw_by_id = raw_by_id
+            self.candidates = candidates
+            self.name_index = name_index
+            self.frame = frame
+            self._last_active = last_active_values
+            self.loaded_at = time.time()
+            self.version += 1
+
+    def ensure_loaded(self) -> None:
+        """
+        Carga sincrónica la primera vez; luego solo arranca el refresco en segundo plano.
+        Lanza ValueError si nunca se pudo cargar.
+        """
+        if self.loaded_at is None:
+            self._refresh_single_flight(lambda: self.loaded_at is None)
+            if self.loaded_at is None:
+                raise ValueError(self.last_error or "Catálogo Corva no disponible")
+        elif self.age_seconds() > 2 * self.refresh_seconds and not self._thread_alive():
+            # Sin hilo de refresco (p. ej. tras un fork): refrescar en línea
+            self._refresh_single_flight(lambda: self.age_seconds() > 2 * self.refresh_seconds)
+        self.start_background_refresh()
+
+    def _refresh_single_flight(self, needed) -> None:
+        """
+        Refresco en línea compartido: un solo hilo descarga el catálogo y los que
+        esperaban reusan ese intento (exitoso o fallido) en lugar de repetirlo.
+        """
+        attempts = self.refresh_count + self.refresh_errors
+        with self._load_lock:
+            if needed() and self.refresh_count + self.refresh_errors == attempts:
+                self.refresh()
+
+    def _thread_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start_background_refresh(self) -> None:
+        if self._thread_alive():
+            return
+
+        def refresh_loop():
+            while not self._stop.wait(self.refresh_seconds):
+                self.refresh()
+
+        self._thread = threading.Thread(target=refresh_loop, name="corva-catalog-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    # ===============================
+    # CONSULTAS VECTORIZADAS
+    # ===============================
+
+    def recent_mask(self, cutoff: datetime) -> np.ndarray:
+        """Assets con actividad desde `cutoff` (NaT nunca pasa el filtro)"""
+        return self._last_active >= np.datetime64(cutoff, "s")
+
+    def recency_bonus(self, cutoff: datetime, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Bonus de recencia (0-15) por asset:
+        hasta +10 proporcional a los días transcurridos desde el corte dentro de la
+        ventana, y +5 si estuvo activo en los últimos VERY_RECENT_DAYS días.
+        """
+        last_active = self._last_active if mask is None else self._last_active[mask]
+        now = np.datetime64(datetime.now(), "s")
+        window_days = max((datetime.now() - cutoff).days, 1)
+
+        days_since_cutoff = (last_active - np.datetime64(cutoff, "s")).astype("float64") / 86400.0
+        days_since_cutoff = np.nan_to_num(days_since_cutoff, nan=-1.0)
+        bonus = np.where(days_since_cutoff >= 0, np.minimum(10.0, days_since_cutoff / (window_days / 10.0)), 0.0)
+
+        days_ago = (now - last_active).astype("float64") / 86400.0
+        very_recent = (days_since_cutoff >= 0) & (days_ago <= VERY_RECENT_DAYS)
+        return bonus + np.where(very_recent, 5.0, 0.0)
+
+    def search_snapshot(self, cutoff_date: Optional[str] = None):
+        """
+        Vista consistente del catálogo para búsqueda por nombre.
+
+        Returns:
+            (candidatos, máscara de activos recientes, bonus por posición, índice de nombres o None)
+        """
+        cutoff = resolve_cutoff(cutoff_date)
+        with self._lock:
+            mask = self.recent_mask(cutoff)
+            bonus = self.recency_bonus(cutoff)
+            return self.candidates, mask, bonus, self.name_index
+
+    def active_candidates(self, since: datetime) -> List[Dict]:
+        """Candidatos con actividad desde `since` (p. ej. equipos operando ahora)"""
+        with self._lock:
+            mask = self.recent_mask(since)
+            return [candidate for candidate, active in zip(self.candidates, mask) if active]
+
+    def recent_frame(self, cutoff_date: Optional[str] = None) -> pd.DataFrame:
+        """DataFrame de assets activos desde el corte, más recientes primero"""
+        cutoff = resolve_cutoff(cutoff_date)
+        with self._lock:
+            mask = self.recent_mask(cutoff)
+            frame = self.frame[mask].copy()
+        frame["days_since_cutoff"] = (frame["last_active_at"] - cutoff).dt.days
+        return frame.sort_values("last_active_at", ascending=False)
+
+    def get_raw_asset(self, *asset_ids) -> Optional[Dict]:
+        for asset_id in asset_ids:
+            if asset_id is not None and str(asset_id) in self.raw_by_id:
+                return self.raw_by_id[str(asset_id)]
+        return None
+
+    # ===============================
+    # MÉTRICAS
+    # ===============================
+
+    def age_seconds(self) -> Optional[float]:
+        return None if self.loaded_at is None else time.time() - self.loaded_at
+
+    def stats(self) -> Dict[str, Any]:
+        age = self.age_seconds()
+        return {
+            "loaded": self.loaded_at is not None,
+            "assets": len(self.candidates),
+            "raw_assets": len(self.raw_assets),
+            "version": self.version,
+            "age_seconds": round(age, 1) if age is not None else None,
+            "stale": age is not None and age > 2 * self.refresh_seconds,
+            "refresh_interval_seconds": self.refresh_seconds,
+            "refresh_count": self.refresh_count,
+            "refresh_errors": self.refresh_errors,
+            "last_refresh_seconds": self.last_refresh_seconds,
+            "last_error": self.last_error,
+            "active_window_days": CORVA_ACTIVE_WINDOW_DAYS,
+            "name_index": self.name_index is not None,
+        }
+
+
+_catalog: Optional[CorvaAssetCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_asset_catalog() -> CorvaAssetCatalog:
+    """
+    Catálogo singleton del proceso, cargado (y con refresco en segundo plano) al primer uso
+    """
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = CorvaAssetCatalog()
+    _catalog.ensure_loaded()
+    return _catalog
+
+
+def get_catalog_stats() -> Dict[str, Any]:
+    """Métricas del catálogo sin forzar su carga"""
+    if _catalog is None:
+        return {"loaded": False}
+    return _catalog.stats()
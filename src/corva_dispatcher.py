@@ -0,0 +1,319 @@
+"""
+Dispatcher de consultas Corva (fast path determinístico)
+========================================================
+
+Una pregunta a Corva pasaba por tres saltos de LLM en serie: selección de tool
+del agente Agno, respuesta del agente, y el re-render de corva_call con
+corva_prompt. Para la mayoría del tráfico (profundidad, ROP, métricas,
+operaciones y KPIs de un asset nombrado) la tool correcta ya se deduce por
+palabras clave:
+
+1. intent_confidence() puntúa la pregunta con INTENT_KEYWORDS de corva_tool.
+2. Si la confianza supera CORVA_FAST_PATH_MIN_INTENT_CONFIDENCE y el asset se
+   resuelve como "exact" (alias, alta confianza o validado por LLM), se llama
+   directamente al endpoint de Corva.
+3. La respuesta se arma con un template (respuestas numéricas simples, 0 LLM)
+   o con una sola pasada de render.
+4. En cualquier otro caso se delega en el agente, como antes.
+
+Las llamadas al LLM se cuentan por request (contador en un ContextVar que
+incrementan la validación de assets, el agente y el render) y se agregan por
+rama en get_dispatcher_stats() para /metrics.
+"""
+
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.corva_tool import (
+    CORVA_BASE_URL_DATA, DATASET_LABELS,
+    build_dataset_request, build_dataset_result, classify_user_intent, count_llm_call,
+    current_llm_calls, extract_asset_name, format_response_for_agent, get_kpis_workflow,
+    score_user_intent, search_asset_by_name
+)
+from src.corva_resolution_memo import current_corva_session
+from src.corva_wits_poller import get_live_dataset
+from src.prompts.entidades_dict import corrections
+
+CORVA_FAST_PATH_ENABLED = os.environ.get("CORVA_FAST_PATH_ENABLED", "true").lower() == "true"
+CORVA_FAST_PATH_MIN_INTENT_CONFIDENCE = float(os.environ.get("CORVA_FAST_PATH_MIN_INTENT_CONFIDENCE", "0.75"))
+CORVA_FAST_PATH_TEMPLATES = os.environ.get("CORVA_FAST_PATH_TEMPLATES", "true").lower() == "true"
+
+# Intenciones que el fast path sabe resolver ("snapshot" = varios datos de un asset)
+FAST_PATH_INTENTS = ("wits_depth", "wits_summary", "metrics_rop", "operations", "kpis", "snapshot")
+# "rig"/"well" califican al asset ("KPIs del rig DLS 167"), no compiten como intención
+_QUALIFIER_INTENTS = ("rigs", "wells")
+# Comparaciones entre assets: extract_asset_name solo devuelve uno, van al agente
+_MULTI_ASSET_RE = re.compile(r"\b(compar\w*|vs\.?|versus|entre)\b", re.IGNORECASE)
+# corva_prompt pide disculpas si el proceso superó 60 s: eso lo resuelve el render
+TEMPLATE_MAX_SECONDS = 60
+
+BRANCHES = ("fast_template", "fast_render", "agent")
+
+
+# ===============================
+# CONFIANZA DE INTENCIÓN
+# ===============================
+
+def intent_confidence(question: str) -> Tuple[str, List[str], float]:
+    """
+    Returns:
+        (intención, tipos de dato, confianza): la confianza es la fracción de
+        palabras clave encontradas que corresponden a la intención elegida.
+        "conexiones" suma tanto a kpis como a operations, así que queda en 0.5.
+    """
+    scores = score_user_intent(question)
+    for qualifier in _QUALIFIER_INTENTS:
+        scores.pop(qualifier, None)
+    total = sum(len(keywords) for keywords in scores.values())
+    if not total:
+        return "unknown", [], 0.0
+
+    data_types = [data_type for data_type in DATASET_LABELS if data_type in scores]
+    if len(data_types) > 1:
+        intent, chosen = "snapshot", data_types
+    else:
+        intent = classify_user_intent(question)
+        chosen = [intent]
+    hits = sum(len(scores.get(name, [])) for name in chosen)
+    return intent, chosen, round(hits / total, 3)
+
+
+# ===============================
+# NOMBRES PARA TEXT-TO-SPEECH
+# ===============================
+
+_CORRECTIONS_LOWER = {key.lower(): value for key, value in corrections.items()}
+_WELL_NAME_RE = re.compile(r"^(?P<prefix>(?:YPF\.)?(?:[A-Za-z]{1,3}\.)?)(?P<core>[A-Za-z]+)[-\s]?(?P<number>\d+)(?P<suffix>\s*\([a-zA-Z]\))?$")
+_RIG_NAME_RE = re.compile(r"^(?P<core>[A-Za-z&]+)[-\s]?(?P<number>[A-Za-z]?\d+)$")
+_RIG_SPOKEN = {"nbrs": "Nabors", "h&p": "H y P"}
+
+
+def spoken_asset_name(asset_name: str) -> Optional[str]:
+    """
+    Aplica las mismas reglas que corva_prompt:
+    "YPF.Nq.LACh-388(h)" → "LACH 388" → "La Amarga Chica 388" (lista de equivalencias),
+    "NBRS-F103" → "Nabors F103", "H&P-219" → "H y P 219".
+    Devuelve None si el nombre no sigue ninguno de esos formatos (lo resuelve el render).
+    """
+    name = (asset_name or "").split(" (Rig:")[0].strip()
+    match = _WELL_NAME_RE.match(name)
+    if match:
+        core, number = match.group("core"), match.group("number")
+        is_well = bool(match.group("prefix") or match.group("suffix"))
+        equivalent = _CORRECTIONS_LOWER.get(core.lower()) if is_well else None
+        return f"{equivalent or core.upper()} {number}"
+    match = _RIG_NAME_RE.match(name)
+    if match:
+        core = match.group("core")
+        return f"{_RIG_SPOKEN.get(core.lower(), core.upper())} {match.group('number')}"
+    return None
+
+
+def _spoken_number(value: Any) -> Optional[str]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if abs(number) >= 100:
+        return str(int(round(number)))
+    return f"{number:.1f}".replace(".", ",")
+
+
+def _latest_record(result: Dict) -> Dict:
+    data = result.get("results", [])
+    latest = data[0] if isinstance(data, list) and data else data
+    return latest if isinstance(latest, dict) else {}
+
+
+def template_answer(results: List[Dict]) -> Optional[str]:
+    """
+    Respuesta sin LLM para un único valor numérico (profundidad o ROP actual).
+    None si la respuesta necesita redacción.
+    """
+    if len(results) != 1 or not results[0].get("success"):
+        return None
+    result = results[0]
+    name = spoken_asset_name(result.get("asset_name", ""))
+    data_section = _latest_record(result).get("data", {})
+    if not name or not isinstance(data_section, dict):
+        return None
+
+    if result.get("data_type") == "wits_depth":
+        hole_depth = _spoken_number(data_section.get("hole_depth"))
+        bit_depth = _spoken_number(data_section.get("bit_depth"))
+        if hole_depth is None or bit_depth is None:
+            return None
+        return (f"En {name}, la profundidad del pozo es de {hole_depth} pies "
+                f"y el trépano está a {bit_depth} pies.")
+
+    if result.get("data_type") == "wits_summary":
+        rop = _spoken_number(data_section.get("rop_mean"))
+        if rop is None:
+            return None
+        return f"En {name}, la ROP actual es de {rop} pies por hora."
+
+    return None
+
+
+# ===============================
+# FAST PATH
+# ===============================
+
+def _fast_path(question: str) -> Tuple[Optional[List[Dict]], Optional[str]]:
+    """
+    Returns:
+        (resultados, None) si se resolvió sin el agente, (None, motivo) si no
+    """
+    intent, data_types, confidence = intent_confidence(question)
+    if intent not in FAST_PATH_INTENTS:
+        return None, "intent"
+    if confidence < CORVA_FAST_PATH_MIN_INTENT_CONFIDENCE:
+        return None, "low_confidence"
+    if _MULTI_ASSET_RE.search(question):
+        return None, "multi_asset"
+
+    asset_name = extract_asset_name(question)
+    if not asset_name:
+        return None, "no_asset"
+    matches, search_type = search_asset_by_name(asset_name)
+    if search_type != "exact" or len(matches) != 1:
+        return None, "asset_resolution"
+    asset = matches[0]
+    print(f"⚡ FAST PATH Corva: {intent} ({confidence:.2f}) para {asset.get('attributes', {}).get('name', '')}")
+
+    if intent == "kpis":
+        # El asset ya quedó en el memo de alias: la segunda resolución no busca de nuevo
+        return [get_kpis_workflow(question)], None
+
+    from src.corva_async_client import fetch_many_sync
+
+    results, pending, requests_list = [], [], []
+    for data_type in data_types:
+        data = get_live_dataset(data_type, asset.get("id"))
+        if data is not None:
+            results.append(build_dataset_result(data_type, asset, data))
+            continue
+        endpoint, params = build_dataset_request(data_type, asset.get("id"))
+        pending.append(data_type)
+        requests_list.append((endpoint, params, CORVA_BASE_URL_DATA))
+
+    for data_type, data in zip(pending, fetch_many_sync(requests_list)):
+        if isinstance(data, Exception):
+            results.append({"success": False, "error": f"Error al obtener {DATASET_LABELS[data_type]}: {str(data)}"})
+        else:
+            results.append(build_dataset_result(data_type, asset, data))
+    return results, None
+
+
+def dispatch_corva_query(question: str, session_id: Optional[str] = None, user_id: Optional[str] = None,
+                         render: Optional[Callable[[str], str]] = None) -> Dict[str, Any]:
+    """
+    Responde una pregunta de Corva por el fast path o por el agente.
+
+    Args:
+        question: Pregunta del usuario
+        session_id, user_id: Sesión para el memo de assets
+        render: Pasada de LLM que convierte la respuesta de Corva en el texto final
+                (se omite cuando la respuesta sale de un template)
+
+    Returns:
+        {"branch", "intent", "corva_response", "answer", "llm_calls", "fallback_reason"}
+        - answer: texto final (template o render); None si no hubo template ni render
+    """
+    from src.corva_agno_agent import corva_api_query_agnostic
+
+    start = time.perf_counter()
+    counter = [0]
+    counter_token = current_llm_calls.set(counter)
+    session_token = current_corva_session.set(session_id or user_id or current_corva_session.get())
+    intent, fallback_reason, answer = None, "disabled", None
+    try:
+        results = None
+        if CORVA_FAST_PATH_ENABLED:
+            try:
+                intent = intent_confidence(question)[0]
+                results, fallback_reason = _fast_path(question)
+            except Exception as e:
+                print(f"⚠️ Error en fast path Corva, usando agente: {e}")
+                results, fallback_reason = None, "error"
+
+        if results is not None:
+            corva_response = "\n\n".join(format_response_for_agent(result) for result in results)
+            if CORVA_FAST_PATH_TEMPLATES and time.perf_counter() - start < TEMPLATE_MAX_SECONDS:
+                answer = template_answer(results)
+            branch = "fast_template" if answer is not None else "fast_render"
+        else:
+            print(f"🔄 Corva vía agente (motivo: {fallback_reason})")
+            corva_response = corva_api_query_agnostic(question)
+            branch = "agent"
+
+        if answer is None and render is not None:
+            count_llm_call()
+            answer = render(corva_response)
+    finally:
+        current_corva_session.reset(session_token)
+        current_llm_calls.reset(counter_token)
+
+    elapsed = time.perf_counter() - start
+    _stats.record(branch, counter[0], elapsed, fallback_reason if branch == "agent" else None)
+    print(f"📊 Corva {branch}: {counter[0]} llamadas LLM en {elapsed:.2f}s")
+    return {
+        "branch": branch,
+        "intent": intent,
+        "corva_response": corva_response,
+        "answer": answer,
+        "llm_calls": counter[0],
+        "fallback_reason": fallback_reason if branch == "agent" else None,
+    }
+
+
+# ===============================
+# MÉTRICAS
+# ===============================
+
+class _DispatcherStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.branches = {branch: {"requests": 0, "llm_calls": 0, "seconds": 0.0} for branch in BRANCHES}
+        self.fallback_reasons: Dict[str, int] = {}
+
+    def record(self, branch: str, llm_calls: int, seconds: float, fallback_reason: Optional[str]) -> None:
+        with self._lock:
+            entry = self.branches[branch]
+            entry["requests"] += 1
+            entry["llm_calls"] += llm_calls
+            entry["seconds"] += seconds
+            if fallback_reason:
+                self.fallback_reasons[fallback_reason] = self.fallback_reasons.get(fallback_reason, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            branches = {branch: dict(entry) for branch, entry in self.branches.items()}
+            reasons = dict(self.fallback_reasons)
+        total = sum(entry["requests"] for entry in branches.values())
+        fast = branches["fast_template"]["requests"] + branches["fast_render"]["requests"]
+        return {
+            "enabled": CORVA_FAST_PATH_ENABLED,
+            "min_intent_confidence": CORVA_FAST_PATH_MIN_INTENT_CONFIDENCE,
+            "requests": total,
+            "fast_path_ratio": round(fast / total, 3) if total else 0.0,
+            "branches": {
+                branch: {
+                    "requests": entry["requests"],
+                    "avg_llm_calls": round(entry["llm_calls"] / entry["requests"], 2) if entry["requests"] else 0.0,
+                    "avg_seconds": round(entry["seconds"] / entry["requests"], 3) if entry["requests"] else 0.0,
+                }
+                for branch, entry in branches.items()
+            },
+            "fallback_reasons": reasons,
+        }
+
+
+_stats = _DispatcherStats()
+
+
+def get_dispatcher_stats() -> Dict[str, Any]:
+    return _stats.snapshot()
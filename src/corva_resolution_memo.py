@@ -0,0 +1,309 @@
+"""
+Memo de resolución de assets de Corva
+======================================
+
+Cada fetcher de corva_tool re-ejecutaba extract_asset_name → search_asset_by_name
+→ validate_asset_match_with_llm, incluso en repreguntas sobre el mismo equipo
+("y el ROP de ese equipo?"). Dos capas evitan ese trabajo:
+
+1. Sesión: último asset resuelto por sesión. Si la pregunta no nombra un asset
+   (pronombre o elipsis), se reutiliza el anterior.
+2. Alias persistentes: nombre tipeado por el usuario (o mal transcripto por STT)
+   → asset, cargados desde matches de alta confianza o validados por el LLM.
+   Tienen TTL, se guardan en PostgreSQL (migrations/004) y se invalidan cuando el
+   catálogo se refresca y el asset ya no está.
+
+stats() reporta cuántas validaciones con LLM se evitaron.
+"""
+
+import contextvars
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+CORVA_ALIAS_TTL_DAYS = float(os.environ.get("CORVA_ALIAS_TTL_DAYS", "7"))
+CORVA_SESSION_ASSET_TTL_MINUTES = float(os.environ.get("CORVA_SESSION_ASSET_TTL_MINUTES", "30"))
+CORVA_ALIAS_PERSIST = os.environ.get("CORVA_ALIAS_PERSIST", "true").lower() == "true"
+MAX_SESSIONS = 5000
+MAX_ALIASES = 20000
+
+# Sesión del request en curso (la fija CorvaAgnoAgent.process_query)
+current_corva_session: contextvars.ContextVar = contextvars.ContextVar("current_corva_session", default=None)
+
+_ALIAS_NORMALIZE_RE = re.compile(r"[^a-z0-9&]+")
+
+
+def normalize_alias(name: str) -> str:
+    """'DLS 167', 'dls-167' y 'DLS_167' comparten alias"""
+    return _ALIAS_NORMALIZE_RE.sub("", (name or "").lower())
+
+
+class AssetResolutionMemo:
+    """
+    Capas de sesión y de alias, compartidas por todo el proceso
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._aliases: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._persisted_loaded = False
+        self._bound_catalog = None
+        self.counters = {
+            "alias_hits": 0,
+            "alias_misses": 0,
+            "session_carryovers": 0,
+            "llm_validation_calls": 0,
+            "llm_validations_avoided": 0,
+            "searches_avoided": 0,
+            "aliases_learned": 0,
+            "aliases_invalidated": 0,
+        }
+
+    # ===============================
+    # CAPA DE SESIÓN
+    # ===============================
+
+    def remember_session(self, asset_name: str, asset: Dict, session_id: Optional[str] = None) -> None:
+        session_id = session_id or current_corva_session.get()
+        if not session_id:
+            return
+        with self._lock:
+            self._sessions[session_id] = {"asset_name": asset_name, "asset": asset, "at": time.time()}
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+
+    def session_asset_name(self, session_id: Optional[str] = None) -> Optional[str]:
+        """Nombre del último asset resuelto en la sesión (si no venció)"""
+        session_id = session_id or current_corva_session.get()
+        if not session_id:
+            return None
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if not entry:
+                return None
+            if time.time() - entry["at"] > CORVA_SESSION_ASSET_TTL_MINUTES * 60:
+                del self._sessions[session_id]
+                return None
+            self.counters["session_carryovers"] += 1
+            return entry["asset_name"]
+
+    # ===============================
+    # CAPA DE ALIAS
+    # ===============================
+
+    def lookup_alias(self, asset_name: str) -> Optional[Dict]:
+        self._ensure_persisted_loaded()
+        key = normalize_alias(asset_name)
+        with self._lock:
+            entry = self._aliases.get(key)
+            if entry and time.time() - entry["created_at"] > CORVA_ALIAS_TTL_DAYS * 86400:
+                del self._aliases[key]
+                entry = None
+            if entry is None:
+                self.counters["alias_misses"] += 1
+                return None
+            self._aliases.move_to_end(key)
+            entry["hits"] += 1
+            self.counters["alias_hits"] += 1
+            self.counters["searches_avoided"] += 1
+            if entry["source"] == "llm_validated":
+                self.counters["llm_validations_avoided"] += 1
+            return entry["asset"]
+
+    def remember_alias(self, asset_name: str, asset: Dict, source: str) -> None:
+        """
+        Registra un alias a partir de un match confiable
+        (source: "high_confidence" o "llm_validated")
+        """
+        key = normalize_alias(asset_name)
+        if not key or not asset.get("id"):
+            return
+        asset = {k: v for k, v in asset.items() if k not in ("match_score", "match_reason", "priority_score", "match_source")}
+        with self._lock:
+            self._aliases[key] = {"asset": asset, "source": source, "created_at": time.time(), "hits": 0}
+            self._aliases.move_to_end(key)
+            while len(self._aliases) > MAX_ALIASES:
+                self._aliases.popitem(last=False)
+            self.counters["aliases_learned"] += 1
+        self._persist_alias(key, asset, source)
+
+    def record_llm_validation(self) -> None:
+        with self._lock:
+            self.counters["llm_validation_calls"] += 1
+
+    # ===============================
+    # INVALIDACIÓN POR REFRESCO DEL CATÁLOGO
+    # ===============================
+
+    def bind_catalog(self, catalog) -> None:
+        """Registra la invalidación en el catálogo (idempotente)"""
+        if self._bound_catalog is catalog:
+            return
+        self._bound_catalog = catalog
+        catalog.add_refresh_listener(self.on_catalog_refresh)
+
+    def on_catalog_refresh(self, catalog) -> None:
+        """
+        Re-vincula los alias a los candidatos nuevos (last_active_at actualizado)
+        y descarta los de assets que ya no están en el catálogo
+        """
+        by_id = {candidate["id"]: candidate for candidate in catalog.candidates}
+        removed = []
+        with self._lock:
+            for key, entry in list(self._aliases.items()):
+                fresh = by_id.get(entry["asset"].get("id"))
+                if fresh is None:
+                    del self._aliases[key]
+                    removed.append(key)
+                else:
+                    entry["asset"] = fresh
+            for entry in self._sessions.values():
+                fresh = by_id.get(entry["asset"].get("id"))
+                if fresh is not None:
+                    entry["asset"] = fresh
+            self.counters["aliases_invalidated"] += len(removed)
+        if removed:
+            print(f"🧹 Alias de assets invalidados tras refresco del catálogo: {len(removed)}")
+            self._delete_persisted(removed)
+
+    # ===============================
+    # PERSISTENCIA (PostgreSQL)
+    # ===============================
+
+    def _ensure_persisted_loaded(self) -> None:
+        if self._persisted_loaded or not CORVA_ALIAS_PERSIST:
+            return
+        self._persisted_loaded = True
+        conn = _get_connection()
+        if not conn:
+            return
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+            SELECT alias, asset_id, original_id, asset_name, well_name, rig_name, last_active_at,
+                   source, EXTRACT(EPOCH FROM created_at)
+            FROM corva_asset_aliases
+            WHERE created_at > now() - make_interval(days => %s)
+            ORDER BY created_at
+            """, (int(CORVA_ALIAS_TTL_DAYS),))
+            rows = cursor.fetchall()
+            cursor.close()
+            with self._lock:
+                for alias, asset_id, original_id, asset_name, well_name, rig_name, last_active, source, created in rows:
+                    self._aliases.setdefault(alias, {
+                        "asset": {
+                            "id": asset_id,
+                            "original_id": original_id,
+                            "attributes": {"name": asset_name},
+                            "well_name": well_name or "",
+                            "rig_name": rig_name or "",
+                            "last_active_at": last_active or "N/A",
+                        },
+                        "source": source,
+                        "created_at": float(created),
+                        "hits": 0,
+                    })
+            print(f"✅ Alias de assets Corva cargados: {len(rows)}")
+        except Exception as e:
+            conn.rollback()
+            print(f"⚠️ No se pudieron cargar alias de assets: {e}")
+            return
+        finally:
+            conn.close()
+
+        # Los alias persistidos pueden apuntar a assets que ya no están en el catálogo
+        if self._bound_catalog is not None and self._bound_catalog.loaded_at is not None:
+            self.on_catalog_refresh(self._bound_catalog)
+
+    def _persist_alias(self, key: str, asset: Dict, source: str) -> None:
+        if not CORVA_ALIAS_PERSIST:
+            return
+        conn = _get_connection()
+        if not conn:
+            return
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+            INSERT INTO corva_asset_aliases
+                (alias, asset_id, original_id, asset_name, well_name, rig_name, last_active_at, source)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (alias) DO UPDATE SET
+                asset_id = EXCLUDED.asset_id,
+                original_id = EXCLUDED.original_id,
+                asset_name = EXCLUDED.asset_name,
+                well_name = EXCLUDED.well_name,
+                rig_name = EXCLUDED.rig_name,
+                last_active_at = EXCLUDED.last_active_at,
+                source = EXCLUDED.source,
+                created_at = now()
+            """, (
+                key, asset.get("id"), asset.get("original_id"),
+                asset.get("attributes", {}).get("name", ""),
+                asset.get("well_name", ""), asset.get("rig_name", ""),
+                asset.get("last_active_at"), source
+            ))
+            conn.commit()
+            cursor.close()
+        except Exception as e:
+            conn.rollback()
+            print(f"⚠️ No se pudo guardar alias de asset: {e}")
+        finally:
+            conn.close()
+
+    def _delete_persisted(self, keys) -> None:
+        if not CORVA_ALIAS_PERSIST:
+            return
+        conn = _get_connection()
+        if not conn:
+            return
+        try:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM corva_asset_aliases WHERE alias = ANY(%s)", (list(keys),))
+            conn.commit()
+            cursor.close()
+        except Exception as e:
+            conn.rollback()
+            print(f"⚠️ No se pudieron eliminar alias de assets: {e}")
+        finally:
+            conn.close()
+
+    # ===============================
+    # MÉTRICAS
+    # ===============================
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            aliases, sessions = len(self._aliases), len(self._sessions)
+        lookups = counters["alias_hits"] + counters["alias_misses"]
+        return {
+            "aliases": aliases,
+            "sessions": sessions,
+            **counters,
+            "alias_hit_ratio": round(counters["alias_hits"] / lookups, 3) if lookups else 0.0,
+        }
+
+
+def _get_connection():
+    try:
+        from src.postgres_integration import get_postgres_connection
+        return get_postgres_connection()
+    except Exception as e:
+        print(f"⚠️ PostgreSQL no disponible para alias de assets: {e}")
+        return None
+
+
+_memo = AssetResolutionMemo()
+
+
+def get_resolution_memo() -> AssetResolutionMemo:
+    return _memo
+
+
+def get_resolution_stats() -> Dict[str, Any]:
+    return _memo.stats()
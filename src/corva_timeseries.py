@@ -0,0 +1,224 @@
+"""
+Series de tiempo de Corva para el contexto del LLM
+==================================================
+
+Los fetchers de KPIs, métricas ROP, operaciones y fracturamiento devolvían
+listas de registros que format_response_for_agent recortaba a los primeros
+N (perdiendo picos y tendencia) o volcaba con json.dumps (payload enorme y
+lento de tokenizar). Esta capa:
+
+- Pasa los registros a arrays numpy (campos anidados "data.x")
+- Calcula estadísticas (min, max, media, percentiles, pendiente por hora)
+- Agrega por etapa los campos de FRACKING_METRICS_MAP
+- Reduce series largas con LTTB (Largest-Triangle-Three-Buckets) a un
+  presupuesto fijo de puntos, conservando picos y forma de la curva
+
+El texto resultante tiene tamaño acotado por CORVA_TS_MAX_POINTS sin importar
+cuántos registros devuelva Corva.
+"""
+
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+CORVA_TS_MAX_POINTS = int(os.environ.get("CORVA_TS_MAX_POINTS", "20"))
+PERCENTILES = (10, 50, 90)
+
+
+# ===============================
+# REGISTROS → ARRAYS
+# ===============================
+
+def _get_path(record: Dict, path: str) -> Any:
+    value = record
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _to_float(value: Any) -> float:
+    if isinstance(value, bool):
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def records_to_arrays(records: Sequence, fields: Sequence[str],
+                      time_field: str = "timestamp") -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Returns:
+        (tiempos en epoch segundos, {campo: valores}) como float64; los valores
+        faltantes o no numéricos quedan como NaN
+    """
+    rows = [record for record in records or [] if isinstance(record, dict)]
+    times = np.fromiter((_to_float(_get_path(row, time_field)) for row in rows), dtype="float64", count=len(rows))
+    # Corva usa epoch en segundos; algunos endpoints en milisegundos
+    times = np.where(times > 1e11, times / 1000.0, times)
+    values = {
+        field: np.fromiter((_to_float(_get_path(row, field)) for row in rows), dtype="float64", count=len(rows))
+        for field in fields
+    }
+    return times, values
+
+
+# ===============================
+# ESTADÍSTICAS
+# ===============================
+
+def summarize(values: np.ndarray, times: Optional[np.ndarray] = None) -> Optional[Dict[str, float]]:
+    """
+    min, max, media, percentiles y pendiente (unidades por hora, si hay tiempos)
+    """
+    mask = ~np.isnan(values)
+    if not mask.any():
+        return None
+    valid = values[mask]
+    summary = {
+        "count": int(valid.size),
+        "min": float(valid.min()),
+        "max": float(valid.max()),
+        "mean": float(valid.mean()),
+        "sum": float(valid.sum()),
+    }
+    for percentile, value in zip(PERCENTILES, np.percentile(valid, PERCENTILES)):
+        summary[f"p{percentile}"] = float(value)
+
+    if times is not None:
+        time_mask = mask & ~np.isnan(times)
+        if time_mask.sum() >= 2 and np.ptp(times[time_mask]) > 0:
+            hours = (times[time_mask] - times[time_mask].min()) / 3600.0
+            summary["slope_per_hour"] = float(np.polyfit(hours, values[time_mask], 1)[0])
+    return summary
+
+
+def stage_aggregates(stages: np.ndarray, values: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Agrega valores por número de etapa (varias filas de una etapa se suman)
+
+    Returns:
+        {"stage": etapas ordenadas, "value": total por etapa, "rows": filas por etapa}
+    """
+    mask = ~np.isnan(stages) & ~np.isnan(values)
+    unique_stages, inverse = np.unique(stages[mask], return_inverse=True)
+    return {
+        "stage": unique_stages,
+        "value": np.bincount(inverse, weights=values[mask], minlength=unique_stages.size),
+        "rows": np.bincount(inverse, minlength=unique_stages.size),
+    }
+
+
+# ===============================
+# DOWNSAMPLING
+# ===============================
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Índices de los puntos elegidos por LTTB. Siempre incluye el primero y el
+    último; en cada bucket elige el punto que forma el triángulo de mayor
+    área con el punto anterior elegido y el promedio del bucket siguiente.
+    """
+    n = x.size
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    # Bordes de los threshold - 2 buckets intermedios sobre los puntos 1..n-2
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], max(edges[bucket + 1], edges[bucket] + 1)
+        next_start = end
+        next_end = edges[bucket + 2] if bucket + 2 < edges.size else n
+        if next_start >= next_end:
+            next_x, next_y = x[-1], y[-1]
+        else:
+            next_x, next_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def downsample(x: np.ndarray, y: np.ndarray, max_points: int = CORVA_TS_MAX_POINTS) -> Tuple[np.ndarray, np.ndarray]:
+    """Serie (x, y) reducida a max_points con LTTB, ignorando NaN"""
+    mask = ~np.isnan(x) & ~np.isnan(y)
+    x, y = x[mask], y[mask]
+    order = np.argsort(x, kind="stable")
+    x, y = x[order], y[order]
+    indices = lttb_indices(x, y, max_points)
+    return x[indices], y[indices]
+
+
+# ===============================
+# PAYLOAD COMPACTO
+# ===============================
+
+def format_number(value: float, decimals: int = 2) -> str:
+    return f"{value:,.{decimals}f}"
+
+
+def format_summary(summary: Optional[Dict[str, float]], unit: str = "", decimals: int = 2) -> str:
+    """Una línea con las estadísticas de summarize()"""
+    if not summary:
+        return "sin valores numéricos"
+    unit = f" {unit}" if unit else ""
+    parts = [
+        f"n={summary['count']}",
+        f"mín {format_number(summary['min'], decimals)}{unit}",
+        f"máx {format_number(summary['max'], decimals)}{unit}",
+        f"media {format_number(summary['mean'], decimals)}{unit}",
+        "p10/p50/p90 " + "/".join(format_number(summary[f"p{p}"], decimals) for p in PERCENTILES),
+    ]
+    if "slope_per_hour" in summary:
+        parts.append(f"tendencia {summary['slope_per_hour']:+,.{decimals}f}{unit}/h")
+    return ", ".join(parts)
+
+
+def series_points(records: Sequence, value_field: str, time_field: str = "timestamp",
+                  max_points: int = CORVA_TS_MAX_POINTS) -> Tuple[Optional[Dict[str, float]], List[Tuple[float, float]]]:
+    """
+    Estadísticas y puntos representativos (≤ max_points) de un campo de una
+    lista de registros de Corva
+    """
+    times, values = records_to_arrays(records, [value_field], time_field)
+    y = values[value_field]
+    summary = summarize(y, times)
+    if summary is None:
+        return None, []
+    x = times if not np.isnan(times).all() else np.arange(y.size, dtype="float64")
+    px, py = downsample(x, y, max_points)
+    return summary, list(zip(px.tolist(), py.tolist()))
+
+
+def fracking_stage_payload(records: Sequence, max_points: int = CORVA_TS_MAX_POINTS) -> Optional[Dict[str, Any]]:
+    """
+    Agregados por etapa de una métrica de fracturamiento (registros del
+    endpoint /metrics/aggregate/ con data.stage_number y data.value)
+
+    Returns:
+        {"summary", "stages": [(etapa, valor), ...] (≤ max_points, LTTB),
+         "total_stages", "max_stage", "min_stage"} o None si no hay valores
+    """
+    _, values = records_to_arrays(records, ["data.stage_number", "data.value"])
+    aggregated = stage_aggregates(values["data.stage_number"], values["data.value"])
+    if aggregated["stage"].size == 0:
+        return None
+    stage, total = aggregated["stage"], aggregated["value"]
+    summary = summarize(total)
+    px, py = downsample(stage, total, max_points)
+    return {
+        "summary": summary,
+        "stages": [(int(s), float(v)) for s, v in zip(px, py)],
+        "total_stages": int(stage.size),
+        "max_stage": (int(stage[np.argmax(total)]), float(total.max())),
+        "min_stage": (int(stage[np.argmin(total)]), float(total.min())),
+    }
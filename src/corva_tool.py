@@ -13,6 +13,7 @@ import requests
 import json
 import re
 import base64
+import contextvars
 from typing import Dict, List, Optional, Tuple
 from langchain.agents import tool
 from fuzzywuzzy import fuzz
@@ -21,6 +22,17 @@ from langchain_openai import AzureChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from datetime import datetime
+from src.corva_catalog import get_asset_catalog, resolve_cutoff
+from src.corva_asset_index import scan_all
+from src.corva_resolution_memo import get_resolution_memo
+from src.corva_wits_poller import get_live_dataset
+from src.metrics_registry import observe_dependency
+from src.corva_timeseries import (
+    CORVA_TS_MAX_POINTS, fracking_stage_payload, format_summary, records_to_arrays, series_points, summarize
+)
+from src.corva_cache import (
+    CORVA_CACHE_ENABLED, CLASS_TTL_SECONDS, endpoint_class, make_cache_key, get_response_cache
+)
 
 
 # Configuración de la API - ACTUALIZADA PARA APIM YPF
@@ -126,9 +138,47 @@ FRACKING_METRICS_MAP = {
     }
 }
 
+# Llamadas al LLM del request en curso: el dispatcher fija una lista [n] y las
+# funciones que invocan un LLM la incrementan (None fuera del dispatcher)
+current_llm_calls: contextvars.ContextVar = contextvars.ContextVar("current_llm_calls", default=None)
+
+def count_llm_call(calls: int = 1) -> None:
+    counter = current_llm_calls.get()
+    if counter is not None:
+        counter[0] += calls
+
 class CorvaAPIError(Exception):
     """Excepción personalizada para errores de la API de Corva"""
-    pass
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+# Palabras clave para cada intención (las usa classify_user_intent y el dispatcher)
+INTENT_KEYWORDS = {
+    "alerts": ["alerta", "alerts", "alarma", "notificación", "warning"],
+    "rigs": ["rig", "rigs"],
+    "wells": ["well", "wells"],
+    "kpis": ["kpi", "kpis", "performance", "rendimiento", "datos", "conexiones", "operacion"],
+    # NUEVAS INTENCIONES
+    "wits_depth": ["profundidad", "depth", "trepano", "hole_depth", "bit_depth", "profundidad actual"],
+    "wits_summary": ["rop actual", "rop current", "velocidad actual", "drilling rate current"],
+    "metrics_rop": ["rop promedio", "rop horizontal", "rop average", "rop metrics", "velocidad promedio"],
+    "operations": ["conexiones", "connections", "tiempos conexion", "weight to weight", "operaciones", "connection times"],
+    "assets": ["assets", "activos", "listado completo", "todos los rigs", "todos los wells"],
+}
+
+def score_user_intent(user_query: str) -> Dict[str, List[str]]:
+    """
+    Palabras clave encontradas por intención (solo intenciones con al menos una)
+    """
+    query_lower = user_query.lower()
+    scores = {}
+    for intent, keywords in INTENT_KEYWORDS.items():
+        matched = [kw for kw in keywords if kw in query_lower]
+        if matched:
+            scores[intent] = matched
+    return scores
 
 def classify_user_intent(user_query: str) -> str:
     """
@@ -137,52 +187,27 @@ def classify_user_intent(user_query: str) -> str:
     Returns:
         str: "alerts", "rigs", "wells", "kpis", "wits_depth", "wits_summary", "metrics_rop", "operations", "assets", o "unknown"
     """
-    query_lower = user_query.lower()
-    
-    # Palabras clave para cada intención
-    alert_keywords = ["alerta", "alerts", "alarma", "notificación", "warning"]
-    rig_keywords = ["rig","rigs"]
-    well_keywords = ["well", "wells"]
-    kpi_keywords = ["kpi", "kpis", "performance", "rendimiento", "datos", "conexiones", "operacion"]
-    
-    # NUEVAS INTENCIONES
-    depth_keywords = ["profundidad", "depth", "trepano", "hole_depth", "bit_depth", "profundidad actual"]
-    rop_actual_keywords = ["rop actual", "rop current", "velocidad actual", "drilling rate current"]
-    rop_metrics_keywords = ["rop promedio", "rop horizontal", "rop average", "rop metrics", "velocidad promedio"]
-    operations_keywords = ["conexiones", "connections", "tiempos conexion", "weight to weight", "operaciones", "connection times"]
-    assets_keywords = ["assets", "activos", "listado completo", "todos los rigs", "todos los wells"]
+    scores = score_user_intent(user_query)
     
     # Verificar nuevas intenciones primero (más específicas)
-    if any(kw in query_lower for kw in depth_keywords):
-        return "wits_depth"
-    
-    if any(kw in query_lower for kw in rop_actual_keywords):
-        return "wits_summary"
-        
-    if any(kw in query_lower for kw in rop_metrics_keywords):
-        return "metrics_rop"
-        
-    if any(kw in query_lower for kw in operations_keywords):
-        return "operations"
-    
-    if any(kw in query_lower for kw in assets_keywords):
-        return "assets"
+    for intent in ("wits_depth", "wits_summary", "metrics_rop", "operations", "assets"):
+        if intent in scores:
+            return intent
     
     # Verificar KPIs (mantener lógica original)
-    if any(kw in query_lower for kw in kpi_keywords):
-        if any(kw in query_lower for kw in rig_keywords + well_keywords):
-            return "kpis"
+    if "kpis" in scores and ("rigs" in scores or "wells" in scores):
+        return "kpis"
     
     # Verificar alertas
-    if any(kw in query_lower for kw in alert_keywords):
+    if "alerts" in scores:
         return "alerts"
     
     # Verificar rigs generales
-    if any(kw in query_lower for kw in rig_keywords) and not any(kw in query_lower for kw in kpi_keywords):
+    if "rigs" in scores and "kpis" not in scores:
         return "rigs"
     
     # Verificar wells generales  
-    if any(kw in query_lower for kw in well_keywords) and not any(kw in query_lower for kw in kpi_keywords):
+    if "wells" in scores and "kpis" not in scores:
         return "wells"
     
     return "unknown"
@@ -284,6 +309,12 @@ def extract_asset_name(user_query: str) -> Optional[str]:
                 print(f"🔍 DEBUG EXTRACT - Extraído: '{candidate}' del query: '{user_query}'")
                 return candidate
     
+    # Repregunta sin asset explícito ("y el ROP de ese equipo?"): último asset de la sesión
+    carried = get_resolution_memo().session_asset_name()
+    if carried:
+        print(f"🔁 DEBUG EXTRACT - Sin asset explícito, se reutiliza el de la sesión: '{carried}'")
+        return carried
+    
     print(f"⚠️ DEBUG EXTRACT - No se pudo extraer asset de: '{user_query}'")
     return None
 
@@ -323,15 +354,37 @@ def _is_valid_asset_name(candidate: str, query_lower: str) -> bool:
     
     return has_number or matches_pattern
 
-def make_corva_request_fixed(endpoint: str, params: Dict = None, base_url: str = None) -> Dict:
+def make_corva_request_fixed(endpoint: str, params: Dict = None, base_url: str = None,
+                             use_cache: bool = True) -> Dict:
     """
-    Versión simplificada que usa solo autenticación APIM YPF
+    Versión simplificada que usa solo autenticación APIM YPF.
+
+    Las respuestas se cachean por (endpoint, params) con TTL según la clase de
+    endpoint y los requests idénticos concurrentes comparten una sola llamada
+    (ver src/corva_cache.py). Cada llamada recibe su propia copia de la respuesta cacheada.
     """
     if base_url is None:
         base_url = CORVA_BASE_URL_DATA
 
     url = f"{base_url}{endpoint}"
-   
+
+    if not (use_cache and CORVA_CACHE_ENABLED):
+        return _request_corva(url, params)
+
+    cls = endpoint_class(endpoint)
+    return get_response_cache().get_or_fetch(
+        make_cache_key(url, params),
+        CLASS_TTL_SECONDS[cls],
+        lambda: _request_corva(url, params),
+        cls=cls,
+        is_negative_error=lambda e: isinstance(e, CorvaAPIError) and e.status_code == 404
+    )
+
+
+def _request_corva(url: str, params: Dict = None) -> Dict:
+    """
+    Llamada HTTP a Corva (sin cache)
+    """
     auth_credential = os.getenv("APIM_AUTH_CREDENTIAL")
     if not auth_credential:
         raise CorvaAPIError("APIM_AUTH_CREDENTIAL no configurada")
@@ -347,7 +400,8 @@ def make_corva_request_fixed(endpoint: str, params: Dict = None, base_url: str =
         print(f"🔍 DEBUG - URL: {url}")
         print(f"🔍 DEBUG - Headers: {headers}")
         
-        response = requests.get(url, headers=headers, params=params, timeout=30)
+        with observe_dependency("corva", "rest"):
+            response = requests.get(url, headers=headers, params=params, timeout=30)
         
         print(f"🔍 DEBUG - Status Code: {response.status_code}")
         print(f"🔍 DEBUG - Content-Type: {response.headers.get('content-type', 'N/A')}")
@@ -392,8 +446,10 @@ def make_corva_request_fixed(endpoint: str, params: Dict = None, base_url: str =
         else:
             print(f"❌ Error HTTP {response.status_code}")
             print(f"🔍 DEBUG - Response: {response.text}")
-            raise CorvaAPIError(f"Error HTTP {response.status_code}: {response.text}")
+            raise CorvaAPIError(f"Error HTTP {response.status_code}: {response.text}", status_code=response.status_code)
             
+    except CorvaAPIError:
+        raise
     except requests.exceptions.RequestException as e:
         print(f"❌ Error de conexión: {str(e)}")
         raise CorvaAPIError(f"Error de conexión: {str(e)}")
@@ -402,232 +458,76 @@ def make_corva_request_fixed(endpoint: str, params: Dict = None, base_url: str =
         raise CorvaAPIError(f"Error inesperado: {str(e)}")
 
 
-def search_asset_by_name(asset_name: str, cutoff_date: str = "2025-07-01") -> Tuple[List[Dict], str]:
+def search_asset_by_name(asset_name: str, cutoff_date: Optional[str] = None) -> Tuple[List[Dict], str]:
     """
     FUNCIÓN COMPLETA CON PRIORIDAD POR RECENCIA - Búsqueda de assets con matching preciso y validación LLM
     
     Args:
         asset_name: Nombre del asset a buscar
-        cutoff_date: Filtrar assets activos desde esta fecha (YYYY-MM-DD)
+        cutoff_date: Filtrar assets activos desde esta fecha (YYYY-MM-DD).
+                     Por defecto: hoy - CORVA_ACTIVE_WINDOW_DAYS
         
     Returns:
         Tuple[List[Dict], str]: (lista_assets, tipo_resultado)
         - tipo_resultado: "exact" (match exacto), "partial" (requiere validación), "none" (sin matches), "error"
     """
     try:
-        # 1. OBTENER DATOS DE LA API
-        params = {
-            "limit": 1000,
-            "query": json.dumps({"company_id": 375}),
-            "sort": json.dumps({"name": 1}),
-            "skip": 0
-        }
+        # 1. CATÁLOGO COMPARTIDO (cacheado y refrescado en segundo plano)
+        catalog = get_asset_catalog()
         
-        data = make_corva_request_fixed(CORVA_ASSETS_URL, params=params, base_url=CORVA_BASE_URL_DATA)
-        
-        # Normalizar respuesta
-        if isinstance(data, list):
-            assets = data
-        elif isinstance(data, dict):
-            assets = data.get("data", data.get("results", []))
-        else:
-            print(f"🔍 DEBUG - Tipo de data inesperado: {type(data)}")
-            return [], "error"
-        
-        if not assets:
-            print("🔍 DEBUG - No se encontraron assets en la respuesta")
+        if not catalog.candidates:
+            print("🔍 DEBUG - No se encontraron assets en el catálogo")
             return [], "none"
         
-        print(f"🔍 DEBUG SEARCH - Assets totales encontrados: {len(assets)}")
-        
-        # 2. FILTRAR POR FECHA RECIENTE
-        recent_assets = []
-        for asset in assets:
-            if asset and isinstance(asset, dict):
-                if filter_by_recent_activity(asset, cutoff_date):
-                    recent_assets.append(asset)
-        
-        print(f"🔍 DEBUG SEARCH - Assets activos desde {cutoff_date}: {len(recent_assets)} de {len(assets)}")
-        
-        if not recent_assets:
-            print(f"🔍 DEBUG - No se encontraron assets activos desde {cutoff_date}")
+        # ALIAS CONOCIDO: nombre ya resuelto antes (alta confianza o validado por LLM)
+        memo = get_resolution_memo()
+        memo.bind_catalog(catalog)
+        if cutoff_date is None:
+            known_asset = memo.lookup_alias(asset_name)
+            if known_asset:
+                print(f"⚡ Alias conocido: '{asset_name}' → {known_asset.get('attributes', {}).get('name', '')}")
+                memo.remember_session(asset_name, known_asset)
+                return [dict(known_asset)], "exact"
+        
+        # 2-3. FILTRAR POR FECHA RECIENTE (vectorizado) Y CANDIDATOS YA PREPARADOS
+        candidates, recent_mask, recency_bonus, name_index = catalog.search_snapshot(cutoff_date)
+        cutoff_label = resolve_cutoff(cutoff_date).strftime("%Y-%m-%d")
+        total_recent = int(recent_mask.sum())
+        
+        print(f"🔍 DEBUG SEARCH - Assets activos desde {cutoff_label}: {total_recent} de {len(candidates)} "
+              f"(catálogo de hace {catalog.age_seconds():.0f}s)")
+        
+        if not total_recent:
+            print(f"🔍 DEBUG - No se encontraron assets activos desde {cutoff_label}")
             return [], "none"
         
-        # 3. PREPARAR CANDIDATOS CON INFORMACIÓN COMPLETA
-        candidate_assets = []
-        for asset in recent_assets:
-            if not asset or not isinstance(asset, dict):
-                continue
-            
-            # Extraer nombres
-            asset_name_field = (asset.get("name") or 
-                               asset.get("asset_name") or 
-                               asset.get("data", {}).get("name", ""))
-            
-            rig_name_field = asset.get("rig", {}).get("name", "")
-            
-            asset_id = (asset.get("id") or 
-                       asset.get("asset_id") or 
-                       asset.get("_id", ""))
-            
-            if not asset_id:
-                continue
-            
-            # Determinar nombre final para mostrar
-            final_name = asset_name_field
-            if not asset_name_field and rig_name_field:
-                final_name = rig_name_field
-            elif asset_name_field and rig_name_field:
-                final_name = f"{asset_name_field} (Rig: {rig_name_field})"
-            
-            if not final_name:
-                continue
-            
-            # Determinar ID correcto para KPIs
-            kpi_asset_id = asset_id
-            active_child = asset.get("active_child")
-            if active_child and isinstance(active_child, dict):
-                child_id = active_child.get("id")
-                if child_id:
-                    kpi_asset_id = child_id
-            
-            candidate_assets.append({
-                "id": str(kpi_asset_id),
-                "original_id": str(asset_id),
-                "attributes": {"name": final_name},
-                "well_name": asset_name_field,
-                "rig_name": rig_name_field,
-                "last_active_at": asset.get("last_active_at", "N/A"),
-            })
-        
-        if not candidate_assets:
-            print("🔍 DEBUG - No se encontraron assets válidos después del filtrado")
-            return [], "none"
-        
-        print(f"🔍 DEBUG - Assets válidos después del filtrado: {len(candidate_assets)}")
-        
         # 4. APLICAR LÓGICA DE MATCHING MEJORADA
+        # El índice de nombres genera candidatos (trigramas, números, prefijos) y solo
+        # esos pasan por la cascada de 7 niveles; sin índice se recorre todo el catálogo
         filtered_candidates = []
         search_name_lower = asset_name.lower()
         
         print(f"🔍 DEBUG - Aplicando matching mejorado para: '{search_name_lower}'")
         
-        for asset in candidate_assets:
-            # Obtener nombres para matching
-            name = asset.get("attributes", {}).get("name", "").lower()
-            well_name = asset.get("well_name", "").lower()
-            rig_name = asset.get("rig_name", "").lower()
-            
-            match_found = False
-            match_score = 0
-            match_reason = ""
-            
-            # PRIORIDAD 1: MATCH EXACTO COMPLETO
-            if (search_name_lower == well_name or 
-                search_name_lower == name or 
-                search_name_lower == rig_name):
-                match_found = True
-                match_score = 100
-                match_reason = "exact_complete_match"
-                
-            # PRIORIDAD 2: MATCH EXACTO POR SUBSTRING EN WELL NAME
-            elif well_name and search_name_lower in well_name:
-                match_found = True
-                match_score = 98
-                match_reason = "exact_well_substring"
-                
-            # PRIORIDAD 3: MATCH EXACTO POR SUBSTRING EN NOMBRE COMBINADO
-            elif search_name_lower in name:
-                match_found = True
-                match_score = 95
-                match_reason = "exact_name_substring"
-                
-            # PRIORIDAD 4: FUZZY MATCH ALTO EN WELL NAME
-            elif well_name and fuzz.ratio(search_name_lower, well_name) >= 90:
-                match_score = fuzz.ratio(search_name_lower, well_name)
-                match_found = True
-                match_reason = "fuzzy_well_high"
-                
-            # PRIORIDAD 5: FUZZY MATCH MEDIO EN WELL NAME
-            elif well_name and fuzz.partial_ratio(search_name_lower, well_name) >= 85:
-                match_score = fuzz.partial_ratio(search_name_lower, well_name)
-                match_found = True
-                match_reason = "fuzzy_well_medium"
-                
-            # PRIORIDAD 6: MATCH EN RIG NAME (solo para búsquedas explícitas de rigs)
-            elif (any(keyword in search_name_lower for keyword in ["dls", "nabors", "h&p", "rig", "f35", "t430"]) and 
-                  rig_name and fuzz.partial_ratio(search_name_lower, rig_name) >= 80):
-                match_score = fuzz.partial_ratio(search_name_lower, rig_name)
-                match_found = True
-                match_reason = "rig_explicit_match"
-                
-            # PRIORIDAD 7: MATCH POR COMPONENTES CRÍTICOS (números + letras)
-            elif well_name or name:
-                target_text = well_name if well_name else name
-                
-                # Extraer componentes críticos: combinaciones letra-número
-                search_components = re.findall(r'[a-zA-Z]+[-.]?\d+(?:\([a-zA-Z]\))?', search_name_lower)
-                target_components = re.findall(r'[a-zA-Z]+[-.]?\d+(?:\([a-zA-Z]\))?', target_text)
-                
-                if search_components and target_components:
-                    # Buscar matches exactos de componentes
-                    exact_component_matches = sum(1 for search_comp in search_components 
-                                                if any(search_comp in target_comp for target_comp in target_components))
-                    
-                    if exact_component_matches > 0:
-                        match_score = min(90, (exact_component_matches / len(search_components)) * 85 + 10)
-                        if match_score >= 70:
-                            match_found = True
-                            match_reason = "component_critical_match"
-            
-            # Agregar candidato si cumple criterios
-            if match_found and match_score >= 70:  # Umbral mínimo de 70%
-                asset['match_score'] = match_score
-                asset['match_reason'] = match_reason
-                filtered_candidates.append(asset)
-                
-                # Debug del match encontrado
-                display_name = asset.get("well_name", "") or asset.get("attributes", {}).get("name", "")
-                print(f"✅ Match: {display_name} | Score: {match_score:.1f}% | Reason: {match_reason}")
-        
-        # 5. ORDENAR POR RELEVANCIA Y FECHA DE ACTIVIDAD (NUEVA LÓGICA)
-        def calculate_priority_score(candidate):
-            """
-            Calcula score de prioridad combinando match_score y recencia
-            """
-            match_score = candidate.get('match_score', 0)
-            last_active = candidate.get('last_active_at', '')
-            
-            # Score base por matching
-            priority_score = match_score
-            
-            # Bonus por recencia (hasta +15 puntos)
-            try:
-                if last_active and 'T' in last_active:
-                    active_date = datetime.fromisoformat(last_active.replace("Z", "").split(".")[0])
-                    cutoff = datetime.strptime(cutoff_date, "%Y-%m-%d")
-                    
-                    # Días desde cutoff_date
-                    days_since_cutoff = (active_date - cutoff).days
-                    
-                    if days_since_cutoff >= 0:
-                        # Más reciente = más bonus (máximo 10 puntos)
-                        recency_bonus = min(10, days_since_cutoff / 2.4)  # 24 días = 10 puntos
-                        priority_score += recency_bonus
-                        
-                        # Bonus extra para assets muy recientes (últimos 7 días)
-                        if days_since_cutoff >= 17:  # Aproximadamente últimos 7 días desde 2025-07-24
-                            priority_score += 5
-                            
-            except Exception:
-                pass  # Usar solo match_score si hay problemas con fechas
+        if name_index is not None:
+            matches = name_index.search(search_name_lower, allowed=recent_mask)
+        else:
+            matches = [match for match in scan_all(search_name_lower, candidates) if recent_mask[match[0]]]
+        
+        for position, match_score, match_reason in matches:
+            # Copia: los candidatos del catálogo se comparten entre requests
+            asset = dict(candidates[position])
+            asset['match_score'] = match_score
+            asset['match_reason'] = match_reason
+            # Score de prioridad: matching + bonus de recencia (hasta +15 puntos)
+            asset['priority_score'] = match_score + float(recency_bonus[position])
+            filtered_candidates.append(asset)
             
-            return priority_score
-        
-        # Aplicar nuevo score de prioridad
-        for candidate in filtered_candidates:
-            candidate['priority_score'] = calculate_priority_score(candidate)
+            # Debug del match encontrado
+            display_name = asset.get("well_name", "") or asset.get("attributes", {}).get("name", "")
+            print(f"✅ Match: {display_name} | Score: {match_score:.1f}% | Reason: {match_reason}")
         
+        # 5. ORDENAR POR RELEVANCIA Y FECHA DE ACTIVIDAD
         # Ordenar por priority_score (incluye match + recencia)
         filtered_candidates.sort(key=lambda x: x.get('priority_score', 0), reverse=True)
         filtered_candidates = filtered_candidates[:25]
@@ -655,6 +555,9 @@ def search_asset_by_name(asset_name: str, cutoff_date: str = "2025-07-01") -> Tu
         
         if match_type == "exact" and len(validated_assets) == 1:
             print("✅ LLM encontró UN match exacto")
+            exact_asset = validated_assets[0]
+            memo.remember_alias(asset_name, exact_asset, exact_asset.get("match_source", "llm_validated"))
+            memo.remember_session(asset_name, exact_asset)
             return validated_assets, "exact"
         elif validated_assets:
             print(f"⚠️ LLM encontró {len(validated_assets)} matches parciales - requiere validación del usuario")
@@ -708,128 +611,55 @@ def get_rigs() -> Dict:
         return {"success": False, "error": str(e)}
 
 
-def get_assets_general(cutoff_date: str = "2025-07-01") -> Dict:
+def get_assets_general(cutoff_date: Optional[str] = None) -> Dict:
     """
     VERSIÓN MEJORADA - Obtiene assets con filtro de fecha reciente y ordenamiento por recencia
     
-    MEJORAS APLICADAS desde search_asset_by_name:
-    - Mismo sistema de filtrado por fecha
-    - Ordenamiento por recencia (más activos primero)
-    - Debug mejorado con información detallada
-    - Límites y parámetros API consistentes
-    - Información más rica manteniendo formato simple
+    Usa el catálogo compartido (src/corva_catalog.py): sin descarga por request,
+    filtro y ordenamiento por recencia vectorizados.
     
     Args:
-        cutoff_date: Filtrar assets activos desde esta fecha (YYYY-MM-DD)
+        cutoff_date: Filtrar assets activos desde esta fecha (YYYY-MM-DD).
+                     Por defecto: hoy - CORVA_ACTIVE_WINDOW_DAYS
     """
     try:
-        # 1. PARÁMETROS API CONSISTENTES con search_asset_by_name
-        params = {
-            "limit": 1000,  # ✅ CAMBIADO: Mismo que search_asset_by_name
-            "query": json.dumps({"company_id": 375}),
-            "sort": json.dumps({"name": 1}),
-            "skip": 0
-        }
-        
-        data = make_corva_request_fixed(CORVA_ASSETS_URL, params=params, base_url=CORVA_BASE_URL_DATA)
+        catalog = get_asset_catalog()
+        total_assets = len(catalog.candidates)
+        cutoff_label = resolve_cutoff(cutoff_date).strftime("%Y-%m-%d")
         
-        # Manejar respuesta del endpoint
-        if isinstance(data, list):
-            assets = data
-        elif isinstance(data, dict):
-            assets = data.get("data", data.get("results", []))
-        else:
-            print(f"🔍 DEBUG GENERAL - Tipo de data inesperado: {type(data)}")
-            return {"success": False, "error": f"Formato de respuesta inesperado: {type(data)}"}
-        
-        if not assets:
-            print("🔍 DEBUG GENERAL - No se encontraron assets en la respuesta")
+        if not total_assets:
+            print("🔍 DEBUG GENERAL - No se encontraron assets en el catálogo")
             return {"success": True, "data_type": "assets", "total": 0, "results": [], "message": "No se encontraron assets"}
         
-        print(f"🔍 DEBUG GENERAL - Assets totales encontrados: {len(assets)}")
-        
-        # 2. FILTRAR POR FECHA RECIENTE (misma lógica que search_asset_by_name)
-        recent_assets = []
-        for asset in assets:
-            if asset and isinstance(asset, dict):
-                if filter_by_recent_activity(asset, cutoff_date):
-                    recent_assets.append(asset)
+        # 1-2. FILTRAR POR FECHA RECIENTE Y ORDENAR POR RECENCIA (más activos primero)
+        recent = catalog.recent_frame(cutoff_date)
         
-        print(f"🔍 DEBUG GENERAL - Assets activos desde {cutoff_date}: {len(recent_assets)} de {len(assets)}")
+        print(f"🔍 DEBUG GENERAL - Assets activos desde {cutoff_label}: {len(recent)} de {total_assets}")
         
-        # 3. PROCESAR Y ENRIQUECER INFORMACIÓN (misma lógica que search_asset_by_name)
-        processed_assets = []
-        for asset in recent_assets:
-            if not asset or not isinstance(asset, dict):
-                continue
-                
-            # Extraer información completa (misma lógica)
-            name = (asset.get("name") or 
-                   asset.get("asset_name") or 
-                   asset.get("data", {}).get("name", "N/A"))
-            
-            asset_id = (asset.get("id") or 
-                       asset.get("asset_id") or 
-                       asset.get("_id", "N/A"))
-            
-            last_active = asset.get("last_active_at", "N/A")
-            if last_active != "N/A" and "T" in last_active:
-                last_active_display = last_active[:10]  # Solo fecha YYYY-MM-DD
-            else:
-                last_active_display = last_active
-            
-            # Incluir rig.name si existe (misma lógica)
-            rig_name = asset.get("rig", {}).get("name", "")
-            
-            # 4. CALCULAR SCORE DE RECENCIA (adaptado de search_asset_by_name)
-            recency_score = 0
-            try:
-                if last_active and "T" in last_active:
-                    active_date = datetime.fromisoformat(last_active.replace("Z", "").split(".")[0])
-                    cutoff = datetime.strptime(cutoff_date, "%Y-%m-%d")
-                    days_since_cutoff = (active_date - cutoff).days
-                    
-                    if days_since_cutoff >= 0:
-                        # Score de recencia para ordenamiento
-                        recency_score = days_since_cutoff
-            except Exception:
-                recency_score = 0
-            
-            # Crear string con más info pero manteniendo simplicidad
-            asset_string = f"{name} (ID: {asset_id})"
-            if rig_name:
-                asset_string += f" - Rig: {rig_name}"
+        # 3. LIMITAR Y ARMAR STRINGS PARA DISPLAY
+        display_limit = 20
+        limited = recent.head(display_limit)
+        simplified_assets = []
+        for row in limited.itertuples(index=False):
+            last_active_display = row.last_active_at.strftime("%Y-%m-%d")
+            asset_string = f"{row.well_name or row.rig_name} (ID: {row.original_id})"
+            if row.rig_name:
+                asset_string += f" - Rig: {row.rig_name}"
             asset_string += f" - Activo: {last_active_display}"
-            
-            processed_assets.append({
-                "display_string": asset_string,
-                "name": name,
-                "asset_id": asset_id,
-                "rig_name": rig_name,
-                "last_active": last_active,
-                "recency_score": recency_score
-            })
-        
-        # 5. ORDENAR POR RECENCIA (más activos primero) - NUEVA LÓGICA
-        processed_assets.sort(key=lambda x: x['recency_score'], reverse=True)
+            simplified_assets.append(asset_string)
         
-        # 6. LIMITAR Y EXTRAER STRINGS PARA DISPLAY (aumentado de 15 a 20)
-        display_limit = 20  # ✅ CAMBIADO: Más assets mostrados
-        limited_assets = processed_assets[:display_limit]
-        simplified_assets = [asset['display_string'] for asset in limited_assets]
-        
-        # 7. DEBUG MEJORADO (similar a search_asset_by_name)
-        print(f"🔍 DEBUG GENERAL - Top {min(10, len(limited_assets))} assets por recencia:")
-        for i, asset in enumerate(limited_assets[:10], 1):
-            print(f"   {i}. {asset['name'][:30]}")
-            print(f"      Rig: {asset['rig_name'] or 'N/A'}, Score: {asset['recency_score']}, Activo: {asset['last_active'][:10] if 'T' in asset['last_active'] else asset['last_active']}")
+        # 4. DEBUG
+        print(f"🔍 DEBUG GENERAL - Top {min(10, len(limited))} assets por recencia:")
+        for i, row in enumerate(limited.head(10).itertuples(index=False), 1):
+            print(f"   {i}. {(row.well_name or row.rig_name)[:30]}")
+            print(f"      Rig: {row.rig_name or 'N/A'}, Score: {row.days_since_cutoff}, Activo: {row.last_active_at:%Y-%m-%d}")
         
         return {
             "success": True,
             "data_type": "assets",
             "total": len(simplified_assets),
             "results": simplified_assets,
-            "message": f"Mostrando {len(simplified_assets)} de {len(processed_assets)} assets activos desde {cutoff_date} (de {len(assets)} totales) - Ordenados por recencia"
+            "message": f"Mostrando {len(simplified_assets)} de {len(recent)} assets activos desde {cutoff_label} (de {total_assets} totales) - Ordenados por recencia"
         }
         
     except CorvaAPIError as e:
@@ -956,24 +786,17 @@ def get_kpis_workflow(user_query: str) -> Dict:
         print(f"🔍 DEBUG KPI - Error inesperado: {type(e).__name__}: {str(e)}")
         return {"success": False, "error": f"Error inesperado al obtener KPIs: {str(e)}"}
 
-def get_wits_depth(user_query: str) -> Dict:
-    """Obtiene profundidad actual del trepano - SIN VALIDACIÓN DE USUARIO"""
-    asset_name = extract_asset_name(user_query)
-    
-    if not asset_name:
-        return {
-            "success": False,
-            "error": "No pude identificar el nombre del rig o well. Especifica el asset para obtener profundidad."
-        }
+def resolve_asset_for_data(asset_name: str) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    Resuelve el asset para las consultas de datos operacionales - SIN VALIDACIÓN DE USUARIO
     
-    # Buscar el asset
+    Returns:
+        (asset, None) si hay un match utilizable, (None, mensaje_error) si no
+    """
     matches, search_type = search_asset_by_name(asset_name)
     
     if search_type == "none" or len(matches) == 0:
-        return {
-            "success": False,
-            "error": f"No se encontró un asset para '{asset_name}'. Especifica el nombre exacto."
-        }
+        return None, f"No se encontró un asset para '{asset_name}'. Especifica el nombre exacto."
     
     # 🔧 FIX: Usar el mejor match disponible (sin pedir validación)
     if search_type == "partial":
@@ -983,256 +806,227 @@ def get_wits_depth(user_query: str) -> Dict:
         
         if similarity >= 85.0:  # Si es buena similitud, usar automáticamente
             print(f"🔧 USANDO mejor match disponible: {best_match['attributes']['name']} ({similarity:.1f}%)")
-            asset = best_match
-        else:
-            return {
-                "success": False,
-                "error": f"No se encontró un match suficientemente similar para '{asset_name}' (mejor: {similarity:.1f}%). Especifica el nombre exacto."
-            }
-    else:
-        # Match exacto
-        asset = matches[0]
+            return best_match, None
+        return None, (f"No se encontró un match suficientemente similar para '{asset_name}' "
+                      f"(mejor: {similarity:.1f}%). Especifica el nombre exacto.")
     
-    asset_id = asset.get("id")
-    asset_name_found = asset.get("attributes", {}).get("name", "")
-    
-    try:
-        params = {
+    # Match exacto
+    return matches[0], None
+
+
+# ===============================
+# DATASETS OPERACIONALES POR ASSET
+# ===============================
+# Endpoint, parámetros y forma del resultado de cada tipo de dato. Los usan tanto
+# las funciones get_* (un asset, un dato) como get_assets_snapshot (fan-out en paralelo).
+
+OPERATION_FILTER_PATTERNS = {
+    "Weight To Weight": "Weight To Weight",
+    "Connection": "Connection",
+    "Drilling": "Drilling"
+}
+
+DATASET_LABELS = {
+    "wits_depth": "profundidad",
+    "wits_summary": "ROP actual",
+    "metrics_rop": "métricas ROP",
+    "operations": "operaciones",
+}
+
+
+def build_dataset_request(data_type: str, asset_id, well_section: str = "Production Lateral",
+                          operation_filter: str = WEIGHT_TO_WEIGHT) -> Tuple[str, Dict]:
+    """
+    Endpoint y parámetros de Corva para un tipo de dato de un asset
+    """
+    if data_type == "wits_depth":
+        return "/data/corva/wits/", {
             "skip": 0,
             "limit": 1,
             "query": json.dumps({"asset_id": int(asset_id)}),
             "sort": json.dumps({"timestamp": -1}),
             "fields": "data.hole_depth,data.bit_depth"
         }
-        
-        # 🔧 CORRECCIÓN PRINCIPAL: Usar CORVA_BASE_URL_DATA en lugar de CORVA_BASE_API_V1
-        data = make_corva_request_fixed("/data/corva/wits/", params=params, base_url=CORVA_BASE_URL_DATA)
-        
-        return {
-            "success": True,
-            "data_type": "wits_depth",
-            "asset_name": asset_name_found,
-            "asset_id": asset_id,
-            "total": len(data) if isinstance(data, list) else 1,
-            "results": data,
-            "message": f"Profundidad del trepano para {asset_name_found}"
-        }
-        
-    except CorvaAPIError as e:
-        return {"success": False, "error": f"Error al obtener profundidad: {str(e)}"}
-
-def get_wits_summary(user_query: str) -> Dict:
-    """Obtiene ROP actual del pozo - SIN VALIDACIÓN DE USUARIO"""
-    asset_name = extract_asset_name(user_query)
-    
-    if not asset_name:
-        return {
-            "success": False,
-            "error": "No pude identificar el nombre del rig o well. Especifica el asset para obtener ROP actual."
-        }
-    
-    matches, search_type = search_asset_by_name(asset_name)
-    
-    if search_type == "none" or len(matches) == 0:
-        return {
-            "success": False,
-            "error": f"No se encontró un asset para '{asset_name}'. Especifica el nombre exacto."
-        }
-    
-    # 🔧 FIX: Usar el mejor match disponible (sin pedir validación)
-    if search_type == "partial":
-        # Usar el mejor match pero informar la similitud
-        best_match = matches[0]
-        similarity = best_match.get("similarity", 0)
-        
-        if similarity >= 85.0:  # Si es buena similitud, usar automáticamente
-            print(f"🔧 USANDO mejor match disponible: {best_match['attributes']['name']} ({similarity:.1f}%)")
-            asset = best_match
-        else:
-            return {
-                "success": False,
-                "error": f"No se encontró un match suficientemente similar para '{asset_name}' (mejor: {similarity:.1f}%). Especifica el nombre exacto."
-            }
-    else:
-        # Match exacto
-        asset = matches[0]
-    
-    asset_id = asset.get("id")
-    asset_name_found = asset.get("attributes", {}).get("name", "")
-    
-    try:
-        params = {
+    if data_type == "wits_summary":
+        return "/data/corva/wits.summary-1ft/", {
             "skip": 0,
             "limit": 1,
             "query": json.dumps({"asset_id": int(asset_id)}),
             "sort": json.dumps({"timestamp": -1}),
             "fields": "data.rop_mean"
         }
-        
-        data = make_corva_request_fixed("/data/corva/wits.summary-1ft/", params=params, base_url=CORVA_BASE_URL_DATA)
-        
-        return {
-            "success": True,
-            "data_type": "wits_summary",
-            "asset_name": asset_name_found,
-            "asset_id": asset_id,
-            "total": len(data) if isinstance(data, list) else 1,
-            "results": data,
-            "message": f"ROP actual para {asset_name_found}"
-        }
-        
-    except CorvaAPIError as e:
-        return {"success": False, "error": f"Error al obtener ROP actual: {str(e)}"}
-
-def get_metrics_rop(user_query: str, well_section: str = "Production Lateral") -> Dict:
-    """Obtiene ROP promedio por sección del pozo - SIN VALIDACIÓN DE USUARIO"""
-    asset_name = extract_asset_name(user_query)
-    
-    if not asset_name:
-        return {
-            "success": False,
-            "error": "No pude identificar el nombre del rig o well. Especifica el asset para obtener métricas ROP."
-        }
-    
-    matches, search_type = search_asset_by_name(asset_name)
-    
-    if search_type == "none" or len(matches) == 0:
-        return {
-            "success": False,
-            "error": f"No se encontró un asset para '{asset_name}'. Especifica el nombre exacto."
-        }
-    
-    # 🔧 FIX: Usar el mejor match disponible (sin pedir validación)
-    if search_type == "partial":
-        # Usar el mejor match pero informar la similitud
-        best_match = matches[0]
-        similarity = best_match.get("similarity", 0)
-        
-        if similarity >= 85.0:  # Si es buena similitud, usar automáticamente
-            print(f"🔧 USANDO mejor match disponible: {best_match['attributes']['name']} ({similarity:.1f}%)")
-            asset = best_match
-        else:
-            return {
-                "success": False,
-                "error": f"No se encontró un match suficientemente similar para '{asset_name}' (mejor: {similarity:.1f}%). Especifica el nombre exacto."
-            }
-    else:
-        # Match exacto
-        asset = matches[0]
-    
-    asset_id = asset.get("id")
-    asset_name_found = asset.get("attributes", {}).get("name", "")
-    
-    try:
+    if data_type == "metrics_rop":
         query_obj = {
             "asset_id": int(asset_id),
             "data.key": "rop",
             "data.type": "well_section",
             "data.well_section": well_section
         }
-        
-        params = {
+        return "/data/corva/metrics/", {
             "skip": 0,
             "limit": 10,
             "query": json.dumps(query_obj),
             "sort": json.dumps({"timestamp": 1}),
             "fields": "data.value,data.key,data.type,data.well_section"
         }
-        
-        data = make_corva_request_fixed("/data/corva/metrics/", params=params, base_url=CORVA_BASE_URL_DATA)
-        
-        return {
-            "success": True,
-            "data_type": "metrics_rop",
-            "asset_name": asset_name_found,
-            "asset_id": asset_id,
-            "well_section": well_section,
-            "total": len(data) if isinstance(data, list) else 1,
-            "results": data,
-            "message": f"Métricas ROP para {asset_name_found} en sección {well_section}"
+    if data_type == "operations":
+        # Aplicar filtro de operación
+        pattern = OPERATION_FILTER_PATTERNS.get(operation_filter, WEIGHT_TO_WEIGHT)
+        query_obj = {
+            "asset_id": int(asset_id),
+            "data.operation_name": {"$regex": pattern, "$options": "i"}
         }
-        
-    except CorvaAPIError as e:
-        return {"success": False, "error": f"Error al obtener métricas ROP: {str(e)}"}
+        return "/data/corva/operations/", {
+            "skip": 0,
+            "limit": 15,
+            "query": json.dumps(query_obj),
+            "sort": json.dumps({"timestamp": -1}),
+            "fields": "data.shift,data.operation_name,data.operation_time,data.well_section,data.start_depth,data.end_depth"
+        }
+    raise ValueError(f"Tipo de dato no soportado: {data_type}")
 
-def get_operations(user_query: str, operation_filter: str = "Weight To Weight") -> Dict:
-    """Obtiene tiempos de operaciones de conexión - SIN VALIDACIÓN DE USUARIO"""
+
+def build_dataset_result(data_type: str, asset: Dict, data, well_section: str = "Production Lateral",
+                         operation_filter: str = WEIGHT_TO_WEIGHT) -> Dict:
+    """
+    Resultado en el formato que espera format_response_for_agent
+    """
+    asset_name_found = asset.get("attributes", {}).get("name", "")
+    result = {
+        "success": True,
+        "data_type": data_type,
+        "asset_name": asset_name_found,
+        "asset_id": asset.get("id"),
+        "total": len(data) if isinstance(data, list) else 1,
+        "results": data,
+    }
+    if data_type == "wits_depth":
+        result["message"] = f"Profundidad del trepano para {asset_name_found}"
+    elif data_type == "wits_summary":
+        result["message"] = f"ROP actual para {asset_name_found}"
+    elif data_type == "metrics_rop":
+        result["well_section"] = well_section
+        result["message"] = f"Métricas ROP para {asset_name_found} en sección {well_section}"
+    elif data_type == "operations":
+        result["operation_filter"] = operation_filter
+        result["message"] = f"Operaciones de {operation_filter} para {asset_name_found}"
+    return result
+
+
+def _get_asset_dataset(user_query: str, data_type: str, **options) -> Dict:
+    label = DATASET_LABELS[data_type]
     asset_name = extract_asset_name(user_query)
     
     if not asset_name:
         return {
             "success": False,
-            "error": "No pude identificar el nombre del rig o well. Especifica el asset para obtener operaciones."
+            "error": f"No pude identificar el nombre del rig o well. Especifica el asset para obtener {label}."
         }
     
-    matches, search_type = search_asset_by_name(asset_name)
+    asset, error = resolve_asset_for_data(asset_name)
+    if error:
+        return {"success": False, "error": error}
     
-    if search_type == "none" or len(matches) == 0:
-        return {
-            "success": False,
-            "error": f"No se encontró un asset para '{asset_name}'. Especifica el nombre exacto."
-        }
+    # Estado en vivo del poller WITS (si está activo y el dato es reciente)
+    data = get_live_dataset(data_type, asset.get("id"), **options)
+    if data is not None:
+        return build_dataset_result(data_type, asset, data, **options)
     
-    # 🔧 FIX: Usar el mejor match disponible (sin pedir validación)
-    if search_type == "partial":
-        # Usar el mejor match pero informar la similitud
-        best_match = matches[0]
-        similarity = best_match.get("similarity", 0)
+    try:
+        endpoint, params = build_dataset_request(data_type, asset.get("id"), **options)
+        data = make_corva_request_fixed(endpoint, params=params, base_url=CORVA_BASE_URL_DATA)
+        return build_dataset_result(data_type, asset, data, **options)
         
-        if similarity >= 85.0:  # Si es buena similitud, usar automáticamente
-            print(f"🔧 USANDO mejor match disponible: {best_match['attributes']['name']} ({similarity:.1f}%)")
-            asset = best_match
+    except CorvaAPIError as e:
+        return {"success": False, "error": f"Error al obtener {label}: {str(e)}"}
+
+def get_wits_depth(user_query: str) -> Dict:
+    """Obtiene profundidad actual del trepano - SIN VALIDACIÓN DE USUARIO"""
+    return _get_asset_dataset(user_query, "wits_depth")
+
+def get_wits_summary(user_query: str) -> Dict:
+    """Obtiene ROP actual del pozo - SIN VALIDACIÓN DE USUARIO"""
+    return _get_asset_dataset(user_query, "wits_summary")
+
+def get_metrics_rop(user_query: str, well_section: str = "Production Lateral") -> Dict:
+    """Obtiene ROP promedio por sección del pozo - SIN VALIDACIÓN DE USUARIO"""
+    return _get_asset_dataset(user_query, "metrics_rop", well_section=well_section)
+
+def get_operations(user_query: str, operation_filter: str = WEIGHT_TO_WEIGHT) -> Dict:
+    """Obtiene tiempos de operaciones de conexión - SIN VALIDACIÓN DE USUARIO"""
+    return _get_asset_dataset(user_query, "operations", operation_filter=operation_filter)
+
+def get_assets_snapshot(asset_names: List[str], data_types: List[str],
+                        well_section: str = "Production Lateral",
+                        operation_filter: str = WEIGHT_TO_WEIGHT) -> List[Dict]:
+    """
+    Varios tipos de dato para uno o más assets en paralelo
+    ("profundidad, ROP y operaciones del DLS-167", "compará ROP de DLS-167 y DLS-168").
+    
+    Los assets se resuelven en paralelo y todas las consultas a Corva salen juntas
+    por el cliente async: la latencia es la de la llamada más lenta, no la suma.
+    Las métricas ROP de varios assets van en una sola consulta `asset_id $in [...]`,
+    lanzada en el mismo gather que el resto.
+    
+    Returns:
+        Lista de resultados (uno por asset y tipo de dato) para format_response_for_agent
+    """
+    from src.corva_async_client import fetch_many_sync, fetch_many_with_batched_sync, resolve_many_sync
+    
+    options = {"well_section": well_section, "operation_filter": operation_filter}
+    unknown = [data_type for data_type in data_types if data_type not in DATASET_LABELS]
+    if unknown:
+        return [{"success": False, "error": f"Tipos de dato no soportados: {', '.join(unknown)}"}]
+    
+    # 1. Resolver todos los assets en paralelo
+    resolved = resolve_many_sync(resolve_asset_for_data, asset_names)
+    results, assets = [], []
+    for asset_name, (asset, error) in zip(asset_names, resolved):
+        if error:
+            results.append({"success": False, "error": error})
         else:
-            return {
-                "success": False,
-                "error": f"No se encontró un match suficientemente similar para '{asset_name}' (mejor: {similarity:.1f}%). Especifica el nombre exacto."
-            }
+            assets.append(asset)
+    if not assets:
+        return results
+    
+    # 2. Métricas ROP multi-asset: una sola consulta con asset_id $in (sale junto con el fan-out)
+    data_types = list(data_types)
+    batched = None
+    if "metrics_rop" in data_types and len(assets) > 1:
+        data_types.remove("metrics_rop")
+        endpoint, params = build_dataset_request("metrics_rop", assets[0].get("id"), **options)
+        batched = (endpoint, params, [asset.get("id") for asset in assets], CORVA_BASE_URL_DATA)
+    
+    # 3. Resto: lo que el poller WITS tiene en memoria, y fan-out del resto
+    pending = []
+    for asset in assets:
+        for data_type in data_types:
+            data = get_live_dataset(data_type, asset.get("id"), **options)
+            if data is not None:
+                results.append(build_dataset_result(data_type, asset, data, **options))
+            else:
+                pending.append((asset, data_type))
+    requests_list = []
+    for asset, data_type in pending:
+        endpoint, params = build_dataset_request(data_type, asset.get("id"), **options)
+        requests_list.append((endpoint, params, CORVA_BASE_URL_DATA))
+    
+    if batched is None:
+        responses = fetch_many_sync(requests_list)
     else:
-        # Match exacto
-        asset = matches[0]
-    
-    asset_id = asset.get("id")
-    asset_name_found = asset.get("attributes", {}).get("name", "")
+        responses, by_asset = fetch_many_with_batched_sync(requests_list, batched)
+        if isinstance(by_asset, Exception):
+            results.append({"success": False, "error": f"Error al obtener métricas ROP: {str(by_asset)}"})
+        else:
+            for asset in assets:
+                results.append(build_dataset_result("metrics_rop", asset, by_asset.get(str(asset.get("id")), []), **options))
     
-    try:
-        query_obj = {"asset_id": int(asset_id)}
-        
-        # Aplicar filtro de operación
-        filter_patterns = {
-            "Weight To Weight": "Weight To Weight",
-            "Connection": "Connection",
-            "Drilling": "Drilling"
-        }
-        
-        pattern = filter_patterns.get(operation_filter, "Weight To Weight")
-        query_obj["data.operation_name"] = {
-            "$regex": pattern,
-            "$options": "i"
-        }
-        
-        params = {
-            "skip": 0,
-            "limit": 15,
-            "query": json.dumps(query_obj),
-            "sort": json.dumps({"timestamp": -1}),
-            "fields": "data.shift,data.operation_name,data.operation_time,data.well_section,data.start_depth,data.end_depth"
-        }
-        
-        data = make_corva_request_fixed("/data/corva/operations/", params=params, base_url=CORVA_BASE_URL_DATA)
-        
-        return {
-            "success": True,
-            "data_type": "operations",
-            "asset_name": asset_name_found,
-            "asset_id": asset_id,
-            "operation_filter": operation_filter,
-            "total": len(data) if isinstance(data, list) else 1,
-            "results": data,
-            "message": f"Operaciones de {operation_filter} para {asset_name_found}"
-        }
-        
-    except CorvaAPIError as e:
-        return {"success": False, "error": f"Error al obtener operaciones: {str(e)}"}
+    for (asset, data_type), data in zip(pending, responses):
+        if isinstance(data, Exception):
+            results.append({"success": False, "error": f"Error al obtener {DATASET_LABELS[data_type]}: {str(data)}"})
+        else:
+            results.append(build_dataset_result(data_type, asset, data, **options))
+    return results
     
 
 def detect_high_confidence_match(user_input: str, found_assets: List[Dict]) -> Tuple[bool, Dict]:
@@ -1317,7 +1111,7 @@ def validate_asset_match_with_llm(user_input: str, found_assets: List[Dict]) ->
     if is_high_confidence:
         # Proceder automáticamente sin validación del usuario
         print("🎯 AUTO-MATCH por alta confianza")
-        return "exact", [best_asset]
+        return "exact", [dict(best_asset, match_source="high_confidence")]
     
     # Si no hay alta confianza, continuar con validación LLM (código existente)
     print("🤖 Enviando al LLM para validación (no hay alta confianza automática)")
@@ -1381,6 +1175,8 @@ El primer resultado tiene Priority Score alto y parece relevante. ¿Es un match
     ])
     
     try:
+        get_resolution_memo().record_llm_validation()
+        count_llm_call()
         chain = prompt | validation_llm | StrOutputParser()
         response = chain.invoke({
             "user_input": user_input,
@@ -1403,7 +1199,7 @@ El primer resultado tiene Priority Score alto y parece relevante. ¿Es un match
                 # Un match exacto - devolver solo ese asset
                 if 1 <= exact_match_number <= len(found_assets):
                     exact_asset = found_assets[exact_match_number - 1]
-                    return "exact", [exact_asset]
+                    return "exact", [dict(exact_asset, match_source="llm_validated")]
             
             elif decision == "MULTIPLE_MATCHES" and relevant_matches:
                 # Múltiples matches - devolver ordenados por relevancia + recencia
@@ -1433,13 +1229,14 @@ El primer resultado tiene Priority Score alto y parece relevante. ¿Es un match
         # Fallback a lógica original en caso de error
         return "partial", found_assets[:5]
 
-def filter_by_recent_activity(asset: dict, cutoff_date: str = "2025-07-01") -> bool:
+def filter_by_recent_activity(asset: dict, cutoff_date: Optional[str] = None) -> bool:
     """
     Filtra assets por actividad reciente a partir de una fecha específica
+    (versión por asset; el catálogo aplica el mismo filtro vectorizado)
     
     Args:
         asset: Asset a evaluar
-        cutoff_date: Fecha de corte en formato "YYYY-MM-DD" 
+        cutoff_date: Fecha de corte en formato "YYYY-MM-DD" (por defecto hoy - CORVA_ACTIVE_WINDOW_DAYS)
         
     Returns:
         bool: True si el asset está activo desde la fecha de corte
@@ -1465,7 +1262,7 @@ def filter_by_recent_activity(asset: dict, cutoff_date: str = "2025-07-01") -> b
             return False
         
         # Fecha de corte
-        cutoff = datetime.strptime(cutoff_date, "%Y-%m-%d")
+        cutoff = resolve_cutoff(cutoff_date)
         
         # Retornar True si el asset estuvo activo desde la fecha de corte
         is_recent = asset_date >= cutoff
@@ -1633,34 +1430,8 @@ def get_asset_detailed_info(user_query: str) -> Dict:
         # 3. OBTENER INFORMACIÓN COMPLETA DEL ASSET del endpoint original
         original_asset_id = asset.get("original_id", asset_id)
         
-        # Re-consultar el endpoint para obtener el JSON completo
-        params = {
-            "limit": 1000,
-            "query": json.dumps({"company_id": 375}),
-            "sort": json.dumps({"name": 1}),
-            "skip": 0
-        }
-        
-        data = make_corva_request_fixed(CORVA_ASSETS_URL, params=params, base_url=CORVA_BASE_URL_DATA)
-        
-        # Encontrar el asset específico en la respuesta completa
-        if isinstance(data, list):
-            assets = data
-        elif isinstance(data, dict):
-            assets = data.get("data", data.get("results", []))
-        else:
-            return {"success": False, "error": "Error obteniendo información detallada del asset"}
-        
-        # Buscar por ID el asset específico
-        target_asset = None
-        for raw_asset in assets:
-            if not raw_asset or not isinstance(raw_asset, dict):
-                continue
-                
-            raw_id = str(raw_asset.get("id", "")) or str(raw_asset.get("asset_id", "")) or str(raw_asset.get("_id", ""))
-            if raw_id == str(original_asset_id) or raw_id == str(asset_id):
-                target_asset = raw_asset
-                break
+        # El JSON completo ya está en el catálogo compartido (sin re-consultar el endpoint)
+        target_asset = get_asset_catalog().get_raw_asset(original_asset_id, asset_id)
         
         if not target_asset:
             return {
@@ -1918,6 +1689,18 @@ def get_fracking_metrics(user_query: str) -> Dict:
         print(f"❌ Traceback: {traceback.format_exc()}")
         return {"success": False, "error": f"Error procesando métricas de fracturamiento: {str(e)}"}
 
+def _format_fracking_value(value, unit: str) -> str:
+    """Formatea el valor según la unidad"""
+    if not isinstance(value, (int, float)):
+        return f"{value} {unit}"
+    if unit in ["bbl", "gal"]:
+        return f"{value:,.2f} {unit}"
+    if unit == "lbs":
+        return f"{value:,.1f} {unit}"
+    if unit == "min":
+        return f"{value:.2f} {unit}"
+    return f"{value} {unit}"
+
 def format_fracking_metrics_response(result: Dict) -> str:
     """
     Formatea la respuesta de métricas de fracturamiento para el agente
@@ -1934,65 +1717,34 @@ def format_fracking_metrics_response(result: Dict) -> str:
     asset_name = result.get("asset_name", "")
     metric_type = result.get("metric_type", "")
     unit = result.get("unit", "")
-    total_stages = result.get("total_stages", 0)
     message = result.get("message", "")
     
     response = f"📊 **{metric_type.upper()}** para {asset_name}\n"
     response += f"🎯 {message}\n"
     response += f"📏 Unidad: {unit}\n\n"
     
-    # Mostrar datos por etapa
+    # Agregados por etapa (numpy) y etapas representativas (LTTB) en lugar de las primeras 10
     metrics_data = result.get("results", [])
+    payload = fracking_stage_payload(metrics_data) if isinstance(metrics_data, list) else None
     
-    if isinstance(metrics_data, list) and len(metrics_data) > 0:
-        response += f"📈 **RESULTADOS POR ETAPA** (Total: {total_stages} etapas):\n"
+    if payload:
+        shown = len(payload["stages"])
+        response += f"📈 **RESULTADOS POR ETAPA** (Total: {payload['total_stages']} etapas"
+        response += f", {shown} representativas):\n" if shown < payload["total_stages"] else "):\n"
         response += "=" * 50 + "\n"
         
-        # Mostrar hasta las primeras 10 etapas para no sobrecargar
-        for i, stage_data in enumerate(metrics_data[:10], 1):
-            if isinstance(stage_data, dict):
-                data_section = stage_data.get("data", {})
-                stage_num = data_section.get("stage_number", "N/A")
-                value = data_section.get("value", "N/A")
-                
-                # Formatear el valor según la unidad
-                if isinstance(value, (int, float)) and value != "N/A":
-                    if unit in ["bbl", "gal"]:
-                        formatted_value = f"{value:,.2f} {unit}"
-                    elif unit == "lbs":
-                        formatted_value = f"{value:,.1f} {unit}" 
-                    elif unit == "min":
-                        formatted_value = f"{value:.2f} {unit}"
-                    else:
-                        formatted_value = f"{value} {unit}"
-                else:
-                    formatted_value = f"{value} {unit}"
-                
-                response += f"• **Etapa {stage_num}:** {formatted_value}\n"
-        
-        # Si hay más etapas, indicarlo
-        if len(metrics_data) > 10:
-            response += f"... y {len(metrics_data) - 10} etapas más\n"
-        
-        # Estadísticas rápidas si hay datos numéricos
-        numeric_values = []
-        for stage_data in metrics_data:
-            if isinstance(stage_data, dict):
-                value = stage_data.get("data", {}).get("value")
-                if isinstance(value, (int, float)):
-                    numeric_values.append(value)
-        
-        if numeric_values:
-            total_value = sum(numeric_values)
-            avg_value = total_value / len(numeric_values)
-            max_value = max(numeric_values)
-            min_value = min(numeric_values)
-            
-            response += "\n📊 **ESTADÍSTICAS:**\n"
-            response += f"• Total acumulado: {total_value:,.2f} {unit}\n"
-            response += f"• Promedio por etapa: {avg_value:,.2f} {unit}\n"
-            response += f"• Máximo: {max_value:,.2f} {unit}\n"
-            response += f"• Mínimo: {min_value:,.2f} {unit}\n"
+        for stage_num, value in payload["stages"]:
+            response += f"• **Etapa {stage_num}:** {_format_fracking_value(value, unit)}\n"
+        
+        summary = payload["summary"]
+        max_stage, max_value = payload["max_stage"]
+        min_stage, min_value = payload["min_stage"]
+        response += "\n📊 **ESTADÍSTICAS:**\n"
+        response += f"• Total acumulado: {summary['sum']:,.2f} {unit}\n"
+        response += f"• Promedio por etapa: {summary['mean']:,.2f} {unit}\n"
+        response += f"• Mediana por etapa: {summary['p50']:,.2f} {unit}\n"
+        response += f"• Máximo: {max_value:,.2f} {unit} (etapa {max_stage})\n"
+        response += f"• Mínimo: {min_value:,.2f} {unit} (etapa {min_stage})\n"
             
     else:
         response += "⚠️ No se encontraron datos de etapas específicas.\n"
@@ -2039,6 +1791,9 @@ def format_response_for_agent(result: Dict) -> str:
                 response += f"- Operación: {data_section.get('operation_name', 'N/A')}\n"
                 response += f"- KPI Valor: {data_section.get('kpi_valor', 'N/A')}\n"
                 response += f"- Timestamp: {latest.get('timestamp', 'N/A')}\n\n"
+            if isinstance(kpis, list) and len(kpis) > 1:
+                times, values = records_to_arrays(kpis, ["data.kpi_valor"])
+                response += f"Serie KPI: {format_summary(summarize(values['data.kpi_valor'], times))}\n"
                 
     # NUEVAS RESPUESTAS
     elif data_type == "wits_depth":
@@ -2072,12 +1827,12 @@ def format_response_for_agent(result: Dict) -> str:
         response = f"📊 MÉTRICAS ROP para {asset_name} - {well_section}:\n{message}\n\n"
         
         data = result.get("results", [])
-        if data:
+        summary, points = series_points(data, "data.value") if isinstance(data, list) else (None, [])
+        if summary:
+            response += f"Resumen ROP: {format_summary(summary, 'ft/hr')}\n"
             response += "Valores ROP encontrados:\n"
-            for i, record in enumerate(data[:5], 1):
-                if isinstance(record, dict):
-                    data_section = record.get("data", {})
-                    response += f"{i}. Valor: {data_section.get('value', 'N/A')} ft/hr\n"
+            for i, (_, value) in enumerate(points, 1):
+                response += f"{i}. Valor: {value:,.2f} ft/hr\n"
                     
     elif data_type == "operations":
         asset_name = result.get("asset_name", "")
@@ -2085,6 +1840,9 @@ def format_response_for_agent(result: Dict) -> str:
         response = f"⏱️ OPERACIONES {operation_filter} para {asset_name}:\n{message}\n\n"
         
         data = result.get("results", [])
+        if isinstance(data, list) and len(data) > 1:
+            times, values = records_to_arrays(data, ["data.operation_time"])
+            response += f"Tiempos de operación: {format_summary(summarize(values['data.operation_time'], times), 'min')}\n"
         if data:
             response += "Operaciones encontradas:\n"
             for i, record in enumerate(data[:5], 1):
@@ -2101,7 +1859,12 @@ def format_response_for_agent(result: Dict) -> str:
             response += f"{i}. {asset}\n"
                     
     else:
-        response = f"Datos obtenidos: {json.dumps(result, indent=2)}"
+        # Payload acotado: no volcar listas largas completas al contexto del LLM
+        results = result.get("results")
+        if isinstance(results, list) and len(results) > CORVA_TS_MAX_POINTS:
+            result = dict(result, results=results[:CORVA_TS_MAX_POINTS],
+                          results_omitted=len(results) - CORVA_TS_MAX_POINTS)
+        response = f"Datos obtenidos: {json.dumps(result, indent=2, default=str)}"
     
     return response
 
@@ -0,0 +1,297 @@
+"""
+Poller de WITS en segundo plano
+===============================
+
+"¿Cuál es la profundidad / ROP actual del equipo X?" es la pregunta más
+frecuente a Corva y cada una disparaba una consulta WITS a demanda (1-3 s).
+Este servicio opcional (CORVA_WITS_POLLER_ENABLED) consulta cada
+CORVA_WITS_POLL_SECONDS el último registro de profundidad y ROP de todos los
+assets activos del catálogo, y las métricas ROP con un intervalo más largo.
+
+- Snapshot inmutable {asset_id: {tipo_de_dato: (polled_at, datos)}}: el hilo
+  del poller arma uno nuevo en cada ciclo y lo reemplaza de una vez, los
+  lectores no toman locks
+- get_wits_depth / get_wits_summary / get_metrics_rop responden desde memoria
+  si el dato tiene menos de CORVA_WITS_FRESHNESS_FACTOR intervalos de antigüedad
+- Presupuesto global de requests por minuto (token bucket): si no alcanza, se
+  consultan primero los datos más viejos
+- stats() reporta antigüedad del snapshot y hits/misses para /metrics
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from src.corva_cache import copy_response
+from src.corva_catalog import get_asset_catalog
+
+CORVA_WITS_POLLER_ENABLED = os.environ.get("CORVA_WITS_POLLER_ENABLED", "false").lower() == "true"
+CORVA_WITS_POLL_SECONDS = float(os.environ.get("CORVA_WITS_POLL_SECONDS", "15"))
+CORVA_WITS_METRICS_POLL_SECONDS = float(os.environ.get("CORVA_WITS_METRICS_POLL_SECONDS", "300"))
+# Assets "activos" para el poller: con actividad en las últimas N horas
+CORVA_WITS_ACTIVE_HOURS = float(os.environ.get("CORVA_WITS_ACTIVE_HOURS", "24"))
+CORVA_WITS_MAX_REQUESTS_PER_MINUTE = float(os.environ.get("CORVA_WITS_MAX_REQUESTS_PER_MINUTE", "120"))
+# Un dato se sirve desde memoria si tiene menos de N intervalos de poll
+CORVA_WITS_FRESHNESS_FACTOR = float(os.environ.get("CORVA_WITS_FRESHNESS_FACTOR", "2"))
+
+# Tipo de dato → intervalo de poll (segundos)
+POLLED_DATASETS = {
+    "wits_depth": CORVA_WITS_POLL_SECONDS,
+    "wits_summary": CORVA_WITS_POLL_SECONDS,
+    "metrics_rop": CORVA_WITS_METRICS_POLL_SECONDS,
+}
+# Las métricas ROP van en consultas `asset_id $in [...]` de a este tamaño
+METRICS_BATCH_SIZE = 50
+DEFAULT_WELL_SECTION = "Production Lateral"
+
+# (polled_at, datos) por tipo de dato, por asset
+Snapshot = Dict[str, Dict[str, Tuple[float, Any]]]
+
+
+class CorvaWitsPoller:
+    """
+    Mantiene en memoria el último estado WITS de los assets activos
+    """
+
+    def __init__(self, catalog_fn: Callable = get_asset_catalog, base_url: Optional[str] = None,
+                 max_requests_per_minute: float = CORVA_WITS_MAX_REQUESTS_PER_MINUTE,
+                 active_hours: float = CORVA_WITS_ACTIVE_HOURS):
+        self._catalog_fn = catalog_fn
+        self.base_url = base_url
+        self.active_hours = active_hours
+        self.max_requests_per_minute = max_requests_per_minute
+        self._snapshot: Snapshot = {}
+        self._tokens = max_requests_per_minute
+        self._tokens_at = time.monotonic()
+        self._thread = None
+        self._stop = threading.Event()
+        self._counters_lock = threading.Lock()
+        self.counters = {
+            "cycles": 0,
+            "requests": 0,
+            "request_errors": 0,
+            "budget_deferred": 0,
+            "served_from_memory": 0,
+            "stale_misses": 0,
+            "unknown_misses": 0,
+        }
+        self.active_assets = 0
+        self.last_cycle_at: Optional[float] = None
+        self.last_cycle_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._counters_lock:
+            self.counters[name] += amount
+
+    # ===============================
+    # PRESUPUESTO DE REQUESTS
+    # ===============================
+
+    def _take_budget(self, wanted: int) -> int:
+        """Token bucket de requests por minuto; devuelve cuántos se pueden hacer ahora"""
+        now = time.monotonic()
+        rate = self.max_requests_per_minute / 60.0
+        self._tokens = min(self.max_requests_per_minute, self._tokens + (now - self._tokens_at) * rate)
+        self._tokens_at = now
+        granted = min(wanted, int(self._tokens))
+        self._tokens -= granted
+        return granted
+
+    # ===============================
+    # CICLO DE POLL
+    # ===============================
+
+    def poll_once(self) -> None:
+        """
+        Un ciclo: consulta los datos vencidos de los assets activos (los más viejos
+        primero, dentro del presupuesto) y publica un snapshot nuevo
+        """
+        from src.corva_tool import CORVA_BASE_URL_DATA, build_dataset_request
+        from src.corva_async_client import fetch_many_sync, fetch_batched_sync
+
+        t0 = time.perf_counter()
+        base_url = self.base_url or CORVA_BASE_URL_DATA
+        since = datetime.now() - timedelta(hours=self.active_hours)
+        assets = self._catalog_fn().active_candidates(since)
+        current = self._snapshot
+        now = time.time()
+
+        # Trabajo pendiente: (último poll, asset_id, tipo de dato)
+        due = []
+        for asset in assets:
+            entries = current.get(asset["id"], {})
+            for data_type, interval in POLLED_DATASETS.items():
+                polled_at = entries.get(data_type, (0.0, None))[0]
+                if now - polled_at >= interval:
+                    due.append((polled_at, asset["id"], data_type))
+
+        # Un request por asset para WITS y uno por lote para métricas; dentro del
+        # presupuesto se atiende primero lo más viejo
+        metrics_due = [(polled_at, asset_id) for polled_at, asset_id, data_type in due if data_type == "metrics_rop"]
+        jobs = [(polled_at, "wits", (asset_id, data_type)) for polled_at, asset_id, data_type in due
+                if data_type != "metrics_rop"]
+        for i in range(0, len(metrics_due), METRICS_BATCH_SIZE):
+            batch = metrics_due[i:i + METRICS_BATCH_SIZE]
+            jobs.append((min(batch)[0], "metrics", [asset_id for _, asset_id in batch]))
+        jobs.sort(key=lambda job: job[0])
+
+        granted = self._take_budget(len(jobs))
+        deferred = len(jobs) - granted
+        wits_due = [job for _, kind, job in jobs[:granted] if kind == "wits"]
+        metrics_batches = [job for _, kind, job in jobs[:granted] if kind == "metrics"]
+
+        fresh: Dict[Tuple[str, str], Any] = {}
+        if wits_due:
+            requests_list = []
+            for asset_id, data_type in wits_due:
+                endpoint, params = build_dataset_request(data_type, asset_id)
+                requests_list.append((endpoint, params, base_url))
+            for key, data in zip(wits_due, fetch_many_sync(requests_list)):
+                if isinstance(data, Exception):
+                    self._count("request_errors")
+                    self.last_error = str(data)
+                else:
+                    fresh[key] = data
+
+        for batch in metrics_batches:
+            endpoint, params = build_dataset_request("metrics_rop", batch[0], well_section=DEFAULT_WELL_SECTION)
+            try:
+                by_asset = fetch_batched_sync(endpoint, params, batch, base_url=base_url)
+                for asset_id in batch:
+                    fresh[(asset_id, "metrics_rop")] = by_asset.get(str(asset_id), [])
+            except Exception as e:
+                self._count("request_errors")
+                self.last_error = str(e)
+
+        # Snapshot nuevo (solo assets activos) y reemplazo atómico de la referencia
+        polled_at = time.time()
+        active_ids = {asset["id"] for asset in assets}
+        snapshot: Snapshot = {asset_id: dict(entries) for asset_id, entries in current.items() if asset_id in active_ids}
+        for (asset_id, data_type), data in fresh.items():
+            snapshot.setdefault(asset_id, {})[data_type] = (polled_at, data)
+        self._snapshot = snapshot
+
+        self.active_assets = len(assets)
+        self.last_cycle_at = polled_at
+        self.last_cycle_seconds = time.perf_counter() - t0
+        self._count("cycles")
+        self._count("requests", len(wits_due) + len(metrics_batches))
+        self._count("budget_deferred", deferred)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def poll_loop():
+            while True:
+                try:
+                    self.poll_once()
+                except Exception as e:
+                    self.last_error = str(e)
+                    print(f"⚠️ Error en poller WITS: {e}")
+                if self._stop.wait(CORVA_WITS_POLL_SECONDS):
+                    break
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=poll_loop, name="corva-wits-poller", daemon=True)
+        self._thread.start()
+        print(f"🚀 Poller WITS iniciado (cada {CORVA_WITS_POLL_SECONDS:.0f}s, "
+              f"{self.max_requests_per_minute:.0f} requests/min)")
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # ===============================
+    # LECTURA
+    # ===============================
+
+    def get(self, data_type: str, asset_id) -> Optional[Any]:
+        """
+        Datos en memoria si son recientes; None si hay que ir a Corva
+        """
+        entry = self._snapshot.get(str(asset_id), {}).get(data_type)
+        if entry is None:
+            self._count("unknown_misses")
+            return None
+        polled_at, data = entry
+        if time.time() - polled_at > POLLED_DATASETS[data_type] * CORVA_WITS_FRESHNESS_FACTOR:
+            self._count("stale_misses")
+            return None
+        self._count("served_from_memory")
+        # Copia profunda: los dicts/listas anidados de WITS son del poller, no del que llama
+        return copy_response(data)
+
+    # ===============================
+    # MÉTRICAS
+    # ===============================
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        now = time.time()
+        with self._counters_lock:
+            counters = dict(self.counters)
+        staleness = {}
+        for data_type, interval in POLLED_DATASETS.items():
+            ages = sorted(now - entries[data_type][0] for entries in snapshot.values() if data_type in entries)
+            max_age = interval * CORVA_WITS_FRESHNESS_FACTOR
+            staleness[data_type] = {
+                "assets": len(ages),
+                "fresh": sum(1 for age in ages if age <= max_age),
+                "median_age_seconds": round(ages[len(ages) // 2], 1) if ages else None,
+                "max_age_seconds": round(ages[-1], 1) if ages else None,
+                "max_fresh_age_seconds": max_age,
+            }
+        lookups = counters["served_from_memory"] + counters["stale_misses"] + counters["unknown_misses"]
+        return {
+            "enabled": True,
+            "running": self.running(),
+            "active_assets": self.active_assets,
+            "last_cycle_age_seconds": round(now - self.last_cycle_at, 1) if self.last_cycle_at else None,
+            "last_cycle_seconds": self.last_cycle_seconds,
+            "max_requests_per_minute": self.max_requests_per_minute,
+            **counters,
+            "memory_hit_ratio": round(counters["served_from_memory"] / lookups, 3) if lookups else 0.0,
+            "staleness": staleness,
+            "last_error": self.last_error,
+        }
+
+
+_poller: Optional[CorvaWitsPoller] = None
+_poller_lock = threading.Lock()
+
+
+def start_wits_poller() -> bool:
+    """Arranca el poller si CORVA_WITS_POLLER_ENABLED (idempotente)"""
+    global _poller
+    if not CORVA_WITS_POLLER_ENABLED:
+        return False
+    with _poller_lock:
+        if _poller is None:
+            _poller = CorvaWitsPoller()
+        _poller.start()
+    return True
+
+
+def get_live_dataset(data_type: str, asset_id, well_section: str = DEFAULT_WELL_SECTION,
+                     **options) -> Optional[Any]:
+    """
+    Respuesta desde el snapshot en memoria para un dato a demanda, o None.
+    Solo se sirven los datos que el poller consulta con los mismos parámetros.
+    """
+    if _poller is None or data_type not in POLLED_DATASETS:
+        return None
+    if data_type == "metrics_rop" and well_section != DEFAULT_WELL_SECTION:
+        return None
+    return _poller.get(data_type, asset_id)
+
+
+def get_wits_poller_stats() -> Dict[str, Any]:
+    if _poller is None:
+        return {"enabled": CORVA_WITS_POLLER_ENABLED, "running": False}
+    return _poller.stats()
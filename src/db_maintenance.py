@@ -0,0 +1,209 @@
+import argparse
+import os
+import re
+from datetime import datetime, timedelta
+from typing import List, Dict, Any
+
+from src.postgres_integration import get_postgres_connection
+
+# ===============================
+# RETENCIÓN POR PARTICIONES
+# ===============================
+# Las tablas Memory, SQL_Query_Executions y Performance_Metrics están
+# particionadas por mes sobre created_at (migrations/003). La retención
+# desprende y elimina particiones completas: sin DELETE fila por fila ni bloat.
+#
+#   python -m src.db_maintenance partitions     # crea particiones futuras
+#   python -m src.db_maintenance retention      # elimina particiones vencidas
+#   python -m src.db_maintenance retention --dry-run
+#   python -m src.db_maintenance report         # tamaño y bloat por tabla
+
+RETENTION_DAYS = {
+    "memory": int(os.environ.get("MEMORY_RETENTION_DAYS", "90")),
+    "sql_query_executions": int(os.environ.get("SQL_EXECUTIONS_RETENTION_DAYS", "180")),
+    "performance_metrics": int(os.environ.get("PERFORMANCE_METRICS_RETENTION_DAYS", "30")),
+}
+PARTITIONS_MONTHS_AHEAD = int(os.environ.get("PARTITIONS_MONTHS_AHEAD", "2"))
+
+_PARTITION_UPPER_RE = re.compile(r"TO \('([^']+)'\)")
+
+
+def _add_months(day: datetime, months: int) -> datetime:
+    month_index = day.month - 1 + months
+    return day.replace(year=day.year + month_index // 12, month=month_index % 12 + 1, day=1)
+
+
+def ensure_future_partitions(months_ahead: int = PARTITIONS_MONTHS_AHEAD) -> List[str]:
+    """
+    Crea las particiones del mes actual y de los próximos N meses (idempotente)
+    """
+    created = []
+    conn = get_postgres_connection()
+    if not conn:
+        return created
+    try:
+        cursor = conn.cursor()
+        first_of_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        for table in RETENTION_DAYS:
+            for offset in range(months_ahead + 1):
+                month_start = _add_months(first_of_month, offset).date()
+                cursor.execute("SELECT create_monthly_partition(%s, %s)", (table, month_start))
+                created.append(cursor.fetchone()[0])
+        conn.commit()
+        cursor.close()
+        print(f"✅ Particiones aseguradas: {len(created)}")
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error creando particiones: {str(e)}")
+    finally:
+        conn.close()
+    return created
+
+
+def list_partitions(cursor, parent: str) -> List[Dict[str, Any]]:
+    """
+    Particiones de una tabla padre con su límite superior (None para DEFAULT)
+    """
+    cursor.execute("""
+    SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+    FROM pg_inherits i
+    JOIN pg_class parent ON parent.oid = i.inhparent
+    JOIN pg_class child ON child.oid = i.inhrelid
+    WHERE parent.relname = %s
+    ORDER BY child.relname
+    """, (parent,))
+    partitions = []
+    for name, bound in cursor.fetchall():
+        match = _PARTITION_UPPER_RE.search(bound or "")
+        upper = datetime.fromisoformat(match.group(1)).replace(tzinfo=None) if match else None
+        partitions.append({"name": name, "upper": upper})
+    return partitions
+
+
+def drop_expired_partitions(dry_run: bool = False) -> List[str]:
+    """
+    Desprende y elimina las particiones cuyo rango completo quedó fuera de la retención.
+    También limpia result_blobs que ya ninguna fila de Memory referencia (las particiones
+    que quedan pueden apuntar a blobs con last_used_at viejo).
+    """
+    dropped = []
+    conn = get_postgres_connection()
+    if not conn:
+        return dropped
+    try:
+        cursor = conn.cursor()
+        now = datetime.now()
+        for table, days in RETENTION_DAYS.items():
+            cutoff = now - timedelta(days=days)
+            for partition in list_partitions(cursor, table):
+                if partition["upper"] is None or partition["upper"] > cutoff:
+                    continue
+                print(f"🗑️ {table}: {partition['name']} (hasta {partition['upper']:%Y-%m-%d}, retención {days} días)")
+                if not dry_run:
+                    cursor.execute(f'ALTER TABLE {table} DETACH PARTITION "{partition["name"]}"')
+                    cursor.execute(f'DROP TABLE "{partition["name"]}"')
+                    conn.commit()
+                dropped.append(partition["name"])
+
+        if not dry_run:
+            # last_used_at viejo evita borrar un blob recién guardado cuya fila de Memory aún no se insertó
+            cursor.execute(
+                """
+                DELETE FROM result_blobs b
+                WHERE b.last_used_at < %s
+                  AND NOT EXISTS (SELECT 1 FROM Memory m WHERE m.query_result_hash = b.hash)
+                """,
+                (now - timedelta(days=RETENTION_DAYS["memory"]),)
+            )
+            print(f"🧹 result_blobs eliminados: {cursor.rowcount}")
+            conn.commit()
+        cursor.close()
+        print(f"✅ Retención {'(simulada) ' if dry_run else ''}completa: {len(dropped)} particiones")
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error aplicando retención: {str(e)}")
+    finally:
+        conn.close()
+    return dropped
+
+
+# ===============================
+# REPORTE DE TAMAÑO Y BLOAT
+# ===============================
+
+def table_size_report() -> List[Dict[str, Any]]:
+    """
+    Tamaño total, de índices y TOAST, filas vivas/muertas y % de bloat por tabla
+    (las particiones se suman a su tabla padre)
+    """
+    conn = get_postgres_connection()
+    if not conn:
+        return []
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+        SELECT
+            COALESCE(parent.relname, c.relname) AS table_name,
+            COUNT(*) AS partitions,
+            SUM(pg_total_relation_size(c.oid)) AS total_bytes,
+            SUM(pg_indexes_size(c.oid)) AS index_bytes,
+            SUM(COALESCE(pg_total_relation_size(NULLIF(c.reltoastrelid, 0)), 0)) AS toast_bytes,
+            SUM(COALESCE(s.n_live_tup, 0)) AS live_rows,
+            SUM(COALESCE(s.n_dead_tup, 0)) AS dead_rows,
+            MAX(s.last_autovacuum) AS last_autovacuum
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_inherits i ON i.inhrelid = c.oid
+        LEFT JOIN pg_class parent ON parent.oid = i.inhparent
+        LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+        WHERE c.relkind = 'r'
+          AND n.nspname = current_schema()
+        GROUP BY COALESCE(parent.relname, c.relname)
+        ORDER BY total_bytes DESC
+        """)
+        rows = []
+        for name, partitions, total, index, toast, live, dead, last_vacuum in cursor.fetchall():
+            rows.append({
+                "table": name,
+                "partitions": partitions,
+                "total_mb": round(total / 1024 / 1024, 2),
+                "index_mb": round(index / 1024 / 1024, 2),
+                "toast_mb": round(toast / 1024 / 1024, 2),
+                "live_rows": int(live),
+                "dead_rows": int(dead),
+                "bloat_pct": round(100.0 * dead / (live + dead), 1) if (live + dead) else 0.0,
+                "last_autovacuum": last_vacuum,
+            })
+        cursor.close()
+        return rows
+    except Exception as e:
+        print(f"❌ Error generando reporte: {str(e)}")
+        return []
+    finally:
+        conn.close()
+
+
+def print_table_size_report() -> None:
+    rows = table_size_report()
+    print(f"{'tabla':28s} {'part':>4s} {'total MB':>10s} {'idx MB':>9s} {'toast MB':>9s} "
+          f"{'vivas':>10s} {'muertas':>9s} {'bloat':>6s}")
+    for row in rows:
+        print(f"{row['table']:28s} {row['partitions']:>4d} {row['total_mb']:>10.2f} {row['index_mb']:>9.2f} "
+              f"{row['toast_mb']:>9.2f} {row['live_rows']:>10d} {row['dead_rows']:>9d} {row['bloat_pct']:>5.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mantenimiento de tablas de memoria en PostgreSQL")
+    parser.add_argument("command", choices=["partitions", "retention", "report"])
+    parser.add_argument("--dry-run", action="store_true", help="Solo muestra qué particiones se eliminarían")
+    parser.add_argument("--months-ahead", type=int, default=PARTITIONS_MONTHS_AHEAD)
+    args = parser.parse_args()
+
+    if args.command == "partitions":
+        ensure_future_partitions(args.months_ahead)
+    elif args.command == "retention":
+        if not args.dry_run:
+            ensure_future_partitions(args.months_ahead)
+        drop_expired_partitions(dry_run=args.dry_run)
+    else:
+        print_table_size_report()
@@ -0,0 +1,284 @@
+"""
+Banco de frases de espera (reemplazo de la llamada LLM de stream_ini)
+=====================================================================
+
+stream_ini (src/minipywo.py) hacía una llamada completa al LLM con
+stream_ini_prompt solo para decir "estoy buscando la respuesta" antes del
+trabajo SQL: un round trip al modelo en serie en cada pregunta SQL. El banco
+arma ese aviso localmente:
+
+- detect_entities() encuentra equipo (DLS-167, NBRS-F103, equipo 35), pozo
+  (LACh-388(h), pozo X) y fecha (ayer, la semana pasada, 12/03, marzo 2024)
+  con expresiones regulares
+- detect_intent() clasifica la pregunta por palabras clave (conteo, ranking,
+  tiempos perdidos, profundidad, estado, listado o general)
+- pick_filler() elige un template del banco curado para esa intención,
+  prefiriendo los que repiten la entidad detectada ("Busco los datos del
+  DLS-167..."), y evita repetir los últimos FILLER_HISTORY_SIZE de la sesión
+
+FILLER_BANK_ENABLED=false vuelve a la llamada al LLM.
+"""
+
+import os
+import random
+import re
+import string
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from src.metrics_registry import EVENTS_TOTAL
+from src.question_normalizer import QUESTION_CODE_PREFIXES
+
+FILLER_BANK_ENABLED = os.environ.get("FILLER_BANK_ENABLED", "true").lower() == "true"
+# Fillers recientes por sesión que no se repiten
+FILLER_HISTORY_SIZE = int(os.environ.get("FILLER_HISTORY_SIZE", "6"))
+FILLER_MAX_SESSIONS = int(os.environ.get("FILLER_MAX_SESSIONS", "2000"))
+
+# ===============================
+# BANCO CURADO
+# ===============================
+
+# Placeholders: {equipo}, {pozo}, {fecha} (frase adverbial: "ayer", "el 12/03", "en marzo")
+FILLER_BANK: Dict[str, Tuple[str, ...]] = {
+    "general": (
+        "Dame un momento, estoy buscando esa información.",
+        "Buenísimo, ya reviso los datos.",
+        "Perfecto, consulto la base y te cuento.",
+        "Enseguida te respondo, estoy revisando los registros.",
+        "Gracias por la consulta, estoy buscando la respuesta.",
+        "Ya lo busco, dame unos segundos.",
+        "Busco los datos del {equipo}.",
+        "Dale, reviso cómo viene el {equipo}.",
+        "Consulto los registros del {equipo}, un momento.",
+        "Busco la información del pozo {pozo}.",
+        "Reviso los datos del pozo {pozo}, dame un momento.",
+        "Me fijo qué hizo el {equipo} {fecha}.",
+        "Reviso los registros del pozo {pozo} {fecha}.",
+        "Busco lo que pasó {fecha}, un momento.",
+    ),
+    "conteo": (
+        "Hago el conteo y te digo.",
+        "Estoy contando los registros, un momento.",
+        "Reviso los números del {equipo} y hago el conteo.",
+        "Cuento lo que hubo {fecha}, dame unos segundos.",
+    ),
+    "ranking": (
+        "Armo la comparación, dame un momento.",
+        "Comparo los datos y te cuento.",
+        "Reviso cómo viene el {equipo} frente al resto.",
+        "Comparo cómo les fue {fecha}, un momento.",
+    ),
+    "tiempos": (
+        "Reviso los tiempos perdidos, un momento.",
+        "Busco los tiempos no productivos del {equipo}.",
+        "Me fijo en las demoras del pozo {pozo}.",
+        "Reviso las demoras que hubo {fecha}, dame unos segundos.",
+    ),
+    "profundidad": (
+        "Busco la profundidad, un momento.",
+        "Me fijo a qué profundidad está el {equipo}.",
+        "Reviso la profundidad del pozo {pozo}.",
+    ),
+    "estado": (
+        "Me fijo cómo viene la operación, un momento.",
+        "Reviso en qué está el {equipo}.",
+        "Busco el estado del pozo {pozo}.",
+        "Me fijo qué estaba haciendo el {equipo} {fecha}.",
+    ),
+    "listado": (
+        "Armo el listado, dame un momento.",
+        "Busco cuáles son y te los paso.",
+        "Armo la lista de lo que hubo {fecha}, un momento.",
+    ),
+}
+
+# Intención -> palabras clave (en minúsculas, se buscan como palabra o prefijo)
+INTENT_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "conteo": ("cuántos", "cuantos", "cuántas", "cuantas", "cantidad", "total de", "número de", "numero de"),
+    "ranking": ("ranking", "mejor", "peor", "compar", "versus", " vs", "más rápido", "mas rapido", "top "),
+    "tiempos": ("npt", "tiempo perdido", "tiempos perdidos", "no productivo", "demora", "parada", "horas de"),
+    "profundidad": ("profundidad", "metros", "mbbp", "tvd", "md "),
+    "estado": ("estado", "actividad", "qué está", "que esta", "qué hace", "que hace", "haciendo", "operación actual"),
+    "listado": ("lista", "listado", "cuáles", "cuales", "qué equipos", "que equipos", "qué pozos", "que pozos"),
+}
+
+# ===============================
+# ENTIDADES
+# ===============================
+
+# Pozos: YPF.Nq.LACh-388(h), LACh-388(h), "pozo ABC-12"
+_WELL_RE = re.compile(
+    r"\b((?:YPF\.)?(?:[A-Za-z]{1,3}\.)?[A-Za-z]{2,6}[-.]?\d{1,4}\s?\([a-zA-Z]\))"
+    r"|\bpozo\s+([A-Za-z]{2,6}[-.\s]?\d{1,4}(?:\s?\([a-zA-Z]\))?)", re.IGNORECASE)
+# Equipos: "equipo 35", "rig F-35" o un prefijo conocido (QUESTION_CODE_PREFIXES): DLS-167, DLS 167,
+# NBRS-F103, H&P-219. Sin prefijo conocido ni "equipo" antes no se toma: "dame 5 pozos" no es un equipo
+_RIG_PREFIXES = sorted((re.escape(prefix) for prefix in QUESTION_CODE_PREFIXES), key=len, reverse=True)
+_RIG_RE = re.compile(
+    r"\b(?:equipo|rig)\s+([A-Za-z&]{0,6}[-\s]?[A-Za-z]?\d{1,4})\b"
+    + (r"|\b((?:" + "|".join(_RIG_PREFIXES) + r")[-\s]?[A-Za-z]?\d{1,4})\b" if _RIG_PREFIXES else ""),
+    re.IGNORECASE)
+_RELATIVE_DATES = (
+    "anteayer", "antes de ayer", "ayer", "hoy", "esta mañana", "esta semana", "la semana pasada",
+    "este mes", "el mes pasado", "este año", "el año pasado", "las últimas 24 horas", "el último turno",
+)
+_MONTHS = ("enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto", "septiembre",
+           "setiembre", "octubre", "noviembre", "diciembre")
+_RELATIVE_DATE_RE = re.compile(r"\b(" + "|".join(re.escape(d) for d in _RELATIVE_DATES) + r")\b", re.IGNORECASE)
+_NUMERIC_DATE_RE = re.compile(r"\b(\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?)\b")
+_MONTH_RE = re.compile(r"\b(" + "|".join(_MONTHS) + r")(?:\s+(?:de\s+|del\s+)?(20\d{2}))?\b", re.IGNORECASE)
+_YEAR_RE = re.compile(r"\b(20\d{2})\b")
+# Palabras que _RIG_RE confunde con equipos ("top 10", "los 5")
+_NOT_ASSETS = {"top", "los", "las", "del", "de", "el", "la", "en", "al", "con", "por", "hace", "ultimos", "últimos",
+               "dias", "días", "año", "mes", "pozo", "pozos", "horas", "metros", "equipo", "rig"}
+
+
+def _normalize_asset(name: str) -> str:
+    name = re.sub(r"\s+", " ", name.strip())
+    # "dls 167" -> "DLS-167"; se respeta lo que ya trae guion o paréntesis
+    match = re.fullmatch(r"([A-Za-z&]+)\s(\d+)", name)
+    if match:
+        return f"{match.group(1).upper()}-{match.group(2)}"
+    return name.upper() if name.islower() else name
+
+
+def detect_entities(question: str) -> Dict[str, str]:
+    """Equipo, pozo y fecha mencionados en la pregunta (solo los encontrados)"""
+    entities: Dict[str, str] = {}
+    text = question or ""
+
+    for well in _WELL_RE.finditer(text):
+        candidate = well.group(1) or well.group(2)
+        # "pozo de 3000 metros" no nombra un pozo
+        if re.split(r"[-.\s\d]", candidate.strip(), maxsplit=1)[0].lower() in _NOT_ASSETS:
+            continue
+        entities["pozo"] = _normalize_asset(candidate)
+        text = text[:well.start()] + " " + text[well.end():]
+        break
+
+    for rig in _RIG_RE.finditer(text):
+        candidate = rig.group(1) or rig.group(2)
+        head = re.split(r"[-\s\d]", candidate.strip(), maxsplit=1)[0].lower()
+        if head in _NOT_ASSETS or _NUMERIC_DATE_RE.fullmatch(candidate.strip()):
+            continue
+        # "equipo 35" se nombra con el sustantivo: "Busco los datos del equipo 35"
+        entities["equipo"] = _normalize_asset(candidate) if head else f"equipo {candidate.strip()}"
+        break
+
+    relative = _RELATIVE_DATE_RE.search(question or "")
+    numeric = _NUMERIC_DATE_RE.search(question or "")
+    month = _MONTH_RE.search(question or "")
+    year = _YEAR_RE.search(question or "")
+    if relative:
+        entities["fecha"] = relative.group(1).lower()
+    elif numeric:
+        entities["fecha"] = f"el {numeric.group(1)}"
+    elif month:
+        entities["fecha"] = f"en {month.group(1).lower()}" + (f" de {month.group(2)}" if month.group(2) else "")
+    elif year:
+        entities["fecha"] = f"en {year.group(1)}"
+    return entities
+
+
+def detect_intent(question: str) -> str:
+    text = f" {(question or '').lower()} "
+    best, best_hits = "general", 0
+    for intent, keywords in INTENT_KEYWORDS.items():
+        hits = sum(1 for keyword in keywords if keyword in text)
+        if hits > best_hits:
+            best, best_hits = intent, hits
+    return best
+
+
+# ===============================
+# SELECCIÓN
+# ===============================
+
+def _slots(template: str) -> frozenset:
+    return frozenset(name for _, name, _, _ in string.Formatter().parse(template) if name)
+
+
+_TEMPLATE_SLOTS = {template: _slots(template) for templates in FILLER_BANK.values() for template in templates}
+
+
+class FillerBank:
+    """
+    Elige fillers por intención y entidades sin repetir dentro de la sesión (thread-safe)
+    """
+
+    def __init__(self, bank: Dict[str, Tuple[str, ...]] = FILLER_BANK, history_size: int = FILLER_HISTORY_SIZE,
+                 max_sessions: int = FILLER_MAX_SESSIONS, rng: Optional[random.Random] = None):
+        self.bank = bank
+        self.history_size = history_size
+        self.max_sessions = max_sessions
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._recent: "OrderedDict[str, Deque[str]]" = OrderedDict()
+        self.counters = {"picked": 0, "with_entity": 0, "history_exhausted": 0}
+
+    def _tiers(self, intent: str, entities: Dict[str, str]) -> List[List[str]]:
+        """
+        Templates completables agrupados por preferencia: primero los que repiten
+        alguna entidad, dentro de eso los de la intención antes que los de "general",
+        y a igualdad los que usan más entidades
+        """
+        available = set(entities)
+        ranked: Dict[Tuple[bool, bool, int], List[str]] = {}
+        for source in dict.fromkeys((intent, "general")):
+            for template in self.bank.get(source, ()):
+                slots = _TEMPLATE_SLOTS.get(template) or _slots(template)
+                if slots <= available:
+                    rank = (bool(slots), source == intent, len(slots))
+                    ranked.setdefault(rank, []).append(template)
+        return [ranked[rank] for rank in sorted(ranked, reverse=True)]
+
+    def pick(self, question: str, session_id: Optional[str] = None) -> Tuple[str, str, Dict[str, str]]:
+        """Devuelve (filler, intención, entidades)"""
+        intent = detect_intent(question)
+        entities = detect_entities(question)
+        tiers = self._tiers(intent, entities)
+        key = session_id or ""
+        with self._lock:
+            recent = self._recent.get(key)
+            if recent is None:
+                recent = self._recent[key] = deque(maxlen=self.history_size)
+                while len(self._recent) > self.max_sessions:
+                    self._recent.popitem(last=False)
+            else:
+                self._recent.move_to_end(key)
+            # El mejor grupo que tenga algo no dicho hace poco en esta sesión
+            fresh = next(([t for t in tier if t not in recent] for tier in tiers
+                          if any(t not in recent for t in tier)), None)
+            if not fresh:
+                # Todos usados hace poco: el del mejor grupo que se usó hace más tiempo
+                self.counters["history_exhausted"] += 1
+                order = {t: i for i, t in enumerate(recent)}
+                fresh = [min(tiers[0], key=lambda t: order.get(t, -1))]
+            template = self._rng.choice(fresh)
+            recent.append(template)
+            self.counters["picked"] += 1
+            if _TEMPLATE_SLOTS.get(template) or _slots(template):
+                self.counters["with_entity"] += 1
+        EVENTS_TOTAL.labels(event="filler", source=intent).inc()
+        return template.format(**entities), intent, entities
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"sessions": len(self._recent), **self.counters}
+
+
+_bank: Optional[FillerBank] = None
+_bank_lock = threading.Lock()
+
+
+def get_filler_bank() -> FillerBank:
+    global _bank
+    if _bank is None:
+        with _bank_lock:
+            if _bank is None:
+                _bank = FillerBank()
+    return _bank
+
+
+def pick_filler(question: str, session_id: Optional[str] = None) -> str:
+    return get_filler_bank().pick(question, session_id)[0]
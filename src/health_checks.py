@@ -0,0 +1,316 @@
+"""
+Health checks livianos
+======================
+
+/health invocaba el grafo completo (`wl_pywo.invoke({"question": "test"})`):
+cada ping de Azure App Service costaba una llamada de relevancia al LLM,
+a veces una generación de SQL y escrituras en PostgreSQL.
+
+Este módulo separa:
+
+- Liveness: el proceso responde (O(1), sin tocar dependencias)
+- Readiness: resultado cacheado de un chequeo en segundo plano que cada
+  HEALTH_CHECK_INTERVAL_SECONDS prueba cada dependencia con la operación más
+  barata posible (completion de 1 token, SELECT 1, conteo del índice, 1 asset)
+- Modo degradado: is_dependency_down("teradata") para que el grafo pueda
+  responder sin intentar una dependencia caída
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+HEALTH_CHECK_INTERVAL_SECONDS = float(os.environ.get("HEALTH_CHECK_INTERVAL_SECONDS", "60"))
+HEALTH_CHECK_TIMEOUT_SECONDS = float(os.environ.get("HEALTH_CHECK_TIMEOUT_SECONDS", "10"))
+# Un resultado más viejo que N intervalos se reporta como "unknown"
+HEALTH_STALE_FACTOR = float(os.environ.get("HEALTH_STALE_FACTOR", "3"))
+# Dependencias sin las cuales el servicio no está listo (el resto solo degrada)
+HEALTH_CRITICAL_DEPENDENCIES = [
+    name.strip() for name in os.environ.get("HEALTH_CRITICAL_DEPENDENCIES", "azure_openai").split(",") if name.strip()
+]
+HEALTH_OPENAI_DEPLOYMENT = os.environ.get("HEALTH_OPENAI_DEPLOYMENT", "gpt-4o-mini")
+HEALTH_OPENAI_API_VERSION = os.environ.get("HEALTH_OPENAI_API_VERSION", "2025-01-01-preview")
+
+
+class ProbeSkipped(Exception):
+    """La dependencia no está configurada en este entorno"""
+
+
+# ===============================
+# PROBES (uno por dependencia)
+# ===============================
+
+def probe_azure_openai() -> None:
+    """Completion de 1 token contra el deployment que usa el grafo"""
+    endpoint = os.environ.get("AZURE_OPENAI_ENDPOINT")
+    api_key = os.environ.get("AZURE_OPENAI_API_KEY")
+    if not endpoint or not api_key:
+        raise ProbeSkipped("AZURE_OPENAI_ENDPOINT/AZURE_OPENAI_API_KEY no configuradas")
+    url = (f"{endpoint.rstrip('/')}/openai/deployments/{HEALTH_OPENAI_DEPLOYMENT}/chat/completions"
+           f"?api-version={HEALTH_OPENAI_API_VERSION}")
+    response = requests.post(
+        url,
+        headers={"api-key": api_key, "Content-Type": "application/json"},
+        json={"messages": [{"role": "user", "content": "ping"}], "max_tokens": 1, "temperature": 0},
+        timeout=HEALTH_CHECK_TIMEOUT_SECONDS,
+    )
+    response.raise_for_status()
+
+
+def probe_teradata() -> None:
+    """Abre una conexión (get_connection_to_db) y ejecuta SELECT 1"""
+    from src.pywo_aux_func import get_connection_to_db
+
+    conn = get_connection_to_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def probe_postgres() -> None:
+    from src.postgres_integration import get_postgres_connection
+
+    conn = get_postgres_connection()
+    if not conn:
+        raise ConnectionError("No se pudo conectar a PostgreSQL")
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def probe_azure_search() -> None:
+    """Conteo de documentos del índice del catálogo (no ejecuta búsqueda ni embeddings)"""
+    endpoint = os.environ.get("AZURE_SEARCH_SERVICE_ENDPOINT")
+    api_key = os.environ.get("AZURE_SEARCH_ADMIN_KEY")
+    if not endpoint or not api_key:
+        raise ProbeSkipped("AZURE_SEARCH_SERVICE_ENDPOINT/AZURE_SEARCH_ADMIN_KEY no configuradas")
+    index = os.environ.get("HEALTH_SEARCH_INDEX", "pywo-catalogo-index")
+    response = requests.get(
+        f"{endpoint.rstrip('/')}/indexes/{index}/docs/$count?api-version=2024-03-01-preview",
+        headers={"api-key": api_key},
+        timeout=HEALTH_CHECK_TIMEOUT_SECONDS,
+    )
+    response.raise_for_status()
+
+
+def probe_corva() -> None:
+    """Un asset de la compañía, sin pasar por el cache de respuestas"""
+    if not os.getenv("APIM_AUTH_CREDENTIAL"):
+        raise ProbeSkipped("APIM_AUTH_CREDENTIAL no configurada")
+    import json
+    from src.corva_tool import make_corva_request_fixed, CORVA_ASSETS_URL, CORVA_BASE_URL_DATA
+    from src.corva_catalog import CORVA_COMPANY_ID
+
+    data = make_corva_request_fixed(
+        CORVA_ASSETS_URL,
+        params={"limit": 1, "skip": 0, "query": json.dumps({"company_id": CORVA_COMPANY_ID}),
+                "fields": "id"},
+        base_url=CORVA_BASE_URL_DATA,
+        use_cache=False,
+    )
+    if isinstance(data, dict) and "error" in data:
+        raise ValueError(data["error"])
+
+
+PROBES: Dict[str, Callable[[], None]] = {
+    "azure_openai": probe_azure_openai,
+    "teradata": probe_teradata,
+    "postgres": probe_postgres,
+    "azure_search": probe_azure_search,
+    "corva": probe_corva,
+}
+
+
+# ===============================
+# CHEQUEO EN SEGUNDO PLANO
+# ===============================
+
+class HealthChecker:
+    """
+    Corre los probes en paralelo cada `interval` segundos y guarda el último
+    resultado de cada dependencia: {status, latency_ms, checked_at, error}
+    """
+
+    def __init__(self, probes: Optional[Dict[str, Callable[[], None]]] = None,
+                 interval: float = HEALTH_CHECK_INTERVAL_SECONDS,
+                 critical: Optional[List[str]] = None):
+        self.probes = probes or PROBES
+        self.interval = interval
+        self.critical = critical if critical is not None else HEALTH_CRITICAL_DEPENDENCIES
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=len(self.probes), thread_name_prefix="health-probe")
+        self._thread = None
+        self._stop = threading.Event()
+        self.started_at = time.time()
+        self.last_run_at: Optional[float] = None
+
+    def _run_probe(self, name: str, probe: Callable[[], None]) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        try:
+            probe()
+            status, error = "up", None
+        except ProbeSkipped as e:
+            status, error = "skipped", str(e)
+        except Exception as e:
+            status, error = "down", f"{type(e).__name__}: {e}"
+        return {
+            "status": status,
+            "latency_ms": round((time.perf_counter() - t0) * 1000, 1),
+            "checked_at": time.time(),
+            "error": error,
+        }
+
+    def run_once(self) -> None:
+        futures = {name: self._executor.submit(self._run_probe, name, probe) for name, probe in self.probes.items()}
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result(timeout=HEALTH_CHECK_TIMEOUT_SECONDS + 5)
+            except FutureTimeout:
+                results[name] = {
+                    "status": "down",
+                    "latency_ms": None,
+                    "checked_at": time.time(),
+                    "error": f"Timeout ({HEALTH_CHECK_TIMEOUT_SECONDS:.0f}s)",
+                }
+        # Reemplazo completo: los lectores nunca ven un resultado a medio armar
+        self._results = results
+        self.last_run_at = time.time()
+        down = [name for name, result in results.items() if result["status"] == "down"]
+        if down:
+            print(f"⚠️ Dependencias caídas: {', '.join(down)}")
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+
+        def check_loop():
+            while True:
+                try:
+                    self.run_once()
+                except Exception as e:
+                    print(f"⚠️ Error en chequeo de salud: {e}")
+                if self._stop.wait(self.interval):
+                    break
+
+        self._thread = threading.Thread(target=check_loop, name="health-checker", daemon=True)
+        self._thread.start()
+        print(f"🚀 Chequeo de salud iniciado (cada {self.interval:.0f}s, {len(self.probes)} dependencias)")
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # ===============================
+    # CONSULTAS (sin I/O)
+    # ===============================
+
+    def dependencies(self) -> Dict[str, Dict[str, Any]]:
+        """Último resultado por dependencia, con antigüedad; "unknown" si vencido o sin chequear"""
+        results = self._results
+        now = time.time()
+        view = {}
+        for name in self.probes:
+            result = results.get(name)
+            if result is None:
+                view[name] = {"status": "unknown", "latency_ms": None, "checked_at": None, "age_seconds": None, "error": None}
+                continue
+            age = now - result["checked_at"]
+            view[name] = {
+                **result,
+                "status": "unknown" if age > self.interval * HEALTH_STALE_FACTOR else result["status"],
+                "checked_at": datetime.fromtimestamp(result["checked_at"]).isoformat(),
+                "age_seconds": round(age, 1),
+            }
+        return view
+
+    def is_down(self, name: str) -> bool:
+        result = self._results.get(name)
+        return bool(result and result["status"] == "down"
+                    and time.time() - result["checked_at"] <= self.interval * HEALTH_STALE_FACTOR)
+
+    def readiness(self) -> Dict[str, Any]:
+        dependencies = self.dependencies()
+        critical_down = [name for name in self.critical if dependencies.get(name, {}).get("status") in ("down", "unknown")]
+        degraded = [name for name, result in dependencies.items()
+                    if result["status"] == "down" and name not in self.critical]
+        if critical_down:
+            status = "unhealthy"
+        elif degraded:
+            status = "degraded"
+        else:
+            status = "healthy"
+        return {
+            "status": status,
+            "ready": not critical_down,
+            "degraded": bool(degraded),
+            "critical_down": critical_down,
+            "degraded_dependencies": degraded,
+            "dependencies": dependencies,
+            "check_interval_seconds": self.interval,
+        }
+
+
+_checker: Optional[HealthChecker] = None
+_checker_lock = threading.Lock()
+_warned_no_checker = False
+
+
+def get_health_checker() -> HealthChecker:
+    """Checker singleton; arranca el hilo de chequeo al primer uso"""
+    global _checker
+    if _checker is None:
+        with _checker_lock:
+            if _checker is None:
+                _checker = HealthChecker()
+    _checker.start()
+    return _checker
+
+
+def liveness() -> Dict[str, Any]:
+    return {"status": "alive", "timestamp": datetime.now().isoformat()}
+
+
+def health_checker_running() -> bool:
+    """False si nadie llamó get_health_checker() en este proceso (o el hilo murió)"""
+    return _checker is not None and _checker.is_running
+
+
+def is_dependency_down(name: str) -> bool:
+    """
+    Modo degradado para el grafo: True solo si el último chequeo (vigente) falló.
+    Sin resultado se asume disponible. Sin checker activo el circuito está
+    apagado: se avisa una vez por proceso en lugar de fallar en silencio.
+    """
+    global _warned_no_checker
+    if not health_checker_running():
+        if not _warned_no_checker:
+            _warned_no_checker = True
+            print(f"⚠️ is_dependency_down('{name}') sin chequeo de salud activo: modo degradado desactivado "
+                  f"(arrancar get_health_checker() al iniciar la app)")
+        return False
+    return _checker.is_down(name)
+
+
+def degraded_dependencies() -> List[str]:
+    if _checker is None:
+        return []
+    return [name for name in _checker.probes if _checker.is_down(name)]
@@ -0,0 +1,259 @@
+"""
+Pool de trabajos para el grafo minipywo
+=======================================
+
+/api/minipywo-process y el evento Socket.IO process_message llamaban a
+wl_pywo.invoke dentro del hilo del request: con el worker sync de gunicorn
+una pregunta lenta bloquea el worker, y en modo threading cada mensaje abre
+un hilo más sin límite. Este módulo ejecuta las preguntas en un pool acotado:
+
+- MINIPYWO_WORKERS hilos y una cola de admisión de MINIPYWO_QUEUE_SIZE
+  trabajos; con la cola llena submit() rechaza (HTTP 429 / evento "busy")
+- Máximo MINIPYWO_MAX_JOBS_PER_USER trabajos activos por usuario
+- submit / get / wait / cancel por job_id; on_done se llama al terminar
+  (app.py lo usa para emitir el resultado a la sala del socket)
+- Métricas de espera en cola, duración y profundidad en el registro
+
+La cancelación es cooperativa: un trabajo en cola no se ejecuta; uno en
+ejecución termina igual (el grafo no se puede interrumpir) pero su resultado
+se descarta y on_done no se llama.
+"""
+
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from src.metrics_registry import REGISTRY, EVENTS_TOTAL, register_queue_depth
+
+MINIPYWO_WORKERS = int(os.environ.get("MINIPYWO_WORKERS", "4"))
+MINIPYWO_QUEUE_SIZE = int(os.environ.get("MINIPYWO_QUEUE_SIZE", "32"))
+MINIPYWO_MAX_JOBS_PER_USER = int(os.environ.get("MINIPYWO_MAX_JOBS_PER_USER", "2"))
+# Trabajos terminados que se conservan para poll (segundos)
+MINIPYWO_JOB_TTL_SECONDS = float(os.environ.get("MINIPYWO_JOB_TTL_SECONDS", "600"))
+
+JOB_WAIT_SECONDS = REGISTRY.histogram(
+    "minipywo_job_wait_seconds", "Tiempo en cola de admisión antes de ejecutar", ["pool"])
+JOB_RUN_SECONDS = REGISTRY.histogram(
+    "minipywo_job_run_seconds", "Duración de ejecución de cada trabajo", ["pool", "outcome"])
+
+QUEUED, RUNNING, DONE, ERROR, CANCELLED = "queued", "running", "done", "error", "cancelled"
+FINISHED = (DONE, ERROR, CANCELLED)
+
+
+class JobRejected(Exception):
+    """El trabajo no fue admitido (cola llena o límite por usuario)"""
+
+    def __init__(self, reason: str, message: str, retry_after: int = 2):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Job:
+    __slots__ = ("id", "user_key", "payload", "on_done", "runner", "status", "result", "error",
+                 "submitted_at", "started_at", "finished_at", "_done")
+
+    def __init__(self, user_key: str, payload: Any, on_done: Optional[Callable[["Job"], None]],
+                 runner: Optional[Callable[[Any], Any]] = None):
+        self.id = str(uuid.uuid4())
+        self.user_key = user_key
+        self.payload = payload
+        self.on_done = on_done
+        self.runner = runner
+        self.status = QUEUED
+        self.result = None
+        self.error: Optional[str] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._done = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "wait_seconds": round((self.started_at or time.time()) - self.submitted_at, 3),
+        }
+        if self.finished_at and self.started_at:
+            data["run_seconds"] = round(self.finished_at - self.started_at, 3)
+        if self.status == DONE:
+            data["result"] = self.result
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class JobPool:
+    """
+    Pool acotado de hilos con cola de admisión y límite de trabajos por usuario
+    """
+
+    def __init__(self, runner: Callable[[Any], Any], workers: int = MINIPYWO_WORKERS,
+                 queue_size: int = MINIPYWO_QUEUE_SIZE, max_per_user: int = MINIPYWO_MAX_JOBS_PER_USER,
+                 name: str = "minipywo"):
+        self.runner = runner
+        self.name = name
+        self.workers = workers
+        self.max_per_user = max_per_user
+        self.queue_size = queue_size
+        # La admisión se controla con _queued (los cancelados en cola no ocupan cupo)
+        self._queue: "queue.Queue[Job]" = queue.Queue()
+        self._queued = 0
+        self._jobs: Dict[str, Job] = {}
+        self._active_by_user: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._running = 0
+        self._threads = []
+        self.counters = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0,
+                         "rejected_queue_full": 0, "rejected_user_limit": 0}
+        register_queue_depth(f"{name}_jobs_queued", lambda: self._queued)
+        register_queue_depth(f"{name}_jobs_running", lambda: self._running)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f"{self.name}-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        print(f"🚀 Pool {self.name} iniciado ({self.workers} workers, cola {self.queue_size}, "
+              f"{self.max_per_user} por usuario)")
+
+    # ===============================
+    # API
+    # ===============================
+
+    def submit(self, user_key: str, payload: Any, on_done: Optional[Callable[[Job], None]] = None,
+               runner: Optional[Callable[[Any], Any]] = None) -> Job:
+        """
+        Encola un trabajo. Raises JobRejected si la cola está llena o el usuario
+        ya tiene max_per_user trabajos activos. runner reemplaza al del pool para
+        este trabajo (p. ej. tools Realtime que comparten cupo con minipywo).
+        """
+        self.start()
+        job = Job(user_key, payload, on_done, runner)
+        with self._lock:
+            self._expire_finished()
+            if self._active_by_user.get(user_key, 0) >= self.max_per_user:
+                self.counters["rejected_user_limit"] += 1
+                EVENTS_TOTAL.labels(event="job_rejected", source="user_limit").inc()
+                raise JobRejected("user_limit", f"Ya hay {self.max_per_user} consultas en curso para este usuario")
+            if self._queued >= self.queue_size:
+                self.counters["rejected_queue_full"] += 1
+                EVENTS_TOTAL.labels(event="job_rejected", source="queue_full").inc()
+                raise JobRejected("queue_full", "El servidor está ocupado, intentá de nuevo en unos segundos",
+                                  retry_after=5)
+            self._queue.put_nowait(job)
+            self._queued += 1
+            self._jobs[job.id] = job
+            self._active_by_user[user_key] = self._active_by_user.get(user_key, 0) + 1
+            self.counters["submitted"] += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str, user_key: Optional[str] = None) -> bool:
+        """
+        Cancela un trabajo no terminado; False si no existe, ya terminó o
+        (con user_key) pertenece a otro usuario
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return False
+            if user_key is not None and job.user_key != user_key:
+                return False
+            was_queued = job.status == QUEUED
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            self.counters["cancelled"] += 1
+            if was_queued:
+                # El worker lo saltea al sacarlo de la cola; el cupo se libera ya
+                self._queued -= 1
+                self._release(job.user_key)
+        job._done.set()
+        return True
+
+    # ===============================
+    # WORKERS
+    # ===============================
+
+    def _release(self, user_key: str) -> None:
+        remaining = self._active_by_user.get(user_key, 1) - 1
+        if remaining > 0:
+            self._active_by_user[user_key] = remaining
+        else:
+            self._active_by_user.pop(user_key, None)
+
+    def _expire_finished(self) -> None:
+        cutoff = time.time() - MINIPYWO_JOB_TTL_SECONDS
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.status in FINISHED and job.finished_at and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def _worker_loop(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                self._execute(job)
+            finally:
+                self._queue.task_done()
+
+    def _execute(self, job: Job) -> None:
+        with self._lock:
+            if job.status == CANCELLED:
+                return
+            self._queued -= 1
+            job.status = RUNNING
+            job.started_at = time.time()
+            self._running += 1
+        JOB_WAIT_SECONDS.labels(pool=self.name).observe(job.started_at - job.submitted_at)
+
+        t0 = time.perf_counter()
+        try:
+            result, error, status = (job.runner or self.runner)(job.payload), None, DONE
+        except Exception as e:
+            result, error, status = None, str(e), ERROR
+        JOB_RUN_SECONDS.labels(pool=self.name, outcome=status).observe(time.perf_counter() - t0)
+
+        with self._lock:
+            self._running -= 1
+            cancelled = job.status == CANCELLED
+            if not cancelled:
+                job.status, job.result, job.error = status, result, error
+                job.finished_at = time.time()
+                self.counters["completed" if status == DONE else "failed"] += 1
+            self._release(job.user_key)
+        job._done.set()
+
+        if not cancelled and job.on_done is not None:
+            try:
+                job.on_done(job)
+            except Exception as e:
+                print(f"⚠️ Error en callback de trabajo {job.id}: {e}")
+
+    # ===============================
+    # MÉTRICAS
+    # ===============================
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "queued": self._queued,
+                "running": self._running,
+                "max_jobs_per_user": self.max_per_user,
+                "users_active": len(self._active_by_user),
+                "tracked_jobs": len(self._jobs),
+                **self.counters,
+            }
@@ -2,7 +2,8 @@ import psycopg2
 import json
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional, Union
-from src.postgres_integration import get_postgres_connection
+from src.postgres_integration import get_postgres_connection, MEMORY_QUERY_RESULT_SQL
+from src.memory_index import find_similar_history, get_indexed_history
 import difflib
 import uuid
 
@@ -33,11 +34,11 @@ def get_user_conversation_history(user_id: Union[int, str, uuid.UUID, None] = No
         cursor = conn.cursor()
         
         # Construir query dinámicamente
-        base_query = """
+        base_query = f"""
         SELECT 
             session_id,
             user_question,
-            query_result,
+            {MEMORY_QUERY_RESULT_SQL},
             relevance,
             sql_query,
             interaction_type,
@@ -55,7 +56,7 @@ def get_user_conversation_history(user_id: Union[int, str, uuid.UUID, None] = No
         if user_id:
             user_id_str = str(user_id)  # Convierte UUID, int, o string a string
             print('USER_ID dentro de get_user_conversation_history:', user_id_str)
-            base_query += " AND session_id IN (SELECT DISTINCT session_id FROM Memory WHERE user_id = %s)"
+            base_query += " AND user_id = %s"
             params.append(user_id_str)
             
         # Excluir sesión actual
@@ -107,7 +108,6 @@ def get_relevant_context_for_question(current_question: str, user_id: int = None
     Busca contexto relevante en el historial para la pregunta actual, 
     aplicando Top-K adaptativo y priorizando entidades y presentaciones.
     """
-    import difflib
 
     # Patrones y entidades clave
     META_QUESTIONS = [
@@ -119,8 +119,10 @@ def get_relevant_context_for_question(current_question: str, user_id: int = None
     ]
 
     try:
-        # Recuperar historial
-        history = get_user_conversation_history(user_id, session_id, last_n_days=7, limit=50)
+        # Recuperar historial: desde el índice del usuario si está al día, si no desde Memory
+        history = get_indexed_history(user_id, session_id, last_n_days=7, limit=50)
+        if history is None:
+            history = get_user_conversation_history(user_id, session_id, last_n_days=7, limit=50)
         print(f"📚 Recuperadas {len(history)} interacciones del historial")
         #for idx, item in enumerate(history, 1):
         #    print(f"🔎 [{idx}] Pregunta: {item.get('question')}\n    Respuesta: {item.get('answer')}\n    SQL: {item.get('sql_query')}\n    Fecha: {item.get('created_at')}\n" + "-"*60)
@@ -149,16 +151,8 @@ def get_relevant_context_for_question(current_question: str, user_id: int = None
             if any(entity in question_lower and entity in q_text for entity in ENTITY_KEYWORDS):
                 entity_matches.append(item)
 
-        # 4. Similitud (puedes cambiar a embeddings si quieres, aquí difflib por robustez)
-        def sim(q1, q2):
-            return difflib.SequenceMatcher(None, q1, q2).ratio()
-
-        scored = [
-            (sim(current_question, item.get("question", "")), item)
-            for item in history
-        ]
-        scored = sorted(scored, key=lambda x: x[0], reverse=True)
-        top_k_similar = [item for score, item in scored[:top_k]]
+        # 4. Similitud: índice por usuario (tf-idf + embeddings opcionales), difflib como fallback
+        top_k_similar = find_similar_history(current_question, history, user_id, session_id, top_k)
 
         # 5. Mezcla y deduplica (prioridad: presentación > entidades > top_k_similar)
         combined = []
@@ -193,6 +187,66 @@ def get_relevant_context_for_question(current_question: str, user_id: int = None
         print(f"❌ Error buscando contexto: {str(e)}")
         return ""
 
+def _get_user_stats_materialized(cursor, user_id_str: str, since: datetime):
+    """
+    Estadísticas de los últimos 30 días desde user_stats (máx. 30 filas por usuario)
+    """
+    cursor.execute("""
+    SELECT 
+        COALESCE(SUM(total_interactions), 0),
+        COALESCE(SUM(sql_queries), 0),
+        COALESCE(SUM(casual_chats), 0),
+        SUM(total_processing_time) / NULLIF(SUM(processing_time_samples), 0),
+        COALESCE(SUM(successful_corrections), 0),
+        (SELECT COUNT(*) FROM user_sessions 
+         WHERE user_id = %s AND last_seen_at >= %s)
+    FROM user_stats 
+    WHERE user_id = %s AND day >= %s
+    """, [user_id_str, since, user_id_str, since.date()])
+    stats = cursor.fetchone()
+
+    cursor.execute("""
+    SELECT topic.key, SUM(topic.value::int) AS frequency
+    FROM user_stats, jsonb_each_text(user_stats.topics) AS topic
+    WHERE user_id = %s AND day >= %s
+    GROUP BY topic.key
+    ORDER BY frequency DESC
+    LIMIT 5
+    """, [user_id_str, since.date()])
+    topics = cursor.fetchall()
+    return stats, topics
+
+def _get_stats_from_memory(cursor, column: str, value: str, since: datetime):
+    """
+    Estadísticas directas sobre Memory filtrando por una columna indexada
+    (user_id o session_id, índices (columna, created_at))
+    """
+    cursor.execute(f"""
+    SELECT 
+        COUNT(*) as total_interactions,
+        COUNT(CASE WHEN relevance = 'consulta' THEN 1 END) as sql_queries,
+        COUNT(CASE WHEN relevance = 'casual' THEN 1 END) as casual_chats,
+        AVG(processing_time_seconds) as avg_processing_time,
+        COUNT(CASE WHEN correction_success = true THEN 1 END) as successful_corrections,
+        COUNT(DISTINCT session_id) as total_sessions
+    FROM Memory 
+    WHERE {column} = %s AND created_at >= %s
+    """, [value, since])
+    stats = cursor.fetchone()
+
+    cursor.execute(f"""
+    SELECT 
+        interaction_type,
+        COUNT(*) as frequency
+    FROM Memory 
+    WHERE {column} = %s AND created_at >= %s
+    GROUP BY interaction_type
+    ORDER BY frequency DESC
+    LIMIT 5
+    """, [value, since])
+    topics = cursor.fetchall()
+    return stats, topics
+
 def get_user_preferences_and_patterns(user_id: Union[int, str, uuid.UUID, None] = None, 
                                      session_id: str = None) -> Dict[str, Any]:
     """
@@ -204,49 +258,23 @@ def get_user_preferences_and_patterns(user_id: Union[int, str, uuid.UUID, None]
             return {}
             
         cursor = conn.cursor()
-        
-        # Obtener estadísticas del usuario
-        stats_query = """
-        SELECT 
-            COUNT(*) as total_interactions,
-            COUNT(CASE WHEN relevance = 'consulta' THEN 1 END) as sql_queries,
-            COUNT(CASE WHEN relevance = 'casual' THEN 1 END) as casual_chats,
-            AVG(processing_time_seconds) as avg_processing_time,
-            COUNT(CASE WHEN correction_success = true THEN 1 END) as successful_corrections,
-            COUNT(DISTINCT session_id) as total_sessions
-        FROM Memory 
-        WHERE created_at >= %s
-        """
-        
-        params = [datetime.now() - timedelta(days=30)]
-        
-        if user_id:
+        since = datetime.now() - timedelta(days=30)
+
+        stats, topics = None, []
+        # extract_user_id_from_session devuelve el session_id si no hay usuario: esas filas
+        # tienen user_id NULL en Memory y se consultan por sesión
+        if user_id and str(user_id) != str(session_id):
             # FIX: Normalizar user_id a string
             user_id_str = str(user_id)
-            # Buscar sesiones del usuario
-            stats_query += " AND session_id LIKE %s"
-            params.append(f"%user{user_id_str}%")
+            try:
+                stats, topics = _get_user_stats_materialized(cursor, user_id_str, since)
+            except Exception as e:
+                # user_stats aún no migrada: consulta directa por user_id (indexada)
+                print(f"⚠️ user_stats no disponible, consultando Memory: {str(e)}")
+                conn.rollback()
+                stats, topics = _get_stats_from_memory(cursor, "user_id", user_id_str, since)
         elif session_id:
-            session_id_str = str(session_id)
-            stats_query += " AND session_id = %s"
-            params.append(session_id_str)
-            
-        cursor.execute(stats_query, params)
-        stats = cursor.fetchone()
-        
-        # Obtener temas más consultados
-        topics_query = """
-        SELECT 
-            interaction_type,
-            COUNT(*) as frequency
-        FROM Memory 
-        WHERE created_at >= %s
-        GROUP BY interaction_type
-        ORDER BY frequency DESC
-        LIMIT 5
-        """
-        cursor.execute(topics_query, [datetime.now() - timedelta(days=30)])
-        topics = cursor.fetchall()
+            stats, topics = _get_stats_from_memory(cursor, "session_id", str(session_id), since)
         
         cursor.close()
         conn.close()
@@ -0,0 +1,553 @@
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+import difflib
+import heapq
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+# ===============================
+# ÍNDICE DE MEMORIA POR USUARIO
+# ===============================
+# Reemplaza el ranking con difflib de get_relevant_context_for_question por un
+# índice invertido de tokens (tf-idf coseno) mantenido en memoria por usuario,
+# con embeddings opcionales y una ruta opcional por columna vectorial en Memory.
+# El índice se carga una vez desde el historial y después crece con cada
+# save_complete_memory (note_saved_memory); la recarga completa desde la base
+# solo ocurre cada MEMORY_INDEX_RESYNC_SECONDS (filas guardadas por otros
+# procesos); mientras tanto el historial del usuario también se sirve desde el
+# índice (get_indexed_history), sin consultar Memory en cada pregunta. Los
+# embeddings se calculan en un hilo aparte, fuera del request.
+
+MEMORY_INDEX_MAX_USERS = int(os.environ.get("MEMORY_INDEX_MAX_USERS", "500"))
+MEMORY_INDEX_LEXICAL_WEIGHT = float(os.environ.get("MEMORY_INDEX_LEXICAL_WEIGHT", "0.5"))
+MEMORY_INDEX_USE_EMBEDDINGS = os.environ.get("MEMORY_INDEX_USE_EMBEDDINGS", "false").lower() == "true"
+MEMORY_VECTOR_COLUMN_ENABLED = os.environ.get("MEMORY_VECTOR_COLUMN_ENABLED", "false").lower() == "true"
+MEMORY_INDEX_RESYNC_SECONDS = float(os.environ.get("MEMORY_INDEX_RESYNC_SECONDS", "300"))
+
+# Un solo hilo para embeddings: el guardado y la búsqueda nunca esperan al servicio
+_EMBEDDING_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-embed")
+
+_STOPWORDS = {
+    "el", "la", "los", "las", "un", "una", "unos", "unas", "de", "del", "al", "a",
+    "en", "y", "o", "que", "por", "para", "con", "sin", "se", "es", "son", "me",
+    "mi", "tu", "su", "lo", "le", "les", "como", "cual", "cuales", "cuanto",
+    "cuantos", "cuanta", "cuantas", "hay", "esta", "este", "estos", "estas",
+    "dame", "decime", "quiero", "saber", "the", "of", "and", "to", "is"
+}
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _fold(text: str) -> str:
+    """Minúsculas y sin acentos"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize_question(text: str) -> List[str]:
+    """
+    Tokeniza una pregunta para el índice: minúsculas, sin acentos, sin stopwords
+    y con un recorte simple de plurales ("pozos" -> "pozo", "equipos" -> "equipo")
+    """
+    tokens = []
+    for tok in _TOKEN_RE.findall(_fold(text or "")):
+        if tok in _STOPWORDS:
+            continue
+        if len(tok) > 4 and not tok.isdigit():
+            if tok.endswith("es") and tok[-3] in "rnld":
+                tok = tok[:-2]
+            elif tok.endswith("s"):
+                tok = tok[:-1]
+        tokens.append(tok)
+    return tokens
+
+
+def _history_key(item: Dict) -> Tuple:
+    """Clave estable de una fila de historial"""
+    return (item.get("session_id"), item.get("created_at"), item.get("question"))
+
+
+# ===============================
+# RANKING LEGADO (FALLBACK)
+# ===============================
+
+def rank_by_difflib(current_question: str, history: List[Dict], top_k: int) -> List[Dict]:
+    """
+    Ranking original con difflib.SequenceMatcher, se mantiene como fallback
+    """
+    def sim(q1, q2):
+        return difflib.SequenceMatcher(None, q1, q2).ratio()
+
+    scored = [
+        (sim(current_question, item.get("question", "")), item)
+        for item in history
+    ]
+    scored = sorted(scored, key=lambda x: x[0], reverse=True)
+    return [item for score, item in scored[:top_k]]
+
+
+# ===============================
+# EMBEDDINGS (OPCIONALES)
+# ===============================
+
+def _get_embeddings_client():
+    """Importa el cliente de embeddings solo cuando se habilitan"""
+    from src.catalogo_retrieval import embeddings
+    return embeddings
+
+
+def _normalize_rows(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+@lru_cache(maxsize=1024)
+def embed_question(question: str) -> np.ndarray:
+    """
+    Embedding normalizado de una pregunta (cacheado por texto, de solo lectura)
+    """
+    vector = _normalize_rows(_get_embeddings_client().embed_query(question))
+    vector.setflags(write=False)
+    return vector
+
+
+def _embed_many(questions: List[str]) -> np.ndarray:
+    """Embeddings normalizados en lote (una fila por pregunta)"""
+    return _normalize_rows(_get_embeddings_client().embed_documents(questions))
+
+
+# ===============================
+# ÍNDICE EN MEMORIA
+# ===============================
+
+class UserMemoryIndex:
+    """
+    Índice de preguntas previas de un usuario.
+
+    - Índice invertido token -> ids de documentos (tf binario, idf por índice)
+    - Normas de documento recalculadas solo cuando el índice cambia
+    - Embeddings opcionales por documento para scoring híbrido, en una matriz
+      numpy (un solo producto matriz-vector por búsqueda)
+    """
+
+    def __init__(self, use_embeddings: bool = MEMORY_INDEX_USE_EMBEDDINGS,
+                 lexical_weight: float = MEMORY_INDEX_LEXICAL_WEIGHT):
+        self.use_embeddings = use_embeddings
+        self.lexical_weight = lexical_weight
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._key_to_id: Dict[Tuple, int] = {}
+        self._items: Dict[int, Dict] = {}
+        self._tokens: Dict[int, frozenset] = {}
+        self._postings: Dict[str, set] = {}
+        self._norms: Dict[int, float] = {}
+        self._idf: Dict[str, float] = {}
+        self._vectors: Dict[int, np.ndarray] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_ids: List[int] = []
+        self._dirty = False
+        self._vectors_dirty = False
+        self.synced_at: Optional[float] = None
+
+    def __len__(self):
+        return len(self._items)
+
+    def needs_sync(self, max_age: float = MEMORY_INDEX_RESYNC_SECONDS) -> bool:
+        return self.synced_at is None or time.time() - self.synced_at >= max_age
+
+    def sync(self, history: List[Dict]) -> None:
+        """
+        Agrega las filas del historial que el índice no tiene. No quita nada: las
+        filas guardadas después de la consulta a la base ya están (add) y la ventana
+        de días se aplica en search()
+        """
+        with self._lock:
+            new_ids = [self._add(item) for item in history if _history_key(item) not in self._key_to_id]
+            if new_ids:
+                self._dirty = True
+            self.synced_at = time.time()
+        self._schedule_embeddings(new_ids)
+
+    def add(self, item: Dict) -> None:
+        """Fila recién guardada (save_complete_memory): entra al índice sin releer la base"""
+        with self._lock:
+            if _history_key(item) in self._key_to_id:
+                return
+            doc_id = self._add(item)
+            self._dirty = True
+        self._schedule_embeddings([doc_id])
+
+    def _schedule_embeddings(self, doc_ids: List[int]) -> None:
+        if not self.use_embeddings or not doc_ids:
+            return
+        with self._lock:
+            pending = [(doc_id, self._items[doc_id].get("question", "")) for doc_id in doc_ids if doc_id in self._items]
+        _EMBEDDING_EXECUTOR.submit(self._embed_pending, pending)
+
+    def _embed_pending(self, pending: List[Tuple[int, str]]) -> None:
+        try:
+            vectors = _embed_many([question for _, question in pending])
+        except Exception as e:
+            print(f"⚠️ No se pudieron calcular embeddings del historial: {str(e)}")
+            return
+        with self._lock:
+            for (doc_id, _), vector in zip(pending, vectors):
+                if doc_id in self._items:
+                    self._vectors[doc_id] = vector
+            self._vectors_dirty = True
+
+    def _add(self, item: Dict) -> int:
+        doc_id = self._next_id
+        self._next_id += 1
+        tokens = frozenset(tokenize_question(item.get("question", "")))
+        self._key_to_id[_history_key(item)] = doc_id
+        self._items[doc_id] = item
+        self._tokens[doc_id] = tokens
+        for tok in tokens:
+            self._postings.setdefault(tok, set()).add(doc_id)
+        return doc_id
+
+    def _remove(self, doc_id: int) -> None:
+        for tok in self._tokens.pop(doc_id, ()):
+            postings = self._postings.get(tok)
+            if postings is not None:
+                postings.discard(doc_id)
+                if not postings:
+                    del self._postings[tok]
+        self._items.pop(doc_id, None)
+        self._norms.pop(doc_id, None)
+        if self._vectors.pop(doc_id, None) is not None:
+            self._vectors_dirty = True
+
+    def _prune(self, since: datetime) -> None:
+        """Quita las filas que salieron de la ventana de días"""
+        expired = [doc_id for doc_id, item in self._items.items()
+                   if isinstance(item.get("created_at"), datetime) and item["created_at"] < since]
+        for doc_id in expired:
+            self._key_to_id.pop(_history_key(self._items[doc_id]), None)
+            self._remove(doc_id)
+        if expired:
+            self._dirty = True
+
+    def _refresh_matrix(self) -> None:
+        self._matrix_ids = list(self._vectors)
+        self._matrix = np.vstack([self._vectors[doc_id] for doc_id in self._matrix_ids]) if self._vectors else None
+        self._vectors_dirty = False
+
+    def _refresh_weights(self) -> None:
+        """Recalcula idf y normas de documentos (solo tras cambios)"""
+        n_docs = len(self._items) or 1
+        self._idf = {
+            tok: math.log(1.0 + n_docs / len(ids))
+            for tok, ids in self._postings.items()
+        }
+        idf = self._idf
+        self._norms = {
+            doc_id: math.sqrt(sum(idf[t] * idf[t] for t in tokens)) or 1.0
+            for doc_id, tokens in self._tokens.items()
+        }
+        self._dirty = False
+
+    def recent(self, exclude_session: Optional[str] = None, since: Optional[datetime] = None,
+               limit: int = 50) -> List[Dict]:
+        """
+        Historial en el orden de get_user_conversation_history (primero los
+        sql_workflow_complete, después los más recientes), sin ir a la base
+        """
+        with self._lock:
+            if since is not None:
+                self._prune(since)
+            items = [item for item in self._items.values()
+                     if exclude_session is None or item.get("session_id") != exclude_session]
+        items.sort(key=lambda item: item.get("created_at") or datetime.min, reverse=True)
+        items.sort(key=lambda item: item.get("interaction_type") != "sql_workflow_complete")
+        return items[:limit]
+
+    def search(self, question: str, top_k: int = 5, exclude_session: Optional[str] = None,
+               since: Optional[datetime] = None) -> List[Tuple[float, Dict]]:
+        """
+        Top-K por scoring híbrido (tf-idf coseno + embeddings si existen), sin las
+        filas de exclude_session ni las anteriores a since.
+        Si hay menos candidatos léxicos que top_k se completa con los más recientes,
+        igual que el ranking original que siempre devolvía top_k elementos.
+        """
+        q_vec = None
+        if self.use_embeddings and self._vectors:
+            try:
+                q_vec = embed_question(question)
+            except Exception as e:
+                print(f"⚠️ Embedding de la pregunta no disponible: {str(e)}")
+
+        with self._lock:
+            if since is not None:
+                self._prune(since)
+            if self._dirty:
+                self._refresh_weights()
+            if not self._items:
+                return []
+
+            idf = self._idf
+            q_tokens = set(tokenize_question(question))
+            q_weights = {t: idf[t] for t in q_tokens if t in idf}
+            q_norm = math.sqrt(sum(w * w for w in q_weights.values())) or 1.0
+
+            # Tokens raros primero: generan candidatos. Los tokens muy frecuentes
+            # solo suman a candidatos existentes para no recorrer todo el índice.
+            common_df = max(50, len(self._items) // 10)
+            scores: Dict[int, float] = {}
+            for tok, weight in sorted(q_weights.items(), key=lambda x: -x[1]):
+                w2 = weight * weight
+                postings = self._postings[tok]
+                if scores and len(postings) > common_df:
+                    for doc_id in scores:
+                        if doc_id in postings:
+                            scores[doc_id] += w2
+                else:
+                    for doc_id in postings:
+                        scores[doc_id] = scores.get(doc_id, 0.0) + w2
+
+            norms = self._norms
+            for doc_id in scores:
+                scores[doc_id] /= (q_norm * norms[doc_id])
+
+            if q_vec is not None and self._vectors:
+                if self._vectors_dirty:
+                    self._refresh_matrix()
+                alpha = self.lexical_weight
+                cosines = self._matrix @ q_vec
+                for doc_id, cos in zip(self._matrix_ids, cosines.tolist()):
+                    scores[doc_id] = alpha * scores.get(doc_id, 0.0) + (1 - alpha) * cos
+
+            if exclude_session is not None:
+                excluded = {doc_id for doc_id, item in self._items.items()
+                            if item.get("session_id") == exclude_session}
+                scores = {doc_id: score for doc_id, score in scores.items() if doc_id not in excluded}
+            else:
+                excluded = set()
+
+            best = heapq.nlargest(top_k, scores.items(), key=lambda x: (x[1], x[0]))
+            result = [(score, self._items[doc_id]) for doc_id, score in best]
+
+            if len(result) < top_k:
+                chosen = {doc_id for doc_id, _ in best} | excluded
+                for doc_id in sorted(self._items, reverse=True):
+                    if len(result) >= top_k:
+                        break
+                    if doc_id not in chosen:
+                        result.append((0.0, self._items[doc_id]))
+            return result
+
+
+_USER_INDEXES: "OrderedDict[str, UserMemoryIndex]" = OrderedDict()
+_USER_INDEXES_LOCK = threading.Lock()
+
+
+def _user_key(user_id) -> str:
+    return str(user_id) if user_id is not None else "__anon__"
+
+
+def get_user_memory_index(user_id) -> UserMemoryIndex:
+    """
+    Devuelve (o crea) el índice del usuario. LRU acotado por MEMORY_INDEX_MAX_USERS.
+    """
+    key = _user_key(user_id)
+    with _USER_INDEXES_LOCK:
+        index = _USER_INDEXES.get(key)
+        if index is None:
+            index = UserMemoryIndex()
+            _USER_INDEXES[key] = index
+            while len(_USER_INDEXES) > MEMORY_INDEX_MAX_USERS:
+                _USER_INDEXES.popitem(last=False)
+        else:
+            _USER_INDEXES.move_to_end(key)
+        return index
+
+
+def note_saved_memory(user_id, item: Dict) -> None:
+    """
+    Fila recién guardada en Memory: se suma al índice del usuario si ya está cargado
+    (si no, la primera búsqueda lo carga desde la base con esta fila incluida)
+    """
+    if not user_id:
+        return
+    with _USER_INDEXES_LOCK:
+        index = _USER_INDEXES.get(_user_key(user_id))
+    if index is not None:
+        index.add(item)
+
+
+def get_indexed_history(user_id, session_id: str = None, last_n_days: int = 7,
+                        limit: int = 50) -> Optional[List[Dict]]:
+    """
+    Historial del usuario desde su índice si ya está cargado y al día; None si
+    hay que consultar Memory (índice frío, resync vencido o sesión sin usuario)
+    """
+    if not user_id:
+        return None
+    with _USER_INDEXES_LOCK:
+        index = _USER_INDEXES.get(_user_key(user_id))
+    if index is None or index.needs_sync():
+        return None
+    return index.recent(exclude_session=session_id, since=datetime.now() - timedelta(days=last_n_days),
+                        limit=limit)
+
+
+def schedule_question_embedding(memory_id: int, question: str) -> None:
+    """store_question_embedding fuera del request: el guardado no espera al servicio de embeddings"""
+    if MEMORY_VECTOR_COLUMN_ENABLED and memory_id and question:
+        _EMBEDDING_EXECUTOR.submit(store_question_embedding, memory_id, question)
+
+
+# ===============================
+# COLUMNA VECTORIAL EN MEMORY (OPCIONAL)
+# ===============================
+
+_vector_column_available: Optional[bool] = None
+
+
+def has_vector_column() -> bool:
+    """
+    Verifica (una sola vez por proceso) si Memory tiene la columna question_embedding
+    """
+    global _vector_column_available
+    if _vector_column_available is not None:
+        return _vector_column_available
+    try:
+        from src.postgres_integration import get_postgres_connection
+        conn = get_postgres_connection()
+        if not conn:
+            return False
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'memory' AND column_name = 'question_embedding'
+        """)
+        _vector_column_available = cursor.fetchone() is not None
+        cursor.close()
+        conn.close()
+    except Exception as e:
+        print(f"⚠️ No se pudo verificar la columna vectorial: {str(e)}")
+        _vector_column_available = False
+    return _vector_column_available
+
+
+def _vector_literal(vector) -> str:
+    return "[" + ",".join(f"{v:.6f}" for v in vector) + "]"
+
+
+def store_question_embedding(memory_id: int, question: str) -> bool:
+    """
+    Guarda el embedding de la pregunta en Memory.question_embedding
+    """
+    if not (MEMORY_VECTOR_COLUMN_ENABLED and memory_id and question and has_vector_column()):
+        return False
+    try:
+        from src.postgres_integration import get_postgres_connection
+        vector = embed_question(question)
+        conn = get_postgres_connection()
+        if not conn:
+            return False
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE Memory SET question_embedding = %s::vector WHERE id = %s",
+            (_vector_literal(vector), memory_id)
+        )
+        conn.commit()
+        cursor.close()
+        conn.close()
+        return True
+    except Exception as e:
+        print(f"❌ Error guardando embedding en Memory: {str(e)}")
+        return False
+
+
+def search_similar_in_db(current_question: str, user_id, session_id: str = None,
+                         top_k: int = 5, last_n_days: int = 7) -> List[Dict]:
+    """
+    Top-K por similitud coseno directamente en Postgres (pgvector, operador <=>)
+    """
+    from src.postgres_integration import get_postgres_connection, MEMORY_QUERY_RESULT_SQL
+    vector = _vector_literal(embed_question(current_question))
+    conn = get_postgres_connection()
+    if not conn:
+        return []
+    cursor = conn.cursor()
+    query = f"""
+    SELECT
+        session_id, user_question, {MEMORY_QUERY_RESULT_SQL}, relevance, sql_query,
+        interaction_type, processing_time_seconds, created_at,
+        correction_success, user_id,
+        1 - (question_embedding <=> %s::vector) AS similarity
+    FROM Memory
+    WHERE user_id = %s
+      AND created_at >= %s
+      AND question_embedding IS NOT NULL
+    """
+    params = [vector, str(user_id), datetime.now() - timedelta(days=last_n_days)]
+    if session_id:
+        query += " AND session_id != %s"
+        params.append(str(session_id))
+    query += " ORDER BY question_embedding <=> %s::vector LIMIT %s"
+    params += [vector, top_k]
+
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+
+    return [{
+        'session_id': row[0],
+        'question': row[1],
+        'answer': row[2],
+        'relevance': row[3],
+        'sql_query': row[4],
+        'interaction_type': row[5],
+        'processing_time': row[6],
+        'created_at': row[7],
+        'correction_success': row[8],
+        'user_id': row[9]
+    } for row in rows]
+
+
+# ===============================
+# PUNTO DE ENTRADA
+# ===============================
+
+def find_similar_history(current_question: str, history: List[Dict], user_id=None,
+                         session_id: str = None, top_k: int = 5, last_n_days: int = 7) -> List[Dict]:
+    """
+    Top-K de preguntas previas similares.
+
+    Orden de preferencia: columna vectorial en Postgres (si está habilitada),
+    índice en memoria del usuario y, ante cualquier error, difflib. El historial
+    solo se vuelca al índice en la primera búsqueda del usuario y cada
+    MEMORY_INDEX_RESYNC_SECONDS; entre medio el índice crece con note_saved_memory.
+    """
+    if MEMORY_VECTOR_COLUMN_ENABLED and user_id and has_vector_column():
+        try:
+            similar = search_similar_in_db(current_question, user_id, session_id, top_k, last_n_days)
+            if similar:
+                return similar
+        except Exception as e:
+            print(f"⚠️ Búsqueda vectorial en Postgres falló: {str(e)}")
+
+    try:
+        index = get_user_memory_index(user_id)
+        if index.needs_sync():
+            index.sync(history)
+        since = datetime.now() - timedelta(days=last_n_days)
+        return [item for score, item in index.search(current_question, top_k, exclude_session=session_id,
+                                                     since=since)]
+    except Exception as e:
+        print(f"⚠️ Índice de memoria no disponible, usando difflib: {str(e)}")
+        return rank_by_difflib(current_question, history, top_k)
@@ -0,0 +1,396 @@
+"""
+Registro de métricas en proceso (formato de exposición Prometheus)
+==================================================================
+
+session_metrics en app.py guardaba una lista de latencias por sesión que
+crecía sin límite y /metrics serializaba todas las sesiones. Este registro
+mantiene memoria O(1) por serie:
+
+- Counter, Gauge (con valor calculado al momento del scrape) e Histogram de
+  buckets fijos (conteos por bucket + suma + total, sin guardar muestras)
+- Cardinalidad acotada: cada métrica admite METRICS_MAX_SERIES_PER_METRIC
+  combinaciones de labels; el excedente se agrupa en la serie "other"
+- Updates con locks particionados (METRICS_LOCK_STRIPES): dos series distintas
+  rara vez comparten lock, y el scrape no bloquea a los updates más que lo
+  que tarda en copiar cada serie
+- render_text() genera el formato de texto 0.0.4 para /metrics/prometheus
+
+Métricas estándar de la app: latencia de requests HTTP, de nodos del grafo,
+del LLM por modelo y de llamadas a Teradata/Postgres/Azure Search/Corva.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from langchain_core.callbacks import BaseCallbackHandler
+    LANGCHAIN_CALLBACKS_AVAILABLE = True
+except ImportError:
+    BaseCallbackHandler = object
+    LANGCHAIN_CALLBACKS_AVAILABLE = False
+
+METRICS_MAX_SERIES_PER_METRIC = int(os.environ.get("METRICS_MAX_SERIES_PER_METRIC", "200"))
+METRICS_LOCK_STRIPES = int(os.environ.get("METRICS_LOCK_STRIPES", "32"))
+
+# Segundos: de 5 ms (Postgres local) a 2 minutos (LLM con timeout=180)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+OVERFLOW_LABEL = "other"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+# ===============================
+# SERIES
+# ===============================
+
+class _CounterSeries:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self, lock: threading.Lock):
+        self._lock = lock
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        if amount < 0:
+            raise ValueError("Un counter solo puede incrementarse")
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self) -> float:
+        with self._lock:
+            return self.value
+
+
+class _GaugeSeries:
+    __slots__ = ("_lock", "value", "_function")
+
+    def __init__(self, lock: threading.Lock):
+        self._lock = lock
+        self.value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = float(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """El valor se calcula al momento del scrape (profundidad de colas, conexiones)"""
+        self._function = function
+
+    def snapshot(self) -> float:
+        if self._function is not None:
+            try:
+                return float(self._function())
+            except Exception:
+                return float("nan")
+        with self._lock:
+            return self.value
+
+
+class _HistogramSeries:
+    __slots__ = ("_lock", "_bounds", "counts", "sum", "count")
+
+    def __init__(self, lock: threading.Lock, bounds: Tuple[float, ...]):
+        self._lock = lock
+        self._bounds = bounds
+        # Un conteo por bucket (no acumulado) + el de +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self._bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0)
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+# ===============================
+# MÉTRICAS (familias de series)
+# ===============================
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help_text: str,
+                 labelnames: Sequence[str] = (), max_series: int = METRICS_MAX_SERIES_PER_METRIC):
+        self._registry = registry
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.max_series = max_series
+        self._series: Dict[Tuple[str, ...], object] = {}
+        self._create_lock = threading.Lock()
+
+    def _new_series(self, lock: threading.Lock):
+        raise NotImplementedError
+
+    def labels(self, *values, **kwargs):
+        """Serie para una combinación de labels (se crea la primera vez)"""
+        if kwargs:
+            values = tuple(str(kwargs.get(name, "")) for name in self.labelnames)
+        else:
+            values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} espera labels {self.labelnames}")
+        series = self._series.get(values)
+        if series is not None:
+            return series
+        with self._create_lock:
+            series = self._series.get(values)
+            if series is None:
+                if len(self._series) >= self.max_series:
+                    # Cardinalidad acotada: las combinaciones nuevas van a "other"
+                    self._registry.overflowed(self.name)
+                    values = (OVERFLOW_LABEL,) * len(self.labelnames)
+                    series = self._series.get(values)
+                if series is None:
+                    series = self._new_series(self._registry.stripe_for(self.name, values))
+                    self._series[values] = series
+        return series
+
+    def _default(self):
+        return self.labels()
+
+    def series_items(self) -> List[Tuple[Tuple[str, ...], object]]:
+        with self._create_lock:
+            return list(self._series.items())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_series(self, lock):
+        return _CounterSeries(lock)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_series(self, lock):
+        return _GaugeSeries(lock)
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._default().set_function(function)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, help_text, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS,
+                 max_series: int = METRICS_MAX_SERIES_PER_METRIC):
+        super().__init__(registry, name, help_text, labelnames, max_series)
+        self.buckets = tuple(sorted(float(b) for b in buckets if b != float("inf")))
+
+    def _new_series(self, lock):
+        return _HistogramSeries(lock, self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default().observe(value)
+
+
+# ===============================
+# REGISTRO
+# ===============================
+
+class MetricsRegistry:
+
+    def __init__(self, stripes: int = METRICS_LOCK_STRIPES):
+        self._stripes = [threading.Lock() for _ in range(max(1, stripes))]
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self._overflow = {}
+
+    def stripe_for(self, name: str, values: Tuple[str, ...]) -> threading.Lock:
+        return self._stripes[hash((name, values)) % len(self._stripes)]
+
+    def overflowed(self, name: str) -> None:
+        with self._lock:
+            self._overflow[name] = self._overflow.get(name, 0) + 1
+
+    def _register(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(self, name, *args, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"La métrica {name} ya existe como {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = (), **kwargs) -> Counter:
+        return self._register(Counter, name, help_text, labelnames, **kwargs)
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = (), **kwargs) -> Gauge:
+        return self._register(Gauge, name, help_text, labelnames, **kwargs)
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (), **kwargs) -> Histogram:
+        return self._register(Histogram, name, help_text, labelnames, **kwargs)
+
+    def render_text(self) -> str:
+        """Formato de exposición de texto de Prometheus (versión 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            overflow = dict(self._overflow)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for values, series in metric.series_items():
+                if metric.kind == "histogram":
+                    counts, total, count = series.snapshot()
+                    cumulative = 0
+                    for bound, bucket_count in zip(metric.buckets + (float("inf"),), counts):
+                        cumulative += bucket_count
+                        le = f'le="{_format_value(bound)}"'
+                        lines.append(f"{metric.name}_bucket{_format_labels(metric.labelnames, values, le)} {cumulative}")
+                    labels = _format_labels(metric.labelnames, values)
+                    lines.append(f"{metric.name}_sum{labels} {_format_value(total)}")
+                    lines.append(f"{metric.name}_count{labels} {count}")
+                else:
+                    lines.append(f"{metric.name}{_format_labels(metric.labelnames, values)} "
+                                 f"{_format_value(series.snapshot())}")
+        lines.append("# HELP metrics_series_overflow_total Combinaciones de labels agrupadas en 'other'")
+        lines.append("# TYPE metrics_series_overflow_total counter")
+        for name, count in overflow.items():
+            lines.append(f'metrics_series_overflow_total{{metric="{_escape(name)}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# ===============================
+# MÉTRICAS ESTÁNDAR
+# ===============================
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Latencia de requests HTTP por ruta", ["route", "method", "status"])
+GRAPH_NODE_SECONDS = REGISTRY.histogram(
+    "graph_node_duration_seconds", "Latencia de cada nodo del grafo minipywo", ["node", "outcome"])
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "llm_request_duration_seconds", "Latencia de llamadas al LLM por modelo", ["model", "outcome"])
+DEPENDENCY_CALL_SECONDS = REGISTRY.histogram(
+    "dependency_call_duration_seconds", "Latencia de llamadas a Teradata, Postgres, Azure Search y Corva",
+    ["dependency", "operation", "outcome"])
+EVENTS_TOTAL = REGISTRY.counter(
+    "app_events_total", "Eventos de la app (mensajes, errores, frames, paquetes de audio)", ["event", "source"])
+QUEUE_DEPTH = REGISTRY.gauge(
+    "queue_depth", "Profundidad de colas y conexiones activas al momento del scrape", ["queue"])
+
+
+@contextmanager
+def observe_dependency(dependency: str, operation: str):
+    """
+    with observe_dependency("teradata", "query"): ...  registra latencia y resultado
+    """
+    t0 = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        DEPENDENCY_CALL_SECONDS.labels(dependency=dependency, operation=operation,
+                                       outcome=outcome).observe(time.perf_counter() - t0)
+
+
+def timed_node(name: str, node: Callable) -> Callable:
+    """Envuelve un nodo del grafo para medir su latencia (conserva la firma)"""
+    @wraps(node)
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        outcome = "ok"
+        try:
+            return node(*args, **kwargs)
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            GRAPH_NODE_SECONDS.labels(node=name, outcome=outcome).observe(time.perf_counter() - t0)
+    return wrapper
+
+
+def register_queue_depth(queue: str, function: Callable[[], float]) -> None:
+    QUEUE_DEPTH.labels(queue=queue).set_function(function)
+
+
+class LLMLatencyCallback(BaseCallbackHandler):
+    """
+    Callback de LangChain que mide cada llamada del modelo (incluye streaming)
+    """
+
+    def __init__(self, model: str):
+        super().__init__()
+        self.model = model
+        self._started: Dict[object, float] = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def _finish(self, run_id, outcome: str) -> None:
+        t0 = self._started.pop(run_id, None)
+        if t0 is not None:
+            LLM_REQUEST_SECONDS.labels(model=self.model, outcome=outcome).observe(time.perf_counter() - t0)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._finish(run_id, "ok")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, "error")
+
+
+def llm_callbacks(model: str) -> list:
+    """Lista para el parámetro callbacks= de los modelos (vacía sin langchain_core)"""
+    return [LLMLatencyCallback(model)] if LANGCHAIN_CALLBACKS_AVAILABLE else []
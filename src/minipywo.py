@@ -15,7 +15,7 @@ from langchain.schema import (
 )
 
 
-from src.pywo_aux_func import llm_gpt_o3_mini, llm_gpt_4o_mini, llm_gpt4o ,get_connection_to_db, _improve_query_if_needed, _get_column_information, juntar_numeros_sucesivos, _regenerate_query, selected_tables_fun, get_tables
+from src.pywo_aux_func import llm_gpt_o3_mini, llm_gpt_4o_mini, llm_gpt4o ,get_connection_to_db, _improve_query_if_needed, _get_column_information, _regenerate_query, selected_tables_fun, get_tables
 from typing import List, Optional, Annotated
 import pandas as pd
 from src.util import GetLogger
@@ -29,7 +29,11 @@ from src.prompts.prompt_minipywoIII import query_prompt_equipos
 from src.prompts.entidades_dict import corrections
 
 from src.schema_td import datos_db
-from src.corva_agno_agent import corva_api_query_agnostic
+from src.corva_dispatcher import dispatch_corva_query
+from src.health_checks import is_dependency_down
+from src.metrics_registry import observe_dependency
+from src.filler_bank import FILLER_BANK_ENABLED, get_filler_bank
+from src.question_normalizer import normalize_question
 from src.self_verification_agent.src.sql_verification import run_critic_with_examples
 from src.self_verification_agent.src.agent import critic_graph 
 
@@ -106,7 +110,9 @@ def check_general_relevance(state: AgentState, llm_model=llm_gpt_4o_mini):
     relevance: casual, corva o consulta. 
     """
     start = time.perf_counter()
-    question = state["question"]
+    # Pregunta normalizada una sola vez al entrar al grafo (números, códigos de equipo/pozo, abreviaturas)
+    question = normalize_question(state["question"])
+    state["question"] = question
     session_id = state.get('session_id', str(uuid.uuid4()))
     user_id = state.get('user_id')  # NO sobrescribir
     if not user_id:  # Solo extraer si no viene del estado
@@ -308,43 +314,32 @@ def corva_call(state: AgentState, llm_model=llm_gpt_4o_mini):
     
     print(f'Procesando consulta Corva: {pregunta}')
     
-    # ✅ OBTENER RESPUESTA DE CORVA
-    answer_cor = corva_api_query_agnostic(pregunta)
-    
-    # 🔧 NUEVA ESTRATEGIA: Usar un prompt template + LLM para generar streaming
-    # Esto permite que LangGraph maneje el streaming correctamente
-    
-    #corva_streaming_prompt = ChatPromptTemplate.from_messages([
-    #    ("system", """Eres un asistente especializado en datos de Corva. 
-    #    Tu trabajo es presentar la siguiente información de manera clara y estructurada.
-        
-    #    INFORMACIÓN DE CORVA:
-    #    {corva_response}
-        
-    #    Presenta esta información de manera profesional y clara, manteniendo todos los detalles importantes."""),
-    #    ("human", "Pregunta del usuario: {pregunta}")
-    #])
-
     corva_streaming_prompt = ChatPromptTemplate.from_messages([
         ("system", corva_prompt["system"]),
         ("human", corva_prompt["human"])
     ])
-    print('==================================================')
-    print('==================================================')
-    print('==================================================')
-    print('CORVA STREAMING PROMPT:', corva_streaming_prompt)
-    print('==================================================')
-    print('==================================================')
-    print('==================================================')
     # Crear chain para streaming
     streaming_chain = corva_streaming_prompt | llm_model | StrOutputParser()
     
-    # ✅ GENERAR RESPUESTA CON STREAMING (esto permite que LangGraph haga streaming)
-    respuesta_final = streaming_chain.invoke({
-        "corva_response": answer_cor,
-        "pregunta": pregunta,
-        'dic_equi':corrections,
-    })
+    def render_corva_answer(answer_cor: str) -> str:
+        # ✅ GENERAR RESPUESTA CON STREAMING (esto permite que LangGraph haga streaming)
+        return streaming_chain.invoke({
+            "corva_response": answer_cor,
+            "pregunta": pregunta,
+            'dic_equi':corrections,
+        })
+    
+    # ✅ OBTENER RESPUESTA DE CORVA: fast path directo a la tool (template o un render)
+    # o agente Agno + render cuando la intención o el asset no son claros
+    if is_dependency_down("corva"):
+        # Modo degradado: el último chequeo de salud de Corva falló, no se intenta la API
+        print("⚠️ Corva no disponible según el chequeo de salud, respuesta degradada")
+        respuesta_final = ("En este momento no puedo acceder a los datos en tiempo real de Corva. "
+                           "Por favor, intentá de nuevo en unos minutos.")
+    else:
+        dispatch = dispatch_corva_query(pregunta, session_id=session_id, user_id=user_id,
+                                        render=render_corva_answer)
+        respuesta_final = dispatch["answer"]
     
     end = time.perf_counter()
     execution_time = end - start
@@ -386,6 +381,17 @@ def stream_ini(state: AgentState, llm_model=llm_gpt_4o_mini):
     pregunta = state['question']
     print("Entro a stream_ini")
     print("ESTADO EN STREAM INI:",state["messages"])
+    if FILLER_BANK_ENABLED:
+        # Aviso armado localmente (banco curado por intención/entidad), sin llamada al LLM.
+        # Sale como mensaje "log" del nodo, igual que los logs de get_query, para que se
+        # transmita en stream_mode="messages" y el avatar lo diga como frase aparte.
+        answer = get_filler_bank().pick(pregunta, state.get("session_id"))[0]
+        state["messages"] = state.get("messages", []) + [AIMessage(id=str(uuid.uuid4()), content=answer, name="log")]
+        state["query_result"] = answer
+        end = time.perf_counter()
+        state["dt"] = state["dt"] + end -start
+        print(f"Filler local: {answer} ({(end - start) * 1000:.2f} ms)")
+        return state
     generate_prompt = ChatPromptTemplate.from_messages([
          ("system", stream_ini_prompt['system']),
          ("human",  stream_ini_prompt['human'])
@@ -427,8 +433,8 @@ def get_query(state: AgentState, llm_model=llm_gpt_o3_mini):
     
     question = state['question']
     print('GET QUERY LELGA PREGUNTA:', question)
-    question = juntar_numeros_sucesivos(question)
-    print('GET QUERY CORRECCION TRANSITORIA DE NUMEROS',question)
+    question = normalize_question(question)
+    print('GET QUERY PREGUNTA NORMALIZADA',question)
     logger.info(f"question: {question}")
 
     # ✅ PRESERVAR user_id del estado
@@ -608,8 +614,9 @@ def ejecutar_consulta(state: AgentState):
             logger.info(f"🔄 Ejecutando intento {count} de consulta SQL...")
 
             cursor = conn.cursor()
-            cursor.execute(sql_query)
-            resultados = cursor.fetchall()
+            with observe_dependency("teradata", "query"):
+                cursor.execute(sql_query)
+                resultados = cursor.fetchall()
             description = cursor.description
             cursor.close()
             conn.close()
@@ -995,8 +1002,9 @@ def ejecutar_consulta_(sql_query):
         logger.info(f"🔄 Ejecutando intento {count} de consulta SQL...")
 
         cursor = conn.cursor()
-        cursor.execute(sql_query)
-        resultados = cursor.fetchall()
+        with observe_dependency("teradata", "query"):
+            cursor.execute(sql_query)
+            resultados = cursor.fetchall()
         description = cursor.description
         cursor.close()
         conn.close()
@@ -1050,6 +1058,14 @@ def react_sql_wrapper(state: AgentState) -> AgentState:
     session_id = state.get("session_id") or str(uuid.uuid4())
     state["session_id"] = session_id    
 
+    # Modo degradado: con Teradata caída no se genera ni ejecuta SQL
+    if is_dependency_down("teradata"):
+        print("⚠️ Teradata no disponible según el chequeo de salud, se omite el agente SQL")
+        state["sql_query"] = None
+        state["query_result"] = ("Error al ejecutar la SQL query: la base de datos Teradata no está "
+                                 "disponible en este momento")
+        return state
+
     update = {
         "question": state["question"],
         "messages": [HumanMessage(content=state["question"])],
@@ -1,7 +1,10 @@
 import psycopg2
+import hashlib
 import json
+import os
 from datetime import datetime, timedelta
 import uuid
+from src.metrics_registry import observe_dependency
 from typing import Dict, Any, Optional, Union  # se usan= 
 
 # ===============================
@@ -22,12 +25,73 @@ def get_postgres_connection():
     Establece conexión con PostgreSQL en Azure
     """
     try:
-        conn = psycopg2.connect(**POSTGRES_CONFIG)
+        with observe_dependency("postgres", "connect"):
+            conn = psycopg2.connect(**POSTGRES_CONFIG)
         return conn
     except Exception as e:
         print(f"Error conectando a PostgreSQL: {str(e)}")
         return None
 
+# ===============================
+# LÍMITES DE TAMAÑO Y DEDUPLICACIÓN
+# ===============================
+
+MEMORY_MAX_TEXT_CHARS = int(os.environ.get("MEMORY_MAX_TEXT_CHARS", "20000"))
+MEMORY_MAX_LIST_ITEMS = int(os.environ.get("MEMORY_MAX_LIST_ITEMS", "200"))
+MEMORY_RESULT_DEDUP_ENABLED = os.environ.get("MEMORY_RESULT_DEDUP_ENABLED", "false").lower() == "true"
+MEMORY_RESULT_DEDUP_MIN_CHARS = int(os.environ.get("MEMORY_RESULT_DEDUP_MIN_CHARS", "1024"))
+
+# Expresión SQL para leer Memory.query_result (resuelve el blob deduplicado si aplica)
+MEMORY_QUERY_RESULT_SQL = (
+    "COALESCE(query_result, (SELECT content FROM result_blobs WHERE hash = query_result_hash))"
+    if MEMORY_RESULT_DEDUP_ENABLED else "query_result"
+)
+
+def cap_text(value, max_chars: int = MEMORY_MAX_TEXT_CHARS):
+    """
+    Recorta textos grandes antes de persistirlos, dejando marca del recorte
+    """
+    if value is None:
+        return None
+    value = str(value)
+    if len(value) <= max_chars:
+        return value
+    return value[:max_chars] + f"\n...[truncado {len(value) - max_chars} caracteres]"
+
+def cap_list(values, max_items: int = MEMORY_MAX_LIST_ITEMS) -> list:
+    """
+    Limita la cantidad de elementos de las listas que se guardan como JSON
+    """
+    values = list(values or [])
+    return values[:max_items]
+
+def store_result_blob(cursor, content: str) -> str:
+    """
+    Guarda un resultado en result_blobs una sola vez (clave sha256) y devuelve el hash
+    """
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    cursor.execute("""
+    INSERT INTO result_blobs (hash, content, size_bytes, ref_count, first_seen_at, last_used_at)
+    VALUES (%s, %s, %s, 1, now(), now())
+    ON CONFLICT (hash) DO UPDATE SET
+        ref_count = result_blobs.ref_count + 1,
+        last_used_at = now()
+    """, (digest, content, len(content.encode("utf-8"))))
+    return digest
+
+def memory_user_id(user_id_raw, session_id: str) -> Optional[str]:
+    """
+    user_id a guardar en Memory. extract_user_id_from_session devuelve el session_id
+    completo cuando la sesión no es "user<id>_...": esa sesión anónima queda con
+    user_id NULL en lugar de registrarse como un usuario propio en user_stats.
+    """
+    if user_id_raw is None or str(user_id_raw).strip() == "":
+        return None
+    user_id = str(user_id_raw)
+    if user_id == session_id:
+        return None
+    return user_id
+
 # ===============================
 # FUNCIONES BÁSICAS DE GUARDADO
 # ===============================
@@ -55,18 +119,18 @@ def save_complete_memory(state_dict, interaction_type: str = "general",
         # Extraer todos los datos del estado
         user_id_raw = state_dict.get('user_id', None)
         session_id_raw = state_dict.get('session_id', str(uuid.uuid4()))
-        user_question = state_dict.get('question', '')
+        user_question = cap_text(state_dict.get('question', ''))
         relevance = state_dict.get('relevance', '')
-        sql_query = state_dict.get('sql_query', '')
-        query_result = state_dict.get('query_result', '')
+        sql_query = cap_text(state_dict.get('sql_query', ''))
+        query_result = cap_text(state_dict.get('query_result', ''))
         correction_success = state_dict.get('correction_success', False)
         processing_time = state_dict.get('dt', 0.0)
-        lista_equipos = state_dict.get('lista_equipos_activos', [])
-        lista_pozos = state_dict.get('lista_pozos_activos_perforacion', [])
+        lista_equipos = cap_list(state_dict.get('lista_equipos_activos', []))
+        lista_pozos = cap_list(state_dict.get('lista_pozos_activos_perforacion', []))
         
         # FIX: Normalizar todos los IDs a string para PostgreSQL
-        user_id = str(user_id_raw) if user_id_raw is not None else None
         session_id = str(session_id_raw) if session_id_raw is not None else str(uuid.uuid4())
+        user_id = memory_user_id(user_id_raw, session_id)
         human_message_id = str(human_msg_id) if human_msg_id is not None else None
         ai_message_id = str(ai_msg_id) if ai_msg_id is not None else None
         
@@ -89,25 +153,34 @@ def save_complete_memory(state_dict, interaction_type: str = "general",
             'timestamp': datetime.now().isoformat()
         }
         
+        # Resultados grandes repetidos: se guardan una sola vez en result_blobs
+        query_result_hash = None
+        if MEMORY_RESULT_DEDUP_ENABLED and query_result and len(query_result) >= MEMORY_RESULT_DEDUP_MIN_CHARS:
+            query_result_hash = store_result_blob(cursor, query_result)
+        
         insert_query = """
         INSERT INTO Memory (
             user_id, session_id, user_question, relevance, sql_query, query_result,
             correction_success, processing_time_seconds, interaction_type,
             human_message_id, ai_message_id, lista_equipos_activos, 
-            lista_pozos_activos, agent_state_snapshot, created_at, expires_at
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            lista_pozos_activos, agent_state_snapshot, created_at, expires_at{hash_column}
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s{hash_value})
         RETURNING id;
-        """
+        """.format(
+            hash_column=", query_result_hash" if query_result_hash else "",
+            hash_value=", %s" if query_result_hash else ""
+        )
         
-        expires_at = datetime.now() + timedelta(hours=24)
+        created_at = datetime.now()
+        expires_at = created_at + timedelta(hours=24)
         
-        cursor.execute(insert_query, (
+        params = [
             user_id,
             session_id,
             user_question,
             relevance,
             sql_query,
-            query_result,
+            None if query_result_hash else query_result,
             correction_success,
             processing_time,
             interaction_type,
@@ -116,12 +189,16 @@ def save_complete_memory(state_dict, interaction_type: str = "general",
             json.dumps(lista_equipos),
             json.dumps(lista_pozos),
             json.dumps(agent_snapshot),
-            datetime.now(),
+            created_at,
             expires_at
-        ))
-        
-        memory_id = cursor.fetchone()[0]
-        conn.commit()
+        ]
+        if query_result_hash:
+            params.append(query_result_hash)
+        
+        with observe_dependency("postgres", "save_memory"):
+            cursor.execute(insert_query, params)
+            memory_id = cursor.fetchone()[0]
+            conn.commit()
         cursor.close()
         conn.close()
         
@@ -130,6 +207,22 @@ def save_complete_memory(state_dict, interaction_type: str = "general",
         print(f"   📝 Query Result: {'✅ Sí' if query_result else '❌ Vacío'}")
         print(f"   📝 Relevance: {'✅ Sí' if relevance else '❌ Vacío'}")
         print(f"   📝 User ID: {'✅ Sí' if user_id else '❌ Vacío'}")
+
+        # Índice de memoria del usuario y embedding de la pregunta (en segundo plano)
+        from src.memory_index import note_saved_memory, schedule_question_embedding
+        note_saved_memory(user_id, {
+            'session_id': session_id,
+            'question': user_question,
+            'answer': query_result,
+            'relevance': relevance,
+            'sql_query': sql_query,
+            'interaction_type': interaction_type,
+            'processing_time': processing_time,
+            'created_at': created_at,
+            'correction_success': correction_success,
+            'user_id': user_id
+        })
+        schedule_question_embedding(memory_id, user_question)
         return memory_id
         
     except Exception as e:
@@ -161,8 +254,8 @@ def save_to_memory_simple(session_id: Union[str, uuid.UUID], question: str, resp
         
         cursor.execute(insert_query, (
             session_id_str,
-            question,
-            response,
+            cap_text(question),
+            cap_text(response),
             interaction_type,
             processing_time,
             datetime.now()
@@ -205,8 +298,8 @@ def save_sql_execution_simple(session_id: Union[str, uuid.UUID], question: str,
         
         cursor.execute(insert_query, (
             session_id_str,
-            question,
-            sql_query,
+            cap_text(question),
+            cap_text(sql_query),
             success,
             processing_time,
             datetime.now()
@@ -249,9 +342,9 @@ def save_sql_error_simple(session_id: Union[str, uuid.UUID], question: str, fail
         
         cursor.execute(insert_query, (
             session_id_str,
-            question,
-            failed_sql,
-            error_message,
+            cap_text(question),
+            cap_text(failed_sql),
+            cap_text(error_message),
             attempt_number,
             datetime.now()
         ))
@@ -13,6 +13,7 @@ from src.catalogo_retrieval import catalogo_index_retrieval
 from src.columns_retrieval import columns_index_retrieval
 from src.tables_retrieval import tables_index_retrieval
 from src.util import GetLogger
+from src.metrics_registry import llm_callbacks
 
 from src.prompts.prompt_minipywoIII import tables_prompt, query_prompt_equipos
 from src.sqltool_aux_fun import get_where_instances, get_improved_query
@@ -39,7 +40,8 @@ llm_gpt4o = AzureChatOpenAI(
         model_name="gpt-4o",
         seed=42,
         timeout=180,
-        temperature=0)
+        temperature=0,
+        callbacks=llm_callbacks("gpt-4o"))
 
 llm_gpt_4o_mini = AzureChatOpenAI(
         api_key=azure_openai_api_key,
@@ -49,7 +51,8 @@ llm_gpt_4o_mini = AzureChatOpenAI(
         model_name="gpt-4o-mini",
         seed=42,
         timeout=180,
-        temperature=0)
+        temperature=0,
+        callbacks=llm_callbacks("gpt-4o-mini"))
 
 llm_gpt_o3_mini = AzureChatOpenAI(
         api_key=azure_openai_api_key,
@@ -59,7 +62,8 @@ llm_gpt_o3_mini = AzureChatOpenAI(
         model_name="o3-mini",
         temperature= 1,
         seed=42,
-        timeout=180)
+        timeout=180,
+        callbacks=llm_callbacks("o3-mini"))
 
 def get_connection_to_db():
     td_user="YS02420"
@@ -0,0 +1,322 @@
+"""
+Normalizador de preguntas (salida del STT)
+==========================================
+
+La pregunta llegaba al grafo tal como la transcribía el STT y las
+correcciones estaban repartidas: juntar_numeros_sucesivos() corría un
+re.sub por palabra (regex armada en cada llamada) antes de get_query, y las
+abreviaturas de entidades_dict solo se resolvían dentro del prompt.
+QuestionNormalizer hace todo en una pasada guiada por un tokenizador con
+patrones precompilados:
+
+- números en palabras, con gramática ("ciento sesenta y siete" -> 167,
+  "dos mil veinticinco" -> 2025)
+- códigos de equipo y pozo a formato canónico ("dls 167", "dls167",
+  "pozo lach 954" -> "DLS-167", "LACH-954"), solo con prefijos conocidos
+  (abreviaturas de entidades_dict y QUESTION_CODE_PREFIXES). Los dígitos
+  dictados de a uno se unen solo dentro del código ("dls uno seis siete" ->
+  "DLS-167") o después de "equipo"/"pozo"/"rig" ("equipo uno seis siete" ->
+  "equipo 167"); en el resto los números quedan separados ("a las 10 30")
+- "uno" y "mil" sueltos son palabras ("dame uno de los equipos", "mil
+  gracias"); solo pasan a número dentro de un dictado de dígitos o después de
+  un prefijo o de "equipo"/"pozo"/"rig"
+- el prefijo escrito con mayúsculas se respeta ("LACh-388(h)"); solo el que
+  llega todo en minúsculas se pasa a mayúsculas. El resto del texto no cambia
+  de caja
+- abreviaturas de entidades_dict expandidas cuando van solas ("pozos de
+  LLL" -> "pozos de Loma La Lata"); seguidas de un número son un código
+- artefactos del STT: muletillas ("eh", "mmm") y palabras repetidas
+  ("el el equipo"), espacios de más
+
+La salida es determinística e idempotente; cache_key() la pliega
+(minúsculas, sin acentos ni signos) para usarla como clave de cache.
+"""
+
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.prompts.entidades_dict import corrections
+
+QUESTION_NORMALIZER_ENABLED = os.environ.get("QUESTION_NORMALIZER_ENABLED", "true").lower() == "true"
+QUESTION_EXPAND_ABBREVIATIONS = os.environ.get("QUESTION_EXPAND_ABBREVIATIONS", "true").lower() == "true"
+QUESTION_CODE_PREFIXES = [
+    prefix.strip() for prefix in os.environ.get("QUESTION_CODE_PREFIXES", "DLS,NBRS,H&P,HP,LS,PETREX").split(",")
+    if prefix.strip()
+]
+
+# ===============================
+# TOKENIZADOR
+# ===============================
+
+_TOKEN_RE = re.compile(
+    # Nombre oficial completo (YPF.Nq.LACh-391(h)): se deja tal cual
+    r"(?P<official>(?:[A-Za-z]{2,4}\.){1,2}[A-Za-z]{2,6}-\d+(?:\([a-zA-Z]\))?)"
+    # Código pegado o con guion: DLS-167, dls167, NBRS-F103, LACh-954(h)
+    r"|(?P<code>[A-Za-z&]{1,6}-?[A-Za-z]?\d{1,5}(?:\s?\([a-zA-Z]\))?)(?![\w])"
+    r"|(?P<num>\d+(?:[.,]\d+)?)"
+    r"|(?P<word>[^\W\d_]+(?:[/&][^\W\d_]+)*)"
+    r"|(?P<space>\s+)"
+    r"|(?P<other>.)"
+)
+_CODE_PARTS_RE = re.compile(r"(?P<prefix>[A-Za-z&]+)-?(?P<number>[A-Za-z]?\d+)\s?(?P<suffix>\([a-zA-Z]\))?$")
+_DIGITS_RE = re.compile(r"\d+")
+
+# ===============================
+# NÚMEROS EN PALABRAS
+# ===============================
+
+_UNITS = {"cero": 0, "uno": 1, "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5, "seis": 6, "siete": 7, "ocho": 8,
+          "nueve": 9}
+_SMALL = dict(_UNITS, **{
+    "diez": 10, "once": 11, "doce": 12, "trece": 13, "catorce": 14, "quince": 15, "dieciseis": 16,
+    "diecisiete": 17, "dieciocho": 18, "diecinueve": 19, "veinte": 20, "veintiuno": 21, "veintiun": 21,
+    "veintidos": 22, "veintitres": 23, "veinticuatro": 24, "veinticinco": 25, "veintiseis": 26,
+    "veintisiete": 27, "veintiocho": 28, "veintinueve": 29,
+})
+_TENS = {"treinta": 30, "cuarenta": 40, "cincuenta": 50, "sesenta": 60, "setenta": 70, "ochenta": 80,
+         "noventa": 90}
+_HUNDREDS = {"cien": 100, "ciento": 100, "doscientos": 200, "trescientos": 300, "cuatrocientos": 400,
+             "quinientos": 500, "seiscientos": 600, "setecientos": 700, "ochocientos": 800, "novecientos": 900}
+_NUMBER_WORDS = set(_SMALL) | set(_TENS) | set(_HUNDREDS) | {"mil"}
+
+# ===============================
+# CONTEXTO
+# ===============================
+
+_HESITATIONS = {"eh", "ehh", "ehm", "em", "emm", "mm", "mmm", "mmmm"}
+# Sustantivos tras los que los dígitos dictados de a uno forman un número ("equipo 1 6 7" -> "equipo 167")
+_ASSET_NOUNS = {"equipo", "pozo", "rig"}
+# Números en palabras que sueltos suelen ser otra cosa ("dame uno de...", "mil gracias")
+_AMBIGUOUS_NUMBER_WORDS = {"uno", "mil"}
+# Palabras que nunca son prefijo de código aunque vengan antes de un número
+_NOT_PREFIXES = {
+    "de", "del", "el", "la", "los", "las", "en", "con", "a", "al", "y", "o", "e", "u", "por", "para", "sin",
+    "nro", "numero", "num", "n", "no", "hace", "ultimos", "ultimas", "hasta", "desde", "entre", "mas", "menos",
+    "top", "que", "es", "son", "fue", "tiene", "hay", "cada", "unos", "unas", "sobre", "año", "ano", "dia",
+}
+
+
+@lru_cache(maxsize=8192)
+def _fold(text: str) -> str:
+    """Minúsculas y sin acentos (cacheado: se llama por palabra)"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+class _Token:
+    __slots__ = ("kind", "text", "space", "expansion", "spoken")
+
+    def __init__(self, kind: str, text: str, space: bool, expansion: Optional[str] = None, spoken: bool = False):
+        self.kind = kind
+        self.text = text
+        self.space = space
+        self.expansion = expansion
+        self.spoken = spoken  # código o número de un dígito tras prefijo/sustantivo: admite más dígitos de a uno
+
+
+class QuestionNormalizer:
+    """
+    Normalización de una pasada, sin estado por llamada (thread-safe)
+    """
+
+    def __init__(self, abbreviations: Optional[Dict[str, str]] = None,
+                 code_prefixes: Iterable[str] = QUESTION_CODE_PREFIXES,
+                 expand_abbreviations: bool = QUESTION_EXPAND_ABBREVIATIONS):
+        abbreviations = corrections if abbreviations is None else abbreviations
+        self.expand_abbreviations = expand_abbreviations
+        # Se expanden tal como están escritas en el diccionario o en mayúsculas ("LLL", "Lach"/"LACH")
+        self._abbreviations: Dict[str, str] = {}
+        for key, value in abbreviations.items():
+            if len(key) < 2 or key == value:
+                continue
+            self._abbreviations[key] = value
+            self._abbreviations.setdefault(key.upper(), value)
+        # Prefijos de código: abreviaturas de pozos/áreas y equipos configurados (de 2+ letras)
+        self._prefixes = {_fold(key) for key in abbreviations if len(key) >= 2 and key.replace("/", "").isalpha()}
+        self._prefixes |= {_fold(prefix) for prefix in code_prefixes if len(prefix) >= 2}
+
+    # ----- números -----
+
+    @staticmethod
+    def _below_thousand(words: List[str], i: int) -> Tuple[int, int]:
+        value, start = 0, i
+        if i < len(words) and words[i] in _HUNDREDS:
+            value += _HUNDREDS[words[i]]
+            i += 1
+        if i < len(words) and words[i] in _TENS:
+            value += _TENS[words[i]]
+            i += 1
+            if i + 1 < len(words) and words[i] == "y" and words[i + 1] in _UNITS and words[i + 1] != "cero":
+                value += _UNITS[words[i + 1]]
+                i += 2
+        elif i < len(words) and words[i] in _SMALL and not (value and words[i] == "cero"):
+            value += _SMALL[words[i]]
+            i += 1
+        return (value, i) if i > start else (0, start)
+
+    def _parse_number(self, words: List[str], i: int) -> Tuple[Optional[int], int]:
+        """Frase numérica desde words[i]; devuelve (valor, índice siguiente)"""
+        value, j = self._below_thousand(words, i)
+        if j < len(words) and words[j] == "mil" and (j == i or value > 0):
+            value = (value or 1) * 1000
+            rest, k = self._below_thousand(words, j + 1)
+            return value + rest, k
+        return (value, j) if j > i else (None, i)
+
+    # ----- códigos -----
+
+    def _canonical_code(self, prefix: str, number: str, suffix: str = "") -> str:
+        suffix = f"({suffix.strip('() ').lower()})" if suffix else ""
+        # "LACh", "NBRS" quedan como se escribieron; "dls" (STT en minúsculas) -> "DLS"
+        prefix = prefix if prefix != prefix.lower() else prefix.upper()
+        return f"{prefix}-{number.upper()}{suffix}"
+
+    def _is_known_prefix(self, text: str) -> bool:
+        folded = _fold(text)
+        return folded in self._prefixes and folded not in _NOT_PREFIXES
+
+    def _is_prefix(self, token: _Token) -> bool:
+        return token.kind in ("word", "abbr") and self._is_known_prefix(token.text)
+
+    @staticmethod
+    def _is_asset_noun(token: Optional[_Token]) -> bool:
+        return token is not None and token.kind == "word" and _fold(token.text) in _ASSET_NOUNS
+
+    def _expects_digits(self, out: List[_Token], next_word: str) -> bool:
+        """Contexto en el que un "uno"/"mil" suelto es número: tras prefijo, sustantivo o dígito dictado"""
+        previous = out[-1] if out else None
+        if previous is not None and (previous.spoken or self._is_prefix(previous) or self._is_asset_noun(previous)):
+            return True
+        return next_word in _UNITS
+
+    # ----- pasada principal -----
+
+    def _tokens(self, text: str) -> List[Tuple[str, str, bool]]:
+        tokens, space = [], False
+        for match in _TOKEN_RE.finditer(text):
+            kind = match.lastgroup
+            if kind == "space":
+                space = True
+                continue
+            tokens.append((kind, match.group(), space))
+            space = False
+        return tokens
+
+    def normalize(self, question: str) -> str:
+        if not question:
+            return ""
+        raw = self._tokens(question)
+        folded_words = [_fold(text) if kind == "word" else "" for kind, text, _ in raw]
+        out: List[_Token] = []
+        i = 0
+        while i < len(raw):
+            kind, text, space = raw[i]
+            folded = folded_words[i]
+
+            if kind == "word" and folded in _HESITATIONS:
+                i += 1
+                continue
+
+            if kind == "word" and folded in _NUMBER_WORDS:
+                # Solo se miran palabras seguidas separadas por espacio
+                run_end = i + 1
+                while run_end < len(raw) and raw[run_end][0] == "word" and raw[run_end][2]:
+                    run_end += 1
+                value, consumed = self._parse_number(folded_words[:run_end], i)
+                if value is not None and consumed == i + 1 and folded in _AMBIGUOUS_NUMBER_WORDS:
+                    next_word = folded_words[consumed] if consumed < run_end else ""
+                    if not self._expects_digits(out, next_word):
+                        value = None
+                if value is not None:
+                    kind, text, i = "num", str(value), consumed
+                    self._emit_number(out, text, space)
+                    continue
+
+            if kind == "num":
+                self._emit_number(out, text, space)
+                i += 1
+                continue
+
+            if kind == "code":
+                parts = _CODE_PARTS_RE.match(text)
+                if parts and self._is_known_prefix(parts.group("prefix")):
+                    out.append(_Token("code", self._canonical_code(parts.group("prefix"), parts.group("number"),
+                                                                    parts.group("suffix") or ""), space))
+                else:
+                    out.append(_Token("word", text, space))
+                i += 1
+                continue
+
+            if kind == "word":
+                previous = out[-1] if out else None
+                # "el el equipo" -> "el equipo"
+                if previous is not None and previous.kind == "word" and space and _fold(previous.text) == folded:
+                    i += 1
+                    continue
+                expansion = self._abbreviations.get(text) if self.expand_abbreviations else None
+                out.append(_Token("abbr" if expansion else "word", text, space, expansion))
+                i += 1
+                continue
+
+            out.append(_Token(kind, text, space))
+            i += 1
+
+        return self._render(out)
+
+    def _emit_number(self, out: List[_Token], digits: str, space: bool) -> None:
+        previous = out[-1] if out else None
+        single_digit = space and len(digits) == 1 and digits.isdigit()
+        # Dígitos dictados de a uno dentro de un código o tras "equipo"/"pozo"/"rig":
+        # "dls 1 6 7" -> "DLS-167", "pozo 1 6 7" -> "pozo 167"
+        if previous is not None and previous.kind in ("code", "num") and previous.spoken and single_digit:
+            previous.text += digits
+            return
+        out.append(_Token("num", digits, space, spoken=single_digit and self._is_asset_noun(previous)))
+        self._maybe_code(out)
+
+    def _maybe_code(self, out: List[_Token]) -> None:
+        """Prefijo conocido + número ya emitidos -> código canónico ("dls", "167" -> "DLS-167")"""
+        if len(out) < 2 or not _DIGITS_RE.fullmatch(out[-1].text):
+            return
+        number, prefix = out[-1], out[-2]
+        if number.space and self._is_prefix(prefix):
+            out[-2:] = [_Token("code", self._canonical_code(prefix.text, number.text), prefix.space,
+                               spoken=len(number.text) == 1)]
+
+    @staticmethod
+    def _render(tokens: List[_Token]) -> str:
+        parts = []
+        for token in tokens:
+            text = token.expansion if token.kind == "abbr" else token.text
+            if parts and token.space:
+                parts.append(" ")
+            parts.append(text)
+        return "".join(parts).strip()
+
+    def cache_key(self, question: str) -> str:
+        """Clave estable: normalizada, plegada y sin signos de puntuación"""
+        folded = _fold(self.normalize(question))
+        return " ".join(re.findall(r"[\w&/()-]+", folded))
+
+
+_normalizer: Optional[QuestionNormalizer] = None
+
+
+def get_question_normalizer() -> QuestionNormalizer:
+    global _normalizer
+    if _normalizer is None:
+        _normalizer = QuestionNormalizer()
+    return _normalizer
+
+
+def normalize_question(question: str) -> str:
+    if not QUESTION_NORMALIZER_ENABLED:
+        return question
+    return get_question_normalizer().normalize(question)
+
+
+def question_cache_key(question: str) -> str:
+    return get_question_normalizer().cache_key(question)
@@ -0,0 +1,105 @@
+"""
+Audio PCM16 para el proxy Realtime
+==================================
+
+Cada response.audio.delta de Azure OpenAI Realtime trae unos pocos ms de PCM16
+en base64 dentro de un JSON; reenviarlo tal cual obliga al navegador a parsear
+el JSON y decodificar el base64 de cada trozo, y el base64 suma un 33% de bytes.
+Estas funciones son las que usa realtime_proxy para el camino binario:
+
+- decode_audio_delta(): extrae response_id, item_id y el PCM (un solo decode)
+- encode_audio_append(): arma el input_audio_buffer.append a partir de PCM
+  crudo que manda el navegador como adjunto binario
+- Pcm16Resampler: baja la frecuencia de muestreo (24 kHz → 16/8 kHz) para
+  clientes con poco ancho de banda; con estado entre trozos para no meter
+  clics en los bordes. Requiere numpy
+"""
+
+import base64
+import json
+import os
+from typing import Optional, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Frecuencia del audio que devuelve la Realtime API (pcm16 mono)
+REALTIME_AUDIO_SAMPLE_RATE = int(os.environ.get("REALTIME_AUDIO_SAMPLE_RATE", "24000"))
+# Duración de cada frame binario hacia el navegador (se acota a 40-100 ms)
+REALTIME_AUDIO_BATCH_MS = min(100.0, max(40.0, float(os.environ.get("REALTIME_AUDIO_BATCH_MS", "80"))))
+# Frecuencias que puede pedir un cliente en realtime_connect
+REALTIME_AUDIO_RATES = [
+    int(rate) for rate in os.environ.get("REALTIME_AUDIO_RATES", "8000,16000,24000").split(",") if rate.strip()
+]
+
+AUDIO_DELTA = "response.audio.delta"
+
+
+def frame_bytes(sample_rate: int, ms: float) -> int:
+    """Bytes de PCM16 mono para ms milisegundos (siempre par)"""
+    return int(sample_rate * ms / 1000.0) * 2
+
+
+def decode_audio_delta(message: str) -> Tuple[Optional[str], Optional[str], bytes]:
+    """response.audio.delta → (response_id, item_id, pcm)"""
+    data = json.loads(message)
+    return data.get("response_id"), data.get("item_id"), base64.b64decode(data.get("delta", ""))
+
+
+def encode_audio_append(pcm: bytes) -> str:
+    """PCM crudo → input_audio_buffer.append (sin pasar por json.dumps: el base64 no necesita escape)"""
+    return '{"type": "input_audio_buffer.append", "audio": "' + base64.b64encode(pcm).decode("ascii") + '"}'
+
+
+class Pcm16Resampler:
+    """
+    Remuestreo de PCM16 mono por trozos
+
+    Con factor entero (24k → 8k) promedia bloques de muestras (filtro de caja,
+    evita el aliasing más grosero); si no (24k → 16k) interpola linealmente.
+    Guarda entre llamadas las muestras sobrantes / la fase, así el resultado
+    de procesar trozos es el mismo que procesar el audio entero.
+    """
+
+    def __init__(self, source_rate: int, target_rate: int):
+        if not NUMPY_AVAILABLE:
+            raise ImportError("numpy no está instalado")
+        if target_rate <= 0 or target_rate > source_rate:
+            raise ValueError(f"Frecuencia destino inválida: {target_rate}")
+        self.source_rate = source_rate
+        self.target_rate = target_rate
+        self.factor = source_rate // target_rate if source_rate % target_rate == 0 else None
+        self.step = source_rate / target_rate
+        self.reset()
+
+    def reset(self) -> None:
+        """Descarta el estado (nueva respuesta)"""
+        self._carry = np.zeros(0, dtype=np.int16)
+        self._position = 0.0
+
+    def process(self, pcm: bytes) -> bytes:
+        samples = np.frombuffer(pcm[:len(pcm) - len(pcm) % 2], dtype=np.int16)
+        if self.factor == 1:
+            return samples.tobytes()
+        if self.factor:
+            samples = np.concatenate((self._carry, samples))
+            usable = len(samples) - len(samples) % self.factor
+            self._carry = samples[usable:]
+            blocks = samples[:usable].reshape(-1, self.factor).astype(np.int32)
+            return (blocks.sum(axis=1) // self.factor).astype(np.int16).tobytes()
+
+        # Interpolación: _carry es la última muestra del trozo anterior, _position
+        # la posición (en muestras de origen) de la próxima salida
+        buffer = np.concatenate((self._carry, samples)).astype(np.float32)
+        if len(buffer) < 2:
+            self._carry = buffer.astype(np.int16)
+            return b""
+        positions = np.arange(self._position, len(buffer) - 1, self.step)
+        out = np.interp(positions, np.arange(len(buffer)), buffer)
+        next_position = positions[-1] + self.step if len(positions) else self._position
+        self._position = next_position - (len(buffer) - 1)
+        self._carry = buffer[-1:].astype(np.int16)
+        return np.clip(np.rint(out), -32768, 32767).astype(np.int16).tobytes()
@@ -0,0 +1,817 @@
+"""
+Proxy asyncio para Azure OpenAI Realtime API
+============================================
+
+RealtimeWebSocketProxy abría un WebSocketApp de websocket-client por cada
+navegador, cada uno con su propio hilo: con cientos de usuarios de voz son
+cientos de hilos compitiendo por el GIL en cada delta de audio, y
+realtime_connections era un dict sin locks. Este motor:
+
+- Corre todos los sockets upstream en REALTIME_PROXY_LOOPS event loops
+  (aiohttp), cada uno en un hilo; cada cliente va siempre al mismo shard
+- Cola de envío acotada por conexión (REALTIME_SEND_QUEUE_SIZE): con backlog
+  los input_audio_buffer.append consecutivos se fusionan en uno y, si la cola
+  se llena, se descarta el audio más viejo (los mensajes de control nunca)
+- Los eventos hacia el navegador salen por un hilo emisor por shard, para que
+  un emit lento no frene el event loop
+- Registro de conexiones con lock; API thread-safe para los handlers de
+  Socket.IO (open / send / close / close_sid / shutdown)
+- stats(): throughput y lag de envío por conexión y totales
+- Audio binario (opcional por conexión, open(binary_audio=True)): los
+  response.audio.delta se decodifican una vez, se agrupan en frames de
+  REALTIME_AUDIO_BATCH_MS y salen como evento realtime_audio con el PCM como
+  adjunto binario de Socket.IO, opcionalmente remuestreado a audio_rate. El
+  navegador puede mandar su audio como bytes (send con bytes) y el base64 se
+  arma acá, recién al enviarlo. Los eventos de control pasan sin cambios, y
+  antes de cada uno se vacía el audio pendiente para respetar el orden
+- Tools del lado servidor (tools=ToolRegistry, ver realtime_tools): los
+  response.function_call_arguments.done de tools registradas no llegan al
+  navegador; la tool corre en un JobPool y el proxy manda function_call_output
+  y response.create (este cuando termina la respuesta activa y no quedan
+  tools pendientes). El navegador recibe realtime_tool_call para la UI, y los
+  session.update del navegador reciben las definiciones de las tools
+- Pool tibio (warm_size): sesiones abiertas y configuradas de antemano que
+  open() entrega sin esperar el handshake; realtime_connected indica
+  session_configured para que el front no repita el session.update
+
+Emite los mismos eventos que el proxy anterior (realtime_connected,
+realtime_message, realtime_error, realtime_closed) más realtime_audio y
+realtime_tool_call.
+"""
+
+import asyncio
+import base64
+import json
+import os
+import queue
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+from src.metrics_registry import REGISTRY, register_queue_depth
+from src.realtime_audio import (
+    AUDIO_DELTA, NUMPY_AVAILABLE, REALTIME_AUDIO_BATCH_MS, REALTIME_AUDIO_SAMPLE_RATE,
+    Pcm16Resampler, decode_audio_delta, encode_audio_append, frame_bytes,
+)
+from src.realtime_tools import FUNCTION_CALL_DONE, ToolRegistry
+
+REALTIME_PROXY_LOOPS = int(os.environ.get("REALTIME_PROXY_LOOPS", "2"))
+REALTIME_SEND_QUEUE_SIZE = int(os.environ.get("REALTIME_SEND_QUEUE_SIZE", "64"))
+# Con este backlog se empiezan a fusionar los appends de audio
+REALTIME_AUDIO_MERGE_BACKLOG = int(os.environ.get("REALTIME_AUDIO_MERGE_BACKLOG", "4"))
+REALTIME_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("REALTIME_CONNECT_TIMEOUT_SECONDS", "15"))
+REALTIME_HEARTBEAT_SECONDS = float(os.environ.get("REALTIME_HEARTBEAT_SECONDS", "20"))
+# Sesiones pre-abiertas y pre-configuradas listas para entregar en open()
+REALTIME_WARM_POOL_SIZE = int(os.environ.get("REALTIME_WARM_POOL_SIZE", "2"))
+# Una sesión tibia sin usar más de esto se cierra y se reemplaza (antes del timeout de upstream)
+REALTIME_WARM_MAX_IDLE_SECONDS = float(os.environ.get("REALTIME_WARM_MAX_IDLE_SECONDS", "300"))
+REALTIME_WARM_CHECK_SECONDS = float(os.environ.get("REALTIME_WARM_CHECK_SECONDS", "15"))
+# Mensajes de upstream que se guardan mientras la sesión espera navegador
+REALTIME_WARM_BACKLOG = 16
+
+AUDIO_APPEND = "input_audio_buffer.append"
+SESSION_UPDATE = "session.update"
+RESPONSE_CREATED = "response.created"
+RESPONSE_DONE = "response.done"
+SESSION_UPDATED = "session.updated"
+
+SEND_LAG_SECONDS = REGISTRY.histogram(
+    "realtime_send_lag_seconds", "Tiempo entre recibir un mensaje del navegador y enviarlo upstream",
+    ["shard"], buckets=(0.001, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+PROXY_MESSAGES_TOTAL = REGISTRY.counter(
+    "realtime_proxy_messages_total", "Mensajes del proxy Realtime", ["direction", "kind"])
+WARM_POOL_TOTAL = REGISTRY.counter(
+    "realtime_warm_pool_total", "Sesiones Realtime del pool tibio", ["outcome"])
+
+# emit(evento, datos, sid)
+EmitFn = Callable[[str, Dict[str, Any], str], None]
+
+
+def _message_type(message: str) -> Optional[str]:
+    # Evita parsear el JSON completo (los appends traen cientos de KB en base64)
+    head = message[:80]
+    start = head.find('"type"')
+    if start < 0:
+        return None
+    start = head.find('"', head.find(":", start) + 1)
+    end = head.find('"', start + 1)
+    return head[start + 1:end] if start >= 0 and end > start else None
+
+
+def _merge_audio_appends(first, second):
+    """Une dos input_audio_buffer.append (PCM crudo: se concatenan los bytes)"""
+    if isinstance(first, bytes) and isinstance(second, bytes):
+        return first + second
+    if isinstance(first, bytes):
+        first = encode_audio_append(first)
+    if isinstance(second, bytes):
+        second = encode_audio_append(second)
+    a, b = json.loads(first), json.loads(second)
+    audio = base64.b64decode(a.get("audio", "")) + base64.b64decode(b.get("audio", ""))
+    a["audio"] = base64.b64encode(audio).decode("ascii")
+    return json.dumps(a)
+
+
+class RealtimeConnection:
+    """
+    Un socket upstream: tarea lectora, tarea escritora y cola de envío acotada.
+    Todos los métodos corren en el event loop de su shard salvo stats().
+
+    Con sid=None la conexión es "tibia": se abre y se configura sin navegador,
+    guarda los mensajes de upstream y adopt() la entrega a un cliente.
+    """
+
+    def __init__(self, shard: "_Shard", client_id: Optional[str], sid: Optional[str], url: str,
+                 headers: Dict[str, str], queue_size: int, merge_backlog: int, binary_audio: bool = False,
+                 audio_rate: Optional[int] = None, tools: Optional[ToolRegistry] = None,
+                 session_update: Optional[str] = None):
+        self.shard = shard
+        self.client_id = client_id
+        self.sid = sid
+        self.url = url
+        self.headers = headers
+        self.queue_size = queue_size
+        self.merge_backlog = merge_backlog
+        self.ws = None
+        self.is_connected = False
+        self.closing = False
+        # (encolado_en, mensaje, tipo); los appends binarios quedan como bytes
+        self._pending: deque = deque()
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self.created_at = time.time()
+        self.counters = {"messages_in": 0, "bytes_in": 0, "messages_out": 0, "bytes_out": 0,
+                         "audio_merged": 0, "audio_dropped": 0,
+                         "audio_deltas_in": 0, "audio_frames_out": 0, "audio_bytes_out": 0,
+                         "tool_calls": 0}
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+        # Camino binario de audio hacia el navegador
+        self._configure_audio(binary_audio, audio_rate)
+        self._audio_frame_bytes = frame_bytes(REALTIME_AUDIO_SAMPLE_RATE, REALTIME_AUDIO_BATCH_MS)
+        self._audio_chunks: List[bytes] = []
+        self._audio_size = 0
+        self._audio_key = None
+        self._audio_timer = None
+
+        # Tools del lado servidor: call_id → (tool, job_id)
+        self.tools = tools
+        self._tool_calls: Dict[str, tuple] = {}
+        self._response_active = False
+        self._needs_response = False
+
+        # session.update que se manda apenas conecta (config tibia u overrides del usuario)
+        self.session_update = session_update
+        self.session_configured = False
+        self.warm = sid is None
+        self._warm_backlog: deque = deque(maxlen=REALTIME_WARM_BACKLOG)
+
+    def _configure_audio(self, binary_audio: bool, audio_rate: Optional[int]) -> None:
+        self.binary_audio = binary_audio
+        self.audio_rate = REALTIME_AUDIO_SAMPLE_RATE
+        self._resampler: Optional[Pcm16Resampler] = None
+        if binary_audio and audio_rate and audio_rate != REALTIME_AUDIO_SAMPLE_RATE:
+            if NUMPY_AVAILABLE:
+                self._resampler = Pcm16Resampler(REALTIME_AUDIO_SAMPLE_RATE, audio_rate)
+                self.audio_rate = audio_rate
+            else:
+                print(f"⚠️ numpy no disponible: el audio de {self.client_id} sale a {REALTIME_AUDIO_SAMPLE_RATE} Hz")
+
+    def _emit(self, event: str, data: Dict[str, Any]) -> None:
+        if self.sid is not None:
+            self.shard.emit(event, data, self.sid)
+        elif event == "realtime_message":
+            # Sin navegador todavía: se guarda para entregarlo en adopt()
+            self._warm_backlog.append(data)
+
+    # ===============================
+    # CICLO DE VIDA
+    # ===============================
+
+    async def run(self) -> None:
+        try:
+            self.ws = await self.shard.session.ws_connect(
+                self.url, headers=self.headers, heartbeat=REALTIME_HEARTBEAT_SECONDS,
+                timeout=aiohttp.ClientWSTimeout(ws_close=REALTIME_CONNECT_TIMEOUT_SECONDS),
+                max_msg_size=0)
+        except Exception as e:
+            self._emit("realtime_error", {"error": str(e), "client_id": self.client_id})
+            self.shard.engine._forget(self)
+            return
+
+        if self.closing:
+            # close() llegó mientras se conectaba
+            await self.ws.close()
+            return
+        self.is_connected = True
+        self._emit("realtime_connected", {"status": "connected", "client_id": self.client_id,
+                                          "warm": False, "session_configured": False})
+        writer = asyncio.ensure_future(self._writer())
+        self._tasks.append(writer)
+        if self.session_update:
+            self.enqueue(self.session_update)
+        code, reason = None, None
+        try:
+            await self._reader()
+            code = self.ws.close_code
+        except Exception as e:
+            reason = str(e)
+            self._emit("realtime_error", {"error": reason, "client_id": self.client_id})
+        finally:
+            self.is_connected = False
+            writer.cancel()
+            self._cancel_tool_calls()
+            if not self.ws.closed:
+                await self.ws.close()
+            self.shard.engine._forget(self)
+            self._emit("realtime_closed", {"status": "disconnected", "client_id": self.client_id,
+                                           "code": code, "message": reason})
+
+    def adopt(self, client_id: str, sid: str, binary_audio: bool = False, audio_rate: Optional[int] = None,
+              session_update: Optional[str] = None) -> None:
+        """Entrega una conexión tibia a un navegador: realtime_connected, backlog y overrides"""
+        self.client_id, self.sid, self.warm = client_id, sid, False
+        self._configure_audio(binary_audio, audio_rate)
+        if not self.is_connected:
+            # Se cayó justo antes de entregarla: el cliente ve el cierre y reintenta
+            self.shard.engine._forget(self)
+            self._emit("realtime_closed", {"status": "disconnected", "client_id": client_id,
+                                           "code": None, "message": "warm session lost"})
+            return
+        self._emit("realtime_connected", {"status": "connected", "client_id": client_id,
+                                          "warm": True, "session_configured": self.session_configured})
+        while self._warm_backlog:
+            data = self._warm_backlog.popleft()
+            data["client_id"] = client_id
+            self._emit("realtime_message", data)
+        if session_update:
+            self.enqueue(session_update)
+
+    async def close(self) -> None:
+        self.closing = True
+        self._cancel_audio_timer()
+        if self.ws is not None and not self.ws.closed:
+            await self.ws.close()
+
+    # ===============================
+    # UPSTREAM → NAVEGADOR
+    # ===============================
+
+    async def _reader(self) -> None:
+        async for msg in self.ws:
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                self.handle_upstream_text(msg.data)
+            elif msg.type == aiohttp.WSMsgType.ERROR:
+                raise self.ws.exception() or ConnectionError("Error en WebSocket upstream")
+        if self._audio_chunks:
+            self._flush_audio()
+
+    def handle_upstream_text(self, data: str) -> None:
+        """Un mensaje de la Realtime API: audio al lote binario, el resto tal cual"""
+        self.counters["messages_in"] += 1
+        self.counters["bytes_in"] += len(data)
+        kind = _message_type(data) if self.binary_audio or self.tools is not None or self.warm else None
+        if kind == SESSION_UPDATED and self.warm:
+            self.session_configured = True
+        if self.binary_audio:
+            if kind == AUDIO_DELTA and self._buffer_audio(data):
+                return
+            if self._audio_chunks:
+                self._flush_audio()
+        if self.tools is not None:
+            if kind == FUNCTION_CALL_DONE and self._start_tool_call(data):
+                return
+            if kind == RESPONSE_CREATED:
+                self._response_active = True
+            elif kind == RESPONSE_DONE:
+                self._response_active = False
+        self._emit("realtime_message", {"data": data, "client_id": self.client_id})
+        if kind == RESPONSE_DONE and self.tools is not None:
+            self._maybe_create_response()
+
+    def _buffer_audio(self, message: str) -> bool:
+        """Acumula el PCM de un delta; False si no se pudo decodificar (sale como mensaje normal)"""
+        try:
+            response_id, item_id, pcm = decode_audio_delta(message)
+        except (ValueError, TypeError):
+            return False
+        self.counters["audio_deltas_in"] += 1
+        key = (response_id, item_id)
+        if key != self._audio_key:
+            if self._audio_chunks:
+                self._flush_audio()
+            self._audio_key = key
+            if self._resampler is not None:
+                self._resampler.reset()
+        self._audio_chunks.append(pcm)
+        self._audio_size += len(pcm)
+        if self._audio_size >= self._audio_frame_bytes:
+            self._flush_audio()
+        elif self._audio_timer is None:
+            # Si no llegan más deltas, el frame parcial sale igual al cumplirse la ventana
+            self._audio_timer = self.shard.loop.call_later(REALTIME_AUDIO_BATCH_MS / 1000.0, self._flush_audio)
+        return True
+
+    def _cancel_audio_timer(self) -> None:
+        if self._audio_timer is not None:
+            self._audio_timer.cancel()
+            self._audio_timer = None
+
+    def _flush_audio(self) -> None:
+        self._cancel_audio_timer()
+        if not self._audio_chunks:
+            return
+        pcm = b"".join(self._audio_chunks)
+        self._audio_chunks, self._audio_size = [], 0
+        if self._resampler is not None:
+            pcm = self._resampler.process(pcm)
+        response_id, item_id = self._audio_key
+        self.counters["audio_frames_out"] += 1
+        self.counters["audio_bytes_out"] += len(pcm)
+        PROXY_MESSAGES_TOTAL.labels(direction="downstream", kind="audio_frame").inc()
+        self._emit("realtime_audio", {
+            "client_id": self.client_id,
+            "response_id": response_id,
+            "item_id": item_id,
+            "format": "pcm16",
+            "sample_rate": self.audio_rate,
+            "audio": pcm,
+        })
+
+    # ===============================
+    # TOOLS DEL LADO SERVIDOR
+    # ===============================
+
+    def _start_tool_call(self, data: str) -> bool:
+        """Lanza la tool si está registrada; False si el evento debe seguir al navegador"""
+        try:
+            event = json.loads(data)
+        except ValueError:
+            return False
+        name, call_id = event.get("name"), event.get("call_id")
+        if not call_id or name not in self.tools:
+            return False
+        self.counters["tool_calls"] += 1
+        self._tool_calls[call_id] = (name, None)
+        self._emit("realtime_tool_call", {"client_id": self.client_id, "call_id": call_id, "name": name,
+                                         "status": "running", "arguments": event.get("arguments")})
+        loop = self.shard.loop
+
+        def on_done(output: str, outcome: str, elapsed: float) -> None:
+            try:
+                loop.call_soon_threadsafe(self._finish_tool_call, call_id, name, output, outcome, elapsed)
+            except RuntimeError:
+                pass  # el loop ya se detuvo (shutdown)
+
+        job_id = self.tools.execute(name, event.get("arguments", ""),
+                                    {"client_id": self.client_id, "sid": self.sid, "call_id": call_id}, on_done)
+        if job_id is not None and call_id in self._tool_calls:
+            self._tool_calls[call_id] = (name, job_id)
+        return True
+
+    def _finish_tool_call(self, call_id: str, name: str, output: str, outcome: str, elapsed: float) -> None:
+        if self._tool_calls.pop(call_id, None) is None or self.closing or not self.is_connected:
+            return
+        self.enqueue(json.dumps({"type": "conversation.item.create",
+                                 "item": {"type": "function_call_output", "call_id": call_id, "output": output}},
+                                ensure_ascii=False))
+        self._needs_response = True
+        self._emit("realtime_tool_call", {"client_id": self.client_id, "call_id": call_id, "name": name,
+                                         "status": "done" if outcome == "ok" else outcome,
+                                         "output": output, "duration_ms": round(elapsed * 1000, 1)})
+        self._maybe_create_response()
+
+    def _maybe_create_response(self) -> None:
+        # Un solo response.create cuando terminaron todas las tools de la respuesta
+        # y la respuesta que las pidió ya cerró (si no, upstream lo rechaza)
+        if self._needs_response and not self._tool_calls and not self._response_active:
+            self._needs_response = False
+            self.enqueue('{"type": "response.create"}')
+
+    def _cancel_tool_calls(self) -> None:
+        for name, job_id in self._tool_calls.values():
+            if job_id is not None:
+                self.tools.cancel(name, job_id)
+        self._tool_calls.clear()
+
+    # ===============================
+    # NAVEGADOR → UPSTREAM
+    # ===============================
+
+    def enqueue(self, message) -> bool:
+        """
+        Encola respetando el límite: fusiona audio con backlog, descarta el audio
+        más viejo si está llena. message es el JSON del navegador o bytes con PCM
+        crudo (se envía como input_audio_buffer.append)
+        """
+        kind = AUDIO_APPEND if isinstance(message, bytes) else _message_type(message)
+        now = time.perf_counter()
+        pending = self._pending
+        if kind == AUDIO_APPEND and len(pending) >= self.merge_backlog and pending[-1][2] == AUDIO_APPEND:
+            enqueued_at, previous, _ = pending.pop()
+            try:
+                pending.append((enqueued_at, _merge_audio_appends(previous, message), AUDIO_APPEND))
+                self.counters["audio_merged"] += 1
+                PROXY_MESSAGES_TOTAL.labels(direction="upstream", kind="audio_merged").inc()
+                return True
+            except (ValueError, TypeError):
+                pending.append((enqueued_at, previous, AUDIO_APPEND))
+
+        if len(pending) >= self.queue_size:
+            for i, (_, _, pending_kind) in enumerate(pending):
+                if pending_kind == AUDIO_APPEND:
+                    del pending[i]
+                    self.counters["audio_dropped"] += 1
+                    PROXY_MESSAGES_TOTAL.labels(direction="upstream", kind="audio_dropped").inc()
+                    break
+            else:
+                if kind == AUDIO_APPEND:
+                    self.counters["audio_dropped"] += 1
+                    PROXY_MESSAGES_TOTAL.labels(direction="upstream", kind="audio_dropped").inc()
+                    return False
+                # Solo mensajes de control en cola: el de control nuevo entra igual
+                # (son pocos y perderlos rompe la sesión)
+        pending.append((now, message, kind))
+        self._wakeup.set()
+        return True
+
+    async def _writer(self) -> None:
+        shard_label = str(self.shard.index)
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            enqueued_at, message, _ = self._pending.popleft()
+            if isinstance(message, bytes):
+                message = encode_audio_append(message)
+            await self.ws.send_str(message)
+            lag = time.perf_counter() - enqueued_at
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            SEND_LAG_SECONDS.labels(shard=shard_label).observe(lag)
+            self.counters["messages_out"] += 1
+            self.counters["bytes_out"] += len(message)
+
+    # ===============================
+    # MÉTRICAS
+    # ===============================
+
+    def stats(self) -> Dict[str, Any]:
+        age = max(time.time() - self.created_at, 1e-6)
+        return {
+            "client_id": self.client_id,
+            "shard": self.shard.index,
+            "connected": self.is_connected,
+            "age_seconds": round(age, 1),
+            "warm": self.warm,
+            "binary_audio": self.binary_audio,
+            "tool_calls_running": len(self._tool_calls),
+            "audio_sample_rate": self.audio_rate,
+            "queue_depth": len(self._pending),
+            "last_send_lag_ms": round(self.last_lag * 1000, 2),
+            "max_send_lag_ms": round(self.max_lag * 1000, 2),
+            "messages_in_per_second": round(self.counters["messages_in"] / age, 2),
+            "messages_out_per_second": round(self.counters["messages_out"] / age, 2),
+            **self.counters,
+        }
+
+
+class _Shard:
+    """Un event loop en su hilo, con su sesión aiohttp y su hilo emisor"""
+
+    def __init__(self, engine: "RealtimeProxyEngine", index: int):
+        self.engine = engine
+        self.index = index
+        self.loop = asyncio.new_event_loop()
+        self.session = None
+        self._emit_queue: "queue.Queue" = queue.Queue()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, name=f"realtime-loop-{index}", daemon=True)
+        self._emitter = threading.Thread(target=self._run_emitter, name=f"realtime-emit-{index}", daemon=True)
+        self._thread.start()
+        self._emitter.start()
+        self._ready.wait()
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self.loop)
+
+        async def create_session():
+            self.session = aiohttp.ClientSession()
+
+        self.loop.run_until_complete(create_session())
+        self._ready.set()
+        self.loop.run_forever()
+
+    def _run_emitter(self) -> None:
+        while True:
+            item = self._emit_queue.get()
+            if item is None:
+                return
+            event, data, sid = item
+            try:
+                self.engine.emit_fn(event, data, sid)
+            except Exception as e:
+                print(f"⚠️ Error emitiendo {event} al navegador: {e}")
+
+    def emit(self, event: str, data: Dict[str, Any], sid: str) -> None:
+        self._emit_queue.put((event, data, sid))
+
+    def emit_backlog(self) -> int:
+        return self._emit_queue.qsize()
+
+    def submit(self, coro) -> "asyncio.Future":
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        async def close_session():
+            if self.session is not None:
+                await self.session.close()
+        try:
+            self.submit(close_session()).result(timeout)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        self._emit_queue.put(None)
+        self._emitter.join(timeout)
+
+
+class RealtimeProxyEngine:
+    """
+    Conexiones Realtime de todos los navegadores sobre unos pocos event loops
+
+    Un motor corresponde a un deployment (url). Con warm_size > 0 mantiene
+    ese número de sesiones abiertas y configuradas con warm_session: open()
+    entrega una (sin handshake TLS/WebSocket ni session.update de espera) y
+    repone el pool en segundo plano. Las que superan
+    REALTIME_WARM_MAX_IDLE_SECONDS sin usarse se cierran y se reemplazan.
+    """
+
+    def __init__(self, url: str, headers: Dict[str, str], emit_fn: EmitFn,
+                 loops: int = REALTIME_PROXY_LOOPS, queue_size: int = REALTIME_SEND_QUEUE_SIZE,
+                 merge_backlog: int = REALTIME_AUDIO_MERGE_BACKLOG, tools: Optional[ToolRegistry] = None,
+                 warm_size: int = REALTIME_WARM_POOL_SIZE, warm_session: Optional[Dict[str, Any]] = None,
+                 warm_max_idle: float = REALTIME_WARM_MAX_IDLE_SECONDS):
+        if not AIOHTTP_AVAILABLE:
+            raise ImportError("aiohttp no está instalado")
+        self.url = url
+        self.headers = headers
+        self.emit_fn = emit_fn
+        self.queue_size = queue_size
+        self.merge_backlog = merge_backlog
+        self.tools = tools
+        self._shards = [_Shard(self, i) for i in range(max(1, loops))]
+        self._connections: Dict[str, RealtimeConnection] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        register_queue_depth("realtime_emit_backlog", lambda: sum(s.emit_backlog() for s in self._shards))
+        register_queue_depth("realtime_send_backlog", self._send_backlog)
+
+        # Pool tibio
+        self.warm_size = max(0, warm_size)
+        self.warm_session = warm_session
+        self.warm_max_idle = warm_max_idle
+        self._warm: List[RealtimeConnection] = []
+        self._warm_next_shard = 0
+        self._warm_task = None
+        self.warm_counters = {"hits": 0, "misses": 0, "opened": 0, "evicted": 0, "failed": 0}
+        if self.warm_size:
+            register_queue_depth("realtime_warm_ready", self._warm_ready)
+            self._replenish()
+            self._warm_task = self._shards[0].submit(self._warm_maintenance())
+
+    def _shard_for(self, client_id: str) -> _Shard:
+        return self._shards[zlib.crc32(client_id.encode()) % len(self._shards)]
+
+    def _forget(self, connection: RealtimeConnection) -> None:
+        with self._lock:
+            if connection in self._warm:
+                # Falló o se cerró antes de entregarse; el mantenimiento la repone
+                self._warm.remove(connection)
+                self.warm_counters["failed"] += 1
+                WARM_POOL_TOTAL.labels(outcome="failed").inc()
+            elif self._connections.get(connection.client_id) is connection:
+                del self._connections[connection.client_id]
+
+    def _send_backlog(self) -> int:
+        with self._lock:
+            return sum(len(c._pending) for c in self._connections.values())
+
+    def _session_update(self, session: Optional[Dict[str, Any]]) -> Optional[str]:
+        if not session:
+            return None
+        message = {"type": SESSION_UPDATE, "session": json.loads(json.dumps(session))}
+        if self.tools is not None and len(self.tools):
+            message = self.tools.inject(message)
+        return json.dumps(message)
+
+    # ===============================
+    # POOL TIBIO
+    # ===============================
+
+    def _warm_ready(self) -> int:
+        with self._lock:
+            return sum(1 for c in self._warm if c.is_connected)
+
+    def _replenish(self) -> None:
+        """Abre sesiones tibias hasta completar warm_size (no bloquea: run() corre en el shard)"""
+        created = []
+        with self._lock:
+            while not self._closed and len(self._warm) < self.warm_size:
+                shard = self._shards[self._warm_next_shard % len(self._shards)]
+                self._warm_next_shard += 1
+                connection = RealtimeConnection(shard, None, None, self.url, self.headers,
+                                                self.queue_size, self.merge_backlog, tools=self.tools,
+                                                session_update=self._session_update(self.warm_session))
+                self._warm.append(connection)
+                self.warm_counters["opened"] += 1
+                created.append(connection)
+        for connection in created:
+            connection.shard.submit(connection.run())
+
+    def _take_warm(self) -> Optional[RealtimeConnection]:
+        with self._lock:
+            ready = [c for c in self._warm if c.is_connected and not c.closing]
+            if not ready:
+                return None
+            # Preferir las que ya confirmaron session.updated
+            connection = next((c for c in ready if c.session_configured), ready[0])
+            self._warm.remove(connection)
+            return connection
+
+    async def _warm_maintenance(self) -> None:
+        while not self._closed:
+            await asyncio.sleep(REALTIME_WARM_CHECK_SECONDS)
+            now = time.time()
+            with self._lock:
+                stale = [c for c in self._warm if now - c.created_at > self.warm_max_idle]
+                for connection in stale:
+                    self._warm.remove(connection)
+                self.warm_counters["evicted"] += len(stale)
+            for connection in stale:
+                WARM_POOL_TOTAL.labels(outcome="evicted").inc()
+                connection.shard.submit(connection.close())
+            self._replenish()
+
+    # ===============================
+    # API (thread-safe, desde los handlers de Socket.IO)
+    # ===============================
+
+    def open(self, client_id: str, sid: str, binary_audio: bool = False,
+             audio_rate: Optional[int] = None, session: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Conecta al cliente: entrega una sesión tibia si hay, si no abre una nueva
+        (en ambos casos cierra la anterior del cliente si existía)
+
+        Args:
+            binary_audio: el audio de respuesta sale como realtime_audio (PCM binario)
+                en lugar de response.audio.delta dentro de realtime_message
+            audio_rate: frecuencia pedida por el cliente para ese audio (requiere numpy)
+            session: overrides del usuario, se aplican con un session.update incremental
+        """
+        if self._closed:
+            return False
+        session_update = self._session_update(session)
+        connection = self._take_warm() if self.warm_size else None
+        if connection is not None:
+            self.warm_counters["hits"] += 1
+            WARM_POOL_TOTAL.labels(outcome="hit").inc()
+        else:
+            if self.warm_size:
+                self.warm_counters["misses"] += 1
+                WARM_POOL_TOTAL.labels(outcome="miss").inc()
+            connection = RealtimeConnection(self._shard_for(client_id), client_id, sid, self.url, self.headers,
+                                            self.queue_size, self.merge_backlog,
+                                            binary_audio=binary_audio, audio_rate=audio_rate, tools=self.tools,
+                                            session_update=session_update)
+        with self._lock:
+            previous = self._connections.get(client_id)
+            self._connections[client_id] = connection
+        if previous is not None:
+            previous.shard.submit(previous.close())
+        if connection.warm:
+            connection.shard.loop.call_soon_threadsafe(
+                connection.adopt, client_id, sid, binary_audio, audio_rate, session_update)
+            self._replenish()
+        else:
+            connection.shard.submit(connection.run())
+        return True
+
+    def send(self, client_id: str, message) -> bool:
+        """
+        Encola un mensaje hacia upstream sin bloquear; False si no hay conexión abierta.
+        message puede ser dict, JSON o bytes con PCM16 (audio del micrófono)
+        """
+        with self._lock:
+            connection = self._connections.get(client_id)
+        if connection is None or connection.closing:
+            return False
+        if self.tools is not None and len(self.tools):
+            # Las tools del servidor se declaran en el session.update del navegador
+            if isinstance(message, str) and _message_type(message) == SESSION_UPDATE:
+                message = json.loads(message)
+            if isinstance(message, dict) and message.get("type") == SESSION_UPDATE:
+                message = self.tools.inject(message)
+        if isinstance(message, dict):
+            message = json.dumps(message)
+        connection.shard.loop.call_soon_threadsafe(connection.enqueue, message)
+        return True
+
+    def is_connected(self, client_id: str) -> bool:
+        with self._lock:
+            connection = self._connections.get(client_id)
+        return bool(connection and connection.is_connected)
+
+    def close(self, client_id: str) -> bool:
+        with self._lock:
+            connection = self._connections.pop(client_id, None)
+        if connection is None:
+            return False
+        connection.shard.submit(connection.close())
+        return True
+
+    def close_sid(self, sid: str) -> List[str]:
+        """Cierra las conexiones de un socket del navegador (al desconectarse)"""
+        with self._lock:
+            client_ids = [cid for cid, connection in self._connections.items() if connection.sid == sid]
+        for client_id in client_ids:
+            self.close(client_id)
+        return client_ids
+
+    def client_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._connections)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._connections)
+
+    def __contains__(self, client_id: str) -> bool:
+        with self._lock:
+            return client_id in self._connections
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Cierra todas las conexiones y detiene los loops"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._warm_task is not None:
+            self._warm_task.cancel()
+        with self._lock:
+            connections = list(self._connections.values()) + self._warm
+            self._connections.clear()
+            self._warm = []
+        futures = [c.shard.submit(c.close()) for c in connections]
+        for future in futures:
+            try:
+                future.result(timeout)
+            except Exception:
+                pass
+        for shard in self._shards:
+            shard.stop(timeout)
+
+    # ===============================
+    # MÉTRICAS
+    # ===============================
+
+    def stats(self, per_connection: bool = False) -> Dict[str, Any]:
+        with self._lock:
+            connections = list(self._connections.values())
+        per = [c.stats() for c in connections]
+        totals = {key: sum(s[key] for s in per) for key in
+                  ("messages_in", "bytes_in", "messages_out", "bytes_out", "audio_merged", "audio_dropped",
+                   "audio_deltas_in", "audio_frames_out", "audio_bytes_out", "tool_calls")}
+        data = {
+            "loops": len(self._shards),
+            "connections": len(per),
+            "connected": sum(1 for s in per if s["connected"]),
+            "send_backlog": sum(s["queue_depth"] for s in per),
+            "emit_backlog": sum(shard.emit_backlog() for shard in self._shards),
+            "max_send_lag_ms": max((s["max_send_lag_ms"] for s in per), default=0.0),
+            **totals,
+        }
+        if self.warm_size:
+            with self._lock:
+                warm = list(self._warm)
+            requests = self.warm_counters["hits"] + self.warm_counters["misses"]
+            data["warm_pool"] = {
+                "size": self.warm_size,
+                "ready": sum(1 for c in warm if c.is_connected),
+                "configured": sum(1 for c in warm if c.session_configured),
+                "connecting": sum(1 for c in warm if not c.is_connected),
+                "hit_rate": round(self.warm_counters["hits"] / requests, 3) if requests else None,
+                **self.warm_counters,
+            }
+        if per_connection:
+            data["per_connection"] = per
+        return data
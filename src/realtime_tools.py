@@ -0,0 +1,203 @@
+"""
+Tools de la Realtime API ejecutadas en el servidor
+==================================================
+
+Antes, cuando el modelo de voz llamaba a query_minipywo, el evento viajaba
+proxy → navegador, el navegador hacía POST a /api/minipywo-process y
+devolvía el resultado navegador → proxy → upstream (conversation.item.create
++ response.create): dos idas y vueltas extra por pregunta, con la red del
+cliente en el medio. Con un ToolRegistry el proxy (realtime_proxy):
+
+- Intercepta response.function_call_arguments.done de las tools registradas
+- Ejecuta la tool en un JobPool (el de minipywo si se indica, así comparte
+  cupo y límite por usuario; si no, uno propio de REALTIME_TOOL_WORKERS)
+- Manda function_call_output y response.create directo a upstream
+- Al navegador solo le avisa (evento realtime_tool_call) para la UI
+
+El registro también arma las definiciones de tools para session.update.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from src.job_pool import JobPool, JobRejected
+from src.metrics_registry import REGISTRY
+
+REALTIME_TOOL_WORKERS = int(os.environ.get("REALTIME_TOOL_WORKERS", "4"))
+REALTIME_TOOL_QUEUE_SIZE = int(os.environ.get("REALTIME_TOOL_QUEUE_SIZE", "32"))
+REALTIME_TOOL_MAX_PER_USER = int(os.environ.get("REALTIME_TOOL_MAX_PER_USER", "2"))
+
+FUNCTION_CALL_DONE = "response.function_call_arguments.done"
+
+TOOL_CALL_SECONDS = REGISTRY.histogram(
+    "realtime_tool_call_seconds", "Duración de tools Realtime (desde los argumentos hasta el resultado)",
+    ["tool", "outcome"], buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0))
+
+# handler(argumentos, contexto) -> texto para function_call_output
+ToolHandler = Callable[[Dict[str, Any], Dict[str, Any]], Any]
+# on_done(salida, outcome, segundos)
+ToolDone = Callable[[str, str, float], None]
+
+
+class RealtimeTool:
+    __slots__ = ("name", "handler", "description", "parameters", "pool", "busy_message", "counters")
+
+    def __init__(self, name: str, handler: ToolHandler, description: str = "",
+                 parameters: Optional[Dict[str, Any]] = None, pool: Optional[JobPool] = None,
+                 busy_message: str = "El sistema está ocupado, pedile al usuario que repita la consulta en unos segundos"):
+        self.name = name
+        self.handler = handler
+        self.description = description
+        self.parameters = parameters or {"type": "object", "properties": {}}
+        self.pool = pool
+        self.busy_message = busy_message
+        self.counters = {"calls": 0, "ok": 0, "error": 0, "rejected": 0, "last_seconds": 0.0}
+
+    def definition(self) -> Dict[str, Any]:
+        """Formato de tools de session.update"""
+        return {"type": "function", "name": self.name, "description": self.description,
+                "parameters": self.parameters}
+
+
+def _run_tool_payload(payload: Dict[str, Any]) -> str:
+    tool: RealtimeTool = payload["tool"]
+    result = tool.handler(payload["arguments"], payload["context"])
+    return result if isinstance(result, str) else json.dumps(result, ensure_ascii=False, default=str)
+
+
+class ToolRegistry:
+    """
+    Tools que el proxy ejecuta del lado servidor (thread-safe)
+    """
+
+    def __init__(self, workers: int = REALTIME_TOOL_WORKERS, queue_size: int = REALTIME_TOOL_QUEUE_SIZE,
+                 max_per_user: int = REALTIME_TOOL_MAX_PER_USER):
+        self._tools: Dict[str, RealtimeTool] = {}
+        self._lock = threading.Lock()
+        self._pool_args = (workers, queue_size, max_per_user)
+        self._pool: Optional[JobPool] = None
+
+    # ===============================
+    # REGISTRO
+    # ===============================
+
+    def register(self, name: str, handler: ToolHandler, description: str = "",
+                 parameters: Optional[Dict[str, Any]] = None, pool: Optional[JobPool] = None,
+                 **kwargs) -> RealtimeTool:
+        """Registra (o reemplaza) una tool; pool=None usa el pool propio del registro"""
+        tool = RealtimeTool(name, handler, description, parameters, pool, **kwargs)
+        with self._lock:
+            self._tools[name] = tool
+        return tool
+
+    def unregister(self, name: str) -> bool:
+        with self._lock:
+            return self._tools.pop(name, None) is not None
+
+    def get(self, name: str) -> Optional[RealtimeTool]:
+        with self._lock:
+            return self._tools.get(name)
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return list(self._tools)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._tools)
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            return name in self._tools
+
+    def definitions(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [tool.definition() for tool in self._tools.values()]
+
+    def inject(self, session_update: Dict[str, Any]) -> Dict[str, Any]:
+        """Agrega las tools registradas a un session.update que no las define"""
+        session = session_update.setdefault("session", {})
+        definitions = self.definitions()
+        if definitions:
+            declared = {tool.get("name") for tool in session.get("tools") or []}
+            session["tools"] = list(session.get("tools") or []) + [
+                definition for definition in definitions if definition["name"] not in declared]
+            session.setdefault("tool_choice", "auto")
+        return session_update
+
+    # ===============================
+    # EJECUCIÓN
+    # ===============================
+
+    def _default_pool(self) -> JobPool:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    workers, queue_size, max_per_user = self._pool_args
+                    self._pool = JobPool(_run_tool_payload, workers=workers, queue_size=queue_size,
+                                         max_per_user=max_per_user, name="realtime_tools")
+        return self._pool
+
+    def execute(self, name: str, arguments: str, context: Dict[str, Any], on_done: ToolDone) -> Optional[str]:
+        """
+        Encola la tool y devuelve el job_id (None si no se pudo encolar: en ese
+        caso on_done ya se llamó con el error). on_done corre en el hilo del pool.
+        """
+        tool = self.get(name)
+        if tool is None:
+            # Nombre que el modelo inventó o tool desregistrada mientras tanto: el modelo recibe el error
+            on_done(json.dumps({"error": "unknown_tool", "tool": name, "available": self.names()},
+                               ensure_ascii=False), "unknown", 0.0)
+            return None
+        started = time.perf_counter()
+
+        def finish(output: str, outcome: str) -> None:
+            elapsed = time.perf_counter() - started
+            tool.counters["calls"] += 1
+            tool.counters[outcome] += 1
+            tool.counters["last_seconds"] = round(elapsed, 3)
+            TOOL_CALL_SECONDS.labels(tool=name, outcome=outcome).observe(elapsed)
+            on_done(output, outcome, elapsed)
+
+        try:
+            parsed = json.loads(arguments) if arguments else {}
+        except ValueError:
+            finish(f"Error: argumentos inválidos para {name}", "error")
+            return None
+
+        def job_done(job) -> None:
+            if job.status == "done":
+                finish(job.result, "ok")
+            else:
+                finish(f"Error: {job.error or job.status}", "error")
+
+        pool = tool.pool or self._default_pool()
+        payload = {"tool": tool, "arguments": parsed, "context": context}
+        # Límite por usuario sobre el socket (el client_id lo elige el navegador), como process_message
+        owner = f"sid:{context['sid']}" if context.get("sid") else context.get("client_id", name)
+        try:
+            job = pool.submit(owner, payload, on_done=job_done, runner=_run_tool_payload)
+        except JobRejected:
+            finish(tool.busy_message, "rejected")
+            return None
+        return job.id
+
+    def cancel(self, name: str, job_id: str) -> bool:
+        tool = self.get(name)
+        pool = (tool.pool if tool else None) or self._pool
+        return bool(pool and pool.cancel(job_id))
+
+    # ===============================
+    # MÉTRICAS
+    # ===============================
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tools = {name: dict(tool.counters) for name, tool in self._tools.items()}
+        data = {"tools": tools}
+        if self._pool is not None:
+            data["pool"] = self._pool.stats()
+        return data
@@ -0,0 +1,361 @@
+"""
+Motor de correcciones de texto (Aho-Corasick)
+=============================================
+
+replace_token() recorría la lista de correcciones completa por cada token y
+solo corregía tokens enteros; las pronunciaciones del avatar se aplicaban con
+un str.replace por entrada. CorrectionAutomaton compila todas las
+correcciones una vez en un autómata Aho-Corasick:
+
+- claves sin mayúsculas ni acentos ("Cénter", "CENTER" y "center" son el
+  mismo patrón); si el texto coincide exacto con una variante registrada se
+  usa su reemplazo, si no el de la primera
+- patrones de varias palabras ("Rial Taim") y límites de palabra: "aim" no
+  se aplica dentro de "Taim" ni "ipf" dentro de otra palabra
+- en caso de superposición gana el match más a la izquierda y, a igual
+  inicio, el más largo
+
+StreamCorrector aplica el autómata sobre un stream de tokens del LLM antes del
+TTS: emite todo lo que ya no puede cambiar y retiene solo la cola que todavía
+puede ser el comienzo de un patrón (a lo sumo el patrón más largo).
+
+CorrectionsStore lee TEXT_CORRECTIONS_FILE y lo recompila cuando cambia el
+archivo (se revisa cada TEXT_CORRECTIONS_RELOAD_SECONDS); si el JSON nuevo es
+inválido se sigue usando el anterior. Para preguntas del usuario y bloques de
+respuesta ofrece replace_token(): la misma semántica que
+pywo_aux_func.replace_token (el texto entero, sin espacios de borde, tiene que
+ser igual a una entrada, respetando mayúsculas) con un dict en lugar de la
+lista. Las entradas cortas del archivo ("Ta", "aim") corrigen fragmentos de
+tokens en inglés y no deben aplicarse a palabras sueltas de una pregunta.
+"""
+
+import json
+import os
+import threading
+import time
+import unicodedata
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.metrics_registry import EVENTS_TOTAL
+
+TEXT_CORRECTIONS_RELOAD_SECONDS = float(os.environ.get("TEXT_CORRECTIONS_RELOAD_SECONDS", "5"))
+
+
+class _FoldTable(dict):
+    """Tabla para str.translate: minúscula sin acento, un carácter por carácter"""
+
+    def __missing__(self, code: int) -> str:
+        char = chr(code)
+        if char.isspace():
+            folded = " "
+        else:
+            base = unicodedata.normalize("NFD", char)[0].lower()
+            # Se mantiene la longitud para que los índices del texto plegado sirvan en el original
+            folded = base[0] if base else char
+        self[code] = folded
+        return folded
+
+
+_FOLD = _FoldTable()
+
+
+def fold_text(text: str) -> str:
+    return text.translate(_FOLD)
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+class CorrectionAutomaton:
+    """
+    Autómata Aho-Corasick inmutable con las correcciones (original -> reemplazo)
+    """
+
+    def __init__(self, corrections: Iterable[Tuple[str, str]], fold: bool = True, word_boundary: bool = True):
+        self.fold = fold
+        self.word_boundary = word_boundary
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._depth: List[int] = [0]
+        self._pattern: List[int] = [-1]      # patrón que termina en el nodo (-1: ninguno)
+        self._output_link: List[int] = [0]   # sufijo propio más largo que es patrón
+        self._default: List[str] = []
+        self._variants: List[Dict[str, str]] = []
+        self._edge_word: List[Tuple[bool, bool]] = []
+        self.max_length = 0
+
+        for original, replacement in corrections:
+            original = (original or "").strip()
+            if not original:
+                continue
+            self._add(original, replacement)
+        self._build_links()
+
+    def __len__(self) -> int:
+        return len(self._default)
+
+    def _key(self, text: str) -> str:
+        return fold_text(text) if self.fold else text
+
+    def _add(self, original: str, replacement: str) -> None:
+        node = 0
+        for char in self._key(original):
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._depth.append(self._depth[node] + 1)
+                self._pattern.append(-1)
+                self._output_link.append(0)
+            node = next_node
+        pattern_id = self._pattern[node]
+        if pattern_id < 0:
+            pattern_id = self._pattern[node] = len(self._default)
+            self._default.append(replacement)
+            self._variants.append({})
+            self._edge_word.append((_is_word_char(original[0]), _is_word_char(original[-1])))
+            self.max_length = max(self.max_length, self._depth[node])
+        self._variants[pattern_id].setdefault(original, replacement)
+
+    def _build_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                if node:
+                    fail = self._fail[node]
+                    while fail and char not in self._goto[fail]:
+                        fail = self._fail[fail]
+                    self._fail[child] = self._goto[fail].get(char, 0)
+                link = self._fail[child]
+                self._output_link[child] = link if self._pattern[link] >= 0 else self._output_link[link]
+                queue.append(child)
+
+    def _boundaries_ok(self, text: str, start: int, end: int, pattern_id: int, previous: str, final: bool) -> bool:
+        if not self.word_boundary:
+            return True
+        starts_word, ends_word = self._edge_word[pattern_id]
+        if starts_word:
+            before = text[start - 1] if start > 0 else previous
+            if before and _is_word_char(before):
+                return False
+        if ends_word:
+            if end == len(text):
+                return final
+            if _is_word_char(text[end]):
+                return False
+        return True
+
+    def rewrite(self, text: str, previous: str = "", final: bool = True) -> Tuple[str, int]:
+        """
+        Aplica las correcciones a text.
+
+        Args:
+            previous: carácter anterior a text (para el límite de palabra en streaming)
+            final: si es False no se consume la cola que todavía puede ser parte de un match
+
+        Returns:
+            (texto corregido, cantidad de caracteres de text consumidos)
+        """
+        if not self._default:
+            return text, len(text)
+        goto, fail, depth = self._goto, self._fail, self._depth
+        pattern, output_link = self._pattern, self._output_link
+        best: Dict[int, Tuple[int, int]] = {}
+        node = 0
+        for index, char in enumerate(self._key(text)):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            match = node if pattern[node] >= 0 else output_link[node]
+            end = index + 1
+            while match:
+                start = end - depth[match]
+                pattern_id = pattern[match]
+                if (start not in best or best[start][0] < end) and \
+                        self._boundaries_ok(text, start, end, pattern_id, previous, final):
+                    best[start] = (end, pattern_id)
+                match = output_link[match]
+
+        # Un match futuro solo puede empezar en la cola que coincide con un prefijo de patrón
+        safe = len(text) if final else len(text) - depth[node]
+        parts, position = [], 0
+        for start in sorted(best):
+            if start >= safe:
+                break
+            if start < position:
+                continue
+            end, pattern_id = best[start]
+            parts.append(text[position:start])
+            parts.append(self._variants[pattern_id].get(text[start:end], self._default[pattern_id]))
+            position = end
+        consumed = max(position, safe)
+        parts.append(text[position:consumed])
+        return "".join(parts), consumed
+
+    def replace(self, text: str) -> str:
+        if not text or not self._default:
+            return text
+        return self.rewrite(text)[0]
+
+    def stream(self) -> "StreamCorrector":
+        return StreamCorrector(self)
+
+
+class StreamCorrector:
+    """
+    Corrige un stream de tokens: feed() devuelve lo que ya se puede emitir y
+    flush() la cola retenida al final de la respuesta
+    """
+
+    def __init__(self, automaton: CorrectionAutomaton):
+        self.automaton = automaton
+        self._pending = ""
+        self._previous = ""
+
+    def feed(self, text: str) -> str:
+        if not text:
+            return ""
+        self._pending += text
+        output, consumed = self.automaton.rewrite(self._pending, self._previous, final=False)
+        if consumed:
+            self._previous = self._pending[consumed - 1]
+            self._pending = self._pending[consumed:]
+        return output
+
+    def flush(self) -> str:
+        if not self._pending:
+            return ""
+        output, _ = self.automaton.rewrite(self._pending, self._previous, final=True)
+        self._previous = self._pending[-1]
+        self._pending = ""
+        return output
+
+
+# ===============================
+# ARCHIVO DE CORRECCIONES
+# ===============================
+
+def load_corrections_file(path: str) -> List[Tuple[str, str]]:
+    """
+    Lee {"original": [...], "replacement": [...]} (formato de
+    config/text_corrections.json) o un objeto plano {"original": "reemplazo"}
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data.get("original"), list):
+        originals, replacements = data["original"], data.get("replacement", [])
+        if len(originals) != len(replacements):
+            raise ValueError(f"{len(originals)} originales y {len(replacements)} reemplazos")
+        return list(zip(originals, replacements))
+    return [(str(original), str(replacement)) for original, replacement in data.items()]
+
+
+class CorrectionsStore:
+    """
+    Autómata compilado desde un archivo JSON, recompilado cuando el archivo cambia
+    """
+
+    def __init__(self, path: str, extra: Iterable[Tuple[str, str]] = (),
+                 check_interval: float = TEXT_CORRECTIONS_RELOAD_SECONDS, fold: bool = False):
+        self.path = path
+        self.extra = list(extra)
+        self.check_interval = check_interval
+        self.fold = fold
+        self._lock = threading.Lock()
+        self._signature: Optional[Tuple[int, int]] = None
+        self._checked_at = 0.0
+        self._automaton = CorrectionAutomaton(self.extra, fold=fold)
+        self._exact = self._exact_map(self.extra)
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+        self._reload()
+
+    @staticmethod
+    def _exact_map(corrections: Iterable[Tuple[str, str]]) -> Dict[str, str]:
+        exact: Dict[str, str] = {}
+        for original, replacement in corrections:
+            # Como list.index en replace_token: gana la primera entrada
+            exact.setdefault((original or "").strip(), replacement)
+        exact.pop("", None)
+        return exact
+
+    def _file_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _reload(self) -> None:
+        signature = self._file_signature()
+        self._checked_at = time.monotonic()
+        if signature == self._signature:
+            return
+        self._signature = signature
+        if signature is None:
+            self.last_error = f"{self.path} no existe"
+            print(f"⚠️ Archivo de correcciones no encontrado ({self.path}), sigue el autómata actual")
+            return
+        try:
+            started = time.perf_counter()
+            entries = self.extra + load_corrections_file(self.path)
+            automaton = CorrectionAutomaton(entries, fold=self.fold)
+        except Exception as e:
+            self.last_error = str(e)
+            EVENTS_TOTAL.labels(event="text_corrections_reload", source="error").inc()
+            print(f"❌ Correcciones inválidas en {self.path}, se mantienen las anteriores: {e}")
+            return
+        self._automaton = automaton
+        self._exact = self._exact_map(entries)
+        self.reloads += 1
+        self.last_error = None
+        EVENTS_TOTAL.labels(event="text_corrections_reload", source="ok").inc()
+        print(f"✅ Correcciones de texto compiladas: {len(automaton)} patrones "
+              f"({(time.perf_counter() - started) * 1000:.1f} ms)")
+
+    def automaton(self) -> CorrectionAutomaton:
+        if time.monotonic() - self._checked_at >= self.check_interval and self._lock.acquire(blocking=False):
+            # Un solo hilo revisa el archivo; el resto sigue con el autómata vigente
+            try:
+                self._reload()
+            finally:
+                self._lock.release()
+        return self._automaton
+
+    def apply(self, text: str) -> str:
+        return self.automaton().replace(text)
+
+    def replace_token(self, token: str) -> str:
+        """
+        pywo_aux_func.replace_token con el archivo vigente: solo si el texto
+        completo (sin espacios de borde) es una entrada; conserva esos espacios
+        """
+        self.automaton()
+        stripped = token.strip() if token else ""
+        replacement = self._exact.get(stripped) if stripped else None
+        if replacement is None:
+            return token
+        leading = token[:len(token) - len(token.lstrip())]
+        trailing = token[len(token.rstrip()):]
+        return leading + replacement + trailing
+
+    def stream(self) -> StreamCorrector:
+        """Corrector para una respuesta (usa el autómata vigente al empezar)"""
+        return self.automaton().stream()
+
+    def __len__(self) -> int:
+        return len(self._automaton)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "path": self.path,
+            "patterns": len(self._automaton),
+            "max_pattern_length": self._automaton.max_length,
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+        }
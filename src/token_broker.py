@@ -0,0 +1,288 @@
+"""
+Broker de tokens de Azure Speech (STS y relay ICE)
+==================================================
+
+/api/speech-token llamaba a issueToken en cada request (cada carga de página
+y cada reconexión sumaba un round trip a STS), y app_sin_voice_live_login.py
+tenía sus propios hilos de refresco del token de speech y del ICE. Este
+módulo centraliza los tokens en un TokenBroker compartido por todos los
+handlers:
+
+- get(nombre) es O(1) sobre el token en memoria; si no hay token válido, un
+  solo hilo lo pide (single-flight) y el resto espera ese resultado
+- Un hilo refresca cada token en segundo plano al TOKEN_REFRESH_RATIO (80%)
+  de su validez, así los requests casi nunca ven un miss
+- Si el refresco falla se reintenta con backoff exponencial con jitter
+  (TOKEN_BACKOFF_BASE_SECONDS hasta TOKEN_BACKOFF_MAX_SECONDS) y se sigue
+  sirviendo el token anterior mientras no venza
+
+Fetchers: speech_sts_fetcher (issueToken con la key), speech_aad_fetcher
+(managed identity para endpoint privado) e ice_relay_fetcher (token relay del
+avatar). Todos aceptan la URL base para apuntarlos a un STS local de pruebas
+(ver benchmark/fake_speech_sts.py).
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import requests
+
+from src.metrics_registry import EVENTS_TOTAL, observe_dependency
+
+# Los tokens STS valen 10 minutos
+SPEECH_TOKEN_TTL_SECONDS = float(os.environ.get("SPEECH_TOKEN_TTL_SECONDS", "600"))
+# El relay token del avatar no informa vencimiento; se renueva con este período
+SPEECH_ICE_TOKEN_TTL_SECONDS = float(os.environ.get("SPEECH_ICE_TOKEN_TTL_SECONDS", "3600"))
+TOKEN_REFRESH_RATIO = float(os.environ.get("TOKEN_REFRESH_RATIO", "0.8"))
+TOKEN_BACKOFF_BASE_SECONDS = float(os.environ.get("TOKEN_BACKOFF_BASE_SECONDS", "2"))
+TOKEN_BACKOFF_MAX_SECONDS = float(os.environ.get("TOKEN_BACKOFF_MAX_SECONDS", "60"))
+TOKEN_FETCH_TIMEOUT_SECONDS = float(os.environ.get("TOKEN_FETCH_TIMEOUT_SECONDS", "10"))
+# Un token con menos vida que esto no se entrega (el cliente no llegaría a usarlo)
+TOKEN_MIN_REMAINING_SECONDS = float(os.environ.get("TOKEN_MIN_REMAINING_SECONDS", "30"))
+
+# fetch() -> (token, segundos de validez)
+Fetcher = Callable[[], Tuple[Any, float]]
+
+
+class TokenUnavailable(Exception):
+    """No hay token válido y el pedido a STS falló"""
+
+
+# ===============================
+# FETCHERS
+# ===============================
+
+def speech_sts_fetcher(region: str, key: str, base_url: Optional[str] = None,
+                       ttl: float = SPEECH_TOKEN_TTL_SECONDS) -> Fetcher:
+    url = f"{(base_url or f'https://{region}.api.cognitive.microsoft.com').rstrip('/')}/sts/v1.0/issueToken"
+
+    def fetch():
+        with observe_dependency("speech_sts", "issue_token"):
+            resp = requests.post(url, headers={"Ocp-Apim-Subscription-Key": key,
+                                               "Content-Type": "application/x-www-form-urlencoded"},
+                                 timeout=TOKEN_FETCH_TIMEOUT_SECONDS)
+            resp.raise_for_status()
+        if not resp.text:
+            raise ValueError("issueToken devolvió un token vacío")
+        return resp.text, ttl
+
+    return fetch
+
+
+def speech_aad_fetcher(resource_url: str, managed_identity_client_id: Optional[str] = None) -> Fetcher:
+    """Token aad#recurso#token para endpoints privados (vence cuando vence el token AAD)"""
+    def fetch():
+        from azure.identity import DefaultAzureCredential
+        credential = DefaultAzureCredential(managed_identity_client_id=managed_identity_client_id)
+        with observe_dependency("speech_sts", "aad_token"):
+            token = credential.get_token("https://cognitiveservices.azure.com/.default")
+        return f"aad#{resource_url}#{token.token}", max(60.0, token.expires_on - time.time())
+
+    return fetch
+
+
+def ice_relay_fetcher(region: str, key: str, private_endpoint: Optional[str] = None,
+                      base_url: Optional[str] = None, ttl: float = SPEECH_ICE_TOKEN_TTL_SECONDS) -> Fetcher:
+    """Token relay (Urls/Username/Password) del avatar, como texto JSON"""
+    base = base_url or private_endpoint
+    if base:
+        url = f"{base.rstrip('/')}/tts/cognitiveservices/avatar/relay/token/v1"
+    else:
+        url = f"https://{region}.tts.speech.microsoft.com/cognitiveservices/avatar/relay/token/v1"
+
+    def fetch():
+        with observe_dependency("speech_sts", "relay_token"):
+            resp = requests.get(url, headers={"Ocp-Apim-Subscription-Key": key},
+                                timeout=TOKEN_FETCH_TIMEOUT_SECONDS)
+            resp.raise_for_status()
+        json.loads(resp.text)  # valida que sea el JSON esperado antes de cachearlo
+        return resp.text, ttl
+
+    return fetch
+
+
+# ===============================
+# BROKER
+# ===============================
+
+class _Slot:
+    __slots__ = ("name", "fetch", "value", "issued_at", "expires_at", "refresh_at",
+                 "failures", "fetching", "last_error", "cond", "counters")
+
+    def __init__(self, name: str, fetch: Fetcher, lock: threading.Lock):
+        self.name = name
+        self.fetch = fetch
+        self.value = None
+        self.issued_at = 0.0
+        self.expires_at = 0.0
+        self.refresh_at = 0.0
+        self.failures = 0
+        self.fetching = False
+        self.last_error: Optional[str] = None
+        self.cond = threading.Condition(lock)
+        self.counters = {"hits": 0, "misses": 0, "refreshes": 0, "refresh_failures": 0}
+
+    def valid(self, now: float) -> bool:
+        return self.value is not None and self.expires_at - now > TOKEN_MIN_REMAINING_SECONDS
+
+
+class TokenBroker:
+    """
+    Tokens cacheados y refrescados en segundo plano (thread-safe)
+    """
+
+    def __init__(self, refresh_ratio: float = TOKEN_REFRESH_RATIO,
+                 backoff_base: float = TOKEN_BACKOFF_BASE_SECONDS, backoff_max: float = TOKEN_BACKOFF_MAX_SECONDS):
+        self.refresh_ratio = refresh_ratio
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        self._slots: Dict[str, _Slot] = {}
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, name: str, fetch: Fetcher) -> None:
+        with self._lock:
+            self._slots[name] = _Slot(name, fetch, self._lock)
+        self._wakeup.set()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._slots
+
+    def start(self) -> None:
+        """Arranca el hilo de refresco (pide todos los tokens de inmediato)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="token-broker", daemon=True)
+            self._thread.start()
+        print(f"🚀 Broker de tokens iniciado ({', '.join(self._slots) or 'sin tokens'})")
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+
+    # ===============================
+    # LECTURA
+    # ===============================
+
+    def get(self, name: str, timeout: float = TOKEN_FETCH_TIMEOUT_SECONDS) -> Tuple[Any, float]:
+        """
+        Devuelve (token, segundos restantes). Con token válido no bloquea; si no,
+        espera al pedido en curso o lo hace este hilo. Raises TokenUnavailable.
+        """
+        slot = self._slots[name]
+        now = time.time()
+        if slot.valid(now):
+            slot.counters["hits"] += 1
+            return slot.value, slot.expires_at - now
+
+        with slot.cond:
+            slot.counters["misses"] += 1
+            EVENTS_TOTAL.labels(event="token_miss", source=name).inc()
+            if slot.fetching:
+                slot.cond.wait_for(lambda: not slot.fetching, timeout)
+            elif not slot.valid(time.time()):
+                self._fetch_locked(slot)
+            now = time.time()
+            if not slot.valid(now):
+                raise TokenUnavailable(f"Token {name} no disponible: {slot.last_error or 'timeout'}")
+            return slot.value, slot.expires_at - now
+
+    def _fetch_locked(self, slot: _Slot) -> bool:
+        """Pide el token con el lock tomado solo para marcar/publicar (single-flight)"""
+        slot.fetching = True
+        slot.cond.release()
+        try:
+            value, ttl = slot.fetch()
+            error = None
+        except Exception as e:
+            value, ttl, error = None, 0.0, str(e)
+        finally:
+            slot.cond.acquire()
+        now = time.time()
+        if error is None:
+            slot.value, slot.issued_at, slot.expires_at = value, now, now + ttl
+            slot.refresh_at = now + ttl * self.refresh_ratio
+            slot.failures, slot.last_error = 0, None
+            slot.counters["refreshes"] += 1
+        else:
+            slot.failures += 1
+            slot.last_error = error
+            slot.counters["refresh_failures"] += 1
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (slot.failures - 1))
+            slot.refresh_at = now + delay * random.uniform(0.8, 1.2)
+            EVENTS_TOTAL.labels(event="token_refresh_failed", source=slot.name).inc()
+            print(f"⚠️ Error renovando token {slot.name} (intento {slot.failures}): {error}")
+        slot.fetching = False
+        slot.cond.notify_all()
+        # El hilo de refresco recalcula su próxima espera
+        self._wakeup.set()
+        return error is None
+
+    # ===============================
+    # REFRESCO EN SEGUNDO PLANO
+    # ===============================
+
+    def refresh(self, name: str) -> bool:
+        """Refresca ya un token (salvo que otro hilo lo esté pidiendo)"""
+        slot = self._slots[name]
+        with slot.cond:
+            if slot.fetching:
+                slot.cond.wait_for(lambda: not slot.fetching, TOKEN_FETCH_TIMEOUT_SECONDS)
+                return slot.valid(time.time())
+            return self._fetch_locked(slot)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wakeup.clear()
+            now = time.time()
+            due = [slot.name for slot in list(self._slots.values()) if slot.refresh_at <= now and not slot.fetching]
+            for name in due:
+                self.refresh(name)
+            pending = [slot.refresh_at for slot in list(self._slots.values())]
+            wait = max(0.05, min(pending) - time.time()) if pending else None
+            self._wakeup.wait(wait)
+
+    # ===============================
+    # MÉTRICAS
+    # ===============================
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        data = {}
+        for name, slot in list(self._slots.items()):
+            data[name] = {
+                "valid": slot.valid(now),
+                "age_seconds": round(now - slot.issued_at, 1) if slot.value is not None else None,
+                "expires_in_seconds": round(slot.expires_at - now, 1) if slot.value is not None else None,
+                "next_refresh_in_seconds": round(slot.refresh_at - now, 1),
+                "consecutive_failures": slot.failures,
+                "last_error": slot.last_error,
+                **slot.counters,
+            }
+        return data
+
+
+# ===============================
+# INSTANCIA COMPARTIDA
+# ===============================
+
+_broker: Optional[TokenBroker] = None
+_broker_lock = threading.Lock()
+
+
+def get_token_broker() -> TokenBroker:
+    """Broker del proceso (se crea vacío; app.py registra los tokens y lo arranca)"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = TokenBroker()
+    return _broker
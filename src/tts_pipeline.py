@@ -0,0 +1,388 @@
+"""
+Pipeline de TTS por oraciones para el chat del avatar
+=====================================================
+
+handleuserquery (app_sin_voice_live_login.py) cortaba los tokens en cada
+signo de puntuación y speakwithqueue arrancaba un hilo por ráfaga que hacía
+pop(0) de una lista; speaktext corría langdetect en cada oración, armaba el
+SSML y bloqueaba en speak_ssml_async().get() antes de siquiera preparar la
+siguiente. Entre oración y oración el avatar quedaba callado mientras se
+detectaba idioma, se armaba SSML y se mandaba el pedido.
+
+TtsPipeline (uno por cliente, vive mientras el avatar está conectado):
+
+- SentenceChunker corta por oración y, si una oración se pasa de
+  TTS_CHUNK_MAX_CHARS, por cláusula (coma, guion) o espacio; no emite trozos
+  de menos de TTS_CHUNK_MIN_CHARS (el primero puede ser más corto, así el
+  audio arranca antes)
+- Cola deque por cliente; el idioma se detecta una vez por respuesta
+  (ResponseLanguage) con camino rápido para español sin langdetect
+- Lookahead: mientras suena la oración N, la N+1 ya está armada y encolada
+  en el synthesizer (TTS_LOOKAHEAD oraciones por delante), así el SDK la
+  arranca apenas termina la anterior
+- cancel() (barge-in / stopSpeaking) descarta lo pendiente y corta el audio
+
+Métricas: tiempo hasta el primer audio de cada respuesta y silencio entre
+oraciones (solo cuando la siguiente ya estaba lista), a partir de los
+eventos synthesis_started/synthesis_completed del synthesizer.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from src.metrics_registry import REGISTRY
+
+TTS_CHUNK_MIN_CHARS = int(os.environ.get("TTS_CHUNK_MIN_CHARS", "40"))
+TTS_CHUNK_MAX_CHARS = int(os.environ.get("TTS_CHUNK_MAX_CHARS", "220"))
+# El primer trozo de cada respuesta puede ser más corto (baja el tiempo al primer audio)
+TTS_FIRST_CHUNK_MIN_CHARS = int(os.environ.get("TTS_FIRST_CHUNK_MIN_CHARS", "12"))
+# Oraciones encoladas en el synthesizer además de la que está sonando
+TTS_LOOKAHEAD = int(os.environ.get("TTS_LOOKAHEAD", "1"))
+# Texto mínimo para confiar en langdetect (con menos se usa el idioma por defecto)
+TTS_LANG_DETECT_MIN_CHARS = int(os.environ.get("TTS_LANG_DETECT_MIN_CHARS", "20"))
+# Los hilos del pipeline terminan tras este tiempo sin nada que decir
+TTS_IDLE_SECONDS = float(os.environ.get("TTS_IDLE_SECONDS", "30"))
+
+TTS_FIRST_AUDIO_SECONDS = REGISTRY.histogram(
+    "tts_time_to_first_audio_seconds", "Tiempo desde el inicio de la respuesta hasta el primer audio del avatar",
+    buckets=(0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0))
+TTS_SENTENCE_GAP_SECONDS = REGISTRY.histogram(
+    "tts_inter_sentence_gap_seconds", "Silencio entre oraciones con la siguiente ya lista",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0))
+TTS_SENTENCES_TOTAL = REGISTRY.counter(
+    "tts_sentences_total", "Oraciones del pipeline de TTS", ["outcome"])
+
+# ===============================
+# CHUNKER
+# ===============================
+
+# Fin de oración: puntuación seguida de espacio (así "3.5" o "YPF.com" no cortan) o salto de línea
+_SENTENCE_END = re.compile(r"\n|[.?!;:。？！：；](?=\s)")
+_CLAUSE_BREAK = re.compile(r"[,，、—–](?=\s)|\s[-–—]\s")
+
+
+class SentenceChunker:
+    """
+    Acumula tokens y devuelve trozos listos para sintetizar
+    """
+
+    def __init__(self, min_chars: int = TTS_CHUNK_MIN_CHARS, max_chars: int = TTS_CHUNK_MAX_CHARS,
+                 first_min_chars: int = TTS_FIRST_CHUNK_MIN_CHARS):
+        self.min_chars = min_chars
+        self.max_chars = max(max_chars, min_chars + 1)
+        self.first_min_chars = first_min_chars
+        self._buffer = ""
+        self._emitted = 0
+
+    def feed(self, text: str) -> List[str]:
+        self._buffer += text
+        chunks = []
+        while True:
+            chunk = self._next_chunk()
+            if chunk is None:
+                return chunks
+            if chunk:
+                chunks.append(chunk)
+                self._emitted += 1
+
+    def flush(self) -> List[str]:
+        """Lo que quedó en el buffer al terminar la respuesta"""
+        chunk, self._buffer = self._buffer.strip(), ""
+        if not chunk:
+            return []
+        self._emitted += 1
+        return [chunk]
+
+    def _cut(self, end: int) -> str:
+        chunk, self._buffer = self._buffer[:end], self._buffer[end:]
+        return chunk.strip()
+
+    def _next_chunk(self) -> Optional[str]:
+        minimum = self.first_min_chars if self._emitted == 0 else self.min_chars
+        for match in _SENTENCE_END.finditer(self._buffer):
+            # Un salto de línea siempre corta (párrafo); una oración corta se junta con la siguiente
+            if match.group() == "\n" or len(self._buffer[:match.end()].strip()) >= minimum:
+                return self._cut(match.end())
+        if len(self._buffer) <= self.max_chars:
+            return None
+        # Oración demasiado larga: última cláusula o último espacio antes del máximo
+        window = self._buffer[:self.max_chars]
+        clauses = [m.end() for m in _CLAUSE_BREAK.finditer(window) if m.end() >= minimum]
+        if clauses:
+            return self._cut(clauses[-1])
+        space = window.rfind(" ")
+        return self._cut(space if space >= minimum else self.max_chars)
+
+
+# ===============================
+# IDIOMA
+# ===============================
+
+_SPANISH_CHARS = re.compile(r"[áéíóúñ¿¡]", re.IGNORECASE)
+_SPANISH_WORDS = re.compile(
+    r"\b(el|la|los|las|del|que|en|es|por|para|con|una|se|su|al|pozo|pozos|está|son|hay|como)\b", re.IGNORECASE)
+
+
+def looks_spanish(text: str) -> bool:
+    """Camino rápido sin langdetect: tildes/ñ/¿¡ o al menos dos palabras funcionales distintas"""
+    if _SPANISH_CHARS.search(text):
+        return True
+    return len({word.lower() for word in _SPANISH_WORDS.findall(text)}) >= 2
+
+
+class ResponseLanguage:
+    """
+    Idioma de una respuesta: se detecta una vez y se reutiliza para todas sus oraciones
+    """
+
+    def __init__(self, detect_fn: Optional[Callable[[str], str]] = None, default: str = "es"):
+        self.detect_fn = detect_fn
+        self.default = default
+        self.language: Optional[str] = None
+        self.counters = {"fast_path": 0, "detected": 0, "cached": 0}
+
+    def reset(self) -> None:
+        self.language = None
+
+    def detect(self, text: str) -> str:
+        if self.language is not None:
+            self.counters["cached"] += 1
+            return self.language
+        if looks_spanish(text):
+            self.counters["fast_path"] += 1
+            self.language = "es"
+        elif self.detect_fn is not None and len(text) >= TTS_LANG_DETECT_MIN_CHARS:
+            self.counters["detected"] += 1
+            try:
+                self.language = self.detect_fn(text)
+            except Exception as e:
+                print(f"⚠️ No se pudo detectar el idioma: {e}")
+                self.language = self.default
+        else:
+            # Muy corto para decidir: idioma por defecto sin fijarlo para la respuesta
+            return self.default
+        return self.language
+
+
+# ===============================
+# PIPELINE
+# ===============================
+
+class _Sentence:
+    __slots__ = ("text", "ending_silence_ms", "generation", "queued_at")
+
+    def __init__(self, text: str, ending_silence_ms: int, generation: int):
+        self.text = text
+        self.ending_silence_ms = ending_silence_ms
+        self.generation = generation
+        self.queued_at = time.perf_counter()
+
+
+class TtsPipeline:
+    """
+    Cola de oraciones de un cliente con síntesis encadenada.
+    speak_async(ssml) devuelve un future con .get() (speak_ssml_async del SDK);
+    build_ssml(texto, idioma, silencio_ms) arma el SSML; stop() corta el audio.
+    """
+
+    def __init__(self, name: str, speak_async: Callable[[str], Any], build_ssml: Callable[[str, str, int], str],
+                 stop: Optional[Callable[[], None]] = None, detect_fn: Optional[Callable[[str], str]] = None,
+                 on_result: Optional[Callable[[Any], None]] = None, lookahead: int = TTS_LOOKAHEAD):
+        self.name = name
+        self.speak_async = speak_async
+        self.build_ssml = build_ssml
+        self.stop = stop
+        self.on_result = on_result
+        self.lookahead = max(0, lookahead)
+        self.language = ResponseLanguage(detect_fn)
+        self.chunker = SentenceChunker()
+        self._cond = threading.Condition()
+        self._pending: Deque[_Sentence] = deque()
+        # Pedidos ya entregados al synthesizer, en orden: (oración, future)
+        self._inflight: Deque[tuple] = deque()
+        self._generation = 0
+        # Tras un barge-in se descarta el resto de la respuesta hasta la próxima begin_response()
+        self._muted = False
+        self._submitter: Optional[threading.Thread] = None
+        self._waiter: Optional[threading.Thread] = None
+        self._closed = False
+        # Medición (con los eventos del synthesizer)
+        self._response_started: Optional[float] = None
+        self._last_finished: Optional[float] = None
+        self._next_ready_at_finish = False
+        self.last_first_audio_seconds: Optional[float] = None
+        self.counters = {"sentences": 0, "spoken": 0, "failed": 0, "cancelled": 0, "barge_ins": 0,
+                         "gaps": 0, "gap_seconds": 0.0}
+
+    # ===============================
+    # ENTRADA
+    # ===============================
+
+    def begin_response(self) -> None:
+        """Nueva respuesta: chunker e idioma nuevos, arranca el reloj del primer audio"""
+        self.chunker = SentenceChunker()
+        self.language.reset()
+        with self._cond:
+            self._muted = False
+            self._response_started = time.perf_counter()
+            self._last_finished = None
+
+    def feed(self, text: str) -> None:
+        for chunk in self.chunker.feed(text):
+            self.enqueue(chunk)
+
+    def end_response(self) -> None:
+        for chunk in self.chunker.flush():
+            self.enqueue(chunk)
+
+    def enqueue(self, text: str, ending_silence_ms: int = 0) -> None:
+        text = text.strip()
+        if not text:
+            return
+        with self._cond:
+            if self._closed or self._muted:
+                return
+            self._pending.append(_Sentence(text, ending_silence_ms, self._generation))
+            self.counters["sentences"] += 1
+            self._ensure_threads()
+            self._cond.notify_all()
+
+    @property
+    def is_speaking(self) -> bool:
+        return bool(self._pending or self._inflight)
+
+    def cancel(self) -> None:
+        """Barge-in: descarta lo pendiente y el resto de la respuesta, ignora lo ya encolado y corta el audio"""
+        with self._cond:
+            self._generation += 1
+            self._muted = True
+            dropped = len(self._pending)
+            self._pending.clear()
+            self._response_started = None
+            self._last_finished = None
+            self.counters["cancelled"] += dropped
+            self.counters["barge_ins"] += 1
+            self._cond.notify_all()
+        if dropped:
+            TTS_SENTENCES_TOTAL.labels(outcome="cancelled").inc(dropped)
+        if self.stop is not None:
+            try:
+                self.stop()
+            except Exception as e:
+                print(f"⚠️ Error cortando el audio de {self.name}: {e}")
+
+    def close(self) -> None:
+        self.cancel()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    # ===============================
+    # EVENTOS DEL SYNTHESIZER
+    # ===============================
+
+    def audio_started(self) -> None:
+        """synthesis_started: empezó a sonar la siguiente oración"""
+        now = time.perf_counter()
+        with self._cond:
+            if self._response_started is not None:
+                elapsed = now - self._response_started
+                self._response_started = None
+                self.last_first_audio_seconds = elapsed
+                TTS_FIRST_AUDIO_SECONDS.observe(elapsed)
+            elif self._last_finished is not None and self._next_ready_at_finish:
+                gap = now - self._last_finished
+                self.counters["gaps"] += 1
+                self.counters["gap_seconds"] += gap
+                TTS_SENTENCE_GAP_SECONDS.observe(gap)
+            self._last_finished = None
+
+    def audio_finished(self) -> None:
+        """synthesis_completed / synthesis_canceled: terminó la oración que sonaba"""
+        with self._cond:
+            self._last_finished = time.perf_counter()
+            # Solo cuenta como hueco del TTS si la siguiente ya estaba lista (si no, se espera al LLM)
+            self._next_ready_at_finish = len(self._inflight) > 1 or bool(self._pending)
+
+    # ===============================
+    # HILOS
+    # ===============================
+
+    def _ensure_threads(self) -> None:
+        if self._submitter is None or not self._submitter.is_alive():
+            self._submitter = threading.Thread(target=self._submit_loop, name=f"tts-{self.name}", daemon=True)
+            self._submitter.start()
+        if self._waiter is None or not self._waiter.is_alive():
+            self._waiter = threading.Thread(target=self._wait_loop, name=f"tts-wait-{self.name}", daemon=True)
+            self._waiter.start()
+
+    def _submit_loop(self) -> None:
+        """Arma el SSML y entrega al synthesizer hasta lookahead oraciones por delante"""
+        while True:
+            with self._cond:
+                ready = lambda: self._closed or (self._pending and len(self._inflight) <= self.lookahead)
+                if not self._cond.wait_for(ready, TTS_IDLE_SECONDS) or self._closed:
+                    self._submitter = None
+                    return
+                sentence = self._pending.popleft()
+                generation = self._generation
+            if sentence.generation != generation:
+                continue
+            try:
+                ssml = self.build_ssml(sentence.text, self.language.detect(sentence.text),
+                                       sentence.ending_silence_ms)
+                future = self.speak_async(ssml)
+            except Exception as e:
+                self.counters["failed"] += 1
+                TTS_SENTENCES_TOTAL.labels(outcome="failed").inc()
+                print(f"❌ Error sintetizando '{sentence.text[:40]}': {e}")
+                continue
+            with self._cond:
+                self._inflight.append((sentence, future))
+                self._cond.notify_all()
+
+    def _wait_loop(self) -> None:
+        """Espera los pedidos en orden; al terminar uno libera lugar para el siguiente"""
+        while True:
+            with self._cond:
+                if not self._cond.wait_for(lambda: self._inflight or self._closed, TTS_IDLE_SECONDS) \
+                        or not self._inflight:
+                    self._waiter = None
+                    return
+                sentence, future = self._inflight[0]
+            outcome = "spoken"
+            try:
+                result = future.get()
+                if self.on_result is not None:
+                    self.on_result(result)
+            except Exception as e:
+                outcome = "failed"
+                print(f"❌ Error sintetizando '{sentence.text[:40]}': {e}")
+            with self._cond:
+                self._inflight.popleft()
+                if sentence.generation != self._generation:
+                    outcome = "cancelled"
+                self.counters[outcome] += 1
+                self._cond.notify_all()
+            TTS_SENTENCES_TOTAL.labels(outcome=outcome).inc()
+
+    # ===============================
+    # MÉTRICAS
+    # ===============================
+
+    def stats(self) -> Dict[str, Any]:
+        gaps = self.counters["gaps"]
+        return {
+            "pending": len(self._pending),
+            "inflight": len(self._inflight),
+            "lookahead": self.lookahead,
+            "last_first_audio_ms": None if self.last_first_audio_seconds is None
+            else round(self.last_first_audio_seconds * 1000, 1),
+            "avg_gap_ms": round(self.counters["gap_seconds"] / gaps * 1000, 1) if gaps else None,
+            "language": dict(self.language.counters),
+            **{k: v for k, v in self.counters.items() if k != "gap_seconds"},
+        }